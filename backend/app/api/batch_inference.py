@@ -0,0 +1,174 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+import logging
+import os
+from datetime import datetime, timezone
+from typing import List
+
+from app.database import get_db
+from app.models.batch_inference import BatchInferenceJob
+from app.models.model_config import ModelConfig
+from app.models.training import Dataset
+from app.schemas.common import ErrorResponse
+from app.schemas.batch_inference import BatchInferenceCreate, BatchInferenceResponse
+from app.services.batch_inference import ACTIVE_BATCH_STATUSES, batch_inference_manager, output_path_for
+from app.utils.auth import get_current_user
+from app.models.user import User
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+def _get_own_job(db: Session, job_id: int, current_user: User) -> BatchInferenceJob:
+    job = db.query(BatchInferenceJob).filter(
+        BatchInferenceJob.id == job_id,
+        BatchInferenceJob.created_by == current_user.id
+    ).first()
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="批量推理任务不存在")
+    return job
+
+def _job_response(job: BatchInferenceJob) -> dict:
+    data = BatchInferenceResponse.model_validate(job).model_dump()
+    if job.status == "completed":
+        data["progress"] = 1.0
+    elif job.total_records:
+        data["progress"] = min((job.cursor or 0) / job.total_records, 1.0)
+    return data
+
+@router.post("/jobs", response_model=BatchInferenceResponse, responses={400: {"model": ErrorResponse}, 401: {"model": ErrorResponse}, 404: {"model": ErrorResponse}})
+async def create_batch_inference_job(
+    request: BatchInferenceCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """创建并启动批量推理任务
+
+    作用：
+    - 在服务端对数据集中的全部提示调用指定模型，输出按记录顺序追加写入 JSONL，替代脚本逐条调用 /playground/chat。
+
+    触发链路：
+    - 用户在批量推理页面选择数据集与模型配置后提交。
+
+    参数：
+    - request：数据集、模型配置、并发数、处理条数上限与生成参数。
+
+    返回：
+    - 200 + `BatchInferenceResponse`；进度、吞吐与预计剩余时间通过 GET /batch-inference/jobs/{id} 查询。
+
+    注意：
+    - 每条输出包含 index（记录序号）、prompt、reference、output、latency_ms，调用失败时为 error；
+    - 支持暂停/继续/取消，服务重启后未完成的任务从最近一次检查点自动续跑。
+    """
+    dataset = db.query(Dataset).filter(Dataset.id == request.dataset_id).first()
+    if not dataset:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="数据集不存在")
+    config = db.query(ModelConfig).filter(ModelConfig.id == request.model_config_id).first()
+    if not config:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="模型配置不存在")
+    if config.status != 1:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"模型配置未启用: {config.model_name}")
+
+    job = BatchInferenceJob(
+        name=request.name,
+        dataset_id=dataset.id,
+        model_config_id=config.id,
+        params=request.model_dump(include={"concurrency", "max_examples", "temperature", "max_tokens", "system_prompt"}),
+        status="pending",
+        cursor=0,
+        output_offset=0,
+        error_count=0,
+        created_by=current_user.id
+    )
+    db.add(job)
+    db.flush()
+    job.output_path = output_path_for(job.id)
+    db.commit()
+    db.refresh(job)
+    batch_inference_manager.submit(job.id)
+    return _job_response(job)
+
+@router.get("/jobs", response_model=List[BatchInferenceResponse], responses={401: {"model": ErrorResponse}})
+async def get_batch_inference_jobs(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """获取当前用户的批量推理任务列表（最新在前）"""
+    jobs = db.query(BatchInferenceJob).filter(BatchInferenceJob.created_by == current_user.id).order_by(BatchInferenceJob.id.desc()).all()
+    return [_job_response(job) for job in jobs]
+
+@router.get("/jobs/{job_id}", response_model=BatchInferenceResponse, responses={401: {"model": ErrorResponse}, 404: {"model": ErrorResponse}})
+async def get_batch_inference_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """获取任务进度、吞吐（条/秒、token/秒）与预计剩余时间
+
+    注意：
+    - 统计信息随检查点每隔几秒更新一次，cursor 之前的记录已写入输出文件。
+    """
+    return _job_response(_get_own_job(db, job_id, current_user))
+
+@router.post("/jobs/{job_id}/pause", response_model=BatchInferenceResponse, responses={401: {"model": ErrorResponse}, 404: {"model": ErrorResponse}, 409: {"model": ErrorResponse}})
+async def pause_batch_inference_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """暂停任务；写入检查点后停止，在途请求在继续时重新发送"""
+    job = _get_own_job(db, job_id, current_user)
+    if job.status not in ACTIVE_BATCH_STATUSES:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="任务未在运行")
+    if not await batch_inference_manager.stop(job.id, "paused"):
+        job.status = "paused"
+        db.commit()
+    db.refresh(job)
+    return _job_response(job)
+
+@router.post("/jobs/{job_id}/resume", response_model=BatchInferenceResponse, responses={401: {"model": ErrorResponse}, 404: {"model": ErrorResponse}, 409: {"model": ErrorResponse}})
+async def resume_batch_inference_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """从最近一次检查点继续已暂停、已取消或失败的任务"""
+    job = _get_own_job(db, job_id, current_user)
+    if job.status in ACTIVE_BATCH_STATUSES or job.status == "completed" or batch_inference_manager.is_active(job.id):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"任务状态为 {job.status}，无法继续")
+    job.status = "pending"
+    db.commit()
+    batch_inference_manager.submit(job.id)
+    db.refresh(job)
+    return _job_response(job)
+
+@router.post("/jobs/{job_id}/cancel", response_model=BatchInferenceResponse, responses={401: {"model": ErrorResponse}, 404: {"model": ErrorResponse}, 409: {"model": ErrorResponse}})
+async def cancel_batch_inference_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """取消任务；已写入的输出保留"""
+    job = _get_own_job(db, job_id, current_user)
+    if job.status not in ACTIVE_BATCH_STATUSES + ("paused",):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="任务已结束")
+    if not await batch_inference_manager.stop(job.id, "cancelled"):
+        job.status = "cancelled"
+        job.completed_at = datetime.now(timezone.utc)
+        db.commit()
+    db.refresh(job)
+    return _job_response(job)
+
+@router.get("/jobs/{job_id}/output", responses={401: {"model": ErrorResponse}, 404: {"model": ErrorResponse}})
+async def download_batch_inference_output(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """下载输出 JSONL（运行中下载得到截至当前已写入的部分）"""
+    job = _get_own_job(db, job_id, current_user)
+    if not job.output_path or not os.path.exists(job.output_path):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="输出文件不存在")
+    return FileResponse(job.output_path, media_type="application/x-ndjson", filename=f"batch_inference_{job.id}.jsonl")
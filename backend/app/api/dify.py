@@ -5,22 +5,30 @@ Dify API代理
 
 from fastapi import APIRouter, HTTPException, Depends
 from fastapi.responses import StreamingResponse
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, Callable, List
 import httpx
-import json
 import logging
-import os
 from pydantic import BaseModel
 
+from app.services.dify_cache import datasets_cache, history_cache
+from app.services.dify_client import DIFY_API_URL, DifyError, dify_client
 from app.utils.auth import get_current_user
 from app.models.user import User
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-DIFY_API_URL = os.getenv("DIFY_API_URL", "http://localhost")
-DIFY_API_KEY = os.getenv("DIFY_API_KEY", "")
-DIFY_TIMEOUT = 60
+# SSE 透传响应头：禁止中间代理缓冲与改写
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def _sse_response(response: httpx.Response, on_close: Optional[Callable[[], None]] = None) -> StreamingResponse:
+    """把已确认状态正常的上游流式响应原样转发给前端；转发结束后调用 on_close"""
+    return StreamingResponse(
+        dify_client.relay(response, on_close),
+        media_type=response.headers.get("content-type", "text/event-stream"),
+        headers=SSE_HEADERS
+    )
 
 
 class DifyChatRequest(BaseModel):
@@ -43,20 +51,19 @@ async def check_dify_health():
     检查Dify服务健康状态
     """
     try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.get(f"{DIFY_API_URL}/console/api/setup")
-            if response.status_code == 200:
-                return {
-                    "status": "running",
-                    "api_url": DIFY_API_URL,
-                    "message": "Dify服务正常"
-                }
-            else:
-                return {
-                    "status": "error",
-                    "api_url": DIFY_API_URL,
-                    "message": f"Dify服务响应异常: {response.status_code}"
-                }
+        response = await dify_client.probe("/console/api/setup")
+        if response.status_code == 200:
+            return {
+                "status": "running",
+                "api_url": DIFY_API_URL,
+                "message": "Dify服务正常"
+            }
+        else:
+            return {
+                "status": "error",
+                "api_url": DIFY_API_URL,
+                "message": f"Dify服务响应异常: {response.status_code}"
+            }
     except Exception as e:
         return {
             "status": "stopped",
@@ -73,54 +80,48 @@ async def get_datasets(
     current_user: User = Depends(get_current_user)
 ):
     """
-    获取知识库列表
+    获取知识库列表（缓存，见 app/services/dify_cache.py）
     
     Args:
         page: 页码
         limit: 每页数量
         keyword: 搜索关键词
     """
-    try:
+    async def load() -> Dict[str, Any]:
         params = {
             "page": page,
             "limit": limit
         }
         if keyword:
             params["keyword"] = keyword
-        
-        async with httpx.AsyncClient(timeout=DIFY_TIMEOUT) as client:
-            response = await client.get(
-                f"{DIFY_API_URL}/v1/datasets",
-                params=params,
-                headers={
-                    "Authorization": f"Bearer {DIFY_API_KEY}",
-                    "Content-Type": "application/json"
-                }
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            # 提取id和name，简化返回
-            datasets = []
-            for item in data.get("data", []):
-                datasets.append({
-                    "id": item["id"],
-                    "name": item["name"],
-                    "description": item.get("description", ""),
-                    "document_count": item.get("document_count", 0),
-                    "word_count": item.get("word_count", 0)
-                })
-            
-            return {
-                "datasets": datasets,
-                "total": data.get("total", 0),
-                "page": data.get("page", page),
-                "has_more": data.get("has_more", False)
-            }
-            
-    except httpx.HTTPStatusError as e:
-        logger.error(f"获取知识库列表失败: {e}")
-        raise HTTPException(status_code=e.response.status_code, detail=f"Dify API错误: {e}")
+
+        data = await dify_client.get("/v1/datasets", params=params)
+
+        # 提取id和name，简化返回
+        datasets = []
+        for item in data.get("data", []):
+            datasets.append({
+                "id": item["id"],
+                "name": item["name"],
+                "description": item.get("description", ""),
+                "document_count": item.get("document_count", 0),
+                "word_count": item.get("word_count", 0)
+            })
+
+        return {
+            "datasets": datasets,
+            "total": data.get("total", 0),
+            "page": data.get("page", page),
+            "has_more": data.get("has_more", False)
+        }
+
+    try:
+        # 知识库很少变化：过期后先返回旧列表并在后台刷新
+        return await datasets_cache.fetch((page, limit, keyword or None), load)
+
+    except DifyError as e:
+        logger.error(f"获取知识库列表失败: {e.detail}")
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     except Exception as e:
         logger.error(f"获取知识库列表异常: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -175,32 +176,17 @@ async def chat_with_dify(
         if request.dataset_ids:
             payload["inputs"]["dataset_ids"] = request.dataset_ids
         
-        async def generate():
-            async with httpx.AsyncClient(timeout=DIFY_TIMEOUT) as client:
-                async with client.stream(
-                    "POST",
-                    f"{DIFY_API_URL}/v1/chat-messages",
-                    json=payload,
-                    headers={
-                        "Authorization": f"Bearer {DIFY_API_KEY}",
-                        "Content-Type": "application/json"
-                    }
-                ) as response:
-                    response.raise_for_status()
-                    async for line in response.aiter_lines():
-                        if line.startswith("data: "):
-                            data = line[6:]
-                            if data.strip():
-                                yield f"data: {data}\n\n"
-        
-        return StreamingResponse(
-            generate(),
-            media_type="text/event-stream"
-        )
-        
-    except httpx.HTTPStatusError as e:
-        logger.error(f"Dify对话失败: {e}")
-        raise HTTPException(status_code=e.response.status_code, detail=f"Dify API错误: {e}")
+        # 先等待上游响应头：鉴权失败、会话不存在等错误以 HTTP 状态码返回，而不是中途断开的流
+        response = await dify_client.open_stream("/v1/chat-messages", payload, route="chat")
+        on_close = None
+        if request.conversation_id:
+            # 本轮对话结束后该会话的历史缓存失效（新会话尚无缓存）
+            on_close = lambda: history_cache.invalidate_group(request.conversation_id)
+        return _sse_response(response, on_close)
+
+    except DifyError as e:
+        logger.error(f"Dify对话失败: {e.detail}")
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     except Exception as e:
         logger.error(f"Dify对话异常: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -229,32 +215,12 @@ async def run_workflow(
             "user": user_id
         }
         
-        async def generate():
-            async with httpx.AsyncClient(timeout=DIFY_TIMEOUT) as client:
-                async with client.stream(
-                    "POST",
-                    f"{DIFY_API_URL}/v1/workflows/run",
-                    json=payload,
-                    headers={
-                        "Authorization": f"Bearer {DIFY_API_KEY}",
-                        "Content-Type": "application/json"
-                    }
-                ) as response:
-                    response.raise_for_status()
-                    async for line in response.aiter_lines():
-                        if line.startswith("data: "):
-                            data = line[6:]
-                            if data.strip():
-                                yield f"data: {data}\n\n"
-        
-        return StreamingResponse(
-            generate(),
-            media_type="text/event-stream"
-        )
-        
-    except httpx.HTTPStatusError as e:
-        logger.error(f"执行工作流失败: {e}")
-        raise HTTPException(status_code=e.response.status_code, detail=f"Dify API错误: {e}")
+        response = await dify_client.open_stream("/v1/workflows/run", payload, route="workflow")
+        return _sse_response(response)
+
+    except DifyError as e:
+        logger.error(f"执行工作流失败: {e.detail}")
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     except Exception as e:
         logger.error(f"执行工作流异常: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -267,26 +233,37 @@ async def get_conversation_messages(
     current_user: User = Depends(get_current_user)
 ):
     """
-    获取会话历史消息
+    获取会话历史消息（按会话缓存，该会话通过 /chat 完成一轮对话后失效）
     """
     try:
-        async with httpx.AsyncClient(timeout=DIFY_TIMEOUT) as client:
-            response = await client.get(
-                f"{DIFY_API_URL}/v1/messages",
+        return await history_cache.fetch(
+            (conversation_id, limit),
+            lambda: dify_client.get(
+                "/v1/messages",
                 params={
                     "conversation_id": conversation_id,
                     "limit": limit
-                },
-                headers={
-                    "Authorization": f"Bearer {DIFY_API_KEY}"
                 }
-            )
-            response.raise_for_status()
-            return response.json()
-            
-    except httpx.HTTPStatusError as e:
-        logger.error(f"获取会话历史失败: {e}")
-        raise HTTPException(status_code=e.response.status_code, detail=f"Dify API错误: {e}")
+            ),
+            group=conversation_id
+        )
+
+    except DifyError as e:
+        logger.error(f"获取会话历史失败: {e.detail}")
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     except Exception as e:
         logger.error(f"获取会话历史异常: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/cache/stats")
+async def get_dify_cache_stats(
+    current_user: User = Depends(get_current_user)
+):
+    """
+    获取Dify缓存统计：命中率、上游请求平均耗时与命中节省的上游耗时
+    """
+    return {
+        "datasets": datasets_cache.stats(),
+        "conversation_messages": history_cache.stats()
+    }
@@ -0,0 +1,180 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+import logging
+from typing import List, Optional
+
+from app.database import get_db
+from app.models.evaluation import EvaluationResult, EvaluationRun
+from app.models.model_config import ModelConfig
+from app.models.training import Dataset
+from app.schemas.common import ErrorResponse
+from app.schemas.evaluation import EvaluationRunCreate, EvaluationRunResponse, EvaluationResultsPage
+from app.services.eval_metrics import JUDGE_METRIC
+from app.services.evaluation_runner import ACTIVE_EVAL_STATUSES, compute_summary, evaluation_manager
+from app.utils.auth import get_current_user
+from app.models.user import User
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+def _get_own_run(db: Session, run_id: int, current_user: User) -> EvaluationRun:
+    run = db.query(EvaluationRun).filter(
+        EvaluationRun.id == run_id,
+        EvaluationRun.created_by == current_user.id
+    ).first()
+    if not run:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="评估任务不存在")
+    return run
+
+def _run_response(db: Session, run: EvaluationRun) -> dict:
+    data = EvaluationRunResponse.model_validate(run).model_dump()
+    expected = (run.total_examples or 0) * len(run.model_config_ids)
+    data["progress"] = 1.0 if run.status == "completed" else (min(run.completed_count / expected, 1.0) if expected else None)
+    if run.status in ACTIVE_EVAL_STATUSES:
+        # 运行中实时汇总已写库的结果
+        data["summary"] = compute_summary(db, run)
+    return data
+
+@router.post("/runs", response_model=EvaluationRunResponse, responses={400: {"model": ErrorResponse}, 401: {"model": ErrorResponse}, 404: {"model": ErrorResponse}})
+async def create_evaluation_run(
+    request: EvaluationRunCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """创建并启动评估任务
+
+    作用：
+    - 在同一份验证集上让多个模型配置回答相同的问题，逐样本计算精确匹配、BLEU、ROUGE 与 LLM 评审得分。
+
+    触发链路：
+    - 训练完成并部署后，用户在评估页面选择验证集、微调模型与基座模型发起对比。
+
+    参数：
+    - request：验证集、参与对比的模型配置、指标、评审模型与并发数等。
+
+    返回：
+    - 200 + `EvaluationRunResponse`，评估在后台执行，进度与实时汇总通过 GET /evaluation/runs/{id} 查询。
+
+    注意：
+    - 指标含 judge 时必须指定 judge_config_id；模型配置需已启用；
+    - 服务重启后未完成的评估会从中断处自动续跑。
+    """
+    dataset = db.query(Dataset).filter(Dataset.id == request.dataset_id).first()
+    if not dataset:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="数据集不存在")
+    config_ids = list(dict.fromkeys(request.model_config_ids))
+    if len(config_ids) < 2:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="至少需要两个不同的模型配置")
+    if JUDGE_METRIC in request.metrics and not request.judge_config_id:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="使用 LLM 评审时必须指定 judge_config_id")
+    lookup_ids = config_ids + ([request.judge_config_id] if request.judge_config_id else [])
+    configs = {config.id: config for config in db.query(ModelConfig).filter(ModelConfig.id.in_(lookup_ids))}
+    missing = [config_id for config_id in lookup_ids if config_id not in configs]
+    if missing:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"模型配置不存在: {', '.join(missing)}")
+    disabled = [configs[config_id].model_name for config_id in lookup_ids if configs[config_id].status != 1]
+    if disabled:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"模型配置未启用: {', '.join(disabled)}")
+
+    run = EvaluationRun(
+        name=request.name,
+        dataset_id=dataset.id,
+        model_config_ids=config_ids,
+        judge_config_id=request.judge_config_id,
+        metrics=list(dict.fromkeys(request.metrics)),
+        params=request.model_dump(include={"concurrency", "max_examples", "temperature", "max_tokens", "system_prompt"}),
+        status="pending",
+        completed_count=0,
+        created_by=current_user.id
+    )
+    db.add(run)
+    db.commit()
+    db.refresh(run)
+    evaluation_manager.submit(run.id)
+    return _run_response(db, run)
+
+@router.get("/runs", response_model=List[EvaluationRunResponse], responses={401: {"model": ErrorResponse}})
+async def get_evaluation_runs(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """获取当前用户的评估任务列表（最新在前）"""
+    runs = db.query(EvaluationRun).filter(EvaluationRun.created_by == current_user.id).order_by(EvaluationRun.id.desc()).all()
+    return [_run_response(db, run) for run in runs]
+
+@router.get("/runs/{run_id}", response_model=EvaluationRunResponse, responses={401: {"model": ErrorResponse}, 404: {"model": ErrorResponse}})
+async def get_evaluation_run(
+    run_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """获取评估进度与各模型的指标汇总"""
+    return _run_response(db, _get_own_run(db, run_id, current_user))
+
+@router.get("/runs/{run_id}/results", response_model=EvaluationResultsPage, responses={401: {"model": ErrorResponse}, 404: {"model": ErrorResponse}})
+async def get_evaluation_results(
+    run_id: int,
+    model_config_id: Optional[str] = None,
+    errors_only: bool = False,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """分页获取逐样本结果
+
+    作用：
+    - 返回每个样本在各模型上的回答、参考答案、得分与评审理由，便于逐条对比。
+
+    返回：
+    - 200 + `EvaluationResultsPage`，按样本序号排序，同一样本的不同模型结果相邻。
+    """
+    run = _get_own_run(db, run_id, current_user)
+    query = db.query(EvaluationResult).filter(EvaluationResult.run_id == run.id)
+    if model_config_id:
+        query = query.filter(EvaluationResult.model_config_id == model_config_id)
+    if errors_only:
+        query = query.filter(EvaluationResult.error.isnot(None))
+    total = query.count()
+    items = query.order_by(EvaluationResult.example_index, EvaluationResult.model_config_id).offset(offset).limit(limit).all()
+    return {"total": total, "offset": offset, "limit": limit, "items": items}
+
+@router.post("/runs/{run_id}/cancel", response_model=EvaluationRunResponse, responses={401: {"model": ErrorResponse}, 404: {"model": ErrorResponse}, 409: {"model": ErrorResponse}})
+async def cancel_evaluation_run(
+    run_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """取消评估；已写入的结果保留，之后可通过 resume 从中断处继续"""
+    run = _get_own_run(db, run_id, current_user)
+    if run.status not in ACTIVE_EVAL_STATUSES:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="评估任务未在运行")
+    if not await evaluation_manager.cancel(run.id):
+        # 已排队但尚未开始执行（例如服务刚重启）
+        run.status = "cancelled"
+        db.commit()
+    db.refresh(run)
+    return _run_response(db, run)
+
+@router.post("/runs/{run_id}/resume", response_model=EvaluationRunResponse, responses={401: {"model": ErrorResponse}, 404: {"model": ErrorResponse}, 409: {"model": ErrorResponse}})
+async def resume_evaluation_run(
+    run_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """继续已取消或失败的评估
+
+    作用：
+    - 跳过已有结果的 (样本, 模型) 对，重试调用失败的样本，完成后重新计算汇总。
+    """
+    run = _get_own_run(db, run_id, current_user)
+    if run.status in ACTIVE_EVAL_STATUSES or evaluation_manager.is_active(run.id):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="评估任务正在运行")
+    run.status = "pending"
+    run.completed_at = None
+    db.commit()
+    evaluation_manager.submit(run.id)
+    db.refresh(run)
+    return _run_response(db, run)
@@ -11,6 +11,7 @@ from app.schemas.user import UserResponse
 from app.schemas.common import ErrorResponse
 from app.utils.auth import get_current_user
 from app.models.user import User
+from app.services.upload_service import save_upload_file, UploadTooLargeError, MAX_IMAGE_SIZE
 
 # 配置日志记录器
 logger = logging.getLogger(__name__)
@@ -282,7 +283,7 @@ async def get_test_history(
         for test in tests
     ]
 
-@router.post("/upload-image", responses={400: {"model": ErrorResponse}, 401: {"model": ErrorResponse}, 500: {"model": ErrorResponse}})
+@router.post("/upload-image", responses={400: {"model": ErrorResponse}, 401: {"model": ErrorResponse}, 413: {"model": ErrorResponse}, 500: {"model": ErrorResponse}})
 async def upload_image(
     file: UploadFile = File(...),
     current_user: User = Depends(get_current_user)
@@ -303,7 +304,7 @@ async def upload_image(
     - 200 + { filename, file_path, url }。
     
     注意：
-    - 仅接受 image/* 类型文件；文件名使用 UUID 避免冲突；需确保 uploads/images 目录存在。
+    - 仅接受 image/* 类型文件；文件名使用 UUID 避免冲突；按块写盘，超过 MAX_IMAGE_SIZE 返回 413。
     """
     # 检查文件类型
     if not file.content_type.startswith('image/'):
@@ -322,9 +323,13 @@ async def upload_image(
     unique_filename = f"{uuid.uuid4()}.{file_extension}"
     file_path = os.path.join(upload_dir, unique_filename)
     
-    with open(file_path, "wb") as buffer:
-        content = await file.read()
-        buffer.write(content)
+    try:
+        await save_upload_file(file, file_path, max_size=MAX_IMAGE_SIZE)
+    except UploadTooLargeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
     
     return {
         "filename": unique_filename,
@@ -1,26 +1,48 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import insert, update, delete
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Dict, Any
+from datetime import datetime
+from contextlib import asynccontextmanager
+import hashlib
+import json
 import uuid
 import httpx
 import asyncio
 import logging
+import os
 
-from app.database import get_db
+from app.database import get_db, get_schema_meta, set_schema_meta
 from app.schemas.model_config import (
     ModelConfigCreate, ModelConfigUpdate,
     ModelConfigResponse, ModelProviderResponse, ModelResponse, RefreshModelsRequest,
-    PlaygroundMessageRequest, PlaygroundStreamRequest
+    RefreshAllModelsResponse, PlaygroundMessageRequest, PlaygroundStreamRequest
 )
 from app.schemas.common import ErrorResponse
 from app.models.model_config import ModelConfig as ModelConfigModel, ModelProvider as ModelProviderModel, ProviderModel
 from app.llm_core.llm_client import get_model_providers, LLMClient
+from app.utils.cache import TTLCache, etag_matches
+from app.utils.log import REFRESH_DEBUG_LOGGER, log_payload
 
 # 配置日志记录器
 logger = logging.getLogger(__name__)
+# 刷新模型的调试细节写入 debug_refresh.log（经日志队列异步落盘）
+refresh_logger = logging.getLogger(REFRESH_DEBUG_LOGGER)
 
 router = APIRouter(tags=["模型配置"])
 
+# 模型目录缓存：按 provider_id 缓存 /models 的序列化结果，刷新后失效
+CATALOG_CACHE_TTL = float(os.getenv("MODEL_CATALOG_CACHE_TTL", "300"))
+catalog_cache = TTLCache(ttl=CATALOG_CACHE_TTL)
+
+# 批量刷新时每个提供商的超时（秒），慢的提供商不会拖住其它提供商
+REFRESH_PROVIDER_TIMEOUT = float(os.getenv("MODEL_REFRESH_PROVIDER_TIMEOUT", "15"))
+
+# 参与差异比较的字段（created_at 来自上游且时区不一致，不参与比较）
+CATALOG_DIFF_FIELDS = ("model_id", "model_name", "size", "description", "is_vision", "status")
+
 # 默认模型提供商
 DEFAULT_PROVIDERS = [
     {
@@ -100,6 +122,9 @@ DEFAULT_PROVIDERS = [
     }
 ]
 
+# 默认模型配置的初始化标记（schema_meta 表中的键）
+DEFAULT_CONFIGS_SEED_KEY = "default_model_configs"
+
 # 默认模型配置列表（按优先级排序：vLLM第一、Ollama第二、DeepSeek第三）
 DEFAULT_MODEL_CONFIGS = [
     # 1. VLLM (预设模板，默认禁用)
@@ -351,46 +376,43 @@ async def init_default_model_configs(db: Session):
     - 无返回值，直接操作数据库。
     
     注意：
-    - 检查重复配置避免重复插入；按时间顺序排列（vLLM 最晚，显示在最上面）。
+    - 一次查询取出已有的 (provider_id, model_id, endpoint)，缺失的配置一次批量插入；
+    - 按时间顺序排列（vLLM 最晚，显示在最上面）；
+    - 以模板内容的哈希作为初始化标记，模板未变化时直接跳过（用户删除的默认配置不会在重启后重新出现）。
     """
     try:
         from datetime import datetime, timedelta
-        
+
+        seed_version = hashlib.sha256(json.dumps(DEFAULT_MODEL_CONFIGS, sort_keys=True).encode("utf-8")).hexdigest()
+        if get_schema_meta(DEFAULT_CONFIGS_SEED_KEY) == seed_version:
+            return
+
+        existing = set(db.query(
+            ModelConfigModel.provider_id, ModelConfigModel.model_id, ModelConfigModel.endpoint
+        ).filter(ModelConfigModel.provider_id.in_({c["provider_id"] for c in DEFAULT_MODEL_CONFIGS})))
+
         # 从过去时间开始，每个配置间隔10毫秒，按顺序往过去排
         # 这样vLLM会有最晚的时间（最接近现在），在倒序排列时显示在最上面
         base_time = datetime.now() - timedelta(hours=1)  # 从1小时前开始
-        
+        rows = []
         for i, config_data in enumerate(DEFAULT_MODEL_CONFIGS):
-            # 检查是否已存在相同的配置
-            existing = db.query(ModelConfigModel).filter(
-                ModelConfigModel.provider_id == config_data["provider_id"],
-                ModelConfigModel.model_id == config_data["model_id"],
-                ModelConfigModel.endpoint == config_data["endpoint"]
-            ).first()
-            
-            # 如果不存在，则创建默认配置
-            if not existing:
-                # 每个配置间隔10毫秒，按数组顺序递增时间
-                # vLLM在数组最前面，所以时间最晚，在倒序排列时显示在最上面
-                created_time = base_time + timedelta(milliseconds=i * 10)
-                
-                # 确保所有必需字段都被正确设置
-                config_dict = config_data.copy()
-                config_dict['user_id'] = 1  # 默认用户ID
-                config_dict['id'] = str(uuid.uuid4())
-                config_dict['created_at'] = created_time
-                
-                # 确保有top_p和top_k字段
-                if 'top_p' not in config_dict:
-                    config_dict['top_p'] = 0.9
-                if 'top_k' not in config_dict:
-                    config_dict['top_k'] = 0.0
-                
-                db_config = ModelConfigModel(**config_dict)
-                db.add(db_config)
-        
+            if (config_data["provider_id"], config_data["model_id"], config_data["endpoint"]) in existing:
+                continue
+            # 每个配置间隔10毫秒，按数组顺序递增时间
+            # vLLM在数组最前面，所以时间最晚，在倒序排列时显示在最上面
+            rows.append({
+                "top_p": 0.9,
+                "top_k": 0.0,
+                **config_data,
+                "user_id": 1,  # 默认用户ID
+                "id": str(uuid.uuid4()),
+                "created_at": base_time + timedelta(milliseconds=i * 10),
+            })
+        if rows:
+            db.execute(insert(ModelConfigModel), rows)
         db.commit()
-        logger.info("默认模型配置初始化完成")
+        set_schema_meta(DEFAULT_CONFIGS_SEED_KEY, seed_version)
+        logger.info(f"默认模型配置初始化完成，新增 {len(rows)} 条")
     except Exception as e:
         db.rollback()
         logger.error(f"初始化默认模型配置失败: {str(e)}")
@@ -605,8 +627,9 @@ async def delete_model_config(config_id: str, db: Session = Depends(get_db)):
         db.rollback()
         raise HTTPException(status_code=500, detail=f"删除模型配置失败: {str(e)}")
 
-@router.get("/models", response_model=List[ModelResponse], responses={500: {"model": ErrorResponse}})
+@router.get("/models", response_model=List[ModelResponse], responses={304: {"description": "模型目录未变化"}, 500: {"model": ErrorResponse}})
 async def get_models(
+    request: Request,
     provider_id: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
@@ -619,20 +642,29 @@ async def get_models(
     - 前端选择提供商后加载对应的模型列表。
     
     参数：
+    - request：用于读取 If-None-Match 条件请求头。
     - provider_id：提供商 ID（可选，未提供时返回空列表）。
     - db：数据库会话依赖注入。
     
     返回：
-    - 200 + 模型列表（包含模型 ID、名称、大小、状态等）。
+    - 200 + 模型列表（包含模型 ID、名称、大小、状态等），附带 ETag。
+    - 304：客户端缓存的 ETag 与当前目录一致。
     
     注意：
-    - 从 ProviderModel 表查询；需要先调用刷新接口获取最新模型列表。
+    - 从 ProviderModel 表查询并按 provider_id 缓存 CATALOG_CACHE_TTL 秒；刷新接口会使缓存失效。
     """
     try:
         if not provider_id:
             return []
-        models = db.query(ProviderModel).filter(ProviderModel.provider_id == provider_id).all()
-        return models
+        entry = catalog_cache.get(provider_id)
+        if entry is None:
+            models = db.query(ProviderModel).filter(ProviderModel.provider_id == provider_id).all()
+            payload = jsonable_encoder([ModelResponse.model_validate(m) for m in models])
+            entry = catalog_cache.set(provider_id, payload)
+        headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), entry.etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return JSONResponse(content=entry.value, headers=headers)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取模型列表失败: {str(e)}")
 
@@ -657,50 +689,29 @@ async def refresh_models(
     - 200 + 更新后的模型列表。
     
     注意：
-    - 支持 Ollama 和 OpenAI 兼容 API；处理各种网络错误和认证错误；详细日志记录到文件。
+    - 支持 Ollama 和 OpenAI 兼容 API；处理各种网络错误和认证错误；调试细节经日志队列写入 debug_refresh.log。
     """
-    import logging
-    from datetime import datetime
-    import os
-    
-    logger = logging.getLogger(__name__)
-    
-    # 写入详细日志到文件
-    log_file = os.path.join(os.path.dirname(__file__), "../../debug_refresh.log")
-    with open(log_file, "a", encoding="utf-8") as f:
-        f.write(f"\n=== 刷新模型请求 {datetime.now()} ===\n")
-        f.write(f"endpoint: '{request.endpoint}'\n")
-        f.write(f"provider_id: '{request.provider_id}'\n")
-        f.write(f"api_key: {'***' if request.api_key else None}\n")
-        f.write(f"endpoint类型: {type(request.endpoint)}\n")
-        f.write(f"endpoint长度: {len(request.endpoint) if request.endpoint else 0}\n")
-    
-    logger.info(f"收到刷新模型请求:")
-    logger.info(f"  endpoint: {request.endpoint}")
-    logger.info(f"  provider_id: {request.provider_id}")
-    logger.info(f"  api_key: {'***' if request.api_key else None}")
-    
-    # 写入进入try块的日志
-    with open(log_file, "a", encoding="utf-8") as f:
-        f.write(f"进入try块，准备处理请求...\n")
+    request_info = {
+        "endpoint": request.endpoint,
+        "provider_id": request.provider_id,
+        "api_key": "***" if request.api_key else None,
+        "endpoint_length": len(request.endpoint) if request.endpoint else 0,
+    }
+    refresh_logger.debug("刷新模型请求", extra=request_info)
+    logger.info(f"收到刷新模型请求: endpoint={request.endpoint}, provider_id={request.provider_id}")
     
     try:
-        # 写入开始处理日志
-        log_file = os.path.join(os.path.dirname(__file__), "../../debug_refresh.log")
-        with open(log_file, "a", encoding="utf-8") as f:
-            f.write(f"开始调用 fetch_models_from_api...\n")
-        
         models = await fetch_models_from_api(
             request.endpoint,
             request.provider_id, 
             request.api_key
         )
         
-        with open(log_file, "a", encoding="utf-8") as f:
-            f.write(f"fetch_models_from_api 返回了 {len(models) if models else 0} 个模型\n")
+        refresh_logger.debug("fetch_models_from_api 返回", extra={"provider_id": request.provider_id, "count": len(models) if models else 0})
         
         if models:
             await update_models_in_db(db, request.provider_id, models)
+            catalog_cache.invalidate(request.provider_id)
             # 重新从数据库查询模型，确保包含所有字段
             db_models = db.query(ProviderModel).filter(ProviderModel.provider_id == request.provider_id).all()
             return db_models
@@ -718,16 +729,68 @@ async def refresh_models(
         else:
             raise HTTPException(status_code=502, detail=f"模型服务返回错误: {e.response.status_code}")
     except Exception as e:
-        # 写入异常详情到日志文件
-        log_file = os.path.join(os.path.dirname(__file__), "../../debug_refresh.log")
-        with open(log_file, "a", encoding="utf-8") as f:
-            f.write(f"refresh_models 异常:\n")
-            f.write(f"  异常类型: {type(e).__name__}\n")
-            f.write(f"  异常信息: {str(e)}\n")
-            import traceback
-            f.write(f"  堆栈跟踪: {traceback.format_exc()}\n")
+        # 异常详情（含堆栈）写入调试日志
+        refresh_logger.exception("refresh_models 异常", extra={"provider_id": request.provider_id, "error_type": type(e).__name__})
         raise HTTPException(status_code=500, detail=f"刷新模型列表失败: {str(e)}")
 
+@router.post("/models/refresh-all", response_model=RefreshAllModelsResponse, responses={500: {"model": ErrorResponse}})
+async def refresh_all_models(db: Session = Depends(get_db)):
+    """并发刷新所有已启用提供商的模型列表
+    
+    作用：
+    - 对所有存在已启用模型配置的提供商，并发请求其 /models（Ollama 为 /api/tags），
+      并把结果以增量方式同步到 ProviderModel 表。
+    
+    触发链路：
+    - 前端模型配置页面"全部刷新"，或运维脚本定期调用。
+    
+    参数：
+    - db：数据库会话依赖注入。
+    
+    返回：
+    - 200 + 每个提供商的刷新结果（新增/更新/删除数量或错误信息）。
+    
+    注意：
+    - 每个提供商独立超时（REFRESH_PROVIDER_TIMEOUT），单个失败不影响其它提供商；
+      同一提供商存在多个端点时取最早创建的启用配置。
+    """
+    try:
+        configs = db.query(ModelConfigModel).filter(
+            ModelConfigModel.status == 1
+        ).order_by(ModelConfigModel.created_at.asc()).all()
+        targets: Dict[str, ModelConfigModel] = {}
+        for config in configs:
+            targets.setdefault(config.provider_id, config)
+
+        async def refresh_one(client: httpx.AsyncClient, config: ModelConfigModel):
+            return await asyncio.wait_for(
+                fetch_models_from_api(config.endpoint, config.provider_id, config.api_key, client=client),
+                timeout=REFRESH_PROVIDER_TIMEOUT
+            )
+
+        timeout = httpx.Timeout(REFRESH_PROVIDER_TIMEOUT, connect=min(10.0, REFRESH_PROVIDER_TIMEOUT))
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            fetched = await asyncio.gather(
+                *(refresh_one(client, config) for config in targets.values()),
+                return_exceptions=True
+            )
+
+        results = []
+        for provider_id, outcome in zip(targets.keys(), fetched):
+            if isinstance(outcome, BaseException):
+                error = "连接超时" if isinstance(outcome, (asyncio.TimeoutError, httpx.TimeoutException)) else str(outcome) or type(outcome).__name__
+                logger.warning(f"刷新提供商 {provider_id} 失败: {error}")
+                results.append({"provider_id": provider_id, "success": False, "error": error})
+                continue
+            counts = await update_models_in_db(db, provider_id, outcome)
+            catalog_cache.invalidate(provider_id)
+            results.append({"provider_id": provider_id, "success": True, "total": len(outcome), **counts})
+
+        return {"results": results}
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"批量刷新模型列表失败: {str(e)}")
+
 # 辅助函数
 def camel_to_snake(name: str) -> str:
     """将驼峰命名转换为下划线命名
@@ -751,7 +814,21 @@ def camel_to_snake(name: str) -> str:
     s1 = re.sub('(.)([A-Z][a-z]+)', r'\1_\2', name)
     return re.sub('([a-z0-9])([A-Z])', r'\1_\2', s1).lower()
 
-async def fetch_models_from_api(endpoint: str, provider_id: str, api_key: Optional[str] = None):
+@asynccontextmanager
+async def _http_client_scope(client: Optional[httpx.AsyncClient], timeout: httpx.Timeout):
+    """复用调用方传入的客户端；未传入时创建临时客户端并在结束后关闭"""
+    if client is not None:
+        yield client
+        return
+    async with httpx.AsyncClient(timeout=timeout) as own_client:
+        yield own_client
+
+async def fetch_models_from_api(
+    endpoint: str,
+    provider_id: str,
+    api_key: Optional[str] = None,
+    client: Optional[httpx.AsyncClient] = None
+):
     """从 API 获取模型列表
     
     作用：
@@ -764,6 +841,7 @@ async def fetch_models_from_api(endpoint: str, provider_id: str, api_key: Option
     - endpoint：提供商 API 端点 URL。
     - provider_id：提供商标识符。
     - api_key：API 密钥（可选）。
+    - client：可复用的 httpx 客户端（可选，批量刷新时共享连接池）。
     
     返回：
     - 模型列表字典数组。
@@ -771,15 +849,7 @@ async def fetch_models_from_api(endpoint: str, provider_id: str, api_key: Option
     注意：
     - 支持 Ollama 和 OpenAI 兼容 API；处理时间戳转换；生成安全的模型 ID。
     """
-    import logging
-    import os
-    logger = logging.getLogger(__name__)
-    
-    # 写入函数开始日志
-    log_file = os.path.join(os.path.dirname(__file__), "../../debug_refresh.log")
-    with open(log_file, "a", encoding="utf-8") as f:
-        f.write(f"fetch_models_from_api 函数开始执行\n")
-        f.write(f"  参数: endpoint='{endpoint}', provider_id='{provider_id}'\n")
+    refresh_logger.debug("fetch_models_from_api 开始执行", extra={"endpoint": endpoint, "provider_id": provider_id})
     
     logger.info(f"正在从 {provider_id} 获取模型列表: {endpoint}")
     
@@ -790,7 +860,7 @@ async def fetch_models_from_api(endpoint: str, provider_id: str, api_key: Option
     # 增加超时时间，设置重试机制
     timeout = httpx.Timeout(30.0, connect=10.0)
     
-    async with httpx.AsyncClient(timeout=timeout) as client:
+    async with _http_client_scope(client, timeout) as client:
         try:
             if provider_id.lower() == "ollama":
                 # Ollama API
@@ -813,14 +883,12 @@ async def fetch_models_from_api(endpoint: str, provider_id: str, api_key: Option
                 logger.info(f"请求 OpenAI 兼容端点: {models_endpoint}")
                 logger.info(f"原始endpoint: '{endpoint}', 清理后: '{endpoint.rstrip('/')}', 最终URL: '{models_endpoint}'")
                 
-                # 写入URL构建详情到日志文件
-                log_file = os.path.join(os.path.dirname(__file__), "../../debug_refresh.log")
-                with open(log_file, "a", encoding="utf-8") as f:
-                    f.write(f"URL构建详情:\n")
-                    f.write(f"  原始endpoint: '{endpoint}'\n")
-                    f.write(f"  清理后endpoint: '{endpoint.rstrip('/')}'\n")
-                    f.write(f"  是否以/v1结尾: {endpoint.rstrip('/').endswith('/v1')}\n")
-                    f.write(f"  最终URL: '{models_endpoint}'\n")
+                refresh_logger.debug("URL构建详情", extra={
+                    "endpoint": endpoint,
+                    "endpoint_clean": endpoint.rstrip('/'),
+                    "ends_with_v1": endpoint.rstrip('/').endswith('/v1'),
+                    "models_endpoint": models_endpoint,
+                })
                 
                 # vLLM通常不需要API key，先尝试不带headers的请求
                 if provider_id.lower() == "vllm":
@@ -833,7 +901,7 @@ async def fetch_models_from_api(endpoint: str, provider_id: str, api_key: Option
             logger.info(f"HTTP 响应状态: {response.status_code}")
             response.raise_for_status()
             data = response.json()
-            logger.info(f"响应数据: {data}")
+            log_payload(logger, "响应数据", data)
             
             models = []
             if provider_id.lower() == "ollama":
@@ -888,13 +956,11 @@ async def fetch_models_from_api(endpoint: str, provider_id: str, api_key: Option
             
         except httpx.ConnectError as e:
             logger.error(f"连接错误: {str(e)}")
-            # 写入错误详情到日志文件
-            log_file = os.path.join(os.path.dirname(__file__), "../../debug_refresh.log")
-            with open(log_file, "a", encoding="utf-8") as f:
-                f.write(f"连接错误详情:\n")
-                f.write(f"  错误类型: {type(e).__name__}\n")
-                f.write(f"  错误信息: {str(e)}\n")
-                f.write(f"  尝试连接的URL: {models_endpoint}\n")
+            refresh_logger.debug("连接错误详情", extra={
+                "error_type": type(e).__name__,
+                "error": str(e),
+                "models_endpoint": models_endpoint,
+            })
             raise
         except httpx.TimeoutException as e:
             logger.error(f"超时错误: {str(e)}")
@@ -906,14 +972,14 @@ async def fetch_models_from_api(endpoint: str, provider_id: str, api_key: Option
             logger.error(f"未知错误: {str(e)}")
             raise
 
-async def update_models_in_db(db: Session, provider_id: str, models: List[dict]):
+async def update_models_in_db(db: Session, provider_id: str, models: List[dict]) -> Dict[str, int]:
     """更新数据库中的模型列表
     
     作用：
-    - 将 API 获取的模型列表更新到数据库 ProviderModel 表。
+    - 将 API 获取的模型列表与 ProviderModel 表现有记录比较，只写入差异。
     
     触发链路：
-    - refresh_models 接口在获取模型列表后调用此函数。
+    - refresh_models / refresh_all_models 接口在获取模型列表后调用此函数。
     
     参数：
     - db：数据库会话对象。
@@ -921,27 +987,53 @@ async def update_models_in_db(db: Session, provider_id: str, models: List[dict])
     - models：从 API 获取的模型列表。
     
     返回：
-    - 无返回值，直接操作数据库。
+    - { inserted, updated, deleted } 各类变更的数量。
     
     注意：
-    - 先删除该提供商的所有旧模型，再插入新模型；使用事务确保数据一致性。
+    - 新增、更新、删除各用一条批量语句完成，并在同一事务内提交；内容未变化的记录不会被改写。
     """
-    # 删除旧的模型数据
-    db.query(ProviderModel).filter(ProviderModel.provider_id == provider_id).delete()
-    
-    # 添加新的模型数据
+    existing = {
+        row.id: row
+        for row in db.query(ProviderModel).filter(ProviderModel.provider_id == provider_id).all()
+    }
+
+    incoming: Dict[str, Dict[str, Any]] = {}
     for model_data in models:
-        model = ProviderModel(
-            id=model_data["id"],
-            provider_id=model_data["provider_id"],
-            model_id=model_data["model_id"], 
-            model_name=model_data["model_name"],
-            size=model_data.get("size"),
-            description=model_data.get("description"),
-            is_vision=model_data.get("is_vision", False),
-            status=model_data.get("status", 1),
-            created_at=model_data.get("created_at")
-        )
-        db.add(model)
-    
-    db.commit() 
\ No newline at end of file
+        incoming[model_data["id"]] = {
+            "id": model_data["id"],
+            "provider_id": model_data["provider_id"],
+            "model_id": model_data["model_id"],
+            "model_name": model_data["model_name"],
+            "size": model_data.get("size"),
+            "description": model_data.get("description"),
+            "is_vision": model_data.get("is_vision", False),
+            "status": model_data.get("status", 1),
+            "created_at": model_data.get("created_at") or datetime.now(),
+        }
+
+    to_insert = [row for model_id, row in incoming.items() if model_id not in existing]
+    to_update = []
+    for model_id, row in incoming.items():
+        current = existing.get(model_id)
+        if current is None:
+            continue
+        if any(getattr(current, field) != row[field] for field in CATALOG_DIFF_FIELDS):
+            to_update.append({"id": model_id, **{field: row[field] for field in CATALOG_DIFF_FIELDS}})
+    to_delete = [model_id for model_id in existing if model_id not in incoming]
+
+    # 先让 ORM 会话忘掉旧对象，避免批量语句与身份映射中的对象状态冲突
+    db.expunge_all()
+    try:
+        if to_insert:
+            db.execute(insert(ProviderModel), to_insert)
+        if to_update:
+            db.execute(update(ProviderModel), to_update)
+        if to_delete:
+            db.execute(delete(ProviderModel).where(ProviderModel.id.in_(to_delete)))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    logger.info(f"提供商 {provider_id} 模型目录已同步: 新增 {len(to_insert)}，更新 {len(to_update)}，删除 {len(to_delete)}")
+    return {"inserted": len(to_insert), "updated": len(to_update), "deleted": len(to_delete)}
@@ -1,34 +1,80 @@
 import sys
 import logging
 
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, status, UploadFile, File, Request
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import json
 import os
 import asyncio
 import subprocess
-from datetime import datetime
+from contextlib import aclosing
+from datetime import datetime, timezone
 
 from ..database import SessionLocal
-from ..models.training import Dataset, TrainingConfig, TrainingTask
+from ..models.training import Dataset, DatasetJob, ModelDeployment, TrainingCheckpoint, TrainingConfig, TrainingTask
 from ..schemas.training import (
-    DatasetCreate, DatasetResponse,
+    DatasetCreate, DatasetResponse, DatasetValidationResponse, DatasetRecordsResponse,
+    DatasetConvertRequest, DatasetConvertResponse, DatasetPreprocessRequest, DatasetSplitRequest, DatasetJobResponse,
+    DatasetUploadInit, DatasetUploadComplete, DatasetUploadStatus, DatasetFromHash,
     TrainingConfigCreate, TrainingConfigResponse,
-    TrainingTaskCreate, TrainingTaskResponse
+    TrainingTaskCreate, TrainingTaskResponse, TrainingStartRequest, TrainingQueueResponse, TrainingMetricsResponse,
+    TrainingCheckpointResponse, CheckpointPruneRequest, CheckpointPruneResponse,
+    ModelDeployRequest, ModelDeploymentResponse
 )
 from app.schemas.common import ErrorResponse
-from app.utils.auth import get_current_user
+from app.utils.auth import create_stream_token, get_current_user, get_stream_user, optional_security, STREAM_TOKEN_EXPIRE_SECONDS
+from app.models.batch_inference import BatchInferenceJob
+from app.models.evaluation import EvaluationRun
 from app.models.user import User
+from app.services.upload_service import (
+    save_upload_file, hash_file, upload_manager, UploadTooLargeError, UploadOffsetError,
+    MAX_DATASET_SIZE, UPLOAD_CHUNK_SIZE
+)
+from app.services.dataset_store import (
+    DATASET_TMP_DIR, acquire_blob, reference_blob, release_dataset_file, remove_file_quietly
+)
+from app.services.dataset_validator import validate_dataset_record
+from app.services.dataset_index import preview_records, sample_records, remove_index
+from app.services.dataset_converter import ConversionError, convert_and_register
+from app.services.dataset_jobs import run_dataset_job
+from app.services import dataset_preprocess, dataset_split  # noqa: F401  注册 preprocess/split 任务处理器
+from app.services.batch_inference import ACTIVE_BATCH_STATUSES
+from app.services.evaluation_runner import ACTIVE_EVAL_STATUSES
+from app.services.training_executor import ACTIVE_STATUSES, TRAINING_USER_MAX_QUEUED, training_executor
+from app.services.training_progress import progress_tracker
+from app.services.checkpoint_index import prune_checkpoints, scan_task_outputs
+from app.services.adapter_deploy import (
+    ACTIVE_DEPLOY_STATUSES, default_endpoint, default_served_name, run_deployment, select_checkpoint
+)
+from app.services.metrics_store import DEFAULT_METRIC_POINTS, MAX_METRIC_POINTS, list_metrics, query_metrics
+from app.services.log_tail import LOG_TAIL_READ_SIZE, default_start_offset, follow_log, read_log_range
+from app.services.process_supervisor import (
+    LLAMAFACTORY_SERVICE, SWANBOARD_SERVICE, configure_swanboard, probe_host, process_supervisor, swanboard_data_dir
+)
+from app.services.swanlab_catalog import check_board_http, swanlab_catalog
 
 # 配置日志记录器
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-# SwanLab 配置和进程管理
+# SwanLab 配置（SwanBoard 进程由 process_supervisor 统一管理）
 SWANLAB_CONFIG_FILE = "swanlab_config.json"
-SWANLAB_PROCESS = None
+# 前台启动时等待看板 HTTP 可用的最长秒数与单次探测超时
+SWANBOARD_START_TIMEOUT = float(os.getenv("SWANBOARD_START_TIMEOUT", "30"))
+SWANBOARD_PROBE_TIMEOUT = 1.0
+
+# 数据集上传
+DATASET_UPLOAD_DIR = "uploads/datasets"
+ALLOWED_DATASET_FORMATS = ['.json', '.jsonl', '.csv', '.txt']
+
+# 训练日志流：无新内容时检查任务状态的间隔与保活注释的间隔（秒）
+LOG_STREAM_CHECK_INTERVAL = 2.0
+LOG_STREAM_KEEPALIVE = 15.0
 
 def get_db():
     """数据库会话依赖注入
@@ -54,31 +100,36 @@ def get_db():
     finally:
         db.close()
 
-_lf_ready = False  # 缓存：一旦就绪就不再检测
-
 @router.get("/llamafactory/health")
-async def check_llamafactory_health():
-    """检查 LLaMA-Factory Web UI 是否已就绪
+async def check_llamafactory_health(current_user: User = Depends(get_current_user)):
+    """检查 LLaMA-Factory Web UI 是否已就绪（未运行时按需启动）
 
-    使用 asyncio TCP 连接检测端口是否可达，不创建 httpx 客户端，
-    避免阻塞事件循环影响其他 API 请求。
+    作用：
+    - 返回进程监管器记录的实时状态：idle / starting / ready / unhealthy / backoff。
+
+    触发链路：
+    - 前端“模型训练”页面可见时轮询（Layout.vue），就绪后才加载 Web UI iframe；
+      首次调用拉起 Web UI，之后每次调用都推迟空闲回收，页面保持打开期间不会被回收。
+
+    注意：
+    - 会拉起并续期子进程，因此需要登录；
+    - 状态由监管器周期性的端口检查维护，子进程退出后立即不再报告 ready；
+    - 不在请求路径上发起连接，避免阻塞事件循环影响其他 API 请求。
     """
-    global _lf_ready
-    if _lf_ready:
-        return {"status": "ready"}
-    try:
-        _, writer = await asyncio.wait_for(
-            asyncio.open_connection("127.0.0.1", 7860), timeout=1
-        )
-        writer.close()
-        await writer.wait_closed()
-        _lf_ready = True
-        return {"status": "ready"}
-    except Exception:
-        return {"status": "starting"}
+    return process_supervisor.ensure_started(LLAMAFACTORY_SERVICE)
 
-@router.post("/datasets", response_model=DatasetResponse, responses={400: {"model": ErrorResponse}, 401: {"model": ErrorResponse}, 500: {"model": ErrorResponse}})
+@router.get("/services")
+async def get_auxiliary_services():
+    """获取辅助服务（LLaMA-Factory、SwanBoard）的运行状态（只查询，不触发启动）
+
+    返回：
+    - 200 + 列表，每项含 status、pid、重启次数、最近错误、CPU/内存占用与日志路径；未就绪时附带最近输出。
+    """
+    return process_supervisor.status_all()
+
+@router.post("/datasets", response_model=DatasetResponse, responses={400: {"model": ErrorResponse}, 401: {"model": ErrorResponse}, 413: {"model": ErrorResponse}, 500: {"model": ErrorResponse}})
 async def upload_dataset(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     name: str = None,
     description: str = None,
@@ -103,45 +154,235 @@ async def upload_dataset(
     - 200 + `DatasetResponse`。
     
     注意：
-    - 文件保存到 uploads/datasets 目录，使用 UUID 避免重名；记录文件大小和格式类型。
+    - 文件保存到 uploads/datasets 目录，使用 UUID 避免重名；按块写盘并顺带计算 SHA-256 与行数，超过 MAX_DATASET_SIZE 返回 413。
+    - 返回后在后台校验数据集，结果通过 GET /datasets/{dataset_id}/validation 查询。
     """
-    allowed_formats = ['.json', '.jsonl', '.csv', '.txt']
-    file_extension = os.path.splitext(file.filename)[1].lower()
+    file_extension = _check_dataset_format(file.filename)
     
-    if file_extension not in allowed_formats:
+    os.makedirs(DATASET_TMP_DIR, exist_ok=True)
+    
+    import uuid
+    tmp_path = os.path.join(DATASET_TMP_DIR, f"{uuid.uuid4()}{file_extension}")
+    
+    try:
+        result = await save_upload_file(file, tmp_path, max_size=MAX_DATASET_SIZE)
+    except UploadTooLargeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    
+    dataset = _create_dataset_from_upload(db, current_user, tmp_path, result, file_extension, name or file.filename, description)
+    background_tasks.add_task(validate_dataset_record, dataset.id)
+    return dataset
+
+def _create_dataset_from_upload(db: Session, current_user: User, tmp_path: str, result, file_extension: str, name: str, description: str = None) -> Dataset:
+    """把已落盘的临时文件纳入内容寻址存储并创建数据集记录"""
+    try:
+        blob = acquire_blob(db, tmp_path, result, file_extension)
+        dataset = Dataset(
+            name=name,
+            description=description,
+            file_path=blob.file_path,
+            file_size=result.size,
+            format_type=file_extension[1:],
+            content_hash=result.sha256,
+            line_count=result.line_count,
+            validation_status="pending",
+            uploaded_by=current_user.id
+        )
+        db.add(dataset)
+        db.commit()
+    except Exception:
+        # 回滚时 acquire_blob 新移入 blob 目录的文件由会话事件删除，这里只需清理尚未移动的临时文件
+        db.rollback()
+        remove_file_quietly(tmp_path if os.path.exists(tmp_path) else None)
+        raise
+    db.refresh(dataset)
+    return dataset
+
+def _check_dataset_format(filename: str) -> str:
+    """校验数据集扩展名，返回小写扩展名（含点）"""
+    file_extension = os.path.splitext(filename)[1].lower()
+    if file_extension not in ALLOWED_DATASET_FORMATS:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"不支持的文件格式，支持的格式: {', '.join(allowed_formats)}"
+            detail=f"不支持的文件格式，支持的格式: {', '.join(ALLOWED_DATASET_FORMATS)}"
         )
+    return file_extension
+
+def _get_upload_session(upload_id: str, current_user: User):
+    session = upload_manager.get(upload_id)
+    if not session or session.user_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="上传会话不存在或已过期"
+        )
+    return session
+
+def _upload_status(session) -> dict:
+    return {
+        "upload_id": session.upload_id,
+        "filename": session.filename,
+        "total_size": session.total_size,
+        "received": session.received,
+        "chunk_size": UPLOAD_CHUNK_SIZE,
+    }
+
+@router.post("/datasets/uploads", response_model=DatasetUploadStatus, responses={400: {"model": ErrorResponse}, 401: {"model": ErrorResponse}, 413: {"model": ErrorResponse}})
+async def init_dataset_upload(
+    upload: DatasetUploadInit,
+    current_user: User = Depends(get_current_user)
+):
+    """创建可断点续传的分块上传会话
     
-    upload_dir = "uploads/datasets"
-    os.makedirs(upload_dir, exist_ok=True)
+    作用：
+    - 为大数据集分配上传会话，之后按偏移顺序 PUT 分块，中断后可查询已接收字节数继续上传。
     
-    import uuid
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
-    file_path = os.path.join(upload_dir, unique_filename)
+    触发链路：
+    - 前端选择大文件后先调用本接口，再循环调用 PUT /datasets/uploads/{upload_id}。
     
-    with open(file_path, "wb") as buffer:
-        content = await file.read()
-        buffer.write(content)
+    参数：
+    - upload：filename（用于校验格式）、total_size（文件总字节数，超过上限直接拒绝）。
+    - current_user：依赖注入。
     
-    file_size = os.path.getsize(file_path)
+    返回：
+    - 200 + `DatasetUploadStatus`（含 upload_id 与建议的分块大小）。
     
+    注意：
+    - 会话元数据持久化在 uploads/datasets/.partial，超过 PARTIAL_UPLOAD_TTL 未完成会被清理。
+    """
+    _check_dataset_format(upload.filename)
+    try:
+        session = await run_in_threadpool(
+            upload_manager.create, upload.filename, upload.total_size, current_user.id
+        )
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    return _upload_status(session)
+
+@router.get("/datasets/uploads/{upload_id}", response_model=DatasetUploadStatus, responses={401: {"model": ErrorResponse}, 404: {"model": ErrorResponse}})
+async def get_dataset_upload(
+    upload_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """查询分块上传进度（断点续传时据此确定下一个分块的偏移）"""
+    return _upload_status(_get_upload_session(upload_id, current_user))
+
+@router.put("/datasets/uploads/{upload_id}", response_model=DatasetUploadStatus, responses={401: {"model": ErrorResponse}, 404: {"model": ErrorResponse}, 409: {"model": ErrorResponse}, 413: {"model": ErrorResponse}})
+async def upload_dataset_chunk(
+    upload_id: str,
+    offset: int,
+    request: Request,
+    current_user: User = Depends(get_current_user)
+):
+    """上传一个分块
+    
+    作用：
+    - 把请求体（application/octet-stream 原始字节）追加到会话文件的 offset 处。
+    
+    参数：
+    - upload_id：会话 ID。
+    - offset：本分块在文件中的起始字节偏移，必须等于服务端已接收的字节数。
+    - request：原始请求，按流读取请求体，不在内存中缓存整个分块。
+    
+    返回：
+    - 200 + 最新的 `DatasetUploadStatus`。
+    
+    注意：
+    - 偏移不匹配返回 409，detail 中带当前已接收字节数，客户端据此续传；超过声明的总大小返回 413。
+    """
+    session = _get_upload_session(upload_id, current_user)
+    try:
+        session = await upload_manager.append(session, offset, request.stream())
+    except UploadOffsetError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    return _upload_status(session)
+
+@router.post("/datasets/uploads/{upload_id}/complete", response_model=DatasetResponse, responses={401: {"model": ErrorResponse}, 404: {"model": ErrorResponse}, 409: {"model": ErrorResponse}})
+async def complete_dataset_upload(
+    upload_id: str,
+    info: DatasetUploadComplete,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """完成分块上传并创建数据集记录
+    
+    注意：
+    - 已接收字节数必须等于 total_size，否则返回 409；文件以原子重命名移入 uploads/datasets。
+    """
+    session = _get_upload_session(upload_id, current_user)
+    file_extension = _check_dataset_format(session.filename)
+    os.makedirs(DATASET_TMP_DIR, exist_ok=True)
+    tmp_path = os.path.join(DATASET_TMP_DIR, f"{upload_id}{file_extension}")
+    try:
+        result = await upload_manager.complete(session, tmp_path)
+    except UploadOffsetError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+    dataset = _create_dataset_from_upload(db, current_user, tmp_path, result, file_extension, info.name or session.filename, info.description)
+    background_tasks.add_task(validate_dataset_record, dataset.id)
+    return dataset
+
+@router.post("/datasets/from-hash", response_model=DatasetResponse, responses={400: {"model": ErrorResponse}, 401: {"model": ErrorResponse}, 404: {"model": ErrorResponse}})
+async def create_dataset_from_hash(
+    info: DatasetFromHash,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """秒传：按内容哈希直接创建数据集
+    
+    作用：
+    - 客户端先在本地计算 SHA-256，若服务端已有相同内容，则不再传输文件，直接创建引用同一文件的数据集。
+    
+    触发链路：
+    - 前端上传大文件前先调用本接口，返回 404 时再走普通上传或分块上传。
+    
+    参数：
+    - info：sha256、filename（用于确定格式）、name、description。
+    - db/current_user：依赖注入。
+    
+    返回：
+    - 200 + `DatasetResponse`；内容不存在时返回 404。
+    """
+    file_extension = _check_dataset_format(info.filename)
+    blob = reference_blob(db, info.sha256)
+    if blob is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="服务端不存在该内容，请上传文件"
+        )
     dataset = Dataset(
-        name=name or file.filename,
-        description=description,
-        file_path=file_path,
-        file_size=file_size,
+        name=info.name or info.filename,
+        description=info.description,
+        file_path=blob.file_path,
+        file_size=blob.file_size,
         format_type=file_extension[1:],
+        content_hash=blob.sha256,
+        line_count=blob.line_count,
+        validation_status="pending",
         uploaded_by=current_user.id
     )
-    
     db.add(dataset)
     db.commit()
     db.refresh(dataset)
-    
+    background_tasks.add_task(validate_dataset_record, dataset.id)
     return dataset
 
+@router.delete("/datasets/uploads/{upload_id}", responses={401: {"model": ErrorResponse}, 404: {"model": ErrorResponse}})
+async def abort_dataset_upload(
+    upload_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """放弃分块上传并删除已接收的数据"""
+    session = _get_upload_session(upload_id, current_user)
+    await run_in_threadpool(upload_manager.abort, session)
+    return {"message": "上传已取消", "upload_id": upload_id}
+
 @router.get("/datasets", response_model=List[DatasetResponse], responses={500: {"model": ErrorResponse}})
 async def get_datasets(db: Session = Depends(get_db)):
     """获取数据集列表
@@ -164,7 +405,304 @@ async def get_datasets(db: Session = Depends(get_db)):
     datasets = db.query(Dataset).order_by(Dataset.created_at.desc()).all()
     return datasets
 
-@router.post("/tasks", response_model=TrainingTaskResponse, responses={404: {"model": ErrorResponse}, 401: {"model": ErrorResponse}, 500: {"model": ErrorResponse}})
+@router.post("/datasets/{dataset_id}/validate", response_model=DatasetValidationResponse, responses={401: {"model": ErrorResponse}, 404: {"model": ErrorResponse}})
+async def validate_dataset(
+    dataset_id: int,
+    background_tasks: BackgroundTasks,
+    force: bool = False,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """触发数据集校验
+    
+    作用：
+    - 在后台进程池中流式校验数据集（格式、alpaca/sharegpt 字段、token 长度分布、重复率），结果缓存在数据集记录上。
+    
+    触发链路：
+    - 上传完成后自动触发；用户也可在训练页面手动重新校验。
+    
+    参数：
+    - dataset_id：数据集 ID。
+    - force：为 true 时忽略已有结果重新校验。
+    - db/current_user：依赖注入。
+    
+    返回：
+    - 200 + `DatasetValidationResponse`（已有结论时直接返回报告，否则状态为 pending）。
+    
+    注意：
+    - 校验在请求返回后执行，通过 GET /datasets/{dataset_id}/validation 轮询结果；正在校验中时不会重复提交（force 除外）；
+    - 服务重启时中断的校验在启动时标记为 error，可直接重新提交。
+    """
+    dataset = db.query(Dataset).filter(Dataset.id == dataset_id).first()
+    if not dataset:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="数据集不存在")
+    if force or dataset.validation_status not in ("running", "passed", "failed"):
+        dataset.validation_status = "pending"
+        db.commit()
+        background_tasks.add_task(validate_dataset_record, dataset.id, force)
+    return _validation_response(dataset)
+
+@router.get("/datasets/{dataset_id}/validation", response_model=DatasetValidationResponse, responses={404: {"model": ErrorResponse}})
+async def get_dataset_validation(dataset_id: int, db: Session = Depends(get_db)):
+    """查询数据集校验状态与报告"""
+    dataset = db.query(Dataset).filter(Dataset.id == dataset_id).first()
+    if not dataset:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="数据集不存在")
+    return _validation_response(dataset)
+
+def _validation_response(dataset: Dataset) -> dict:
+    return {
+        "dataset_id": dataset.id,
+        "validation_status": dataset.validation_status,
+        "validated_at": dataset.validated_at,
+        "report": dataset.validation_report,
+    }
+
+def _get_dataset_file(db: Session, dataset_id: int) -> Dataset:
+    dataset = db.query(Dataset).filter(Dataset.id == dataset_id).first()
+    if not dataset:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="数据集不存在")
+    if not os.path.exists(dataset.file_path):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="数据集文件不存在")
+    return dataset
+
+@router.get("/datasets/{dataset_id}/preview", response_model=DatasetRecordsResponse, responses={404: {"model": ErrorResponse}})
+async def preview_dataset(
+    dataset_id: int,
+    offset: int = 0,
+    limit: int = 20,
+    db: Session = Depends(get_db)
+):
+    """分页预览数据集记录
+    
+    作用：
+    - 不下载整个文件即可查看任意位置的记录。
+    
+    触发链路：
+    - 前端训练页面打开数据集详情并翻页。
+    
+    参数：
+    - dataset_id：数据集 ID。
+    - offset：起始记录序号（从 0 开始）。
+    - limit：本页条数（最多 100）。
+    
+    返回：
+    - 200 + `DatasetRecordsResponse`。
+    
+    注意：
+    - JSONL/CSV/TXT 首次访问时扫描一遍文件建立行偏移索引（保存为 <文件>.idx），之后每页只读取所需记录；
+    - JSON 数组无法建立索引，按顺序解析到 offset 处，total 为 None。
+    """
+    dataset = _get_dataset_file(db, dataset_id)
+    result = await run_in_threadpool(preview_records, dataset.file_path, dataset.format_type, offset, limit)
+    return {"dataset_id": dataset.id, **result}
+
+@router.get("/datasets/{dataset_id}/sample", response_model=DatasetRecordsResponse, responses={404: {"model": ErrorResponse}})
+async def sample_dataset(
+    dataset_id: int,
+    n: int = 10,
+    seed: int = None,
+    db: Session = Depends(get_db)
+):
+    """均匀随机抽样数据集记录
+    
+    参数：
+    - n：抽样条数（最多 100）。
+    - seed：随机种子，相同种子返回相同样本。
+    
+    注意：
+    - 有行偏移索引时只读取被抽中的记录；JSON 数组需完整扫描一遍文件。
+    """
+    dataset = _get_dataset_file(db, dataset_id)
+    result = await run_in_threadpool(sample_records, dataset.file_path, dataset.format_type, n, seed)
+    return {"dataset_id": dataset.id, **result}
+
+@router.post("/datasets/{dataset_id}/convert", response_model=DatasetConvertResponse, responses={400: {"model": ErrorResponse}, 401: {"model": ErrorResponse}, 404: {"model": ErrorResponse}})
+async def convert_dataset(
+    dataset_id: int,
+    options: DatasetConvertRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """转换数据集并登记到 LLaMA-Factory
+    
+    作用：
+    - 把 CSV/TXT/JSON/JSONL 流式转换为规范化 JSONL（alpaca/sharegpt/text），写入 LLaMA-Factory 数据目录并登记到 dataset_info.json。
+    
+    触发链路：
+    - 创建训练任务前调用；返回的 dataset/dataset_dir 直接用于 llamafactory-cli 的训练参数。
+    
+    参数：
+    - dataset_id：数据集 ID。
+    - options：target（目标格式，默认沿用源格式）、columns（列映射，CSV 表头不是标准字段名时使用）。
+    - db/current_user：依赖注入。
+    
+    返回：
+    - 200 + `DatasetConvertResponse`（cached 表示命中了之前的转换结果）。
+    
+    注意：
+    - 转换结果按“文件内容哈希 + 转换参数”缓存，内容相同的数据集共享同一份转换结果；
+    - 无法识别格式或没有有效记录时返回 400。
+    """
+    dataset = _get_dataset_file(db, dataset_id)
+    if not dataset.content_hash:
+        # 旧数据没有内容哈希：补算一次并保存
+        result = await run_in_threadpool(hash_file, dataset.file_path)
+        dataset.content_hash = result.sha256
+        dataset.line_count = result.line_count
+        db.commit()
+    try:
+        converted = await convert_and_register(
+            dataset.file_path, dataset.format_type, dataset.content_hash, options.target, options.columns
+        )
+    except ConversionError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return {"dataset_id": dataset.id, **converted}
+
+def _submit_dataset_job(db: Session, background_tasks: BackgroundTasks, dataset_id: int, job_type: str, params: dict, current_user: User) -> DatasetJob:
+    dataset = _get_dataset_file(db, dataset_id)
+    job = DatasetJob(
+        dataset_id=dataset.id,
+        job_type=job_type,
+        status="pending",
+        progress=0.0,
+        params=params,
+        created_by=current_user.id
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    background_tasks.add_task(run_dataset_job, job.id)
+    return job
+
+@router.post("/datasets/{dataset_id}/preprocess", response_model=DatasetJobResponse, responses={401: {"model": ErrorResponse}, 404: {"model": ErrorResponse}})
+async def preprocess_dataset(
+    dataset_id: int,
+    options: DatasetPreprocessRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """提交数据集预处理任务
+    
+    作用：
+    - 对数据集做精确去重、MinHash 近似去重、按 token 数过滤与长度分桶，结果保存为新的派生数据集（parent_id 指向源数据集）。
+    
+    触发链路：
+    - 用户在训练前清洗数据；提交后通过 GET /dataset-jobs/{job_id} 轮询进度。
+    
+    参数：
+    - dataset_id：源数据集 ID。
+    - options：去重开关与阈值、min_tokens/max_tokens、bucket_boundaries 等。
+    - db/current_user：依赖注入。
+    
+    返回：
+    - 200 + `DatasetJobResponse`（status=pending）。
+    
+    注意：
+    - 文件按行切成多个分片在进程池中并行处理；完成后 result.dataset_id 为派生数据集 ID。
+    """
+    return _submit_dataset_job(db, background_tasks, dataset_id, "preprocess", options.model_dump(), current_user)
+
+@router.post("/datasets/{dataset_id}/split", response_model=DatasetJobResponse, responses={401: {"model": ErrorResponse}, 404: {"model": ErrorResponse}})
+async def split_dataset(
+    dataset_id: int,
+    options: DatasetSplitRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """提交数据集切分任务
+    
+    作用：
+    - 按“种子 + 记录内容”的哈希把数据集确定性地划分为训练集/验证集，并可把训练集分成 N 个分片，结果保存为子数据集。
+    
+    触发链路：
+    - 用户在创建训练任务前切分数据；任务完成后在 POST /tasks 中通过 split_job_id 引用。
+    
+    参数：
+    - dataset_id：源数据集 ID。
+    - options：eval_ratio、seed、num_shards、name、description。
+    - db/current_user：依赖注入。
+    
+    返回：
+    - 200 + `DatasetJobResponse`（status=pending）；完成后 result 中包含 train_dataset_id、eval_dataset_id、shard_dataset_ids。
+    
+    注意：
+    - 相同种子与内容总是得到相同划分；内容完全相同的记录总在同一侧。
+    """
+    return _submit_dataset_job(db, background_tasks, dataset_id, "split", options.model_dump(), current_user)
+
+@router.get("/datasets/{dataset_id}/jobs", response_model=List[DatasetJobResponse])
+async def get_dataset_jobs(dataset_id: int, db: Session = Depends(get_db)):
+    """获取数据集的后台任务列表（按创建时间倒序）"""
+    return db.query(DatasetJob).filter(DatasetJob.dataset_id == dataset_id).order_by(DatasetJob.created_at.desc()).all()
+
+@router.get("/dataset-jobs/{job_id}", response_model=DatasetJobResponse, responses={404: {"model": ErrorResponse}})
+async def get_dataset_job(job_id: int, db: Session = Depends(get_db)):
+    """查询数据集后台任务的状态、进度与结果"""
+    job = db.query(DatasetJob).filter(DatasetJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="任务不存在")
+    return job
+
+@router.delete("/datasets/{dataset_id}", responses={401: {"model": ErrorResponse}, 403: {"model": ErrorResponse}, 404: {"model": ErrorResponse}, 409: {"model": ErrorResponse}})
+async def delete_dataset(
+    dataset_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """删除数据集
+    
+    作用：
+    - 删除数据集记录并释放其对文件的引用；没有其它数据集引用时删除文件。
+    
+    触发链路：
+    - 用户在训练页面删除数据集。
+    
+    参数：
+    - dataset_id：数据集 ID。
+    - db/current_user：依赖注入。
+    
+    返回：
+    - 200 + { message }。
+    
+    注意：
+    - 仅上传者或管理员可删除；仍被训练任务、评估记录、批量推理任务引用或有处理任务在执行的数据集返回 409；
+    - 派生数据集保留，仅解除与源数据集的关联。
+    """
+    dataset = db.query(Dataset).filter(Dataset.id == dataset_id).first()
+    if not dataset:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="数据集不存在")
+    if dataset.uploaded_by != current_user.id and not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="无权删除该数据集")
+    if db.query(TrainingTask).filter((TrainingTask.dataset_id == dataset_id) | (TrainingTask.eval_dataset_id == dataset_id)).first():
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="数据集仍被训练任务引用，无法删除")
+    if db.query(DatasetJob).filter(DatasetJob.dataset_id == dataset_id, DatasetJob.status.in_(("pending", "running"))).first():
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="数据集有正在执行的处理任务，无法删除")
+    # 已结束的评估仍可继续（resume），且 dataset_id 不可为空：有任何评估引用时都保留数据集
+    evaluation_runs = db.query(EvaluationRun).filter(EvaluationRun.dataset_id == dataset_id)
+    if evaluation_runs.filter(EvaluationRun.status.in_(ACTIVE_EVAL_STATUSES)).first():
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="数据集有正在执行的评估任务，无法删除")
+    if evaluation_runs.first():
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="数据集仍被评估记录引用，无法删除")
+    # 批量推理同理：暂停的任务从检查点续跑时仍要读取数据集
+    batch_jobs = db.query(BatchInferenceJob).filter(BatchInferenceJob.dataset_id == dataset_id)
+    if batch_jobs.filter(BatchInferenceJob.status.in_(ACTIVE_BATCH_STATUSES + ("paused",))).first():
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="数据集有正在执行或已暂停的批量推理任务，无法删除")
+    if batch_jobs.first():
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="数据集仍被批量推理记录引用，无法删除")
+
+    orphan_path = release_dataset_file(db, dataset)
+    db.query(DatasetJob).filter(DatasetJob.dataset_id == dataset_id).delete(synchronize_session=False)
+    db.query(Dataset).filter(Dataset.parent_id == dataset_id).update({Dataset.parent_id: None}, synchronize_session=False)
+    db.delete(dataset)
+    db.commit()
+    await run_in_threadpool(remove_file_quietly, orphan_path)
+    await run_in_threadpool(remove_index, orphan_path)
+    return {"message": "数据集已删除"}
+
+@router.post("/tasks", response_model=TrainingTaskResponse, responses={400: {"model": ErrorResponse}, 404: {"model": ErrorResponse}, 401: {"model": ErrorResponse}, 409: {"model": ErrorResponse}, 500: {"model": ErrorResponse}})
 async def create_training_task(
     task_data: TrainingTaskCreate,
     db: Session = Depends(get_db),
@@ -179,30 +717,63 @@ async def create_training_task(
     - 用户在训练页面提交训练任务配置。
     
     参数：
-    - task_data：包含 name、model_name、dataset_id、config_id 的任务配置。
+    - task_data：包含 name、model_name、dataset_id（或 split_job_id）、eval_dataset_id、config_id，
+      以及调度用的 priority 与 resources（CPU 核数、内存 GB、GPU 数）。
     - db/current_user：依赖注入。
     
     返回：
     - 200 + `TrainingTaskResponse`。
     
     注意：
-    - 验证数据集存在性；自动创建输出目录（按时间戳命名）；任务状态初始为 pending。
+    - 验证数据集存在性；指定 split_job_id 时使用该切分任务生成的训练集与验证集；
+    - 未指定 config_id 而提供 config_data 时，保存为新的训练配置并关联；
+    - 自动创建输出目录（按时间戳命名）；任务状态初始为 pending。
     """
-    dataset = db.query(Dataset).filter(Dataset.id == task_data.dataset_id).first()
-    if not dataset:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="数据集不存在"
-        )
+    dataset_id, eval_dataset_id = task_data.dataset_id, task_data.eval_dataset_id
+    if task_data.split_job_id is not None:
+        split_job = db.query(DatasetJob).filter(
+            DatasetJob.id == task_data.split_job_id,
+            DatasetJob.job_type == "split"
+        ).first()
+        if not split_job:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="切分任务不存在")
+        if split_job.status != "completed":
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="切分任务尚未完成")
+        dataset_id = split_job.result["train_dataset_id"]
+        eval_dataset_id = eval_dataset_id or split_job.result.get("eval_dataset_id")
+    if dataset_id is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="需要指定 dataset_id 或 split_job_id")
+
+    for required_id in filter(None, (dataset_id, eval_dataset_id)):
+        if not db.query(Dataset).filter(Dataset.id == required_id).first():
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="数据集不存在"
+            )
     
     output_dir = f"outputs/training/{datetime.now().strftime('%Y%m%d_%H%M%S')}_{task_data.name}"
     os.makedirs(output_dir, exist_ok=True)
     
+    config_id = task_data.config_id
+    if config_id is None and task_data.config_data:
+        # 直接提交的训练参数保存为一份训练配置，供执行器渲染 YAML
+        config = TrainingConfig(
+            name=f"{task_data.name} 配置",
+            config_data=task_data.config_data,
+            created_by=current_user.id
+        )
+        db.add(config)
+        db.flush()
+        config_id = config.id
+    
     task = TrainingTask(
         name=task_data.name,
         model_name=task_data.model_name,
-        dataset_id=task_data.dataset_id,
-        config_id=task_data.config_id,
+        dataset_id=dataset_id,
+        eval_dataset_id=eval_dataset_id,
+        config_id=config_id,
+        priority=task_data.priority,
+        resource_request=task_data.resources.model_dump() if task_data.resources else None,
         output_dir=output_dir,
         created_by=current_user.id
     )
@@ -240,29 +811,57 @@ async def get_training_tasks(
     ).order_by(TrainingTask.created_at.desc()).all()
     return tasks
 
-@router.post("/tasks/{task_id}/start", responses={404: {"model": ErrorResponse}, 401: {"model": ErrorResponse}})
+@router.get("/queue", response_model=TrainingQueueResponse, responses={401: {"model": ErrorResponse}})
+async def get_training_queue(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """获取训练队列状态
+    
+    作用：
+    - 返回主机容量、已占用资源、运行中任务与排队任务（含排队序号与阻塞原因）。
+    
+    触发链路：
+    - 前端任务列表页展示排队位置与资源占用。
+    
+    返回：
+    - 200 + `TrainingQueueResponse`。
+    
+    注意：
+    - blocked_reason：concurrency（并发名额已满）、quota（用户运行配额已满）、
+      resources（资源不足）、order（前面的任务仍在等待资源，按顺序不插队）。
+    """
+    return training_executor.queue_snapshot(db)
+
+@router.post("/tasks/{task_id}/start", responses={404: {"model": ErrorResponse}, 401: {"model": ErrorResponse}, 409: {"model": ErrorResponse}, 429: {"model": ErrorResponse}})
 async def start_training(
     task_id: int,
+    options: Optional[TrainingStartRequest] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """启动训练任务
     
     作用：
-    - 将指定训练任务状态更新为运行中，并记录开始时间。
+    - 把训练任务放入持久化队列，由调度器按优先级与资源情况放行后，
+      渲染 LLaMA-Factory YAML 配置并以子进程运行 llamafactory-cli train。
     
     触发链路：
     - 用户在任务列表页面点击"开始训练"按钮。
     
     参数：
     - task_id：要启动的训练任务 ID。
+    - options：可选，覆盖任务的 priority / resources。
     - db/current_user：依赖注入。
     
     返回：
-    - 200 + { message, task_id }。
+    - 200 + { message, task_id, status }。
     
     注意：
-    - 仅允许启动当前用户自己的任务；状态更新为 running，记录 started_at 时间。
+    - 仅允许启动当前用户自己的任务；已在排队或运行中的任务返回 409；
+    - 用户排队中的任务数达到 TRAINING_USER_MAX_QUEUED 时返回 429；
+    - 状态先置为 queued，调度器放行（并发名额、用户配额、CPU/内存/GPU 均满足）后变为 running，进程退出后变为 completed/failed；
+    - 训练输出写入 output_dir/train.log（log_file 字段）。
     """
     task = db.query(TrainingTask).filter(
         TrainingTask.id == task_id,
@@ -274,22 +873,490 @@ async def start_training(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="训练任务不存在"
         )
+    if task.status in ACTIVE_STATUSES or training_executor.is_active(task.id):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="训练任务已在排队或运行中"
+        )
+    if TRAINING_USER_MAX_QUEUED:
+        queued_count = db.query(TrainingTask).filter(
+            TrainingTask.created_by == current_user.id,
+            TrainingTask.status == "queued"
+        ).count()
+        if queued_count >= TRAINING_USER_MAX_QUEUED:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"排队中的训练任务已达上限（{TRAINING_USER_MAX_QUEUED}）"
+            )
+    
+    if options is not None:
+        if options.priority is not None:
+            task.priority = options.priority
+        if options.resources is not None:
+            task.resource_request = options.resources.model_dump()
+    task.status = "queued"
+    task.queued_at = datetime.now(timezone.utc)
+    task.progress = 0.0
+    task.metrics = None
+    task.error_message = None
+    task.completed_at = None
+    db.commit()
+    training_executor.submit(task.id)
+    
+    return {"message": "训练任务已提交", "task_id": task.id, "status": task.status}
+
+@router.post("/tasks/{task_id}/stop", responses={404: {"model": ErrorResponse}, 401: {"model": ErrorResponse}, 409: {"model": ErrorResponse}})
+async def stop_training(
+    task_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """停止训练任务
+    
+    作用：
+    - 取消排队中的任务，或结束运行中的训练进程（整个进程组，先 SIGTERM，超时后 SIGKILL）。
+    
+    触发链路：
+    - 用户在任务列表页面点击"停止训练"按钮。
+    
+    返回：
+    - 200 + { message, task_id, status }，任务最终状态为 cancelled。
+    
+    注意：
+    - 仅允许停止当前用户自己的任务；未在排队或运行的任务返回 409。
+    """
+    task = db.query(TrainingTask).filter(
+        TrainingTask.id == task_id,
+        TrainingTask.created_by == current_user.id
+    ).first()
+    if not task:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="训练任务不存在")
+    if task.status not in ACTIVE_STATUSES and not training_executor.is_active(task.id):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="训练任务未在运行")
+    
+    if not await training_executor.stop(task.id):
+        # 尚未被调度器放行的排队任务，直接标记为已取消
+        task.status = "cancelled"
+        task.completed_at = datetime.now()
+        db.commit()
+    db.refresh(task)
+    return {"message": "训练任务已停止", "task_id": task.id, "status": task.status}
+
+def _get_own_task(db: Session, task_id: int, current_user: User) -> TrainingTask:
+    task = db.query(TrainingTask).filter(
+        TrainingTask.id == task_id,
+        TrainingTask.created_by == current_user.id
+    ).first()
+    if not task:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="训练任务不存在")
+    return task
+
+@router.get("/tasks/{task_id}/progress", responses={404: {"model": ErrorResponse}, 401: {"model": ErrorResponse}})
+async def get_training_progress(
+    task_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """获取训练进度与最新指标
+    
+    作用：
+    - 返回 step/total_steps、epoch、loss、学习率、吞吐（samples/s、tokens/s）与预计剩余时间。
+    
+    触发链路：
+    - 前端任务列表/详情页轮询训练进度。
+    
+    返回：
+    - 200 + { task_id, status, progress, metrics }。
+    
+    注意：
+    - 运行中的任务直接返回解析器内存中的最新值；数据库中的 progress/metrics 每隔 TRAINING_PROGRESS_INTERVAL 秒批量更新一次。
+    """
+    task = _get_own_task(db, task_id, current_user)
+    metrics = progress_tracker.snapshot(task.id)
+    if metrics is None:
+        return {"task_id": task.id, "status": task.status, "progress": task.progress, "metrics": task.metrics}
+    total = metrics.get("total_steps")
+    live_progress = min(metrics["step"] / total, 1.0) if metrics.get("step") and total else task.progress
+    return {"task_id": task.id, "status": task.status, "progress": live_progress, "metrics": metrics}
+
+@router.get("/tasks/{task_id}/metrics", response_model=TrainingMetricsResponse, responses={404: {"model": ErrorResponse}, 401: {"model": ErrorResponse}})
+async def get_training_metrics(
+    task_id: int,
+    names: Optional[str] = Query(None, description="逗号分隔的指标名，默认返回全部"),
+    points: int = Query(DEFAULT_METRIC_POINTS, ge=3, le=MAX_METRIC_POINTS),
+    start_step: Optional[float] = Query(None),
+    end_step: Optional[float] = Query(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """获取训练指标曲线（服务端降采样）
+    
+    作用：
+    - 返回 loss、学习率、eval_* 等逐步指标，供前端直接绘制训练曲线，无需打开 SwanBoard。
+    
+    触发链路：
+    - 前端任务详情页加载/刷新图表；缩放时带 start_step/end_step 请求局部细节。
+    
+    参数：
+    - names：要查询的指标；points：每条曲线最多返回的点数；start_step/end_step：步数区间（闭区间）。
+    
+    返回：
+    - 200 + `TrainingMetricsResponse`，每条曲线含区间内原始点数 total 与 LTTB 降采样后的 points。
+    
+    注意：
+    - 指标在训练运行时由进度解析器写入 output_dir/metrics，训练中查询会包含截至当前的数据。
+    """
+    task = _get_own_task(db, task_id, current_user)
+    if not task.output_dir:
+        return {"task_id": task.id, "available": [], "metrics": {}}
+    selected = [name.strip() for name in names.split(",") if name.strip()] if names else None
+    available = await run_in_threadpool(list_metrics, task.output_dir)
+    metrics = await run_in_threadpool(query_metrics, task.output_dir, selected, points, start_step, end_step)
+    return {"task_id": task.id, "available": available, "metrics": metrics}
+
+@router.get("/tasks/{task_id}/checkpoints", response_model=List[TrainingCheckpointResponse], responses={404: {"model": ErrorResponse}, 401: {"model": ErrorResponse}})
+async def get_training_checkpoints(
+    task_id: int,
+    rescan: bool = True,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """获取训练输出索引（checkpoint 与最终模型）
+    
+    作用：
+    - 列出输出目录中的 checkpoint-N 与最终模型：步数、大小、是否含 LoRA 适配器、该时刻的 loss/eval_loss。
+    
+    触发链路：
+    - 前端任务详情页的“输出/Checkpoint”面板；部署、评估前选择 checkpoint。
+    
+    参数：
+    - rescan：返回前先增量扫描输出目录（只统计 mtime 变化的目录），默认 true。
+    
+    返回：
+    - 200 + checkpoint 列表（按步数升序，最终模型在最后）。
+    
+    注意：
+    - 训练结束时执行器会自动扫描一次；训练过程中查询可看到已保存的 checkpoint。
+    """
+    task = _get_own_task(db, task_id, current_user)
+    if rescan:
+        await run_in_threadpool(scan_task_outputs, db, task)
+    rows = db.query(TrainingCheckpoint).filter(TrainingCheckpoint.task_id == task.id).all()
+    return sorted(rows, key=lambda row: (row.kind != "checkpoint", row.step or 0))
+
+@router.post("/tasks/{task_id}/checkpoints/prune", response_model=CheckpointPruneResponse, responses={400: {"model": ErrorResponse}, 401: {"model": ErrorResponse}, 404: {"model": ErrorResponse}, 409: {"model": ErrorResponse}})
+async def prune_training_checkpoints(
+    task_id: int,
+    request: CheckpointPruneRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """清理 checkpoint，只保留指标最好的前 K 个
+    
+    作用：
+    - 按 eval_loss / loss（越小越好）或 step（最新）排序，删除排名 K 之后的 checkpoint 目录以回收磁盘。
+    
+    触发链路：
+    - 用户在任务详情页点击“清理 checkpoint”，可先以 dry_run 预览。
+    
+    返回：
+    - 200 + `CheckpointPruneResponse`（保留/删除的 checkpoint 与释放的字节数）。
+    
+    注意：
+    - 训练排队或运行中返回 409（训练进程可能正在写入或从 checkpoint 恢复）；
+    - 最终模型始终保留；按 eval_loss 清理但没有任何 checkpoint 记录 eval_loss 时返回 400。
+    """
+    task = _get_own_task(db, task_id, current_user)
+    if task.status in ACTIVE_STATUSES or training_executor.is_active(task.id):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="训练任务正在排队或运行，不能清理 checkpoint")
+    try:
+        return await run_in_threadpool(prune_checkpoints, db, task, request.keep, request.metric, request.dry_run)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@router.post("/tasks/{task_id}/deploy", response_model=ModelDeploymentResponse, responses={400: {"model": ErrorResponse}, 401: {"model": ErrorResponse}, 404: {"model": ErrorResponse}, 409: {"model": ErrorResponse}})
+async def deploy_training_output(
+    task_id: int,
+    request: ModelDeployRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """一键部署训练输出为可对话的模型
+    
+    作用：
+    - 把已完成任务的 checkpoint（可选先合并 LoRA）注册到本地 vLLM / Ollama，并自动创建指向它的 ModelConfig。
+    
+    触发链路：
+    - 用户在任务详情页的 checkpoint 列表中点击“部署”；前端随后轮询 GET /training/deployments/{id}。
+    
+    参数：
+    - request：checkpoint 名称、目标推理服务、是否合并、服务中的模型名、端点与 Ollama 基座模型。
     
-    task.status = "running"
-    task.started_at = datetime.now()
+    返回：
+    - 200 + `ModelDeploymentResponse`（status=pending），各步骤在后台执行，耗时写入 timings。
+    
+    注意：
+    - 只有已完成的训练任务可以部署，否则返回 409；同名模型正在部署时也返回 409；
+    - vLLM 只能热加载 LoRA 适配器（服务需以 --enable-lora 且 VLLM_ALLOW_RUNTIME_LORA_UPDATING=True 启动），合并或全参模型请部署到 Ollama；
+    - 推理服务需能访问本机的 checkpoint 路径。
+    """
+    task = _get_own_task(db, task_id, current_user)
+    if task.status != "completed":
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="只有已完成的训练任务可以部署")
+    await run_in_threadpool(scan_task_outputs, db, task)
+    checkpoint = select_checkpoint(db, task, request.checkpoint)
+    if checkpoint is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="checkpoint 不存在")
+    if request.merge and not checkpoint.has_adapter:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="该 checkpoint 不含 LoRA 适配器，无需合并")
+    if request.target == "vllm" and (request.merge or not checkpoint.has_adapter):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="vLLM 只支持热加载 LoRA 适配器，合并后的模型请部署到 Ollama")
+
+    served_name = request.served_name or default_served_name(task, checkpoint.name)
+    endpoint = request.endpoint or default_endpoint(request.target)
+    running = db.query(ModelDeployment).filter(
+        ModelDeployment.target == request.target,
+        ModelDeployment.served_name == served_name,
+        ModelDeployment.endpoint == endpoint,
+        ModelDeployment.status.in_(ACTIVE_DEPLOY_STATUSES)
+    ).first()
+    if running:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"模型 {served_name} 正在部署中（部署 {running.id}）")
+
+    deployment = ModelDeployment(
+        task_id=task.id,
+        checkpoint_name=checkpoint.name,
+        source_path=checkpoint.path,
+        target=request.target,
+        merge=request.merge,
+        served_name=served_name,
+        endpoint=endpoint,
+        base_model=request.base_model,
+        status="pending",
+        created_by=current_user.id
+    )
+    db.add(deployment)
     db.commit()
+    db.refresh(deployment)
+    background_tasks.add_task(run_deployment, deployment.id)
+    return deployment
+
+@router.get("/tasks/{task_id}/deployments", response_model=List[ModelDeploymentResponse], responses={401: {"model": ErrorResponse}, 404: {"model": ErrorResponse}})
+async def get_task_deployments(
+    task_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """获取训练任务的部署记录（最新在前）"""
+    task = _get_own_task(db, task_id, current_user)
+    return db.query(ModelDeployment).filter(ModelDeployment.task_id == task.id).order_by(ModelDeployment.id.desc()).all()
+
+@router.get("/deployments/{deployment_id}", response_model=ModelDeploymentResponse, responses={401: {"model": ErrorResponse}, 404: {"model": ErrorResponse}})
+async def get_deployment(
+    deployment_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """获取部署状态、当前步骤与各步骤耗时"""
+    deployment = db.query(ModelDeployment).filter(
+        ModelDeployment.id == deployment_id,
+        ModelDeployment.created_by == current_user.id
+    ).first()
+    if not deployment:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="部署记录不存在")
+    return deployment
+
+@router.get("/tasks/{task_id}/logs", responses={404: {"model": ErrorResponse}, 401: {"model": ErrorResponse}})
+async def get_training_logs(
+    task_id: int,
+    offset: Optional[int] = Query(None, ge=0),
+    limit: int = Query(LOG_TAIL_READ_SIZE, ge=1, le=4 * 1024 * 1024),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """读取训练日志片段
+    
+    作用：
+    - 按字节偏移读取训练日志，供轮询式查看或下载。
+    
+    触发链路：
+    - 前端任务详情页打开日志面板。
+    
+    参数：
+    - offset：起始字节偏移；不传时从末尾往前约 64KB 的行首开始（类似 tail）。
+    - limit：本次最多返回的字节数，内容截止到行边界。
     
-    return {"message": "训练任务已启动", "task_id": task.id}
+    返回：
+    - 200 + { task_id, status, content, offset, next_offset, size, eof }；下一次请求以 next_offset 作为 offset。
+    
+    注意：
+    - 任务尚未启动（没有日志文件）时返回空内容。
+    """
+    task = _get_own_task(db, task_id, current_user)
+    path = task.log_file
+    if not path or not os.path.exists(path):
+        return {"task_id": task.id, "status": task.status, "content": "", "offset": 0, "next_offset": 0, "size": 0, "eof": True}
+    start = offset if offset is not None else await run_in_threadpool(default_start_offset, path)
+    size = os.path.getsize(path)
+    data, next_offset = await run_in_threadpool(read_log_range, path, start, None, limit)
+    return {
+        "task_id": task.id,
+        "status": task.status,
+        "content": data.decode("utf-8", errors="replace"),
+        "offset": start,
+        "next_offset": next_offset,
+        "size": size,
+        "eof": next_offset >= size,
+    }
+
+def _sse_log_event(end: int, data: bytes, event: str = "log") -> str:
+    lines = [line for line in data.decode("utf-8", errors="replace").splitlines() if line]
+    return f"id: {end}\nevent: {event}\n" + "".join(f"data: {line}\n" for line in lines or [""]) + "\n"
+
+def _log_stream_scope(task_id: int) -> str:
+    return f"training_log:{task_id}"
+
+def _authorize_log_stream(credentials: Optional[HTTPAuthorizationCredentials], token: Optional[str], task_id: int):
+    """流式接口的鉴权与归属检查：使用短会话，返回前关闭，长连接期间不占用连接池
+
+    优先使用 Authorization 头（fetch 客户端），没有时使用查询参数中的流令牌（原生 EventSource）。
+    """
+    db = SessionLocal()
+    try:
+        if credentials is not None:
+            user = get_current_user(credentials, db)
+        elif token:
+            user = get_stream_user(db, token, _log_stream_scope(task_id))
+        else:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="未提供认证信息", headers={"WWW-Authenticate": "Bearer"})
+        task = _get_own_task(db, task_id, user)
+        return task.status, task.log_file
+    finally:
+        db.close()
+
+@router.post("/tasks/{task_id}/logs/stream-token", responses={404: {"model": ErrorResponse}, 401: {"model": ErrorResponse}})
+async def create_log_stream_token(
+    task_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """签发实时日志流令牌
+    
+    作用：
+    - 为原生 EventSource 签发只能订阅该任务日志流的短期令牌（EventSource 无法携带 Authorization 请求头）。
+    
+    触发链路：
+    - 前端打开任务日志前调用，再以 `logs/stream?token=...` 建立 SSE 连接。
+    
+    返回：
+    - 200 + { token, expires_in }。
+    
+    注意：
+    - 令牌只在建立连接时校验；有效期内浏览器断线重连（自动携带 Last-Event-ID）可直接续传，
+      过期后重连会收到 401，需重新签发令牌并以 offset=最后收到的 id 重新连接。
+    """
+    _get_own_task(db, task_id, current_user)
+    return {"token": create_stream_token(current_user.id, _log_stream_scope(task_id)), "expires_in": STREAM_TOKEN_EXPIRE_SECONDS}
+
+def _task_log_state(task_id: int):
+    """流式接口在请求会话之外查询任务状态（长连接不占用请求的数据库会话）"""
+    db = SessionLocal()
+    try:
+        task = db.query(TrainingTask).filter(TrainingTask.id == task_id).first()
+        if task is None:
+            return None, None
+        return task.status, task.log_file
+    finally:
+        db.close()
+
+@router.get("/tasks/{task_id}/logs/stream", responses={404: {"model": ErrorResponse}, 401: {"model": ErrorResponse}})
+async def stream_training_logs(
+    task_id: int,
+    request: Request,
+    offset: Optional[int] = Query(None, ge=0),
+    token: Optional[str] = Query(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+):
+    """实时训练日志（Server-Sent Events）
+    
+    作用：
+    - 持续推送训练日志的新增内容，训练结束后发送 end 事件并关闭连接。
+    
+    触发链路：
+    - 前端任务详情页以 SSE 订阅日志。
+    
+    参数：
+    - offset：从该字节偏移续传；不传时使用 Last-Event-ID 请求头，都没有时从末尾约 64KB 开始。
+    - token：`logs/stream-token` 签发的流令牌，供不能设置请求头的原生 EventSource 使用；
+      fetch 客户端可直接携带 Authorization 头，断线重连时需自行带上 Last-Event-ID 或 offset。
+    
+    返回：
+    - 200 + text/event-stream：
+      - `event: log`，`id` 为本块结束的字节偏移，每行日志一条 `data:`；
+      - `event: end`，data 为任务最终状态；空闲时每 15 秒发送一条注释行保活。
+    
+    注意：
+    - 同一日志文件的所有查看者共用一个跟踪器（app/services/log_tail.py），只轮询文件大小、只读取新增字节；
+    - 任务尚在排队（还没有日志文件）时保持连接，启动后自动开始推送；
+    - 原生 EventSource 只有在流令牌有效期内的自动重连才会携带 Last-Event-ID 续传，过期后需重新签发令牌并以 offset 重连；
+    - 鉴权与任务归属检查在返回前用短会话完成（不使用 get_db / get_current_user 依赖，
+      它们的会话要到流结束才释放），查看者再多也不占用数据库连接。
+    """
+    initial_status, log_file = await run_in_threadpool(_authorize_log_stream, credentials, token, task_id)
+    if offset is None and request.headers.get("last-event-id", "").isdigit():
+        offset = int(request.headers["last-event-id"])
+
+    async def generate():
+        task_status, path = initial_status, log_file
+        # 排队中的任务还没有日志文件，等待启动或结束
+        while not path or not os.path.exists(path):
+            if task_status not in ACTIVE_STATUSES:
+                yield f"event: end\ndata: {task_status}\n\n"
+                return
+            await asyncio.sleep(LOG_STREAM_CHECK_INTERVAL)
+            task_status, path = await run_in_threadpool(_task_log_state, task_id)
+        position = offset if offset is not None else await run_in_threadpool(default_start_offset, path)
+        idle = 0.0
+        async with aclosing(follow_log(path, position, LOG_STREAM_CHECK_INTERVAL)) as chunks:
+            async for chunk in chunks:
+                if chunk is not None:
+                    start, end, data = chunk
+                    if start < position:
+                        yield "event: reset\ndata: \n\n"
+                    yield _sse_log_event(end, data)
+                    position, idle = end, 0.0
+                    continue
+                task_status, _ = await run_in_threadpool(_task_log_state, task_id)
+                if task_status not in ACTIVE_STATUSES:
+                    # 训练已结束：补发剩余内容（包括末尾不完整的一行）后关闭
+                    while True:
+                        data, next_position = await run_in_threadpool(read_log_range, path, position)
+                        if not data:
+                            break
+                        yield _sse_log_event(next_position, data)
+                        position = next_position
+                    yield f"id: {position}\nevent: end\ndata: {task_status}\n\n"
+                    return
+                idle += LOG_STREAM_CHECK_INTERVAL
+                if idle >= LOG_STREAM_KEEPALIVE:
+                    yield ": keepalive\n\n"
+                    idle = 0.0
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
+        }
+    )
 
 import subprocess
 import json
 import os
-import requests
-from pathlib import Path
 
-# SwanLab 配置存储
-SWANLAB_CONFIG_FILE = "swanlab_config.json"
-SWANLAB_PROCESS = None
 
 def load_swanlab_config():
     """加载SwanLab配置"""
@@ -309,12 +1376,28 @@ def save_swanlab_config(config):
         json.dump(config, f, ensure_ascii=False, indent=2)
 
 def check_swanlab_status():
-    """检查SwanLab服务状态"""
-    global SWANLAB_PROCESS
-    if SWANLAB_PROCESS and SWANLAB_PROCESS.poll() is None:
+    """检查SwanLab服务状态：running / starting / stopped（按需启动与手动启动共用同一个受监管进程）"""
+    board_status = process_supervisor.status(SWANBOARD_SERVICE)["status"]
+    if board_status == "ready":
         return "running"
+    if board_status in ("starting", "unhealthy", "backoff"):
+        return "starting"
     return "stopped"
 
+def _apply_swanlab_config(config: dict) -> bool:
+    """把 SwanLab 配置同步为 SwanBoard 的启动参数，返回是否有变化"""
+    return configure_swanboard(
+        config.get("data_dir", "./swanlab_data"),
+        config.get("host", "0.0.0.0"),
+        int(config.get("port", 5092)),
+    )
+
+def _swanboard_probe_url(config: dict) -> str:
+    host = probe_host(config.get("host", "0.0.0.0"))
+    if ":" in host:
+        host = f"[{host}]"  # IPv6 地址在 URL 中需加方括号
+    return f"http://{host}:{int(config.get('port', 5092))}"
+
 def is_conda_env():
     """检测是否在 conda 环境中（包括 base 环境）"""
     # conda 会设置 CONDA_PREFIX 或 CONDA_DEFAULT_ENV 环境变量
@@ -340,64 +1423,81 @@ async def get_swanlab_info():
     - 200 + { status, url, projects, config }。
     
     注意：
-    - 检查 SwanLab 进程状态；返回模拟项目数据（实际应调用 SwanLab API）。
+    - 检查 SwanLab 进程状态；项目与实验（状态、指标、步数、最新值）读取自本地 SwanLab 日志；
+    - 数据目录已有训练日志时按需拉起 SwanBoard，board 字段为其 idle/starting/ready 状态，
+      页面轮询期间不会被空闲回收。
     """
     config = load_swanlab_config()
+    if not process_supervisor.is_running(SWANBOARD_SERVICE):
+        _apply_swanlab_config(config)
+    board = process_supervisor.status(SWANBOARD_SERVICE)
+    board_dir = swanboard_data_dir()
+    # 用户手动停止（stopped）后不再自动拉起，直到再次点击启动
+    if board["status"] != "stopped" and os.path.isdir(board_dir) and os.listdir(board_dir):
+        board = process_supervisor.ensure_started(SWANBOARD_SERVICE)
     status = check_swanlab_status()
     
-    # 获取 SwanLab 项目数据
+    # 获取 SwanLab 项目数据（线程池中读取 SwanBoard 数据库与运行日志，按 mtime 缓存）
     projects = []
     if status == "running":
         try:
-            # 尝试从 SwanLab API 获取实际项目数据
-            data_dir = config.get('data_dir', './swanlab_data')
-            if os.path.exists(data_dir):
-                # 扫描数据目录下的项目
-                for item in os.listdir(data_dir):
-                    project_path = os.path.join(data_dir, item)
-                    if os.path.isdir(project_path):
-                        stat = os.stat(project_path)
-                        projects.append({
-                            "name": item,
-                            "status": "active",
-                            "created_at": datetime.fromtimestamp(stat.st_ctime).isoformat(),
-                            "updated_at": datetime.fromtimestamp(stat.st_mtime).isoformat(),
-                            "experiments": []
-                        })
+            projects = await swanlab_catalog.list_projects(config.get('data_dir', './swanlab_data'))
         except Exception as e:
             logger.warning(f"获取项目列表失败: {str(e)}")
-            # 如果获取失败，返回空列表
-            projects = []
-    
+
     return {
         "status": status,
         "url": f"http://{config['host']}:{config['port']}",
         "projects": projects,
-        "config": config
+        "config": config,
+        "board": board["status"]
     }
 
+@router.get("/swanlab/health")
+async def check_swanboard_health(current_user: User = Depends(get_current_user)):
+    """检查 SwanBoard 看板是否已就绪（未运行时按需启动）
+
+    作用：
+    - 返回进程监管器记录的 SwanBoard 状态：idle / starting / ready / unhealthy / backoff / stopped，以及实际端口。
+
+    触发链路：
+    - 前端“训练可视化”页面可见时轮询；首次调用拉起看板，之后每次调用都推迟空闲回收。
+
+    注意：
+    - 会拉起并续期子进程，因此需要登录；
+    - 用户手动停止（stopped）后不再自动拉起，直到再次点击启动；
+    - 与 GET /training/swanlab 不同，不读取项目列表，适合高频轮询。
+    """
+    if not process_supervisor.is_running(SWANBOARD_SERVICE):
+        _apply_swanlab_config(load_swanlab_config())
+    board = process_supervisor.status(SWANBOARD_SERVICE)
+    if board["status"] == "stopped":
+        return board
+    return process_supervisor.ensure_started(SWANBOARD_SERVICE)
+
 @router.post("/swanlab/start", responses={400: {"model": ErrorResponse}, 500: {"model": ErrorResponse}})
-async def start_swanlab(config: dict):
+async def start_swanlab(config: dict, background: bool = False):
     """启动 SwanLab 服务
     
     作用:
-    - 根据配置启动 SwanLab 监控服务进程。
+    - 按配置启动 SwanBoard 可视化服务，并轮询其 HTTP 端口确认可用。
     
     触发链路:
     - 用户在训练监控页面点击"启动 SwanLab"按钮。
     
     参数:
     - config：包含 host、port、data_dir 的配置字典。
+    - background：为 true 时启动后立即返回 starting，之后通过 GET /training/swanlab 或 /training/services 查看进度。
     
     返回:
-    - 200 + { message, status }。
+    - 200 + { message, status, service }；service 为监管器中 SwanBoard 的状态快照。
     
     注意:
-    - 自动检测 conda 环境选择启动方式；创建数据目录；保存配置到文件。
+    - 与按需启动共用同一个受监管进程，不会同时运行两个看板；已在运行时返回 400；
+    - 前台模式在 SWANBOARD_START_TIMEOUT 秒内就绪即返回，进程中途退出或超时则停止服务并返回 500（附最近输出）；
+    - 配置保存到文件，数据目录必须已有训练日志。
     """
-    global SWANLAB_PROCESS
-
-    if check_swanlab_status() == "running":
+    if process_supervisor.is_running(SWANBOARD_SERVICE):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="SwanBoard 服务已在运行"
@@ -410,47 +1510,49 @@ async def start_swanlab(config: dict):
     port = int(config.get("port", 5092))
 
     # 检查数据目录是否包含 swanlab 数据库（训练后才会生成）
-    has_db = any(f.endswith(".db") or f == "runs" for f in os.listdir(data_dir)) if os.listdir(data_dir) else False
+    has_db = any(f.endswith(".db") or f.endswith(".swanlab") or f == "runs" for f in os.listdir(data_dir))
     if not has_db:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"数据目录 {os.path.abspath(data_dir)} 中没有训练日志。请先在 LLaMA-Factory 中启用 SwanLab 回调进行一次训练。"
         )
 
-    try:
-        # 使用 swanboard 的 Python API 启动可视化服务
-        data_dir_escaped = os.path.abspath(data_dir).replace("\\", "/")
-        SWANLAB_PROCESS = subprocess.Popen(
-            ["python", "-c",
-             f"from swanboard.run import SwanBoardRun; SwanBoardRun.run('{data_dir_escaped}', '{host}', {port})"],
-            creationflags=subprocess.CREATE_NEW_CONSOLE if os.name == 'nt' else 0
-        )
-        logger.info(f"SwanBoard 进程已启动，PID: {SWANLAB_PROCESS.pid}")
+    _apply_swanlab_config(config)
+    process_supervisor.ensure_started(SWANBOARD_SERVICE)
+    if background:
+        return {
+            "message": f"SwanBoard 正在启动 http://{host}:{port}",
+            "status": "starting",
+            "service": process_supervisor.status(SWANBOARD_SERVICE)
+        }
 
-        # 等待进程启动
-        await asyncio.sleep(3)
+    probe_url = _swanboard_probe_url(config)
 
-        if SWANLAB_PROCESS.poll() is not None:
-            SWANLAB_PROCESS = None
-            raise Exception("SwanBoard 进程启动后立即退出，请检查数据目录是否包含有效的 swanlab 训练日志")
+    async def probe() -> bool:
+        return (await check_board_http(probe_url, timeout=SWANBOARD_PROBE_TIMEOUT))[0]
 
-        return {"message": f"SwanBoard 可视化服务已启动 http://{host}:{port}", "status": "running"}
+    board = await process_supervisor.wait_ready(SWANBOARD_SERVICE, probe, timeout=SWANBOARD_START_TIMEOUT)
+    if board["status"] == "ready":
+        return {"message": f"SwanBoard 可视化服务已启动 http://{host}:{port}", "status": "running", "service": board}
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"启动 SwanBoard 失败: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"启动 SwanBoard 失败: {str(e)}"
-        )
+    await process_supervisor.stop(SWANBOARD_SERVICE)
+    output = "\n".join(board["recent_output"][-5:])
+    if board["pid"] is None:
+        reason = f"SwanBoard 进程启动后退出（返回码 {board['last_exit_code']}），请检查数据目录是否包含有效的 swanlab 训练日志"
+    else:
+        reason = f"SwanBoard 在 {SWANBOARD_START_TIMEOUT:.0f} 秒内未就绪"
+    logger.error(f"启动 SwanBoard 失败: {reason}")
+    raise HTTPException(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        detail=f"启动 SwanBoard 失败: {reason}" + (f"\n{output}" if output else "")
+    )
 
 @router.post("/swanlab/stop", responses={500: {"model": ErrorResponse}})
 async def stop_swanlab():
     """停止 SwanLab 服务
     
     作用:
-    - 终止当前运行的 SwanLab 服务进程。
+    - 终止当前运行的 SwanBoard 进程（无论是按需启动还是手动启动的）。
     
     触发链路:
     - 用户在训练监控页面点击"停止 SwanLab"按钮。
@@ -462,15 +1564,10 @@ async def stop_swanlab():
     - 200 + { message }。
     
     注意:
-    - 发送 SIGTERM 信号终止进程；等待进程完全退出。
+    - 先发送 SIGTERM，超时后强制结束；
+    - 停止后状态为 stopped，页面轮询与 GET /training/swanlab 不会再按需拉起看板，需用户再次点击启动（POST /training/swanlab/start）。
     """
-    global SWANLAB_PROCESS
-    
-    if SWANLAB_PROCESS and SWANLAB_PROCESS.poll() is None:
-        SWANLAB_PROCESS.terminate()
-        SWANLAB_PROCESS.wait()
-        SWANLAB_PROCESS = None
-    
+    await process_supervisor.stop(SWANBOARD_SERVICE)
     return {"message": "SwanLab服务已停止"}
 
 @router.post("/swanlab/config", responses={500: {"model": ErrorResponse}})
@@ -518,24 +1615,16 @@ async def test_swanlab_connection(config: dict):
     - 200 + { message }。
     
     注意:
-    - 发送 HTTP GET 请求测试连接；5 秒超时；返回连接状态。
+    - 使用共享的异步 HTTP 客户端发送 GET 请求，5 秒超时，不阻塞事件循环。
     """
-    try:
-        import requests
-        url = f"http://{config.get('host', 'localhost')}:{config.get('port', 5092)}"
-        response = requests.get(url, timeout=5)
-        if response.status_code == 200:
-            return {"message": "连接测试成功"}
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="连接失败"
-            )
-    except Exception as e:
+    url = f"http://{config.get('host', 'localhost')}:{config.get('port', 5092)}"
+    ok, reason = await check_board_http(url, timeout=5)
+    if not ok:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"连接测试失败: {str(e)}"
+            detail=f"连接测试失败: {reason}"
         )
+    return {"message": "连接测试成功"}
 
 @router.post("/swanlab/projects", responses={500: {"model": ErrorResponse}})
 async def create_swanlab_project(project: dict):
@@ -619,30 +1708,15 @@ async def get_swanlab_projects():
     - 200 + 项目列表（包含 name、status、created_at、updated_at、experiments）。
     
     注意:
-    - 仅当 SwanLab 服务运行时返回数据；当前返回模拟项目数据。
+    - 仅当 SwanLab 服务运行时返回数据；数据来自本地 SwanLab 日志，每个实验含状态、指标名、步数与最新值。
     """
     status = check_swanlab_status()
     if status != "running":
         return []
     
-    # 获取实际项目数据
-    projects = []
     try:
         config = load_swanlab_config()
-        data_dir = config.get('data_dir', './swanlab_data')
-        if os.path.exists(data_dir):
-            for item in os.listdir(data_dir):
-                project_path = os.path.join(data_dir, item)
-                if os.path.isdir(project_path):
-                    stat = os.stat(project_path)
-                    projects.append({
-                        "name": item,
-                        "status": "active",
-                        "created_at": datetime.fromtimestamp(stat.st_ctime).isoformat(),
-                        "updated_at": datetime.fromtimestamp(stat.st_mtime).isoformat(),
-                        "experiments": []
-                    })
+        return await swanlab_catalog.list_projects(config.get('data_dir', './swanlab_data'))
     except Exception as e:
         logger.warning(f"获取项目列表失败: {str(e)}")
-    
-    return projects
\ No newline at end of file
+        return []
\ No newline at end of file
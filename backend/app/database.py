@@ -1,7 +1,11 @@
-from sqlalchemy import create_engine
+from sqlalchemy import Column, String, Table, create_engine, delete, insert, inspect, select, text
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+import hashlib
+import json
 import os
+from typing import Optional
 
 # 数据库配置：优先读环境变量，默认SQLite
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./modeltrain.db")
@@ -15,6 +19,14 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+# 启动初始化标记：记录表结构指纹与默认数据版本，未变化时跳过 create_all / 结构比对 / 种子查询
+schema_meta = Table(
+    "schema_meta", Base.metadata,
+    Column("key", String(64), primary_key=True),
+    Column("value", String(128), nullable=False),
+)
+SCHEMA_FINGERPRINT_KEY = "schema_fingerprint"
+
 def get_db():
     """数据库会话依赖"""
     db = SessionLocal()
@@ -22,3 +34,64 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def sync_added_columns(bind=None):
+    """为已存在的表补齐模型中新增的列
+
+    create_all 只会创建缺失的表，不会修改已有表；已部署的数据库在模型新增列后
+    直接查询会报 "no such column"。这里对比表结构，用 ALTER TABLE ADD COLUMN 补齐缺失列（均为可空列）。
+    正式的结构变更仍建议使用 Alembic 迁移。
+    """
+    bind = bind or engine
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or column.primary_key:
+                    continue
+                column_type = column.type.compile(dialect=bind.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+
+
+def schema_fingerprint() -> str:
+    """根据所有已注册模型的表、列、类型与索引计算指纹；模型有任何增改时指纹随之变化"""
+    parts = []
+    for table in sorted(Base.metadata.sorted_tables, key=lambda t: t.name):
+        columns = [(c.name, str(c.type), c.nullable, c.primary_key) for c in table.columns]
+        indexes = sorted((i.name or "", tuple(c.name for c in i.columns), bool(i.unique)) for i in table.indexes)
+        parts.append([table.name, columns, indexes])
+    return hashlib.sha256(json.dumps(parts, default=str).encode("utf-8")).hexdigest()
+
+
+def get_schema_meta(key: str, bind=None) -> Optional[str]:
+    """读取初始化标记；标记表尚不存在（全新数据库）时返回 None"""
+    try:
+        with (bind or engine).connect() as conn:
+            return conn.execute(select(schema_meta.c.value).where(schema_meta.c.key == key)).scalar()
+    except SQLAlchemyError:
+        return None
+
+
+def set_schema_meta(key: str, value: str, bind=None) -> None:
+    with (bind or engine).begin() as conn:
+        conn.execute(delete(schema_meta).where(schema_meta.c.key == key))
+        conn.execute(insert(schema_meta).values(key=key, value=value))
+
+
+def init_schema(bind=None) -> bool:
+    """建表并补齐新增列；表结构指纹与上次一致时跳过，返回是否实际执行了初始化
+
+    设置 SCHEMA_FORCE_INIT=1 可强制重新执行（例如手工删除过表）。
+    """
+    bind = bind or engine
+    fingerprint = schema_fingerprint()
+    if os.getenv("SCHEMA_FORCE_INIT", "") != "1" and get_schema_meta(SCHEMA_FINGERPRINT_KEY, bind) == fingerprint:
+        return False
+    Base.metadata.create_all(bind=bind)
+    sync_added_columns(bind)
+    set_schema_meta(SCHEMA_FINGERPRINT_KEY, fingerprint, bind)
+    return True
@@ -1,7 +1,10 @@
-from typing import Dict, List, Any, Optional
+import re
+from typing import Dict, List, Any, Optional, Tuple
 from .openai_client import OpenAIClient
 from .ollama_client import OllamaClient
 
+_THINK_RE = re.compile(r'<think>(.*?)</think>', re.DOTALL)
+
 # 默认模型设置
 DEFAULT_MODEL_SETTINGS = {
     'temperature': 0.7,
@@ -205,6 +208,26 @@ class LLMClient:
                 'cot': ''
             }
 
+def create_llm_client(model_config) -> LLMClient:
+    """根据 ModelConfig 记录创建客户端"""
+    return LLMClient({
+        'provider_id': model_config.provider_id,
+        'endpoint': model_config.endpoint,
+        'api_key': model_config.api_key,
+        'model_name': model_config.model_name,
+        'temperature': model_config.temperature,
+        'max_tokens': model_config.max_tokens,
+        'top_p': model_config.top_p,
+        'top_k': model_config.top_k
+    })
+
+def split_thinking(text: str) -> Tuple[str, str]:
+    """拆分推理模型输出中的 <think>...</think>，返回 (回答, 思维链)"""
+    match = _THINK_RE.search(text or '')
+    if not match:
+        return text or '', ''
+    return _THINK_RE.sub('', text).strip(), match.group(1).strip()
+
 def get_model_providers() -> List[Dict]:
     """获取模型提供商列表"""
     return MODEL_PROVIDERS
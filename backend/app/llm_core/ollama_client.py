@@ -1,8 +1,11 @@
 import json
+import logging
 from typing import Dict, List, Any
-from .base_client import BaseClient
+from .base_client import BaseClient, get_http_client
 import httpx
 
+logger = logging.getLogger(__name__)
+
 class OllamaClient(BaseClient):
     """Ollama客户端"""
     
@@ -113,7 +116,7 @@ class OllamaClient(BaseClient):
             except Exception as e:
                 # 如果流式请求失败，回退到普通请求并模拟流式输出
                 try:
-                    print(f"Ollama流式请求失败，回退到普通请求: {str(e)}")
+                    logger.warning(f"Ollama流式请求失败，回退到普通请求: {str(e)}")
                     payload['stream'] = False
                     normal_result = await self._make_request_ollama(url, payload)
                     content = normal_result['message']['content']
@@ -145,11 +148,10 @@ class OllamaClient(BaseClient):
         """发起Ollama专用请求"""
         headers = {'Content-Type': 'application/json'}
         
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(url, json=payload, headers=headers)
-            if response.status_code != 200:
-                raise Exception(f"API请求失败: {response.status_code} {response.text}")
-            return response.json()
+        response = await get_http_client().post(url, json=payload, headers=headers)
+        if response.status_code != 200:
+            raise Exception(f"API请求失败: {response.status_code} {response.text}")
+        return response.json()
     
     async def get_models(self):
         """获取可用模型列表"""
@@ -1,8 +1,11 @@
 import json
+import logging
 from typing import Dict, List, Any
-from .base_client import BaseClient
+from .base_client import BaseClient, get_http_client
 import httpx
 
+logger = logging.getLogger(__name__)
+
 class OpenAIClient(BaseClient):
     """OpenAI兼容客户端"""
     
@@ -115,7 +118,7 @@ class OpenAIClient(BaseClient):
             except Exception as e:
                 # 如果流式请求失败，回退到普通请求并模拟流式输出
                 try:
-                    print(f"流式请求失败，回退到普通请求: {str(e)}")
+                    logger.warning(f"流式请求失败，回退到普通请求: {str(e)}")
                     payload['stream'] = False
                     fallback_headers = {'Content-Type': 'application/json'}
                     if self.requires_api_key and self.api_key and self.api_key.strip():
@@ -161,10 +164,9 @@ class OpenAIClient(BaseClient):
         if self.requires_api_key and self.api_key and self.api_key.strip():
             headers['Authorization'] = f'Bearer {self.api_key}'
             
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(url, json=payload, headers=headers)
-            
-            if response.status_code != 200:
-                raise Exception(f"API请求失败: {response.status_code} {response.text}")
-            
-            return response.json() 
\ No newline at end of file
+        response = await get_http_client().post(url, json=payload, headers=headers)
+        
+        if response.status_code != 200:
+            raise Exception(f"API请求失败: {response.status_code} {response.text}")
+        
+        return response.json() 
\ No newline at end of file
@@ -0,0 +1,32 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON
+from sqlalchemy.sql import func
+from sqlalchemy.orm import relationship
+
+from app.database import Base
+
+
+class BatchInferenceJob(Base):
+    """用某个模型配置对数据集中的全部提示做离线推理，结果按记录顺序追加写入 JSONL"""
+    __tablename__ = "batch_inference_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(255), nullable=False)
+    dataset_id = Column(Integer, ForeignKey("datasets.id"), nullable=False)
+    model_config_id = Column(String(100), ForeignKey("model_configs.id"), nullable=False)
+    params = Column(JSON)  # concurrency、max_examples、temperature、max_tokens、system_prompt
+    status = Column(String(50), default="pending")  # pending, running, paused, completed, failed, cancelled
+    output_path = Column(String(500))
+    # 检查点：序号小于 cursor 的记录都已写入输出文件的前 output_offset 字节，续跑时截断到该位置并从 cursor 继续
+    cursor = Column(Integer, default=0)
+    output_offset = Column(Integer, default=0)
+    total_records = Column(Integer)  # 待处理记录数（读完数据集前为估计值）
+    error_count = Column(Integer, default=0)  # 调用失败或无法解析的记录数（已写入输出文件的部分）
+    stats = Column(JSON)  # records_per_second、output_tokens、output_tokens_per_second、eta_seconds、elapsed_seconds
+    error = Column(Text)
+    created_by = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    completed_at = Column(DateTime(timezone=True))
+
+    # 关联关系
+    dataset = relationship("Dataset")
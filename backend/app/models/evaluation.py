@@ -0,0 +1,49 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Float, JSON, UniqueConstraint
+from sqlalchemy.sql import func
+from sqlalchemy.orm import relationship
+
+from app.database import Base
+
+
+class EvaluationRun(Base):
+    """在同一份验证集上对比多个模型配置（如微调模型与其基座模型）的评估任务"""
+    __tablename__ = "evaluation_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(255), nullable=False)
+    dataset_id = Column(Integer, ForeignKey("datasets.id"), nullable=False)
+    model_config_ids = Column(JSON, nullable=False)  # 参与对比的 ModelConfig.id 列表
+    judge_config_id = Column(String(100), ForeignKey("model_configs.id"))  # LLM 评审所用的模型配置
+    metrics = Column(JSON, nullable=False)  # exact_match, bleu, rouge_1, rouge_l, judge
+    params = Column(JSON)  # concurrency、max_examples、temperature、max_tokens、system_prompt
+    status = Column(String(50), default="pending")  # pending, running, completed, failed, cancelled
+    total_examples = Column(Integer)  # 参与评估的样本数（读完数据集前为估计值）
+    completed_count = Column(Integer, default=0)  # 已得到结果的 (样本, 模型) 对数
+    summary = Column(JSON)  # 各模型的平均指标、错误数与平均延迟
+    error = Column(Text)
+    created_by = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    completed_at = Column(DateTime(timezone=True))
+
+    # 关联关系
+    dataset = relationship("Dataset")
+
+
+class EvaluationResult(Base):
+    """单个样本在单个模型上的输出与得分；续跑时已有结果的 (样本, 模型) 对会被跳过"""
+    __tablename__ = "evaluation_results"
+    __table_args__ = (UniqueConstraint("run_id", "model_config_id", "example_index"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    run_id = Column(Integer, ForeignKey("evaluation_runs.id"), nullable=False, index=True)
+    model_config_id = Column(String(100), nullable=False)
+    example_index = Column(Integer, nullable=False)  # 记录在数据集中的序号（从 0 开始）
+    prompt = Column(Text)  # 最后一条用户消息
+    reference = Column(Text)
+    prediction = Column(Text)
+    scores = Column(JSON)  # {"exact_match": 1.0, "bleu": 0.42, ..., "judge": 8}
+    judge_reason = Column(Text)
+    latency_ms = Column(Float)
+    error = Column(Text)  # 调用失败原因；续跑时会重试
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
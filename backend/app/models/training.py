@@ -3,6 +3,17 @@ from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database import Base
 
+class DatasetBlob(Base):
+    """按内容寻址存储的数据集文件，多个 Dataset 共享同一份文件"""
+    __tablename__ = "dataset_blobs"
+    
+    sha256 = Column(String(64), primary_key=True)
+    file_path = Column(String(500), nullable=False)
+    file_size = Column(Integer)
+    line_count = Column(Integer)
+    ref_count = Column(Integer, nullable=False, default=0)  # 引用该文件的 Dataset 数量
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
 class Dataset(Base):
     __tablename__ = "datasets"
     
@@ -12,8 +23,39 @@ class Dataset(Base):
     file_path = Column(String(500), nullable=False)
     file_size = Column(Integer)
     format_type = Column(String(50))  # json, jsonl, csv等
+    content_hash = Column(String(64), index=True)  # 文件内容 SHA-256
+    line_count = Column(Integer)  # 文件行数（上传时顺带统计）
+    validation_status = Column(String(20))  # pending, running, passed, failed, error
+    validation_report = Column(JSON)  # 校验报告：记录数、错误样例、token 分布、重复率
+    validated_at = Column(DateTime(timezone=True))
+    parent_id = Column(Integer, ForeignKey("datasets.id"))  # 由预处理/切分生成的派生数据集指向源数据集
+    derivation = Column(JSON)  # 派生方式与参数，如 {"job_type": "preprocess", "params": {...}}
     uploaded_by = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    # 关联关系（content_hash 即 blob 主键；旧数据没有对应 blob 时为 None）
+    blob = relationship("DatasetBlob", primaryjoin="foreign(Dataset.content_hash) == DatasetBlob.sha256", viewonly=True)
+
+class DatasetJob(Base):
+    """数据集后台处理任务（预处理、切分等），进度与结果写回本记录"""
+    __tablename__ = "dataset_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    dataset_id = Column(Integer, ForeignKey("datasets.id"), nullable=False)
+    job_type = Column(String(50), nullable=False)  # preprocess, split
+    status = Column(String(50), default="pending")  # pending, running, completed, failed
+    progress = Column(Float, default=0.0)
+    stage = Column(String(50))  # 当前阶段，便于前端展示
+    params = Column(JSON)
+    result = Column(JSON)  # 统计信息与生成的数据集 ID
+    error = Column(Text)
+    created_by = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    completed_at = Column(DateTime(timezone=True))
+    
+    # 关联关系
+    dataset = relationship("Dataset")
 
 class TrainingConfig(Base):
     __tablename__ = "training_configs"
@@ -32,9 +74,16 @@ class TrainingTask(Base):
     name = Column(String(255), nullable=False)
     model_name = Column(String(255), nullable=False)
     dataset_id = Column(Integer, ForeignKey("datasets.id"))
+    eval_dataset_id = Column(Integer, ForeignKey("datasets.id"))  # 验证集（来自切分任务或手动指定）
     config_id = Column(Integer, ForeignKey("training_configs.id"))
-    status = Column(String(50), default="pending")  # pending, running, completed, failed
+    status = Column(String(50), default="pending")  # pending, queued, running, completed, failed, cancelled
     progress = Column(Float, default=0.0)
+    metrics = Column(JSON)  # 最新训练指标：step、total_steps、epoch、loss、lr、吞吐、eta_seconds 等
+    error_message = Column(Text)  # 启动失败原因或非零退出码
+    priority = Column(Integer, default=0)  # 调度优先级，数值越大越先运行
+    resource_request = Column(JSON)  # 声明的资源需求 {"cpu_cores", "memory_gb", "gpus"}
+    queued_at = Column(DateTime(timezone=True))  # 进入队列的时间，同优先级按先后调度
+    pid = Column(Integer)  # 运行中训练进程的 PID，服务重启后用于回收遗留进程
     log_file = Column(String(500))
     output_dir = Column(String(500))
     swanlab_url = Column(String(500))
@@ -44,5 +93,56 @@ class TrainingTask(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # 关联关系
-    dataset = relationship("Dataset")
-    config = relationship("TrainingConfig") 
\ No newline at end of file
+    dataset = relationship("Dataset", foreign_keys=[dataset_id])
+    eval_dataset = relationship("Dataset", foreign_keys=[eval_dataset_id])
+    config = relationship("TrainingConfig")
+
+class TrainingCheckpoint(Base):
+    """训练输出目录索引：每个 checkpoint-N 目录一条，训练结束时输出目录根部保存的最终模型记为 final"""
+    __tablename__ = "training_checkpoints"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    task_id = Column(Integer, ForeignKey("training_tasks.id"), nullable=False, index=True)
+    name = Column(String(255), nullable=False)  # checkpoint-500 / final
+    kind = Column(String(20), nullable=False)  # checkpoint, final
+    path = Column(String(500), nullable=False)
+    step = Column(Integer)
+    size_bytes = Column(Integer)
+    file_count = Column(Integer)
+    has_adapter = Column(Boolean, default=False)  # 是否包含 LoRA 适配器（adapter_model.*）
+    files = Column(JSON)  # 目录顶层文件名与大小，用于判断权重/适配器类型
+    metrics = Column(JSON)  # 该 checkpoint 时刻的 loss、eval_loss 等（来自 trainer_state.json）
+    eval_loss = Column(Float)  # 单独存一列便于按验证集损失排序
+    mtime_ns = Column(Integer)  # 目录修改时间，未变化时跳过重新统计
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    
+    # 关联关系
+    task = relationship("TrainingTask")
+
+class ModelDeployment(Base):
+    """把训练输出部署到本地推理服务（vLLM / Ollama）并登记为 ModelConfig 的部署记录"""
+    __tablename__ = "model_deployments"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    task_id = Column(Integer, ForeignKey("training_tasks.id"), nullable=False, index=True)
+    checkpoint_name = Column(String(255), nullable=False)  # checkpoint-500 / final
+    source_path = Column(String(500))  # 部署所用的 checkpoint 目录
+    target = Column(String(20), nullable=False)  # vllm, ollama
+    merge = Column(Boolean, default=False)  # 是否先把 LoRA 合并进基座模型
+    served_name = Column(String(200), nullable=False)  # 推理服务中的模型名，也是 ModelConfig.model_name
+    endpoint = Column(String(500), nullable=False)
+    base_model = Column(String(255))  # Ollama Modelfile 的 FROM（基座模型）
+    model_path = Column(String(500))  # 实际注册的目录：适配器或合并后的模型
+    status = Column(String(50), default="pending")  # pending, running, completed, failed
+    stage = Column(String(50))  # 当前步骤：resolve, merge, register, verify, model_config
+    timings = Column(JSON)  # 各步骤耗时（秒）与 total_seconds（提交到可用的总耗时）
+    model_config_id = Column(String(100), ForeignKey("model_configs.id"))
+    error = Column(Text)
+    created_by = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    completed_at = Column(DateTime(timezone=True))
+    
+    # 关联关系
+    task = relationship("TrainingTask")
@@ -0,0 +1,39 @@
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from pydantic import BaseModel, Field
+
+
+class BatchInferenceCreate(BaseModel):
+    name: str
+    dataset_id: int
+    model_config_id: str
+    concurrency: int = Field(8, ge=1, le=128)  # 同时在途的模型调用数
+    max_examples: Optional[int] = Field(None, ge=1)  # 只处理数据集前 N 条记录
+    temperature: Optional[float] = Field(None, ge=0, le=2)  # 为空时使用模型配置中的值
+    max_tokens: Optional[int] = Field(None, ge=1)
+    system_prompt: Optional[str] = None  # 记录本身没有 system 消息时附加
+
+
+class BatchInferenceResponse(BaseModel):
+    id: int
+    name: str
+    dataset_id: int
+    model_config_id: str
+    params: Optional[Dict[str, Any]] = None
+    status: str
+    output_path: Optional[str] = None
+    cursor: int = 0  # 已写入输出的记录数（即下一条待写入记录的序号）
+    output_offset: int = 0
+    total_records: Optional[int] = None
+    error_count: int = 0
+    progress: Optional[float] = None
+    stats: Optional[Dict[str, Any]] = None  # records_per_second、output_tokens_per_second、eta_seconds 等
+    error: Optional[str] = None
+    created_by: Optional[int] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
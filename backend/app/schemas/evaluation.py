@@ -0,0 +1,65 @@
+from datetime import datetime
+from typing import Any, Dict, List, Literal, Optional
+
+from pydantic import BaseModel, Field
+
+EvaluationMetric = Literal["exact_match", "bleu", "rouge_1", "rouge_l", "judge"]
+
+
+class EvaluationRunCreate(BaseModel):
+    name: str
+    dataset_id: int  # 验证集（如切分任务生成的 eval 子数据集）
+    model_config_ids: List[str] = Field(..., min_length=2)  # 参与对比的模型配置，如微调模型与基座模型
+    metrics: List[EvaluationMetric] = ["exact_match", "bleu", "rouge_l"]
+    judge_config_id: Optional[str] = None  # metrics 含 judge 时必填
+    concurrency: int = Field(4, ge=1, le=64)  # 同时在途的模型调用数（含评审调用）
+    max_examples: Optional[int] = Field(None, ge=1)  # 只评估数据集前 N 条记录
+    temperature: float = Field(0.0, ge=0, le=2)
+    max_tokens: Optional[int] = Field(None, ge=1)
+    system_prompt: Optional[str] = None  # 记录本身没有 system 消息时附加
+
+
+class EvaluationRunResponse(BaseModel):
+    id: int
+    name: str
+    dataset_id: int
+    model_config_ids: List[str]
+    judge_config_id: Optional[str] = None
+    metrics: List[str]
+    params: Optional[Dict[str, Any]] = None
+    status: str
+    total_examples: Optional[int] = None
+    completed_count: int = 0
+    progress: Optional[float] = None  # completed_count / (total_examples × 模型数)
+    summary: Optional[Dict[str, Any]] = None  # {model_config_id: {count, errors, avg_latency_ms, metrics}}
+    error: Optional[str] = None
+    created_by: Optional[int] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class EvaluationResultResponse(BaseModel):
+    id: int
+    model_config_id: str
+    example_index: int
+    prompt: Optional[str] = None
+    reference: Optional[str] = None
+    prediction: Optional[str] = None
+    scores: Optional[Dict[str, float]] = None
+    judge_reason: Optional[str] = None
+    latency_ms: Optional[float] = None
+    error: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class EvaluationResultsPage(BaseModel):
+    total: int
+    offset: int
+    limit: int
+    items: List[EvaluationResultResponse]
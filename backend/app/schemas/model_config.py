@@ -137,4 +137,17 @@ class RefreshModelsRequest(BaseModel):
     api_key: Optional[str] = Field(None, alias="apiKey")
 
     class Config:
-        populate_by_name = True 
\ No newline at end of file
+        populate_by_name = True
+
+
+class ProviderRefreshResult(BaseModel):
+    provider_id: str
+    success: bool
+    total: int = 0
+    inserted: int = 0
+    updated: int = 0
+    deleted: int = 0
+    error: Optional[str] = None
+
+class RefreshAllModelsResponse(BaseModel):
+    results: List[ProviderRefreshResult]
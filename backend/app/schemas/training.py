@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Dict, Any, Optional, List
+from pydantic import BaseModel, Field
+from typing import Dict, Any, Optional, List, Literal
 from datetime import datetime
 
 # 数据集
@@ -14,12 +14,101 @@ class DatasetResponse(BaseModel):
     file_path: str
     file_size: Optional[int]
     format_type: Optional[str]
+    content_hash: Optional[str] = None
+    line_count: Optional[int] = None
+    validation_status: Optional[str] = None
+    validated_at: Optional[datetime] = None
+    parent_id: Optional[int] = None
     uploaded_by: Optional[int]
     created_at: datetime
 
     class Config:
         from_attributes = True
 
+class DatasetValidationResponse(BaseModel):
+    dataset_id: int
+    validation_status: Optional[str]
+    validated_at: Optional[datetime]
+    report: Optional[Dict[str, Any]]
+
+class DatasetRecordsResponse(BaseModel):
+    dataset_id: int
+    total: Optional[int]  # JSON 数组分页预览时为 None
+    records: List[Dict[str, Any]]  # {"index", "record"}，解析失败时为 {"index", "error", "raw"}
+
+class DatasetConvertRequest(BaseModel):
+    target: Optional[str] = None  # alpaca / sharegpt / text，默认沿用源格式
+    columns: Optional[Dict[str, str]] = None  # 列映射：目标字段 -> 源字段（如 {"instruction": "question"}）
+
+class DatasetConvertResponse(BaseModel):
+    dataset_id: int
+    dataset: str  # dataset_info.json 中的名称，训练时作为 dataset 参数
+    dataset_dir: str
+    file_name: str
+    cached: bool
+    source_schema: Optional[str]
+    target_schema: Optional[str]
+    source_count: int
+    record_count: int
+    skipped_count: int
+
+class DatasetPreprocessRequest(BaseModel):
+    name: Optional[str] = None  # 派生数据集名称，默认“<源名称>-preprocessed”
+    description: Optional[str] = None
+    dedup_exact: bool = True
+    dedup_near: bool = True
+    near_dup_threshold: float = Field(0.8, gt=0, lt=1)  # MinHash 估计的 Jaccard 相似度阈值
+    min_tokens: Optional[int] = Field(None, ge=0)
+    max_tokens: Optional[int] = Field(None, gt=0)
+    bucket_boundaries: Optional[List[int]] = None  # 长度分桶上界，如 [512, 1024, 2048]；每个非空桶另生成分桶子数据集
+
+class DatasetSplitRequest(BaseModel):
+    name: Optional[str] = None  # 子数据集名称前缀，默认沿用源数据集名称
+    description: Optional[str] = None
+    eval_ratio: float = Field(0.1, ge=0, lt=1)
+    seed: int = Field(42, ge=0, le=2 ** 63 - 1)
+    num_shards: int = Field(1, ge=1, le=256)  # 训练集分片数，大于 1 时额外生成分片子数据集
+
+class DatasetJobResponse(BaseModel):
+    id: int
+    dataset_id: int
+    job_type: str
+    status: str
+    progress: float
+    stage: Optional[str]
+    params: Optional[Dict[str, Any]]
+    result: Optional[Dict[str, Any]]
+    error: Optional[str]
+    created_by: Optional[int]
+    created_at: datetime
+    started_at: Optional[datetime]
+    completed_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
+
+# 分块上传（断点续传）
+class DatasetUploadInit(BaseModel):
+    filename: str
+    total_size: int
+
+class DatasetUploadComplete(BaseModel):
+    name: Optional[str] = None
+    description: Optional[str] = None
+
+class DatasetFromHash(BaseModel):
+    sha256: str = Field(..., min_length=64, max_length=64)
+    filename: str
+    name: Optional[str] = None
+    description: Optional[str] = None
+
+class DatasetUploadStatus(BaseModel):
+    upload_id: str
+    filename: str
+    total_size: int
+    received: int
+    chunk_size: int
+
 # 训练配置
 class TrainingConfigCreate(BaseModel):
     name: str
@@ -37,21 +126,42 @@ class TrainingConfigResponse(BaseModel):
         from_attributes = True
 
 # 训练任务
+class TrainingResources(BaseModel):
+    """训练任务声明的资源需求，调度器据此与主机容量比较后决定是否放行"""
+    cpu_cores: float = Field(1, gt=0)
+    memory_gb: float = Field(0, ge=0)
+    gpus: Optional[int] = Field(None, ge=0)  # 未指定时：主机有 GPU 则占用 1 张，否则为 0
+
 class TrainingTaskCreate(BaseModel):
     name: str
     model_name: str
-    dataset_id: int
+    dataset_id: Optional[int] = None
+    eval_dataset_id: Optional[int] = None
+    split_job_id: Optional[int] = None  # 引用已完成的切分任务，自动使用其 train/eval 子数据集
     config_id: Optional[int] = None
     config_data: Optional[Dict[str, Any]] = None
+    priority: int = Field(0, ge=-100, le=100)
+    resources: Optional[TrainingResources] = None
+
+class TrainingStartRequest(BaseModel):
+    """启动训练时可覆盖创建任务时设置的优先级与资源需求"""
+    priority: Optional[int] = Field(None, ge=-100, le=100)
+    resources: Optional[TrainingResources] = None
 
 class TrainingTaskResponse(BaseModel):
     id: int
     name: str
     model_name: str
     dataset_id: int
+    eval_dataset_id: Optional[int] = None
     config_id: Optional[int]
     status: str
     progress: float
+    metrics: Optional[Dict[str, Any]] = None
+    error_message: Optional[str] = None
+    priority: Optional[int] = 0
+    resource_request: Optional[Dict[str, Any]] = None
+    queued_at: Optional[datetime] = None
     log_file: Optional[str]
     output_dir: Optional[str]
     swanlab_url: Optional[str]
@@ -63,6 +173,98 @@ class TrainingTaskResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class TrainingQueueEntry(BaseModel):
+    task_id: int
+    name: str
+    status: str
+    priority: int
+    created_by: Optional[int]
+    resources: Dict[str, Any]
+    queued_at: Optional[datetime] = None
+    position: Optional[int] = None  # 排队序号（从 1 开始），运行中的任务为空
+    blocked_reason: Optional[str] = None  # 排队原因：quota / resources / concurrency / order
+
+class TrainingQueueResponse(BaseModel):
+    capacity: Dict[str, Any]  # 主机容量 {"cpu_cores", "memory_gb", "gpus"}
+    reserved: Dict[str, Any]  # 运行中任务已占用的资源
+    available_memory_gb: float
+    max_concurrent: int
+    user_max_running: int
+    running: List[TrainingQueueEntry]
+    queued: List[TrainingQueueEntry]
+
+class MetricSeries(BaseModel):
+    total: int  # 查询区间内的原始点数
+    points: List[List[Optional[float]]]  # 降采样后的 [step, value]，value 为 NaN/Inf 时为 null
+
+class TrainingMetricsResponse(BaseModel):
+    task_id: int
+    available: List[str]  # 该任务已记录的全部指标名
+    metrics: Dict[str, MetricSeries]
+
+class TrainingCheckpointResponse(BaseModel):
+    id: int
+    task_id: int
+    name: str
+    kind: str  # checkpoint / final
+    path: str
+    step: Optional[int]
+    size_bytes: Optional[int]
+    file_count: Optional[int]
+    has_adapter: bool
+    files: Optional[Dict[str, int]] = None
+    metrics: Optional[Dict[str, Any]] = None
+    eval_loss: Optional[float] = None
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class CheckpointPruneRequest(BaseModel):
+    keep: int = Field(..., ge=1)  # 保留的 checkpoint 数（最终模型不计入、始终保留）
+    metric: Literal["eval_loss", "loss", "step"] = "eval_loss"  # step 表示保留最新的 keep 个
+    dry_run: bool = False
+
+class CheckpointPruneResponse(BaseModel):
+    kept: List[str]
+    removed: List[str]
+    freed_bytes: int
+    dry_run: bool
+
+class ModelDeployRequest(BaseModel):
+    """部署训练输出；checkpoint 为空时优先使用最终模型，否则取步数最大的 checkpoint"""
+    checkpoint: Optional[str] = None  # checkpoint-500 / final
+    target: Literal["vllm", "ollama"] = "vllm"
+    merge: bool = False  # 先合并 LoRA 再部署（vLLM 只能热加载适配器，不支持合并后部署）
+    served_name: Optional[str] = Field(None, max_length=200, pattern=r"^[A-Za-z0-9][A-Za-z0-9_.:/-]*$")
+    endpoint: Optional[str] = None  # 推理服务地址，默认取 VLLM_ENDPOINT / OLLAMA_ENDPOINT
+    base_model: Optional[str] = None  # Ollama 的基座模型（如 qwen2.5:7b），默认使用训练任务的 model_name
+
+class ModelDeploymentResponse(BaseModel):
+    id: int
+    task_id: int
+    checkpoint_name: str
+    source_path: Optional[str] = None
+    target: str
+    merge: bool
+    served_name: str
+    endpoint: str
+    base_model: Optional[str] = None
+    model_path: Optional[str] = None
+    status: str
+    stage: Optional[str] = None
+    timings: Optional[Dict[str, float]] = None
+    model_config_id: Optional[str] = None
+    error: Optional[str] = None
+    created_by: Optional[int] = None
+    created_at: Optional[datetime]
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
 # LlamaFactory训练配置
 class LlamaFactoryConfig(BaseModel):
     # 基础配置
@@ -0,0 +1,309 @@
+"""
+训练输出一键部署
+把已完成训练任务的某个 checkpoint 部署到本地推理服务并登记为 ModelConfig，之后即可在对话/Playground 中直接选用：
+1. resolve：定位 checkpoint 目录，确认适配器/权重文件存在；
+2. merge（可选）：llamafactory-cli export 在 CPU 上把 LoRA 合并进基座模型，同一 checkpoint 的合并结果会复用；
+3. register：vLLM 通过 /v1/load_lora_adapter 热加载适配器；Ollama 生成 Modelfile 后执行 ollama create；
+4. verify：轮询推理服务的模型列表，直到新模型出现；
+5. model_config：创建（或重新启用）指向该模型的 ModelConfig。
+每一步的耗时写入 ModelDeployment.timings，total_seconds 即从开始部署到可对话的时间。
+"""
+
+import asyncio
+import logging
+import os
+import shlex
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+import yaml
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models.model_config import ModelConfig
+from app.models.training import ModelDeployment, TrainingCheckpoint, TrainingTask
+from app.services.checkpoint_index import FINAL_NAME
+from app.services.training_executor import TRAINER_COMMAND, _process_group_kwargs
+
+logger = logging.getLogger(__name__)
+
+# 推理服务默认地址，与默认模型配置中的 vLLM / Ollama 端点一致
+VLLM_ENDPOINT = os.getenv("VLLM_ENDPOINT", "http://127.0.0.1:8000/v1/")
+OLLAMA_ENDPOINT = os.getenv("OLLAMA_ENDPOINT", "http://127.0.0.1:11434/api")
+OLLAMA_COMMAND = os.getenv("OLLAMA_COMMAND", "ollama")
+# 注册后等待模型出现在推理服务模型列表中的最长时间与轮询间隔（秒）
+DEPLOY_VERIFY_TIMEOUT = float(os.getenv("DEPLOY_VERIFY_TIMEOUT", "120"))
+DEPLOY_VERIFY_INTERVAL = 1.0
+DEPLOY_HTTP_TIMEOUT = 60.0
+
+DEPLOY_DIR_NAME = "deploy"
+DEPLOY_LOG_FILE = "deploy.log"
+# 合并成功后写入的标记文件；存在时同一 checkpoint 的后续部署直接复用合并结果
+MERGED_MARKER = ".merged"
+ACTIVE_DEPLOY_STATUSES = ("pending", "running")
+
+PROVIDER_NAMES = {"vllm": "VLLM", "ollama": "Ollama"}
+
+
+class DeployError(Exception):
+    """部署步骤失败（推理服务拒绝、命令退出码非零等），消息直接展示给用户"""
+
+
+def default_endpoint(target: str) -> str:
+    return VLLM_ENDPOINT if target == "vllm" else OLLAMA_ENDPOINT
+
+
+def default_served_name(task: TrainingTask, checkpoint_name: str) -> str:
+    # Ollama 模型名只允许小写
+    return f"ft-{task.id}-{checkpoint_name}".lower()
+
+
+def select_checkpoint(db: Session, task: TrainingTask, name: Optional[str]) -> Optional[TrainingCheckpoint]:
+    """按名称查找 checkpoint；未指定时优先最终模型，否则取步数最大的 checkpoint"""
+    query = db.query(TrainingCheckpoint).filter(TrainingCheckpoint.task_id == task.id)
+    if name:
+        return query.filter(TrainingCheckpoint.name == name).first()
+    rows = query.all()
+    final = [row for row in rows if row.kind == FINAL_NAME]
+    if final:
+        return final[0]
+    return max(rows, key=lambda row: row.step or 0, default=None)
+
+
+def deploy_dir(task: TrainingTask, deployment_id: int) -> str:
+    return os.path.join(task.output_dir, DEPLOY_DIR_NAME, str(deployment_id))
+
+
+def merged_dir(task: TrainingTask, checkpoint_name: str) -> str:
+    return os.path.join(task.output_dir, DEPLOY_DIR_NAME, f"merged-{checkpoint_name}")
+
+
+def _vllm_base(endpoint: str) -> str:
+    base = endpoint.rstrip("/")
+    if base.endswith("/chat/completions"):
+        base = base[:-len("/chat/completions")]
+    return base if base.endswith("/v1") else base + "/v1"
+
+
+def _ollama_host(endpoint: str) -> str:
+    parts = urlsplit(endpoint)
+    return f"{parts.scheme or 'http'}://{parts.netloc}"
+
+
+def _ollama_names(name: str) -> List[str]:
+    # 未带标签的模型在 /api/tags 中显示为 name:latest
+    return [name] if ":" in name else [name, f"{name}:latest"]
+
+
+async def _run_command(command: List[str], log_path: str, env: Optional[Dict[str, str]] = None) -> None:
+    """执行命令并把输出追加到部署日志；退出码非零时抛出 DeployError（附日志末尾几行）"""
+    with open(log_path, "ab") as log_fp:
+        log_fp.write(f"$ {' '.join(command)}\n".encode("utf-8"))
+        log_fp.flush()
+        proc = await asyncio.create_subprocess_exec(
+            *command, stdout=log_fp, stderr=asyncio.subprocess.STDOUT, stdin=asyncio.subprocess.DEVNULL,
+            env={**os.environ, "PYTHONUNBUFFERED": "1", **(env or {})}, **_process_group_kwargs()
+        )
+    return_code = await proc.wait()
+    if return_code != 0:
+        with open(log_path, "rb") as f:
+            tail = f.read()[-2000:].decode("utf-8", errors="replace").strip().splitlines()[-5:]
+        raise DeployError(f"{os.path.basename(command[0])} 退出码 {return_code}: {' | '.join(tail)}")
+
+
+class DeploymentRunner:
+    """执行单个部署记录的各个步骤，并把阶段与耗时写回数据库"""
+
+    def __init__(self, db: Session, deployment: ModelDeployment):
+        self.db = db
+        self.deployment = deployment
+        self.task: TrainingTask = deployment.task
+        self.work_dir = deploy_dir(self.task, deployment.id)
+        self.log_path = os.path.join(self.work_dir, DEPLOY_LOG_FILE)
+        self.timings: Dict[str, float] = {}
+
+    async def _step(self, stage: str, func, *args):
+        self.deployment.stage = stage
+        self.db.commit()
+        started = time.perf_counter()
+        try:
+            return await func(*args)
+        finally:
+            self.timings[stage] = round(time.perf_counter() - started, 3)
+            # JSON 列需要整体赋新对象才会被识别为已修改
+            self.deployment.timings = dict(self.timings)
+            self.db.commit()
+
+    async def run(self) -> None:
+        started = time.perf_counter()
+        os.makedirs(self.work_dir, exist_ok=True)
+        await self._step("resolve", self._resolve)
+        if self.deployment.merge:
+            await self._step("merge", self._merge)
+        else:
+            self.deployment.model_path = self.deployment.source_path
+        register = self._register_vllm if self.deployment.target == "vllm" else self._register_ollama
+        await self._step("register", register)
+        await self._step("verify", self._verify)
+        await self._step("model_config", self._create_model_config)
+        self.timings["total_seconds"] = round(time.perf_counter() - started, 3)
+        self.deployment.timings = dict(self.timings)
+
+    async def _resolve(self) -> None:
+        path = self.deployment.source_path
+        if not path or not os.path.isdir(path):
+            raise DeployError(f"checkpoint 目录不存在: {path}")
+        # 最终模型与 checkpoint 同在输出目录，checkpoint 可能已被清理；这里只需顶层文件
+        names = set(await run_in_threadpool(os.listdir, path))
+        if not names & {"adapter_config.json", "config.json"}:
+            raise DeployError(f"{path} 中没有适配器或模型配置文件")
+
+    async def _merge(self) -> None:
+        target_dir = merged_dir(self.task, self.deployment.checkpoint_name)
+        marker = os.path.join(target_dir, MERGED_MARKER)
+        source_mtime = os.stat(self.deployment.source_path).st_mtime
+        if os.path.exists(marker) and os.stat(marker).st_mtime >= source_mtime:
+            self.deployment.model_path = target_dir
+            self.timings["merge_cached"] = 1
+            return
+        config_data = dict(self.task.config.config_data) if self.task.config else {}
+        args = {
+            "model_name_or_path": self.task.model_name,
+            "adapter_name_or_path": os.path.abspath(self.deployment.source_path),
+            "template": config_data.get("template", "default"),
+            "finetuning_type": "lora",
+            "export_dir": os.path.abspath(target_dir),
+            "export_size": 5,
+            "export_device": "cpu",  # 在 CPU 上合并，不占用训练调度器分配的 GPU
+            "export_legacy_format": False,
+        }
+        config_path = os.path.join(self.work_dir, "export_config.yaml")
+        with open(config_path, "w", encoding="utf-8") as f:
+            yaml.safe_dump(args, f, allow_unicode=True, sort_keys=False)
+        command = shlex.split(TRAINER_COMMAND, posix=os.name != "nt") + ["export", config_path]
+        await _run_command(command, self.log_path)
+        with open(marker, "w", encoding="utf-8") as f:
+            f.write(datetime.now(timezone.utc).isoformat())
+        self.deployment.model_path = target_dir
+
+    async def _register_vllm(self) -> None:
+        """热加载 LoRA（需以 VLLM_ALLOW_RUNTIME_LORA_UPDATING=True 与 --enable-lora 启动 vLLM）"""
+        base = _vllm_base(self.deployment.endpoint)
+        payload = {"lora_name": self.deployment.served_name, "lora_path": os.path.abspath(self.deployment.model_path)}
+        async with httpx.AsyncClient(timeout=DEPLOY_HTTP_TIMEOUT) as client:
+            response = await client.post(f"{base}/load_lora_adapter", json=payload)
+            if response.status_code == 400 and "already" in response.text:
+                # 同名适配器已加载（重新部署）：先卸载再加载新的权重
+                await client.post(f"{base}/unload_lora_adapter", json={"lora_name": self.deployment.served_name})
+                response = await client.post(f"{base}/load_lora_adapter", json=payload)
+        if response.status_code >= 400:
+            raise DeployError(f"vLLM 加载适配器失败（HTTP {response.status_code}）: {response.text[:500]}")
+
+    async def _register_ollama(self) -> None:
+        model_path = os.path.abspath(self.deployment.model_path)
+        if self.deployment.merge or not os.path.exists(os.path.join(model_path, "adapter_config.json")):
+            lines = [f"FROM {model_path}"]
+        else:
+            lines = [f"FROM {self.deployment.base_model or self.task.model_name}", f"ADAPTER {model_path}"]
+        modelfile = os.path.join(self.work_dir, "Modelfile")
+        with open(modelfile, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        command = shlex.split(OLLAMA_COMMAND, posix=os.name != "nt") + ["create", self.deployment.served_name, "-f", modelfile]
+        await _run_command(command, self.log_path, {"OLLAMA_HOST": _ollama_host(self.deployment.endpoint)})
+
+    async def _list_models(self, client: httpx.AsyncClient) -> List[str]:
+        if self.deployment.target == "vllm":
+            response = await client.get(f"{_vllm_base(self.deployment.endpoint)}/models")
+            response.raise_for_status()
+            return [model.get("id") for model in response.json().get("data", [])]
+        response = await client.get(f"{_ollama_host(self.deployment.endpoint)}/api/tags")
+        response.raise_for_status()
+        return [model.get("name") for model in response.json().get("models", [])]
+
+    async def _verify(self) -> None:
+        names = _ollama_names(self.deployment.served_name) if self.deployment.target == "ollama" else [self.deployment.served_name]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + DEPLOY_VERIFY_TIMEOUT
+        last_error = None
+        async with httpx.AsyncClient(timeout=DEPLOY_HTTP_TIMEOUT) as client:
+            while True:
+                try:
+                    if set(names) & set(await self._list_models(client)):
+                        return
+                except (httpx.HTTPError, ValueError) as e:
+                    last_error = e
+                if loop.time() >= deadline:
+                    detail = f"：{last_error}" if last_error else ""
+                    raise DeployError(f"{DEPLOY_VERIFY_TIMEOUT:.0f} 秒内模型列表中未出现 {self.deployment.served_name}{detail}")
+                await asyncio.sleep(DEPLOY_VERIFY_INTERVAL)
+
+    async def _create_model_config(self) -> None:
+        """创建指向已部署模型的 ModelConfig；同一端点下同名配置已存在时重新启用"""
+        deployment = self.deployment
+        config = self.db.query(ModelConfig).filter(
+            ModelConfig.provider_id == deployment.target,
+            ModelConfig.model_name == deployment.served_name,
+            ModelConfig.endpoint == deployment.endpoint
+        ).first()
+        if config is None:
+            config = ModelConfig(
+                id=str(uuid.uuid4()),
+                user_id=deployment.created_by or 1,
+                provider_id=deployment.target,
+                provider_name=PROVIDER_NAMES[deployment.target],
+                endpoint=deployment.endpoint,
+                api_key="",
+                model_id=deployment.served_name,
+                # LLMClient 以 model_name 作为请求中的模型名
+                model_name=deployment.served_name,
+                type="chat",
+                temperature=0.7,
+                max_tokens=4096,
+            )
+            self.db.add(config)
+        config.status = 1
+        self.db.flush()
+        deployment.model_config_id = config.id
+
+
+async def run_deployment(deployment_id: int) -> None:
+    """执行部署并写回状态（作为后台任务运行，使用独立会话）"""
+    db = SessionLocal()
+    try:
+        deployment = db.query(ModelDeployment).filter(ModelDeployment.id == deployment_id).first()
+        if deployment is None or deployment.status != "pending":
+            return
+        deployment.status = "running"
+        deployment.started_at = datetime.now(timezone.utc)
+        db.commit()
+        try:
+            await DeploymentRunner(db, deployment).run()
+            deployment.status = "completed"
+            deployment.stage = None
+            logger.info(f"部署 {deployment_id} 完成: {deployment.target} {deployment.served_name}，耗时 {deployment.timings}")
+        except Exception as e:
+            db.rollback()
+            if not isinstance(e, DeployError):
+                logger.exception(f"部署 {deployment_id} 失败")
+            deployment.status = "failed"
+            deployment.error = str(e) or type(e).__name__
+        deployment.completed_at = datetime.now(timezone.utc)
+        db.commit()
+    finally:
+        db.close()
+
+
+def fail_interrupted_deployments(db: Session) -> int:
+    """服务启动时把上次未结束的部署标记为失败"""
+    deployments = db.query(ModelDeployment).filter(ModelDeployment.status.in_(ACTIVE_DEPLOY_STATUSES)).all()
+    for deployment in deployments:
+        deployment.status = "failed"
+        deployment.error = "服务重启，部署中断"
+        deployment.completed_at = datetime.now(timezone.utc)
+    db.commit()
+    return len(deployments)
@@ -0,0 +1,283 @@
+"""
+批量推理
+对数据集中的每条提示调用同一个模型配置，输出按记录顺序写入 JSONL：
+- 数据集流式读取，在途请求数不超过 2 × 并发数，5 万条提示也不会整体载入内存；
+- 请求乱序完成，先放入重排缓冲，只把从游标开始连续完成的记录写入文件；
+- 每隔 CHECKPOINT_INTERVAL 秒把 (cursor, output_offset) 与统计信息写库，二者总是对应同一时刻的文件内容，
+  暂停、取消或服务重启后续跑时先把输出截断到 output_offset，再从 cursor 处继续，不重复不遗漏；
+- 吞吐按最近 THROUGHPUT_WINDOW 秒的检查点计算，据此估算剩余时间。
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+import orjson
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.llm_core.llm_client import create_llm_client, split_thinking
+from app.models.batch_inference import BatchInferenceJob
+from app.models.model_config import ModelConfig
+from app.services.evaluation_runner import iter_dataset_chats
+
+logger = logging.getLogger(__name__)
+
+BATCH_INFERENCE_DIR = os.getenv("BATCH_INFERENCE_DIR", os.path.join("uploads", "batch_inference"))
+BATCH_DEFAULT_CONCURRENCY = int(os.getenv("BATCH_DEFAULT_CONCURRENCY", "8"))
+BATCH_MAX_CONCURRENCY = 128
+CHECKPOINT_INTERVAL = 2.0
+THROUGHPUT_WINDOW = 60.0
+ACTIVE_BATCH_STATUSES = ("pending", "running")
+
+
+def output_path_for(job_id: int) -> str:
+    return os.path.join(BATCH_INFERENCE_DIR, f"job_{job_id}.jsonl")
+
+
+def _output_tokens(response: Dict[str, Any]) -> Optional[int]:
+    """从原始响应中取生成 token 数：OpenAI 兼容接口的 usage.completion_tokens 或 Ollama 的 eval_count"""
+    raw = response.get("response") or {}
+    usage = raw.get("usage") or {}
+    value = usage.get("completion_tokens", raw.get("eval_count"))
+    return value if isinstance(value, int) else None
+
+
+class BatchInferenceRunner:
+    """执行单个批量推理任务"""
+
+    def __init__(self, manager: "BatchInferenceManager", job_id: int):
+        self.manager = manager
+        self.job_id = job_id
+        self.db = SessionLocal()
+        self._ready: Dict[int, Tuple[bytes, bool, int]] = {}  # 序号 → (输出行, 是否失败, 生成 token 数)
+        self._samples: Deque[Tuple[float, int, int]] = deque()  # (时间, cursor, 累计 token) 用于计算吞吐
+        self._last_checkpoint = 0.0
+        self._started = time.monotonic()
+
+    def _setup(self, job: BatchInferenceJob) -> None:
+        config = self.db.query(ModelConfig).filter(ModelConfig.id == job.model_config_id).first()
+        if config is None:
+            raise ValueError("模型配置不存在")
+        params = job.params or {}
+        self.client = create_llm_client(config)
+        self.concurrency = min(max(int(params.get("concurrency") or BATCH_DEFAULT_CONCURRENCY), 1), BATCH_MAX_CONCURRENCY)
+        self.semaphore = asyncio.BoundedSemaphore(self.concurrency)
+        self.system_prompt = params.get("system_prompt")
+        self.options: Dict[str, Any] = {}
+        for key in ("temperature", "max_tokens"):
+            if params.get(key) is not None:
+                self.options[key] = params[key]
+        stats = job.stats or {}
+        self.cursor = job.cursor or 0
+        self.error_count = job.error_count or 0
+        self.output_tokens = stats.get("output_tokens", 0)
+        self.elapsed_base = stats.get("elapsed_seconds", 0.0)
+
+    def _open_output(self, job: BatchInferenceJob):
+        """打开输出文件并截断到最近一次检查点（丢弃检查点之后写入、未被记录的内容）"""
+        os.makedirs(os.path.dirname(job.output_path), exist_ok=True)
+        fp = open(job.output_path, "r+b" if os.path.exists(job.output_path) else "wb")
+        fp.truncate(job.output_offset or 0)
+        fp.seek(job.output_offset or 0)
+        return fp
+
+    async def run(self) -> None:
+        db = self.db
+        pending: Set[asyncio.Task] = set()
+        job = None
+        self.fp = None
+        try:
+            job = db.query(BatchInferenceJob).filter(BatchInferenceJob.id == self.job_id).first()
+            if job is None or job.status not in ACTIVE_BATCH_STATUSES:
+                return
+            dataset = job.dataset
+            if dataset is None or not os.path.exists(dataset.file_path):
+                raise FileNotFoundError("数据集文件不存在")
+            self._setup(job)
+            self.fp = self._open_output(job)
+            max_examples = (job.params or {}).get("max_examples")
+            estimate = dataset.line_count or None
+            job.total_records = min(estimate, max_examples) if max_examples and estimate else (max_examples or estimate)
+            job.status = "running"
+            job.started_at = job.started_at or datetime.now(timezone.utc)
+            job.completed_at = None
+            job.error = None
+            db.commit()
+            self._started = time.monotonic()
+            self._samples.append((self._started, self.cursor, self.output_tokens))
+
+            async for index, chat in iter_dataset_chats(dataset.file_path, dataset.format_type, start=self.cursor, limit=max_examples):
+                if chat is None:
+                    self._complete(index, {"index": index, "error": "无法解析的记录"}, True, 0)
+                else:
+                    if len(pending) >= self.concurrency * 2:
+                        _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    pending.add(asyncio.create_task(self._infer(index, *chat)))
+                self._maybe_checkpoint(job)
+            if pending:
+                await asyncio.gather(*pending)
+                pending.clear()
+            job.total_records = self.cursor
+            job.status = "completed"
+            job.completed_at = datetime.now(timezone.utc)
+            self._checkpoint(job)
+            logger.info(f"批量推理 {job.id} 完成，{self.cursor} 条记录，失败 {self.error_count} 条")
+        except asyncio.CancelledError:
+            await self._discard(pending)
+            if job is not None:
+                # 暂停/取消由用户发起；服务关闭时放回待执行状态，重启后自动续跑
+                job.status = self.manager.stop_reason(self.job_id)
+                if job.status == "cancelled":
+                    job.completed_at = datetime.now(timezone.utc)
+                self._checkpoint(job)
+            raise
+        except Exception as e:
+            logger.exception(f"批量推理 {self.job_id} 失败")
+            await self._discard(pending)
+            db.rollback()
+            if job is not None:
+                job.status = "failed"
+                job.error = str(e) or type(e).__name__
+                job.completed_at = datetime.now(timezone.utc)
+                self._checkpoint(job)
+        finally:
+            if self.fp is not None:
+                self.fp.close()
+            db.close()
+
+    @staticmethod
+    async def _discard(pending: Set[asyncio.Task]) -> None:
+        """取消在途请求；它们的记录位于游标之后，续跑时会重新请求"""
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _infer(self, index: int, messages: List[Dict[str, str]], reference: Optional[str]) -> None:
+        if self.system_prompt and messages[0]["role"] != "system":
+            messages = [{"role": "system", "content": self.system_prompt}] + messages
+        record: Dict[str, Any] = {
+            "index": index,
+            "prompt": next((m["content"] for m in reversed(messages) if m["role"] == "user"), None),
+            "reference": reference,
+        }
+        tokens = 0
+        try:
+            started = time.perf_counter()
+            async with self.semaphore:
+                response = await self.client.chat(messages, self.options)
+            record["output"], reasoning = split_thinking(response.get("text") or "")
+            if reasoning:
+                record["reasoning"] = reasoning
+            record["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            tokens = _output_tokens(response) or 0
+            if tokens:
+                record["output_tokens"] = tokens
+        except Exception as e:
+            record["error"] = str(e) or type(e).__name__
+        self._complete(index, record, "error" in record, tokens)
+
+    def _complete(self, index: int, record: Dict[str, Any], failed: bool, tokens: int) -> None:
+        """放入重排缓冲，并把从游标开始连续完成的记录写入文件"""
+        self._ready[index] = (orjson.dumps(record) + b"\n", failed, tokens)
+        while self.cursor in self._ready:
+            line, failed, tokens = self._ready.pop(self.cursor)
+            self.fp.write(line)
+            self.error_count += failed
+            self.output_tokens += tokens
+            self.cursor += 1
+
+    def _maybe_checkpoint(self, job: BatchInferenceJob) -> None:
+        if time.monotonic() - self._last_checkpoint >= CHECKPOINT_INTERVAL:
+            self._checkpoint(job)
+
+    def _throughput(self, now: float) -> Dict[str, Any]:
+        self._samples.append((now, self.cursor, self.output_tokens))
+        while len(self._samples) > 2 and now - self._samples[1][0] >= THROUGHPUT_WINDOW:
+            self._samples.popleft()
+        then, cursor, tokens = self._samples[0]
+        elapsed = now - then
+        rate = (self.cursor - cursor) / elapsed if elapsed > 0 else 0.0
+        stats = {
+            "records_per_second": round(rate, 3),
+            "output_tokens": self.output_tokens,
+            "output_tokens_per_second": round((self.output_tokens - tokens) / elapsed, 1) if elapsed > 0 else 0.0,
+            "elapsed_seconds": round(self.elapsed_base + now - self._started, 1),
+            "eta_seconds": None,
+        }
+        total = self.job_total
+        if rate > 0 and total:
+            stats["eta_seconds"] = round(max(total - self.cursor, 0) / rate, 1)
+        return stats
+
+    def _checkpoint(self, job: BatchInferenceJob) -> None:
+        """刷盘后记录游标与文件偏移；两者在同一事务中更新，始终与文件内容一致"""
+        if self.fp is None:
+            # 输出文件尚未打开（启动阶段失败），只需保存状态
+            self.db.commit()
+            return
+        self.fp.flush()
+        os.fsync(self.fp.fileno())
+        now = time.monotonic()
+        self._last_checkpoint = now
+        self.job_total = job.total_records
+        job.cursor = self.cursor
+        job.output_offset = self.fp.tell()
+        job.error_count = self.error_count
+        job.stats = self._throughput(now)
+        self.db.commit()
+
+
+class BatchInferenceManager:
+    """管理后台运行的批量推理任务：提交、暂停、取消，以及服务启停时的中断与续跑"""
+
+    def __init__(self):
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._stop_reasons: Dict[int, str] = {}
+        self.shutting_down = False
+
+    def is_active(self, job_id: int) -> bool:
+        return job_id in self._tasks
+
+    def stop_reason(self, job_id: int) -> str:
+        """任务被中断后应进入的状态"""
+        return "pending" if self.shutting_down else self._stop_reasons.get(job_id, "cancelled")
+
+    def submit(self, job_id: int) -> None:
+        if job_id in self._tasks:
+            return
+        self._stop_reasons.pop(job_id, None)
+        task = asyncio.create_task(BatchInferenceRunner(self, job_id).run())
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    async def stop(self, job_id: int, reason: str) -> bool:
+        """reason 为 paused 或 cancelled；任务不在运行时返回 False"""
+        task = self._tasks.get(job_id)
+        if task is None:
+            return False
+        self._stop_reasons[job_id] = reason
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return True
+
+    def recover(self, db: Session) -> int:
+        """服务启动时继续上次未完成的任务（已暂停的保持暂停）"""
+        jobs = db.query(BatchInferenceJob.id).filter(BatchInferenceJob.status.in_(ACTIVE_BATCH_STATUSES)).all()
+        for (job_id,) in jobs:
+            self.submit(job_id)
+        return len(jobs)
+
+    async def shutdown(self) -> None:
+        self.shutting_down = True
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+batch_inference_manager = BatchInferenceManager()
@@ -0,0 +1,225 @@
+"""
+训练输出目录索引
+记录每个训练任务输出目录中的 checkpoint-N 与最终模型：大小、文件数、是否含 LoRA 适配器，
+以及该时刻的 loss / eval_loss（取自 trainer_state.json）。扫描是增量的：每次只列出输出目录并 stat 各 checkpoint 目录，
+目录 mtime 未变化的记录直接跳过，只有新增或变化的目录才会遍历统计大小、解析 trainer_state.json。
+支持按 eval_loss / loss / step 只保留前 K 个 checkpoint，删除其余目录回收磁盘。
+"""
+
+import logging
+import os
+import re
+import shutil
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models.training import TrainingCheckpoint, TrainingTask
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_DIR_RE = re.compile(r"^checkpoint-(\d+)$")
+ADAPTER_WEIGHT_FILES = ("adapter_model.safetensors", "adapter_model.bin")
+MODEL_WEIGHT_RE = re.compile(r"^(?:pytorch_model|model)(?:-\d+-of-\d+)?\.(?:safetensors|bin)$")
+TRAINER_STATE_FILE = "trainer_state.json"
+# 训练结束时 transformers 写在输出目录根部的汇总指标
+RESULT_FILES = ("all_results.json", "train_results.json", "eval_results.json")
+FINAL_NAME = "final"
+
+
+def _is_weight_file(name: str) -> bool:
+    return name in ADAPTER_WEIGHT_FILES or bool(MODEL_WEIGHT_RE.match(name))
+
+
+def _read_json(path: str) -> Optional[Any]:
+    try:
+        with open(path, "rb") as f:
+            return orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        return None
+
+
+def _top_files(path: str) -> Dict[str, int]:
+    files = {}
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_file(follow_symlinks=False):
+                files[entry.name] = entry.stat().st_size
+    return files
+
+
+def _dir_usage(path: str) -> Tuple[int, int]:
+    size = count = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            try:
+                size += os.lstat(os.path.join(root, name)).st_size
+                count += 1
+            except OSError:
+                pass
+    return size, count
+
+
+def _state_metrics(state: Optional[Dict[str, Any]], step: Optional[int]) -> Dict[str, Any]:
+    """从 trainer_state.json 的 log_history 中取 step 及之前最近一次的训练指标
+
+    eval_loss 只取恰好在该步做的评估（排序依据必须属于这个 checkpoint），更早的评估记为 last_eval_loss。
+    """
+    if not state:
+        return {}
+    step = state.get("global_step", step) if step is None else step
+    metrics: Dict[str, Any] = {}
+    for entry in state.get("log_history") or []:
+        entry_step = entry.get("step", 0)
+        if step is not None and entry_step > step:
+            continue
+        for key in ("loss", "learning_rate", "epoch"):
+            if entry.get(key) is not None:
+                metrics[key] = entry[key]
+        if entry.get("eval_loss") is not None:
+            metrics["last_eval_loss"], metrics["last_eval_step"] = entry["eval_loss"], entry_step
+            if entry_step == step:
+                metrics.update({key: value for key, value in entry.items() if key.startswith("eval_")})
+    for key in ("global_step", "best_metric", "best_model_checkpoint"):
+        if state.get(key) is not None:
+            metrics[key] = state[key]
+    return metrics
+
+
+def _final_signature(output_dir: str) -> Optional[int]:
+    """输出目录根部权重文件的最新修改时间；没有权重文件（训练未结束或失败）时返回 None"""
+    latest = None
+    with os.scandir(output_dir) as entries:
+        for entry in entries:
+            if entry.is_file(follow_symlinks=False) and _is_weight_file(entry.name):
+                mtime = entry.stat().st_mtime_ns
+                latest = mtime if latest is None else max(latest, mtime)
+    return latest
+
+
+def latest_checkpoint_step(output_dir: str) -> int:
+    """输出目录中最新 checkpoint-N 的步数；没有 checkpoint 时返回 0（LLaMA-Factory 将从头训练）"""
+    latest = 0
+    try:
+        with os.scandir(output_dir) as entries:
+            for entry in entries:
+                match = CHECKPOINT_DIR_RE.match(entry.name)
+                if match and entry.is_dir(follow_symlinks=False):
+                    latest = max(latest, int(match.group(1)))
+    except OSError:
+        pass
+    return latest
+
+
+def _describe(path: str, kind: str, step: Optional[int]) -> Dict[str, Any]:
+    files = _top_files(path)
+    if kind == FINAL_NAME:
+        # 根目录还包含日志、指标与各 checkpoint，最终模型只统计顶层文件
+        size, count = sum(files.values()), len(files)
+    else:
+        size, count = _dir_usage(path)
+    state = _read_json(os.path.join(path, TRAINER_STATE_FILE))
+    metrics = _state_metrics(state, step)
+    if kind == FINAL_NAME:
+        step = (state or {}).get("global_step", step)
+        for name in RESULT_FILES:
+            metrics.update(_read_json(os.path.join(path, name)) or {})
+    return {
+        "step": step,
+        "size_bytes": size,
+        "file_count": count,
+        "has_adapter": any(name in files for name in ADAPTER_WEIGHT_FILES),
+        "files": files,
+        "metrics": metrics,
+        "eval_loss": metrics.get("eval_loss"),
+    }
+
+
+def scan_task_outputs(db: Session, task: TrainingTask) -> Dict[str, int]:
+    """增量扫描任务输出目录并同步索引，返回 {added, updated, removed, unchanged}"""
+    stats = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+    existing = {row.name: row for row in db.query(TrainingCheckpoint).filter(TrainingCheckpoint.task_id == task.id)}
+    found: Dict[str, Tuple[str, str, Optional[int], int]] = {}
+    if task.output_dir and os.path.isdir(task.output_dir):
+        with os.scandir(task.output_dir) as entries:
+            for entry in entries:
+                match = CHECKPOINT_DIR_RE.match(entry.name)
+                if match and entry.is_dir(follow_symlinks=False):
+                    found[entry.name] = (entry.path, "checkpoint", int(match.group(1)), entry.stat().st_mtime_ns)
+        final_mtime = _final_signature(task.output_dir)
+        if final_mtime is not None:
+            found[FINAL_NAME] = (task.output_dir, FINAL_NAME, None, final_mtime)
+
+    for name, (path, kind, step, mtime_ns) in found.items():
+        row = existing.pop(name, None)
+        if row is not None and row.mtime_ns == mtime_ns:
+            stats["unchanged"] += 1
+            continue
+        try:
+            values = _describe(path, kind, step)
+        except OSError:
+            continue  # 目录在扫描过程中被删除
+        if row is None:
+            row = TrainingCheckpoint(task_id=task.id, name=name, kind=kind, path=path)
+            db.add(row)
+            stats["added"] += 1
+        else:
+            stats["updated"] += 1
+        for key, value in values.items():
+            setattr(row, key, value)
+        row.mtime_ns = mtime_ns
+
+    for row in existing.values():
+        db.delete(row)
+        stats["removed"] += 1
+    db.commit()
+    return stats
+
+
+def index_task_outputs(task_id: int) -> Optional[Dict[str, int]]:
+    """使用独立会话扫描单个任务（训练结束后由执行器在线程池中调用）"""
+    db = SessionLocal()
+    try:
+        task = db.query(TrainingTask).filter(TrainingTask.id == task_id).first()
+        return scan_task_outputs(db, task) if task else None
+    finally:
+        db.close()
+
+
+def _prune_key(row: TrainingCheckpoint, metric: str):
+    if metric == "step":
+        return -(row.step or 0)
+    value = row.eval_loss if metric == "eval_loss" else (row.metrics or {}).get(metric)
+    # 缺少指标的排在最后；指标相同时保留较新的
+    return (value is None, value if value is not None else 0.0, -(row.step or 0))
+
+
+def plan_prune(rows: List[TrainingCheckpoint], keep: int, metric: str) -> Tuple[List[TrainingCheckpoint], List[TrainingCheckpoint]]:
+    """返回 (保留, 删除)；最终模型不参与排序，始终保留"""
+    if metric == "eval_loss" and not any(row.eval_loss is not None for row in rows if row.kind == "checkpoint"):
+        raise ValueError("checkpoint 中没有 eval_loss，请开启验证或改用 metric=loss / step")
+    candidates = sorted((row for row in rows if row.kind == "checkpoint"), key=lambda row: _prune_key(row, metric))
+    kept = [row for row in rows if row.kind != "checkpoint"] + candidates[:keep]
+    return kept, candidates[keep:]
+
+
+def prune_checkpoints(db: Session, task: TrainingTask, keep: int, metric: str, dry_run: bool = False) -> Dict[str, Any]:
+    """按指标保留前 keep 个 checkpoint，删除其余目录与索引记录（同步函数，需在线程池中调用）"""
+    scan_task_outputs(db, task)
+    rows = db.query(TrainingCheckpoint).filter(TrainingCheckpoint.task_id == task.id).order_by(TrainingCheckpoint.step).all()
+    kept, removed = plan_prune(rows, keep, metric)
+    freed = sum(row.size_bytes or 0 for row in removed)
+    if not dry_run:
+        for row in removed:
+            shutil.rmtree(row.path, ignore_errors=True)
+            db.delete(row)
+        db.commit()
+        logger.info(f"训练任务 {task.id} 清理 checkpoint {len(removed)} 个，释放 {freed} 字节")
+    return {
+        "kept": [row.name for row in kept],
+        "removed": [row.name for row in removed],
+        "freed_bytes": freed,
+        "dry_run": dry_run,
+    }
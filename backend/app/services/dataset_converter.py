@@ -0,0 +1,286 @@
+"""
+数据集转换与 LLaMA-Factory 注册
+把 CSV / TXT / JSON / JSONL 数据集流式转换为规范化的 JSONL（alpaca / sharegpt / text），
+写入 LLaMA-Factory 数据目录并登记到 dataset_info.json。
+转换结果按“源文件哈希 + 转换参数”缓存，同一数据集重复训练时直接复用。
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import orjson
+from fastapi.concurrency import run_in_threadpool
+
+from app.services.dataset_validator import (
+    SCHEMA_CHECKS, _Malformed, detect_schema, get_process_pool, iter_records
+)
+
+# LLaMA-Factory 的 dataset_dir（训练时通过 dataset_dir 参数传入）
+LLAMAFACTORY_DATA_DIR = os.getenv("LLAMAFACTORY_DATA_DIR", os.path.join("uploads", "datasets", "llamafactory"))
+DATASET_INFO_FILE = "dataset_info.json"
+# 转换结果存放在数据目录下的子目录，dataset_info.json 中使用相对路径
+CONVERTED_SUBDIR = "modeltrain"
+# 登记到 dataset_info.json 的数据集名前缀
+REGISTERED_NAME_PREFIX = "modeltrain_"
+# 转换格式版本，转换逻辑变化时递增以使旧缓存失效
+CONVERTER_VERSION = 1
+TARGET_SCHEMAS = ("alpaca", "sharegpt", "text")
+
+_SHAREGPT_ROLES = {"user": "human", "human": "human", "assistant": "gpt", "gpt": "gpt",
+                   "system": "system", "observation": "observation", "function_call": "function_call"}
+
+# sharegpt 角色 → OpenAI 消息角色
+_CHAT_ROLES = {"human": "user", "gpt": "assistant", "observation": "user", "function_call": "assistant"}
+
+_info_lock = threading.Lock()
+
+
+class ConversionError(Exception):
+    """数据集无法转换为目标格式"""
+
+
+# ---------------------------------------------------------------- 单条记录转换
+
+def _apply_columns(record: Any, columns: Optional[Dict[str, str]]) -> Any:
+    """按列映射重命名字段（目标字段 -> 源字段），未映射的字段原样保留"""
+    if not columns or not isinstance(record, dict):
+        return record
+    mapped = {key: value for key, value in record.items() if key not in columns.values()}
+    for target, source in columns.items():
+        if source in record:
+            mapped[target] = record[source]
+    return mapped
+
+
+def _sharegpt_turns(record: Dict[str, Any]) -> list:
+    turns = record.get("conversations", record.get("messages")) or []
+    normalized = []
+    for turn in turns:
+        role = turn.get("from", turn.get("role"))
+        normalized.append({"from": _SHAREGPT_ROLES.get(role, role), "value": turn.get("value", turn.get("content"))})
+    return normalized
+
+
+def _alpaca_to_sharegpt(record: Dict[str, Any]) -> Dict[str, Any]:
+    conversations = []
+    for query, response in record.get("history") or []:
+        conversations += [{"from": "human", "value": query}, {"from": "gpt", "value": response}]
+    prompt = "\n".join(part for part in (record["instruction"], record.get("input") or "") if part)
+    conversations += [{"from": "human", "value": prompt}, {"from": "gpt", "value": record["output"]}]
+    converted = {"conversations": conversations}
+    if record.get("system"):
+        converted["system"] = record["system"]
+    return converted
+
+
+def _sharegpt_to_alpaca(record: Dict[str, Any]) -> Dict[str, Any]:
+    turns = _sharegpt_turns(record)
+    system = record.get("system") or next((t["value"] for t in turns if t["from"] == "system"), None)
+    turns = [t for t in turns if t["from"] != "system"]
+    pairs = [(turns[i]["value"], turns[i + 1]["value"]) for i in range(0, len(turns) - 1, 2)]
+    instruction, output = pairs[-1]
+    converted = {"instruction": instruction, "input": "", "output": output}
+    if pairs[:-1]:
+        converted["history"] = [list(pair) for pair in pairs[:-1]]
+    if system:
+        converted["system"] = system
+    return converted
+
+
+def _normalize(record: Dict[str, Any], schema: str, target: str) -> Dict[str, Any]:
+    """把已通过格式检查的记录转换为目标格式"""
+    if target == "text":
+        if schema == "text":
+            return {"text": record["text"]}
+        raise ConversionError(f"无法把 {schema} 格式转换为 text 格式")
+    if schema == "text":
+        raise ConversionError(f"无法把 text 格式转换为 {target} 格式，请提供列映射")
+    if schema == "alpaca":
+        if target == "sharegpt":
+            return _alpaca_to_sharegpt(record)
+        converted = {"instruction": record["instruction"], "input": record.get("input") or "", "output": record["output"]}
+        for key in ("system", "history"):
+            if record.get(key):
+                converted[key] = record[key]
+        return converted
+    if target == "alpaca":
+        return _sharegpt_to_alpaca(record)
+    converted = {"conversations": [t for t in _sharegpt_turns(record) if t["from"] != "system"]}
+    system = record.get("system") or next((t["value"] for t in _sharegpt_turns(record) if t["from"] == "system"), None)
+    if system:
+        converted["system"] = system
+    return converted
+
+
+def record_to_chat(record: Any) -> Optional[Tuple[List[Dict[str, str]], Optional[str]]]:
+    """把一条记录转为推理请求 (messages, 参考答案)；无法识别格式或未通过检查时返回 None
+
+    alpaca 的 output、sharegpt 最后一轮模型回复作为参考答案，其余轮次作为上下文；
+    text 格式整段作为用户输入，没有参考答案。
+    """
+    schema = detect_schema(record)
+    if schema is None or SCHEMA_CHECKS[schema](record):
+        return None
+    if schema == "text":
+        return [{"role": "user", "content": record["text"]}], None
+    if schema == "alpaca":
+        record = _alpaca_to_sharegpt(record)
+    turns = _sharegpt_turns(record)
+    system = record.get("system") or next((t["value"] for t in turns if t["from"] == "system"), None)
+    turns = [t for t in turns if t["from"] != "system"]
+    reference = None
+    if turns[-1]["from"] == "gpt":
+        reference, turns = turns[-1]["value"], turns[:-1]
+    messages = [{"role": "system", "content": system}] if system else []
+    messages += [{"role": _CHAT_ROLES.get(t["from"], "user"), "content": t["value"]} for t in turns]
+    return messages, reference
+
+
+def iter_chat_records(path: str, format_type: str, start: int = 0) -> Iterator[Tuple[int, Optional[Tuple[List[Dict[str, str]], Optional[str]]]]]:
+    """顺序产出 (记录序号, record_to_chat 结果)，从序号 start 开始
+
+    序号从 0 开始并包含解析失败的记录（结果为 None），文件不变时同一条记录的序号固定，可作为续跑游标。
+    """
+    for index, (_, record) in enumerate(iter_records(path, format_type)):
+        if index < start:
+            continue
+        yield index, None if isinstance(record, _Malformed) else record_to_chat(record)
+
+
+def _converted_records(path: str, format_type: str, target: Optional[str], columns: Optional[Dict[str, str]],
+                       stats: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    schema: Optional[str] = None
+    for _, record in iter_records(path, format_type):
+        stats["source_count"] += 1
+        if isinstance(record, _Malformed):
+            stats["skipped_count"] += 1
+            continue
+        record = _apply_columns(record, columns)
+        if schema is None:
+            schema = detect_schema(record)
+            if schema is None:
+                raise ConversionError("无法识别数据格式，请提供列映射（如 instruction/output）")
+            stats["source_schema"] = schema
+            stats["target_schema"] = target = target or schema
+        if not isinstance(record, dict) or SCHEMA_CHECKS[schema](record):
+            stats["skipped_count"] += 1
+            continue
+        yield _normalize(record, schema, target)
+
+
+# ---------------------------------------------------------------- 转换与登记
+
+def conversion_key(content_hash: str, format_type: str, target: Optional[str],
+                   columns: Optional[Dict[str, str]]) -> str:
+    """源内容哈希 + 源格式 + 转换参数 → 缓存键（同一内容按 .txt 与 .jsonl 读取的结果不同，格式必须参与）"""
+    options = json.dumps({"v": CONVERTER_VERSION, "format": (format_type or "").lower(), "target": target,
+                          "columns": columns or {}}, sort_keys=True)
+    return hashlib.sha256(f"{content_hash}:{options}".encode("utf-8")).hexdigest()
+
+
+def convert_to_jsonl(path: str, format_type: str, dest_path: str, target: Optional[str] = None,
+                     columns: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """流式转换为 JSONL 并原子写入 dest_path，返回统计信息（同步函数，供进程池调用）
+
+    注意：
+    - 解析失败或不符合格式的记录被跳过并计数；一条有效记录都没有时抛出 ConversionError。
+    """
+    stats: Dict[str, Any] = {"source_count": 0, "record_count": 0, "skipped_count": 0,
+                             "source_schema": None, "target_schema": target}
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dest_path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for record in _converted_records(path, format_type, target, columns, stats):
+                out.write(orjson.dumps(record))
+                out.write(b"\n")
+                stats["record_count"] += 1
+        if stats["record_count"] == 0:
+            raise ConversionError("没有可用于训练的有效记录")
+        os.replace(tmp, dest_path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return stats
+
+
+def dataset_info_entry(file_name: str, schema: str) -> Dict[str, Any]:
+    """生成 dataset_info.json 条目（转换后的字段名与 LLaMA-Factory 默认列名一致）"""
+    if schema == "sharegpt":
+        return {"file_name": file_name, "formatting": "sharegpt", "columns": {"messages": "conversations", "system": "system"}}
+    if schema == "text":
+        return {"file_name": file_name, "columns": {"prompt": "text"}}
+    return {"file_name": file_name, "formatting": "alpaca"}
+
+
+def register_dataset(name: str, entry: Dict[str, Any], data_dir: str = LLAMAFACTORY_DATA_DIR) -> None:
+    """把条目写入 data_dir/dataset_info.json（读-改-原子替换，进程内串行）"""
+    info_path = os.path.join(data_dir, DATASET_INFO_FILE)
+    with _info_lock:
+        info: Dict[str, Any] = {}
+        if os.path.exists(info_path):
+            with open(info_path, "r", encoding="utf-8") as f:
+                info = json.load(f)
+        if info.get(name) == entry:
+            return
+        info[name] = entry
+        os.makedirs(data_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=data_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(info, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, info_path)
+
+
+def _meta_path(dest_path: str) -> str:
+    return f"{dest_path}.meta.json"
+
+
+def _read_meta(dest_path: str) -> Optional[Dict[str, Any]]:
+    if not (os.path.exists(dest_path) and os.path.exists(_meta_path(dest_path))):
+        return None
+    with open(_meta_path(dest_path), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_meta(dest_path: str, stats: Dict[str, Any]) -> None:
+    with open(_meta_path(dest_path), "w", encoding="utf-8") as f:
+        json.dump(stats, f)
+
+
+async def convert_and_register(path: str, format_type: str, content_hash: str, target: Optional[str] = None,
+                               columns: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """转换（命中缓存时跳过）并登记，返回训练时需要的 dataset / dataset_dir 与统计信息
+
+    注意：
+    - 转换在进程池中执行；dataset_info.json 的读写留在当前进程，由 _info_lock 串行化。
+    """
+    if target is not None and target not in TARGET_SCHEMAS:
+        raise ConversionError(f"不支持的目标格式: {target}")
+    key = conversion_key(content_hash, format_type, target, columns)
+    file_name = f"{CONVERTED_SUBDIR}/{key}.jsonl"
+    dest_path = os.path.join(LLAMAFACTORY_DATA_DIR, CONVERTED_SUBDIR, f"{key}.jsonl")
+
+    stats = await run_in_threadpool(_read_meta, dest_path)
+    cached = stats is not None
+    if not cached:
+        loop = asyncio.get_running_loop()
+        stats = await loop.run_in_executor(
+            get_process_pool(), convert_to_jsonl, path, format_type, dest_path, target, columns
+        )
+        await run_in_threadpool(_write_meta, dest_path, stats)
+
+    name = f"{REGISTERED_NAME_PREFIX}{key[:16]}"
+    await run_in_threadpool(register_dataset, name, dataset_info_entry(file_name, stats["target_schema"]))
+    return {
+        "dataset": name,
+        "dataset_dir": LLAMAFACTORY_DATA_DIR,
+        "file_name": file_name,
+        "cached": cached,
+        **stats,
+    }
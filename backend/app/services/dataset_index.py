@@ -0,0 +1,235 @@
+"""
+数据集行偏移索引
+为 JSONL / CSV / TXT 数据集建立“第 i 条记录从第几个字节开始”的紧凑索引（array('Q')，每条 8 字节），
+索引文件保存在数据文件旁（<文件>.idx），之后按页预览或随机抽样都只需 mmap 读取目标记录，
+耗时与页大小相关，与文件大小无关。
+"""
+
+import csv
+import io
+import mmap
+import os
+import random
+import tempfile
+from array import array
+from functools import lru_cache
+from itertools import islice
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import orjson
+
+from app.services.dataset_validator import is_json_array, iter_json_array
+
+INDEX_SUFFIX = ".idx"
+# 单次预览/抽样最多返回的记录数
+MAX_PREVIEW_RECORDS = 100
+# 单条记录解析失败时返回的原文长度上限
+RAW_PREVIEW_CHARS = 2000
+
+
+def index_path_for(path: str) -> str:
+    return f"{path}{INDEX_SUFFIX}"
+
+
+def supports_index(path: str, format_type: str) -> bool:
+    """JSON 数组无法按行切分，只能顺序读取"""
+    format_type = (format_type or "").lower()
+    if format_type == "json":
+        return not is_json_array(path)
+    return format_type in ("jsonl", "csv", "txt")
+
+
+def build_line_index(path: str, csv_mode: bool = False) -> array:
+    """顺序扫描一遍文件，返回每条记录的起始偏移，末尾追加文件大小作为哨兵
+
+    注意：
+    - 空白行不计为记录；
+    - csv_mode 下按双引号奇偶判断记录是否结束，引号内的换行不会把一条记录拆开；
+      第一条记录是表头，同样记入索引（读取时跳过）。
+    """
+    offsets = array("Q")
+    pos = 0
+    record_start: Optional[int] = None
+    quotes = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if csv_mode:
+                if record_start is None:
+                    if not line.strip():
+                        pos += len(line)
+                        continue
+                    record_start, quotes = pos, 0
+                quotes += line.count(b'"')
+                if quotes % 2 == 0:
+                    offsets.append(record_start)
+                    record_start = None
+            elif line.strip():
+                offsets.append(pos)
+            pos += len(line)
+    if record_start is not None:
+        # 末尾引号未闭合，按一条（损坏的）记录处理
+        offsets.append(record_start)
+    offsets.append(pos)
+    return offsets
+
+
+def _write_index(path: str, offsets: array) -> None:
+    target = index_path_for(path)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            offsets.tofile(f)
+        os.replace(tmp, target)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _read_index(path: str, size: int) -> Optional[array]:
+    """读取磁盘上的索引；文件缺失、损坏或哨兵与当前文件大小不一致时返回 None"""
+    target = index_path_for(path)
+    try:
+        index_size = os.path.getsize(target)
+    except OSError:
+        return None
+    if index_size == 0 or index_size % 8:
+        return None
+    offsets = array("Q")
+    with open(target, "rb") as f:
+        offsets.fromfile(f, index_size // 8)
+    return offsets if offsets[-1] == size else None
+
+
+@lru_cache(maxsize=16)
+def _load_index(path: str, size: int, mtime_ns: int, csv_mode: bool) -> array:
+    # size/mtime_ns 参与缓存键，文件被替换后自动失效
+    offsets = _read_index(path, size)
+    if offsets is None:
+        offsets = build_line_index(path, csv_mode)
+        try:
+            _write_index(path, offsets)
+        except OSError:
+            pass  # 目录不可写时只在内存中使用
+    return offsets
+
+
+def get_line_index(path: str, format_type: str) -> array:
+    """获取（必要时构建并保存）行偏移索引（同步函数，首次构建需扫描全文件，应在线程池中调用）"""
+    stat = os.stat(path)
+    return _load_index(path, stat.st_size, stat.st_mtime_ns, (format_type or "").lower() == "csv")
+
+
+def remove_index(path: Optional[str]) -> None:
+    """删除数据文件对应的索引文件（数据文件被删除时调用）"""
+    if not path:
+        return
+    try:
+        os.remove(index_path_for(path))
+    except OSError:
+        pass
+
+
+class _IndexedReader:
+    """基于索引与 mmap 的随机读取"""
+
+    def __init__(self, path: str, format_type: str):
+        self.format_type = (format_type or "").lower()
+        self.offsets = get_line_index(path, format_type)
+        self.header: Optional[List[str]] = None
+        self._skip = 1 if self.format_type == "csv" else 0
+        self._fp = open(path, "rb")
+        self._mm = mmap.mmap(self._fp.fileno(), 0, access=mmap.ACCESS_READ) if self.offsets[-1] else None
+        if self._skip and self.record_count_raw > 0:
+            self.header = self._csv_row(self._slice(0))
+
+    @property
+    def record_count_raw(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def total(self) -> int:
+        return max(self.record_count_raw - self._skip, 0)
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+        self._fp.close()
+
+    def __enter__(self) -> "_IndexedReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _slice(self, raw_index: int) -> str:
+        data = self._mm[self.offsets[raw_index]:self.offsets[raw_index + 1]]
+        return data.decode("utf-8-sig", errors="replace").rstrip("\r\n")
+
+    @staticmethod
+    def _csv_row(text: str) -> List[str]:
+        return next(csv.reader(io.StringIO(text)), [])
+
+    def record(self, index: int) -> Dict[str, Any]:
+        text = self._slice(index + self._skip)
+        if self.format_type == "csv":
+            row = self._csv_row(text)
+            if self.header and len(row) > len(self.header):
+                return {"index": index, "error": "列数多于表头", "raw": text[:RAW_PREVIEW_CHARS]}
+            return {"index": index, "record": dict(zip(self.header or [], row))}
+        if self.format_type == "txt":
+            return {"index": index, "record": {"text": text}}
+        try:
+            return {"index": index, "record": orjson.loads(text)}
+        except orjson.JSONDecodeError as e:
+            return {"index": index, "error": f"JSON 解析失败: {e}", "raw": text[:RAW_PREVIEW_CHARS]}
+
+
+def _stream_entries(path: str) -> Iterable[Tuple[int, Dict[str, Any]]]:
+    for index, value in iter_json_array(path):
+        if isinstance(value, Exception):
+            yield index, {"index": index, "error": str(value)}
+            return
+        yield index, {"index": index, "record": value}
+
+
+def preview_records(path: str, format_type: str, offset: int, limit: int) -> Dict[str, Any]:
+    """读取第 offset 条起的 limit 条记录，返回 {"total", "records"}
+
+    注意：
+    - JSON 数组只能顺序解析到 offset 处，total 为 None（条数见校验报告）。
+    """
+    limit = max(1, min(limit, MAX_PREVIEW_RECORDS))
+    offset = max(offset, 0)
+    if not supports_index(path, format_type):
+        entries = [entry for _, entry in islice(_stream_entries(path), offset, offset + limit)]
+        return {"total": None, "records": entries}
+    with _IndexedReader(path, format_type) as reader:
+        end = min(offset + limit, reader.total)
+        return {"total": reader.total, "records": [reader.record(i) for i in range(offset, end)]}
+
+
+def sample_records(path: str, format_type: str, n: int, seed: Optional[int] = None) -> Dict[str, Any]:
+    """均匀随机抽取 n 条记录（按序号升序返回），返回 {"total", "records"}
+
+    注意：
+    - 有索引时只读取被抽中的记录；JSON 数组退化为一次顺序扫描的蓄水池抽样。
+    """
+    n = max(1, min(n, MAX_PREVIEW_RECORDS))
+    rng = random.Random(seed)
+    if not supports_index(path, format_type):
+        reservoir: List[Dict[str, Any]] = []
+        seen = 0
+        for index, entry in _stream_entries(path):
+            seen += 1
+            if len(reservoir) < n:
+                reservoir.append(entry)
+            else:
+                slot = rng.randrange(seen)
+                if slot < n:
+                    reservoir[slot] = entry
+        reservoir.sort(key=lambda entry: entry["index"])
+        return {"total": seen, "records": reservoir}
+    with _IndexedReader(path, format_type) as reader:
+        picked = sorted(rng.sample(range(reader.total), min(n, reader.total)))
+        return {"total": reader.total, "records": [reader.record(i) for i in picked]}
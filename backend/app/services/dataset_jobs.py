@@ -0,0 +1,187 @@
+"""
+数据集后台任务
+统一管理预处理、切分等耗时操作：任务记录（DatasetJob）的状态流转、进度节流写库、
+工作目录清理，以及服务重启后对中断任务的收尾。具体处理逻辑按 job_type 注册，
+并共用这里的“规范化 → 按行分片 → 进程池并行 → 拼接”工具函数。
+"""
+
+import asyncio
+import logging
+import os
+import shutil
+import time
+from array import array
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models.training import Dataset, DatasetJob
+from app.services.dataset_converter import convert_to_jsonl
+from app.services.dataset_index import build_line_index
+from app.services.dataset_store import DATASET_TMP_DIR
+from app.services.dataset_validator import VALIDATOR_WORKERS, get_process_pool
+from app.services.upload_service import UPLOAD_CHUNK_SIZE, UploadResult, _DigestWriter
+
+logger = logging.getLogger(__name__)
+
+# 每个工作进程分到的分片数；每个分片至少包含的记录数，避免小文件被切得过碎
+SHARDS_PER_WORKER = 4
+MIN_SHARD_RECORDS = 1000
+# 进度至少变化该比例或间隔该秒数才写库
+PROGRESS_MIN_DELTA = 0.01
+PROGRESS_MIN_INTERVAL = 2.0
+
+
+class JobProgress:
+    """把处理进度节流写回 DatasetJob 记录"""
+
+    def __init__(self, db: Session, job: DatasetJob):
+        self.db = db
+        self.job = job
+        self._last_value = job.progress or 0.0
+        self._last_time = 0.0
+
+    def update(self, value: float, stage: Optional[str] = None) -> None:
+        value = min(max(value, 0.0), 1.0)
+        now = time.monotonic()
+        stage_changed = stage is not None and stage != self.job.stage
+        if not stage_changed and value - self._last_value < PROGRESS_MIN_DELTA and now - self._last_time < PROGRESS_MIN_INTERVAL:
+            return
+        self.job.progress = value
+        if stage is not None:
+            self.job.stage = stage
+        self.db.commit()
+        self._last_value, self._last_time = value, now
+
+    def span(self, start: float, end: float, stage: Optional[str] = None) -> Callable[[float], None]:
+        """返回把 0~1 的子进度映射到 [start, end] 区间的回调"""
+        if stage is not None:
+            self.update(start, stage)
+        return lambda fraction: self.update(start + (end - start) * fraction)
+
+
+# handler(db, job, dataset, progress, work_dir) -> 结果字典
+JobHandler = Callable[[Session, DatasetJob, Dataset, JobProgress, str], Awaitable[Dict[str, Any]]]
+JOB_HANDLERS: Dict[str, JobHandler] = {}
+
+
+def register_job_handler(job_type: str) -> Callable[[JobHandler], JobHandler]:
+    def decorator(handler: JobHandler) -> JobHandler:
+        JOB_HANDLERS[job_type] = handler
+        return handler
+    return decorator
+
+
+# ---------------------------------------------------------------- 分片并行处理
+
+def iter_shard(path: str, start: int, end: int) -> Iterator[bytes]:
+    """逐行读取 [start, end) 字节区间（区间边界需位于行首）"""
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start
+        for line in f:
+            if remaining <= 0:
+                break
+            remaining -= len(line)
+            yield line
+
+
+def plan_shards(offsets: array, workers: int = VALIDATOR_WORKERS) -> List[Tuple[int, int, int]]:
+    """按记录数把文件切成分片，返回 [(首条记录序号, 起始字节, 结束字节)]"""
+    total = len(offsets) - 1
+    shard_count = max(1, min(workers * SHARDS_PER_WORKER, total // MIN_SHARD_RECORDS))
+    bounds = [round(total * k / shard_count) for k in range(shard_count + 1)]
+    return [(bounds[k], offsets[bounds[k]], offsets[bounds[k + 1]]) for k in range(shard_count) if bounds[k + 1] > bounds[k]]
+
+
+async def map_shards(func, shard_args: List[tuple], on_progress) -> List[Any]:
+    """把每个分片提交到进程池，按完成顺序汇报进度，按分片顺序返回结果"""
+    loop = asyncio.get_running_loop()
+    pool = get_process_pool()
+    futures = [loop.run_in_executor(pool, func, *args) for args in shard_args]
+    done = 0
+    for future in asyncio.as_completed(futures):
+        await future
+        done += 1
+        on_progress(done / len(futures))
+    return [future.result() for future in futures]
+
+
+def concat_parts(part_files: List[str], dest_path: str) -> UploadResult:
+    """按顺序拼接分片输出文件，同时计算大小/哈希/行数（同步函数，需在线程池中调用）"""
+    with open(dest_path, "wb") as out:
+        writer = _DigestWriter(out, None)
+        for part in part_files:
+            with open(part, "rb") as src:
+                while True:
+                    chunk = src.read(UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    writer.write(chunk)
+    return UploadResult(dest_path, writer.size, writer.hasher.hexdigest(), writer.total_lines())
+
+
+async def normalize_for_job(dataset: Dataset, work_dir: str, on_progress) -> Tuple[str, str, array]:
+    """把数据集规范化为 JSONL 并建立行偏移，返回 (路径, 格式, 偏移)"""
+    normalized = os.path.join(work_dir, "normalized.jsonl")
+    loop = asyncio.get_running_loop()
+    stats = await loop.run_in_executor(
+        get_process_pool(), convert_to_jsonl, dataset.file_path, dataset.format_type or "", normalized
+    )
+    on_progress(0.5)
+    offsets = await run_in_threadpool(build_line_index, normalized)
+    on_progress(1.0)
+    return normalized, stats["target_schema"], offsets
+
+
+def job_work_dir(job_id: int) -> str:
+    return os.path.join(DATASET_TMP_DIR, f"job_{job_id}")
+
+
+async def run_dataset_job(job_id: int) -> None:
+    """执行任务并把状态、进度与结果写回记录（作为后台任务运行，使用独立会话）"""
+    db = SessionLocal()
+    work_dir = job_work_dir(job_id)
+    try:
+        job = db.query(DatasetJob).filter(DatasetJob.id == job_id).first()
+        if job is None or job.status != "pending":
+            return
+        handler = JOB_HANDLERS.get(job.job_type)
+        job.status = "running"
+        job.started_at = datetime.now(timezone.utc)
+        db.commit()
+        try:
+            if handler is None:
+                raise ValueError(f"未知的任务类型: {job.job_type}")
+            if job.dataset is None or not os.path.exists(job.dataset.file_path):
+                raise FileNotFoundError("数据集文件不存在")
+            os.makedirs(work_dir, exist_ok=True)
+            job.result = await handler(db, job, job.dataset, JobProgress(db, job), work_dir)
+            job.status = "completed"
+            job.progress = 1.0
+            job.stage = None
+        except Exception as e:
+            db.rollback()
+            logger.exception(f"数据集任务 {job_id}（{job.job_type}）失败")
+            job.status = "failed"
+            job.error = str(e) or type(e).__name__
+        job.completed_at = datetime.now(timezone.utc)
+        db.commit()
+    finally:
+        db.close()
+        await run_in_threadpool(shutil.rmtree, work_dir, True)
+
+
+def fail_interrupted_jobs(db: Session) -> int:
+    """服务启动时把上次未结束的任务标记为失败（其工作进程已随旧服务退出）"""
+    jobs = db.query(DatasetJob).filter(DatasetJob.status.in_(("pending", "running"))).all()
+    for job in jobs:
+        job.status = "failed"
+        job.error = "服务重启，任务中断"
+        job.completed_at = datetime.now(timezone.utc)
+        shutil.rmtree(job_work_dir(job.id), ignore_errors=True)
+    db.commit()
+    return len(jobs)
@@ -0,0 +1,222 @@
+"""
+数据集预处理
+对数据集做精确去重、MinHash 近似去重、按 token 长度过滤，并按长度分桶重排，生成派生数据集；
+设置了分桶边界时，每个非空长度桶另外生成一个分桶子数据集（派生数据集的子数据集），可单独用于训练。
+流程：规范化为 JSONL → 按行偏移把文件切成若干分片，在进程池中并行计算长度/指纹/MinHash
+→ 汇总去重（LSH 分带）→ 各分片并行写出保留的记录 → 按“桶优先、分片次之”的顺序拼接，并逐桶拼接分桶文件。
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+from array import array
+from typing import Any, Dict, List, Sequence, Tuple
+
+import orjson
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from app.models.training import Dataset, DatasetJob
+from app.services.dataset_jobs import (
+    JobProgress, concat_parts, iter_shard, map_shards, normalize_for_job, plan_shards, register_job_handler
+)
+from app.services.dataset_store import create_derived_dataset
+from app.services.dataset_validator import (
+    estimate_tokens, get_process_pool, record_fingerprint, record_text, validate_dataset_record
+)
+
+# MinHash 置换数与字符 n-gram 长度
+MINHASH_PERMUTATIONS = 64
+SHINGLE_SIZE = 5
+
+# 固定的置换掩码：由常量种子派生，保证不同进程、不同次运行结果一致
+_PERMUTATION_MASKS = [
+    int.from_bytes(hashlib.blake2b(f"minhash-{i}".encode(), digest_size=8).digest(), "big")
+    for i in range(MINHASH_PERMUTATIONS)
+]
+_WS_RE = re.compile(r"\s+")
+
+
+# ---------------------------------------------------------------- MinHash
+
+def lsh_bands(threshold: float, permutations: int = MINHASH_PERMUTATIONS) -> Tuple[int, int]:
+    """选择 (bands, rows)，使 LSH 的近似相似度阈值 (1/b)^(1/r) 最接近 threshold"""
+    candidates = [(b, permutations // b) for b in range(1, permutations + 1) if permutations % b == 0]
+    return min(candidates, key=lambda br: abs((1 / br[0]) ** (1 / br[1]) - threshold))
+
+
+def minhash_signature(text: str) -> List[int]:
+    """字符 n-gram 的 MinHash 签名（对中英文都适用）"""
+    text = _WS_RE.sub(" ", text.lower()).strip()
+    if len(text) <= SHINGLE_SIZE:
+        shingles = {text}
+    else:
+        shingles = {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big") for s in shingles]
+    # 以异或随机掩码近似独立置换，min(map(...)) 在 C 层完成循环
+    return [min(map(mask.__xor__, hashes)) for mask in _PERMUTATION_MASKS]
+
+
+def band_keys(signature: Sequence[int], bands: int, rows: int) -> List[int]:
+    """把签名分带，每带压缩为 64 位键；任一带相同即视为候选近似重复"""
+    keys = []
+    for band in range(bands):
+        chunk = signature[band * rows:(band + 1) * rows]
+        raw = b"".join(value.to_bytes(8, "big") for value in chunk) + band.to_bytes(2, "big")
+        keys.append(int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), "big"))
+    return keys
+
+
+# ---------------------------------------------------------------- 进程池任务
+
+def _scan_shard(path: str, start: int, end: int, schema: str, near_dup: bool, bands: int, rows: int):
+    """统计分片内每条记录的 token 数、精确指纹与 LSH 分带键"""
+    tokens, fingerprints, keys = array("I"), array("Q"), array("Q")
+    for line in iter_shard(path, start, end):
+        record = orjson.loads(line)
+        tokens.append(min(estimate_tokens(record_text(record, schema)), 0xFFFFFFFF))
+        fingerprints.append(record_fingerprint(record))
+        if near_dup:
+            keys.extend(band_keys(minhash_signature(record_text(record, schema)), bands, rows))
+    return tokens, fingerprints, keys
+
+
+def _select_records(tokens: array, fingerprints: array, keys: array, bands: int, params: Dict[str, Any]):
+    """按顺序决定每条记录的去留与长度桶，返回 (每条记录的桶号+1，0 表示丢弃, 统计)"""
+    min_tokens = params.get("min_tokens") or 0
+    max_tokens = params.get("max_tokens")
+    boundaries = sorted(params.get("bucket_boundaries") or [])
+    decisions = bytearray(len(tokens))
+    seen_exact: set = set()
+    seen_bands: List[set] = [set() for _ in range(bands)] if keys else []
+    stats = {"filtered_length": 0, "exact_duplicates": 0, "near_duplicates": 0}
+    bucket_counts = [0] * (len(boundaries) + 1)
+
+    for i, length in enumerate(tokens):
+        if length < min_tokens or (max_tokens is not None and length > max_tokens):
+            stats["filtered_length"] += 1
+            continue
+        if params.get("dedup_exact", True):
+            if fingerprints[i] in seen_exact:
+                stats["exact_duplicates"] += 1
+                continue
+            seen_exact.add(fingerprints[i])
+        if seen_bands:
+            record_keys = keys[i * bands:(i + 1) * bands]
+            if any(key in seen for key, seen in zip(record_keys, seen_bands)):
+                stats["near_duplicates"] += 1
+                continue
+            for key, seen in zip(record_keys, seen_bands):
+                seen.add(key)
+        bucket = next((b for b, bound in enumerate(boundaries) if length < bound), len(boundaries))
+        bucket_counts[bucket] += 1
+        decisions[i] = bucket + 1
+    stats["buckets"] = [
+        {"lt": boundaries[b] if b < len(boundaries) else None, "count": count}
+        for b, count in enumerate(bucket_counts)
+    ]
+    return decisions, stats
+
+
+def _write_shard(path: str, start: int, end: int, decisions: bytes, part_prefix: str, bucket_count: int) -> List[int]:
+    """把分片中保留的记录按桶写入 part_prefix.<桶号> 文件，返回各桶写出条数"""
+    outputs = [open(f"{part_prefix}.{b}", "wb") for b in range(bucket_count)]
+    counts = [0] * bucket_count
+    try:
+        for decision, line in zip(decisions, iter_shard(path, start, end)):
+            if decision:
+                outputs[decision - 1].write(line if line.endswith(b"\n") else line + b"\n")
+                counts[decision - 1] += 1
+    finally:
+        for out in outputs:
+            out.close()
+    return counts
+
+
+@register_job_handler("preprocess")
+async def preprocess_dataset(db: Session, job: DatasetJob, dataset: Dataset, progress: JobProgress, work_dir: str) -> Dict[str, Any]:
+    """预处理任务：去重 + 长度过滤 + 长度分桶，结果保存为派生数据集"""
+    params = job.params or {}
+    normalized, schema, offsets = await normalize_for_job(dataset, work_dir, progress.span(0.0, 0.15, "normalize"))
+    shards = plan_shards(offsets)
+    near_dup = params.get("dedup_near", True)
+    bands, rows = lsh_bands(params.get("near_dup_threshold", 0.8))
+
+    scans = await map_shards(
+        _scan_shard,
+        [(normalized, start, end, schema, near_dup, bands, rows) for _, start, end in shards],
+        progress.span(0.15, 0.65, "scan"),
+    )
+    tokens, fingerprints, keys = array("I"), array("Q"), array("Q")
+    for shard_tokens, shard_fingerprints, shard_keys in scans:
+        tokens.extend(shard_tokens)
+        fingerprints.extend(shard_fingerprints)
+        keys.extend(shard_keys)
+    del scans
+
+    progress.update(0.65, "dedup")
+    loop = asyncio.get_running_loop()
+    decisions, stats = await loop.run_in_executor(
+        get_process_pool(), _select_records, tokens, fingerprints, keys if near_dup else array("Q"), bands, params
+    )
+    bucket_count = len(stats["buckets"])
+
+    firsts = [first for first, _, _ in shards] + [len(tokens)]
+    part_counts = await map_shards(
+        _write_shard,
+        [
+            (normalized, start, end, bytes(decisions[firsts[k]:firsts[k + 1]]), os.path.join(work_dir, f"part{k:05d}"), bucket_count)
+            for k, (_, start, end) in enumerate(shards)
+        ],
+        progress.span(0.75, 0.9, "write"),
+    )
+    kept = sum(sum(counts) for counts in part_counts)
+    if kept == 0:
+        raise ValueError("预处理后没有剩余记录，请放宽过滤条件")
+
+    bucket_parts = [[os.path.join(work_dir, f"part{k:05d}.{b}") for k in range(len(shards))] for b in range(bucket_count)]
+    output = os.path.join(work_dir, "output.jsonl")
+    result = await run_in_threadpool(concat_parts, [part for parts in bucket_parts for part in parts], output)
+
+    stats.update({"schema": schema, "input_count": len(tokens), "output_count": kept,
+                  "lsh_bands": bands, "lsh_rows": rows})
+    # 各桶在输出文件中的记录区间
+    start = 0
+    for bucket in stats["buckets"]:
+        bucket["start"] = start
+        start += bucket["count"]
+
+    # 只有一个桶时分桶文件与输出文件相同，不再重复生成
+    bucket_results = []
+    if bucket_count > 1:
+        for b, bucket in enumerate(stats["buckets"]):
+            if bucket["count"]:
+                bucket_results.append((b, await run_in_threadpool(
+                    concat_parts, bucket_parts[b], os.path.join(work_dir, f"bucket-{b:02d}.jsonl")
+                )))
+            progress.update(0.9 + 0.07 * (b + 1) / bucket_count)
+
+    # 全部文件生成后再在同一事务中登记，避免中途失败残留部分子数据集（同 dataset_split）
+    progress.update(0.97, "register")
+    name = params.get("name") or f"{dataset.name}-preprocessed"
+    derivation = {"job_type": "preprocess", "job_id": job.id, "params": params}
+    derived = create_derived_dataset(
+        db, dataset, output, result,
+        name=name,
+        description=params.get("description"),
+        derivation={**derivation, "stats": stats},
+        owner_id=job.created_by,
+    )
+    bucket_datasets: List[Dataset] = []
+    for b, bucket_result in bucket_results:
+        bucket = stats["buckets"][b]
+        bucket_datasets.append(create_derived_dataset(
+            db, derived, bucket_result.path, bucket_result, f"{name}-bucket-{b:02d}-of-{bucket_count:02d}", None,
+            {**derivation, "role": "bucket", "bucket_index": b, "num_buckets": bucket_count,
+             "tokens_ge": stats["buckets"][b - 1]["lt"] if b else None, "tokens_lt": bucket["lt"], "record_count": bucket["count"]},
+            job.created_by,
+        ))
+    db.commit()
+    await validate_dataset_record(derived.id)
+    return {"dataset_id": derived.id, "bucket_dataset_ids": [d.id for d in bucket_datasets], **stats}
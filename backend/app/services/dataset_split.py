@@ -0,0 +1,129 @@
+"""
+数据集切分
+按“种子 + 记录内容”的哈希把数据集确定性地划分为训练集/验证集，并把训练集再按哈希分成 N 个分片，
+一次流式遍历完成（分片在进程池中并行）。相同种子、相同内容总是得到相同的划分，
+内容完全相同的记录必然落在同一侧，不会造成训练/验证泄漏。
+"""
+
+import hashlib
+import os
+from typing import Any, Dict, List, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from app.models.training import Dataset, DatasetJob
+from app.services.dataset_jobs import (
+    JobProgress, concat_parts, iter_shard, map_shards, normalize_for_job, plan_shards, register_job_handler
+)
+from app.services.dataset_store import create_derived_dataset
+from app.services.dataset_validator import validate_dataset_record
+
+_SPLIT_SPACE = 1 << 64
+
+
+def assign_record(line: bytes, seed: int, eval_ratio: float, num_shards: int) -> Tuple[bool, int]:
+    """返回 (是否进入验证集, 训练分片号)；前 8 字节决定划分，后 8 字节决定分片，两者互不相关"""
+    digest = hashlib.blake2b(line.rstrip(b"\r\n"), digest_size=16, key=seed.to_bytes(8, "big", signed=True)).digest()
+    is_eval = int.from_bytes(digest[:8], "big") < eval_ratio * _SPLIT_SPACE
+    return is_eval, int.from_bytes(digest[8:], "big") % num_shards
+
+
+def _split_shard(path: str, start: int, end: int, seed: int, eval_ratio: float, num_shards: int, part_prefix: str) -> Tuple[int, List[int]]:
+    """把分片中的记录写入 part_prefix.eval 与 part_prefix.train.<k>，返回 (验证集条数, 各训练分片条数)"""
+    eval_out = open(f"{part_prefix}.eval", "wb")
+    train_outs = [open(f"{part_prefix}.train.{k}", "wb") for k in range(num_shards)]
+    eval_count, train_counts = 0, [0] * num_shards
+    try:
+        for line in iter_shard(path, start, end):
+            is_eval, shard = assign_record(line, seed, eval_ratio, num_shards)
+            if is_eval:
+                eval_out.write(line)
+                eval_count += 1
+            else:
+                train_outs[shard].write(line)
+                train_counts[shard] += 1
+    finally:
+        eval_out.close()
+        for out in train_outs:
+            out.close()
+    return eval_count, train_counts
+
+
+@register_job_handler("split")
+async def split_dataset(db: Session, job: DatasetJob, dataset: Dataset, progress: JobProgress, work_dir: str) -> Dict[str, Any]:
+    """切分任务：生成 train / eval 子数据集，num_shards > 1 时再为训练集生成分片子数据集"""
+    params = job.params or {}
+    seed = params.get("seed", 42)
+    eval_ratio = params.get("eval_ratio", 0.1)
+    num_shards = params.get("num_shards", 1)
+    base_name = params.get("name") or dataset.name
+
+    normalized, schema, offsets = await normalize_for_job(dataset, work_dir, progress.span(0.0, 0.2, "normalize"))
+    shards = plan_shards(offsets)
+    prefixes = [os.path.join(work_dir, f"part{k:05d}") for k in range(len(shards))]
+    counts = await map_shards(
+        _split_shard,
+        [(normalized, start, end, seed, eval_ratio, num_shards, prefixes[k]) for k, (_, start, end) in enumerate(shards)],
+        progress.span(0.2, 0.8, "split"),
+    )
+    eval_count = sum(shard_eval for shard_eval, _ in counts)
+    shard_counts = [sum(shard_train[k] for _, shard_train in counts) for k in range(num_shards)]
+    train_count = sum(shard_counts)
+    if train_count == 0:
+        raise ValueError("训练集为空，请调小 eval_ratio")
+
+    # 先生成全部输出文件，再在同一事务中登记所有派生数据集：progress.update 会提交任务会话，
+    # 不能穿插在登记之间，否则中途失败时已登记的子数据集（及其文件引用计数）会残留
+    progress.update(0.8, "write")
+    train_parts = [f"{prefix}.train.{k}" for k in range(num_shards) for prefix in prefixes]
+    train_result = await run_in_threadpool(concat_parts, train_parts, os.path.join(work_dir, "train.jsonl"))
+    eval_result = None
+    if eval_count:
+        eval_result = await run_in_threadpool(concat_parts, [f"{prefix}.eval" for prefix in prefixes], os.path.join(work_dir, "eval.jsonl"))
+    shard_results = []
+    if num_shards > 1:
+        for k in range(num_shards):
+            if not shard_counts[k]:
+                continue
+            shard_results.append((k, await run_in_threadpool(
+                concat_parts, [f"{prefix}.train.{k}" for prefix in prefixes], os.path.join(work_dir, f"train-{k:05d}.jsonl")
+            )))
+            progress.update(0.85 + 0.1 * (k + 1) / num_shards)
+    progress.update(0.95, "register")
+
+    derivation = {"job_type": "split", "job_id": job.id, "params": params, "schema": schema}
+    train = create_derived_dataset(
+        db, dataset, train_result.path, train_result, f"{base_name}-train", params.get("description"),
+        {**derivation, "role": "train", "record_count": train_count}, job.created_by,
+    )
+    eval_dataset = None
+    if eval_result is not None:
+        eval_dataset = create_derived_dataset(
+            db, dataset, eval_result.path, eval_result, f"{base_name}-eval", params.get("description"),
+            {**derivation, "role": "eval", "record_count": eval_count}, job.created_by,
+        )
+    shard_datasets: List[Dataset] = [
+        create_derived_dataset(
+            db, train, shard_result.path, shard_result, f"{base_name}-train-{k:05d}-of-{num_shards:05d}", None,
+            {**derivation, "role": "shard", "shard_index": k, "num_shards": num_shards, "record_count": shard_counts[k]},
+            job.created_by,
+        )
+        for k, shard_result in shard_results
+    ]
+    db.commit()
+
+    await validate_dataset_record(train.id)
+    if eval_dataset is not None:
+        await validate_dataset_record(eval_dataset.id)
+    return {
+        "dataset_id": train.id,
+        "train_dataset_id": train.id,
+        "eval_dataset_id": eval_dataset.id if eval_dataset else None,
+        "shard_dataset_ids": [shard.id for shard in shard_datasets],
+        "train_count": train_count,
+        "eval_count": eval_count,
+        "shard_counts": shard_counts,
+        "seed": seed,
+        "eval_ratio": eval_ratio,
+    }
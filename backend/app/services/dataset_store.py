@@ -0,0 +1,176 @@
+"""
+数据集内容寻址存储
+上传文件按 SHA-256 存放在 uploads/datasets/blobs/<前两位>/<哈希><扩展名>，
+相同内容只保存一份；DatasetBlob.ref_count 记录引用数，归零时删除文件。
+新文件在提交前就已移入 blob 目录，事务未提交就结束（回滚或关闭会话）时由会话事件删除，不留下无记录的文件。
+"""
+
+import logging
+import os
+from typing import Optional
+
+from sqlalchemy import event, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.training import Dataset, DatasetBlob
+from app.services.upload_service import UploadResult
+
+logger = logging.getLogger(__name__)
+
+DATASET_BLOB_DIR = os.path.join("uploads", "datasets", "blobs")
+# 上传过程中的临时文件目录（与 blob 目录同盘，保证 os.replace 是原子重命名）
+DATASET_TMP_DIR = os.path.join("uploads", "datasets", ".tmp")
+# Session.info 中记录本事务新移入 blob 目录的文件
+_NEW_BLOB_FILES = "dataset_store.new_blob_files"
+
+
+def blob_path_for(sha256: str, extension: str) -> str:
+    """内容哈希对应的存储路径（按前两位分目录，避免单目录文件过多）"""
+    return os.path.join(DATASET_BLOB_DIR, sha256[:2], f"{sha256}{extension}")
+
+
+def find_blob(db: Session, sha256: str) -> Optional[DatasetBlob]:
+    """查找文件仍然存在的 blob；记录存在但文件丢失时视为不存在"""
+    blob = db.query(DatasetBlob).filter(DatasetBlob.sha256 == sha256.lower()).first()
+    if blob and os.path.exists(blob.file_path):
+        return blob
+    return None
+
+
+def _track_new_file(db: Session, path: str) -> None:
+    db.info.setdefault(_NEW_BLOB_FILES, []).append(path)
+
+
+@event.listens_for(Session, "after_commit")
+def _keep_new_files(session: Session) -> None:
+    session.info.pop(_NEW_BLOB_FILES, None)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _remove_uncommitted_files(session: Session, transaction) -> None:
+    # 只在最外层事务结束时处理：提交后列表已被清空，剩下的都是未提交记录的文件
+    if transaction.parent is not None:
+        return
+    for path in session.info.pop(_NEW_BLOB_FILES, ()):
+        remove_file_quietly(path)
+
+
+def _increment(db: Session, sha256: str) -> None:
+    db.execute(
+        update(DatasetBlob)
+        .where(DatasetBlob.sha256 == sha256)
+        .values(ref_count=DatasetBlob.ref_count + 1)
+    )
+
+
+def acquire_blob(db: Session, tmp_path: str, result: UploadResult, extension: str) -> DatasetBlob:
+    """把刚上传的临时文件纳入内容寻址存储，并为其增加一次引用
+
+    注意：
+    - 内容已存在时删除临时文件，只增加引用计数；
+    - 并发上传同一内容时，以数据库主键冲突兜底，失败方回滚后改为增加引用；
+    - 只 flush 不 commit，由调用方与 Dataset 记录一起提交；未提交就回滚时删除本次移入的文件。
+    """
+    existing = find_blob(db, result.sha256)
+    if existing is not None:
+        os.remove(tmp_path)
+        _increment(db, existing.sha256)
+        db.refresh(existing)
+        return existing
+
+    stale = db.query(DatasetBlob).filter(DatasetBlob.sha256 == result.sha256).first()
+    blob_path = stale.file_path if stale else blob_path_for(result.sha256, extension)
+    os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+    os.replace(tmp_path, blob_path)
+    if stale is not None:
+        # 记录还在但文件丢失：用本次上传的内容修复
+        _track_new_file(db, blob_path)
+        _increment(db, stale.sha256)
+        db.refresh(stale)
+        return stale
+
+    blob = DatasetBlob(
+        sha256=result.sha256,
+        file_path=blob_path,
+        file_size=result.size,
+        line_count=result.line_count,
+        ref_count=1,
+    )
+    try:
+        with db.begin_nested():
+            db.add(blob)
+        _track_new_file(db, blob_path)
+    except IntegrityError:
+        # 另一个请求刚刚写入了同一内容，文件内容相同，直接增加引用即可（文件归对方记录，回滚时不删除）
+        _increment(db, result.sha256)
+        blob = db.query(DatasetBlob).filter(DatasetBlob.sha256 == result.sha256).one()
+    return blob
+
+
+def create_derived_dataset(db: Session, parent: Dataset, tmp_path: str, result: UploadResult, name: str,
+                           description: Optional[str], derivation: dict, owner_id: Optional[int]) -> Dataset:
+    """把处理结果（JSONL 临时文件）纳入存储并创建指向 parent 的派生数据集（调用方提交）"""
+    blob = acquire_blob(db, tmp_path, result, ".jsonl")
+    dataset = Dataset(
+        name=name,
+        description=description,
+        file_path=blob.file_path,
+        file_size=result.size,
+        format_type="jsonl",
+        content_hash=result.sha256,
+        line_count=result.line_count,
+        validation_status="pending",
+        parent_id=parent.id,
+        derivation=derivation,
+        uploaded_by=owner_id,
+    )
+    db.add(dataset)
+    db.flush()
+    return dataset
+
+
+def reference_blob(db: Session, sha256: str) -> Optional[DatasetBlob]:
+    """秒传：内容已存在时增加一次引用并返回 blob，否则返回 None"""
+    blob = find_blob(db, sha256)
+    if blob is None:
+        return None
+    _increment(db, blob.sha256)
+    db.refresh(blob)
+    return blob
+
+
+def release_dataset_file(db: Session, dataset: Dataset) -> Optional[str]:
+    """释放数据集对文件的引用，返回引用归零后应删除的文件路径（提交后再删）
+
+    注意：
+    - 旧数据（无 blob）仅在没有其它 Dataset 指向同一路径时才删除文件。
+    """
+    blob = db.query(DatasetBlob).filter(DatasetBlob.sha256 == dataset.content_hash).first() if dataset.content_hash else None
+    if blob is None:
+        shared = db.query(Dataset).filter(Dataset.file_path == dataset.file_path, Dataset.id != dataset.id).count()
+        return None if shared else dataset.file_path
+
+    db.execute(
+        update(DatasetBlob)
+        .where(DatasetBlob.sha256 == blob.sha256)
+        .values(ref_count=DatasetBlob.ref_count - 1)
+    )
+    db.refresh(blob)
+    if blob.ref_count <= 0:
+        path = blob.file_path
+        db.delete(blob)
+        return path
+    return None
+
+
+def remove_file_quietly(path: Optional[str]) -> None:
+    """删除文件，不存在或删除失败只记日志"""
+    if not path:
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"删除数据集文件失败 {path}: {e}")
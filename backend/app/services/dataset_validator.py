@@ -0,0 +1,482 @@
+"""
+数据集校验与统计
+流式逐条解析 JSON / JSONL / CSV / TXT 数据集（内存占用与文件大小无关），
+检查 LLaMA-Factory 要求的 alpaca / sharegpt 格式，并统计记录数、token 长度分布与重复率。
+校验在进程池中执行，不占用 API 进程的事件循环与 GIL。
+"""
+
+import asyncio
+import csv
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import orjson
+
+from app.database import SessionLocal
+from app.models.training import Dataset
+
+logger = logging.getLogger(__name__)
+
+# 报告中最多保留的错误条数
+MAX_REPORTED_ERRORS = 20
+# 精确去重最多跟踪的记录数，超过后按哈希抽样估算重复率
+DUP_TRACK_LIMIT = 2_000_000
+# token 长度直方图的桶上界（最后一个桶为无穷大）
+TOKEN_BUCKETS = [32, 64, 128, 256, 512, 1024, 2048, 4096, 8192]
+# 读取 JSON 数组时每次读入的字符数
+JSON_READ_SIZE = 1024 * 1024
+# JSON 数组单个元素的最大字符数：超过仍未解析完成即判为格式错误，缓冲区不会随坏元素增长到整个文件
+JSON_MAX_ELEMENT_CHARS = int(os.getenv("DATASET_JSON_MAX_ELEMENT_CHARS", str(8 * JSON_READ_SIZE)))
+# 校验进程池大小
+VALIDATOR_WORKERS = int(os.getenv("DATASET_VALIDATOR_WORKERS", "2"))
+
+# 粗略 token 估算：每个汉字/假名/谚文一个 token，英文单词一个 token，数字与标点逐个计
+_TOKEN_RE = re.compile(r"[぀-ヿ㐀-鿿가-힯]|[A-Za-z]+|\d|[^\sA-Za-z\d]")
+
+_SHAREGPT_ROLE_KEYS = (("from", "value"), ("role", "content"))
+
+
+def estimate_tokens(text: str) -> int:
+    """估算文本 token 数（不依赖分词器，用于长度分布统计）"""
+    return len(_TOKEN_RE.findall(text))
+
+
+def tokenize(text: str) -> List[str]:
+    """与 estimate_tokens 相同的切分：中日韩按字、英文按词、数字与标点逐个"""
+    return _TOKEN_RE.findall(text)
+
+
+class _Malformed(Exception):
+    """单条记录无法解析"""
+
+
+# ---------------------------------------------------------------- 读取器
+
+def iter_jsonl(path: str) -> Iterator[Tuple[int, Any]]:
+    """逐行解析 JSONL，产出 (行号, 记录或 _Malformed)"""
+    with open(path, "rb") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            if line_no == 1 and line.startswith(b"\xef\xbb\xbf"):
+                line = line[3:]
+            try:
+                yield line_no, orjson.loads(line)
+            except orjson.JSONDecodeError as e:
+                yield line_no, _Malformed(f"JSON 解析失败: {e}")
+
+
+def iter_json_array(path: str) -> Iterator[Tuple[int, Any]]:
+    """增量解析顶层 JSON 数组，逐个产出元素 (序号, 记录)，只在内存中保留当前元素
+
+    顶层不是数组、或数组中途出现语法错误时产出 _Malformed 并结束（JSON 数组无法跳过坏元素继续）。
+    解析失败时只有错误位于缓冲区末尾（元素可能被截断）才读入更多内容重试，且单个元素不超过 JSON_MAX_ELEMENT_CHARS，
+    因此坏元素不会让缓冲区增长到整个文件。
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8-sig") as f:
+        buf, pos, eof = "", 0, False
+
+        def read_more() -> None:
+            # 丢弃已消费部分并追加新内容，缓冲区只保留未解析的尾部
+            nonlocal buf, pos, eof
+            chunk = f.read(JSON_READ_SIZE)
+            eof = not chunk
+            buf = buf[pos:] + chunk
+            pos = 0
+
+        read_more()
+        pos = _skip_ws(buf, pos)
+        while pos >= len(buf) and not eof:
+            read_more()
+            pos = _skip_ws(buf, pos)
+        if pos >= len(buf) or buf[pos] != "[":
+            yield 0, _Malformed("JSON 文件顶层必须是数组")
+            return
+        pos += 1
+        index = 0
+        expect_value = True
+        while True:
+            pos = _skip_ws(buf, pos)
+            if pos >= len(buf):
+                if eof:
+                    yield index, _Malformed("JSON 数组未闭合")
+                    return
+                read_more()
+                continue
+            char = buf[pos]
+            if char == "]":
+                return
+            if char == "," and not expect_value:
+                pos += 1
+                expect_value = True
+                continue
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError as e:
+                if eof or not _maybe_truncated(e, len(buf)):
+                    yield index, _Malformed(f"第 {index} 个元素 JSON 解析失败: {e.msg}")
+                    return
+                if len(buf) - pos > JSON_MAX_ELEMENT_CHARS:
+                    yield index, _Malformed(f"第 {index} 个元素超过 {JSON_MAX_ELEMENT_CHARS} 个字符仍未结束")
+                    return
+                # 元素跨越了缓冲区边界：读入更多内容再试
+                read_more()
+                continue
+            if end + 2 >= len(buf) and not eof:
+                # 在缓冲区末尾附近结束的数字可能被截断（如 123|456、1.|5、1e|+5），读入更多内容后重新解析
+                read_more()
+                continue
+            if not expect_value:
+                yield index, _Malformed(f"第 {index} 个元素前缺少逗号")
+                return
+            yield index, value
+            index += 1
+            pos = end
+            expect_value = False
+
+
+def _maybe_truncated(error: json.JSONDecodeError, size: int) -> bool:
+    """解析错误是否可能由元素被缓冲区截断引起：未闭合的字符串，或错误位于缓冲区末尾（留出 \\uXXXX 转义的长度）"""
+    return error.msg.startswith("Unterminated string") or error.pos >= size - 6
+
+
+def _skip_ws(buf: str, pos: int) -> int:
+    while pos < len(buf) and buf[pos] in " \t\r\n":
+        pos += 1
+    return pos
+
+
+def iter_csv(path: str) -> Iterator[Tuple[int, Any]]:
+    """逐行读取 CSV（首行为表头），产出 (行号, dict)"""
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            if None in row:
+                yield reader.line_num, _Malformed("列数多于表头")
+                continue
+            yield reader.line_num, row
+
+
+def iter_txt(path: str) -> Iterator[Tuple[int, Any]]:
+    """纯文本：每个非空行是一条 {"text": ...} 记录"""
+    with open(path, "r", encoding="utf-8-sig") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.rstrip("\r\n")
+            if line.strip():
+                yield line_no, {"text": line}
+
+
+def is_json_array(path: str) -> bool:
+    """文件（跳过 BOM 与空白后）是否以 [ 开头"""
+    with open(path, "rb") as f:
+        head = f.read(4096).lstrip(b"\xef\xbb\xbf \t\r\n")
+    return head.startswith(b"[")
+
+
+def iter_records(path: str, format_type: str) -> Iterator[Tuple[int, Any]]:
+    """按格式选择读取器；.json 文件若首字符不是 [ 则按 JSONL 读取（与 datasets 库行为一致）"""
+    format_type = (format_type or "").lower()
+    if format_type == "jsonl":
+        return iter_jsonl(path)
+    if format_type == "json":
+        return iter_json_array(path) if is_json_array(path) else iter_jsonl(path)
+    if format_type == "csv":
+        return iter_csv(path)
+    if format_type == "txt":
+        return iter_txt(path)
+    raise ValueError(f"不支持的数据集格式: {format_type}")
+
+
+# ---------------------------------------------------------------- 格式检查
+
+def detect_schema(record: Any) -> Optional[str]:
+    """根据单条记录判断格式：alpaca / sharegpt / text"""
+    if not isinstance(record, dict):
+        return None
+    if "instruction" in record and "output" in record:
+        return "alpaca"
+    if isinstance(record.get("conversations"), list) or isinstance(record.get("messages"), list):
+        return "sharegpt"
+    if "text" in record:
+        return "text"
+    return None
+
+
+def check_alpaca(record: Dict[str, Any]) -> Optional[str]:
+    for key in ("instruction", "output"):
+        if not isinstance(record.get(key), str):
+            return f"字段 {key} 缺失或不是字符串"
+    if not record["instruction"].strip() and not str(record.get("input") or "").strip():
+        return "instruction 与 input 均为空"
+    for key in ("input", "system"):
+        if record.get(key) is not None and not isinstance(record[key], str):
+            return f"字段 {key} 必须是字符串"
+    history = record.get("history")
+    if history is not None:
+        if not isinstance(history, list) or not all(
+            isinstance(turn, list) and len(turn) == 2 and all(isinstance(t, str) for t in turn) for turn in history
+        ):
+            return "history 必须是 [[问, 答], ...] 形式的列表"
+    return None
+
+
+def check_sharegpt(record: Dict[str, Any]) -> Optional[str]:
+    turns = record.get("conversations", record.get("messages"))
+    if not isinstance(turns, list) or not turns:
+        return "conversations 缺失或为空"
+    keys = next((pair for pair in _SHAREGPT_ROLE_KEYS if isinstance(turns[0], dict) and pair[0] in turns[0]), None)
+    if keys is None:
+        return "对话轮次必须包含 from/value 或 role/content"
+    role_key, content_key = keys
+    turns = [t for t in turns if not (isinstance(t, dict) and t.get(role_key) == "system")]
+    if not turns:
+        return "对话只有 system 消息"
+    for i, turn in enumerate(turns):
+        if not isinstance(turn, dict) or not isinstance(turn.get(content_key), str):
+            return f"第 {i} 轮缺少 {content_key} 字符串"
+        role = turn.get(role_key)
+        expect_user = i % 2 == 0
+        if expect_user and role not in ("human", "user", "observation"):
+            return f"第 {i} 轮应为用户消息，实际为 {role}"
+        if not expect_user and role not in ("gpt", "assistant", "function_call"):
+            return f"第 {i} 轮应为模型回复，实际为 {role}"
+    if len(turns) % 2 != 0:
+        return "对话轮次必须成对（以模型回复结尾）"
+    return None
+
+
+def check_text(record: Dict[str, Any]) -> Optional[str]:
+    if not isinstance(record.get("text"), str) or not record["text"].strip():
+        return "text 缺失或为空"
+    return None
+
+
+SCHEMA_CHECKS = {"alpaca": check_alpaca, "sharegpt": check_sharegpt, "text": check_text}
+
+
+def record_text(record: Dict[str, Any], schema: str) -> str:
+    """拼接记录中参与训练的文本，用于长度统计"""
+    if schema == "alpaca":
+        parts = [record.get("system") or "", record.get("instruction") or "", record.get("input") or "", record.get("output") or ""]
+        for turn in record.get("history") or []:
+            parts.extend(turn)
+        return "\n".join(parts)
+    if schema == "sharegpt":
+        turns = record.get("conversations", record.get("messages")) or []
+        return "\n".join(str(t.get("value", t.get("content", ""))) for t in turns if isinstance(t, dict))
+    return str(record.get("text", ""))
+
+
+# ---------------------------------------------------------------- 统计与入口
+
+class _TokenStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.min: Optional[int] = None
+        self.max = 0
+        self.buckets = [0] * (len(TOKEN_BUCKETS) + 1)
+
+    def add(self, tokens: int) -> None:
+        self.count += 1
+        self.total += tokens
+        self.min = tokens if self.min is None else min(self.min, tokens)
+        self.max = max(self.max, tokens)
+        for i, upper in enumerate(TOKEN_BUCKETS):
+            if tokens < upper:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "min": self.min or 0,
+            "max": self.max,
+            "mean": round(self.total / self.count, 2) if self.count else 0,
+            "total": self.total,
+            "histogram": [
+                {"lt": upper, "count": count}
+                for upper, count in zip(TOKEN_BUCKETS + [None], self.buckets)
+            ],
+        }
+
+
+def record_fingerprint(record: Any) -> int:
+    """记录内容的 64 位指纹（键排序后序列化），用于精确去重"""
+    raw = orjson.dumps(record, option=orjson.OPT_SORT_KEYS)
+    return int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), "big")
+
+
+def validate_dataset(path: str, format_type: str, expected_records: Optional[int] = None) -> Dict[str, Any]:
+    """流式校验数据集文件并返回报告（同步函数，供进程池调用）
+
+    参数：
+    - path：数据集文件路径。
+    - format_type：json / jsonl / csv / txt。
+    - expected_records：预估记录数（如上传时统计的行数），超过 DUP_TRACK_LIMIT 时按哈希抽样统计重复率。
+    """
+    started = time.monotonic()
+    schema: Optional[str] = None
+    record_count = 0
+    invalid_count = 0
+    errors: List[Dict[str, Any]] = []
+    tokens = _TokenStats()
+
+    sample_rate = 1.0
+    if expected_records and expected_records > DUP_TRACK_LIMIT:
+        sample_rate = DUP_TRACK_LIMIT / expected_records
+    sample_threshold = int(sample_rate * (1 << 64))
+    seen = set()
+    sampled = 0
+    duplicates = 0
+
+    def add_error(location: int, message: str) -> None:
+        nonlocal invalid_count
+        invalid_count += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({"location": location, "message": message})
+
+    try:
+        for location, record in iter_records(path, format_type):
+            record_count += 1
+            if isinstance(record, _Malformed):
+                add_error(location, str(record))
+                continue
+            if schema is None:
+                schema = detect_schema(record)
+                if schema is None:
+                    add_error(location, "无法识别格式：需要 alpaca（instruction/output）、sharegpt（conversations）或 text 字段")
+                    continue
+            problem = SCHEMA_CHECKS[schema](record) if isinstance(record, dict) else "记录必须是 JSON 对象"
+            if problem:
+                add_error(location, problem)
+                continue
+            tokens.add(estimate_tokens(record_text(record, schema)))
+            fingerprint = record_fingerprint(record)
+            if fingerprint < sample_threshold or sample_rate >= 1.0:
+                sampled += 1
+                if fingerprint in seen:
+                    duplicates += 1
+                else:
+                    seen.add(fingerprint)
+    except UnicodeDecodeError as e:
+        add_error(record_count, f"文件不是 UTF-8 编码: {e.reason}")
+    except (OSError, ValueError) as e:
+        add_error(record_count, str(e))
+
+    valid_count = record_count - invalid_count
+    return {
+        "format": format_type,
+        "schema": schema,
+        "valid": schema is not None and valid_count > 0 and invalid_count == 0,
+        "record_count": record_count,
+        "valid_count": valid_count,
+        "invalid_count": invalid_count,
+        "errors": errors,
+        "token_stats": tokens.as_dict(),
+        "duplicate_count": duplicates if sample_rate >= 1.0 else round(duplicates / sample_rate),
+        "duplicate_rate": round(duplicates / sampled, 6) if sampled else 0.0,
+        "duplicate_sampled": sample_rate < 1.0,
+        "elapsed_seconds": round(time.monotonic() - started, 3),
+    }
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """惰性创建的共享进程池（数据集校验、预处理等 CPU 密集任务共用）"""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=VALIDATOR_WORKERS)
+    return _pool
+
+
+def shutdown_process_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def run_validation(path: str, format_type: str, expected_records: Optional[int] = None) -> Dict[str, Any]:
+    """在进程池中执行 validate_dataset"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_process_pool(), validate_dataset, path, format_type, expected_records)
+
+
+def reset_interrupted_validations(db) -> int:
+    """服务启动时把上次未完成的校验（pending/running）标记为 error：其后台任务与进程池已随旧进程退出，
+    不重置的话 running 状态会一直阻止重新提交校验"""
+    datasets = db.query(Dataset).filter(Dataset.validation_status.in_(("pending", "running"))).all()
+    for dataset in datasets:
+        dataset.validation_status = "error"
+        dataset.validation_report = {"errors": [{"location": 0, "message": "服务重启，校验中断，请重新校验"}]}
+        dataset.validated_at = datetime.now(timezone.utc)
+    db.commit()
+    return len(datasets)
+
+
+def _reusable_report(db, dataset: Dataset) -> Optional[Dict[str, Any]]:
+    """同内容、同格式的其它数据集已有校验报告时直接复用"""
+    if not dataset.content_hash:
+        return None
+    other = (
+        db.query(Dataset)
+        .filter(
+            Dataset.content_hash == dataset.content_hash,
+            Dataset.format_type == dataset.format_type,
+            Dataset.id != dataset.id,
+            Dataset.validation_status.in_(("passed", "failed")),
+        )
+        .first()
+    )
+    return other.validation_report if other else None
+
+
+async def validate_dataset_record(dataset_id: int, force: bool = False) -> Optional[str]:
+    """校验数据集并把报告写回 Dataset 行，返回最终状态（数据集不存在返回 None）
+
+    注意：
+    - 已有结论（passed/failed）且未指定 force 时直接返回，不重复校验；
+    - 内容哈希相同的数据集共享校验结果；
+    - 使用独立的数据库会话，可作为后台任务在请求结束后运行。
+    """
+    db = SessionLocal()
+    try:
+        dataset = db.query(Dataset).filter(Dataset.id == dataset_id).first()
+        if dataset is None:
+            return None
+        if not force and dataset.validation_status in ("passed", "failed"):
+            return dataset.validation_status
+
+        report = None if force else _reusable_report(db, dataset)
+        if report is None:
+            dataset.validation_status = "running"
+            db.commit()
+            try:
+                report = await run_validation(dataset.file_path, dataset.format_type or "", dataset.line_count)
+            except Exception as e:
+                logger.error(f"数据集 {dataset_id} 校验失败: {e}")
+                dataset.validation_status = "error"
+                dataset.validation_report = {"errors": [{"location": 0, "message": str(e)}]}
+                dataset.validated_at = datetime.now(timezone.utc)
+                db.commit()
+                return dataset.validation_status
+
+        dataset.validation_status = "passed" if report.get("valid") else "failed"
+        dataset.validation_report = report
+        dataset.validated_at = datetime.now(timezone.utc)
+        db.commit()
+        return dataset.validation_status
+    finally:
+        db.close()
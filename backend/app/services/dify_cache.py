@@ -0,0 +1,127 @@
+"""
+Dify 只读接口缓存
+知识库列表与会话历史变化不频繁，页面每次打开都请求 Dify 没有必要：
+- 知识库列表按 (page, limit, keyword) 缓存，过期后在 stale 窗口内先返回旧数据，同时在后台刷新（stale-while-revalidate）；
+- 会话历史按 (conversation_id, limit) 缓存，chat_with_dify 在该会话中完成一轮对话时整组失效；
+  失效前已发出的上游请求返回后不会写回缓存，避免旧历史覆盖失效结果；
+- 同一键的并发未命中只请求一次上游；
+- 统计命中率、上游请求耗时，以及按各条目上游耗时估算的命中节省时间。
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set
+
+from app.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+DIFY_DATASETS_CACHE_TTL = float(os.getenv("DIFY_DATASETS_CACHE_TTL", "60"))
+DIFY_DATASETS_STALE_TTL = float(os.getenv("DIFY_DATASETS_STALE_TTL", "600"))
+DIFY_HISTORY_CACHE_TTL = float(os.getenv("DIFY_HISTORY_CACHE_TTL", "300"))
+
+
+class DifyResponseCache:
+    """带 stale-while-revalidate 与分组失效的异步缓存
+
+    参数：
+    - ttl：条目新鲜期（秒），期内直接返回。
+    - stale_ttl：新鲜期之后仍可返回旧值的时长（秒），返回旧值时触发后台刷新；为 0 时过期即重新请求。
+    - maxsize：最多保留的条目数。
+    """
+
+    def __init__(self, name: str, ttl: float, stale_ttl: float = 0.0, maxsize: int = 256):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._cache = TTLCache(ttl=ttl + stale_ttl, maxsize=maxsize)
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._inflight_groups: Dict[Hashable, Hashable] = {}
+        # 被 invalidate_group 作废的进行中请求，返回后不写回缓存；请求结束即移除，规模不超过进行中的请求数
+        self._stale: Set[asyncio.Task] = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.upstream_requests = 0
+        self.upstream_errors = 0
+        self.upstream_seconds = 0.0
+        self.saved_seconds = 0.0
+
+    async def fetch(self, key: Hashable, loader: Callable[[], Awaitable[Any]], group: Optional[Hashable] = None) -> Any:
+        """返回缓存值，未命中时调用 loader 请求上游；group 用于 invalidate_group 整组失效"""
+        entry = self._cache.get(key)
+        if entry is not None:
+            self.saved_seconds += entry.meta.get("latency", 0.0)
+            if time.monotonic() - entry.stored_at < self.ttl:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+                if key not in self._inflight:
+                    self._load(key, loader, group).add_done_callback(self._log_refresh_error)
+            return entry.value
+        self.misses += 1
+        task = self._inflight.get(key) or self._load(key, loader, group)
+        # 一个请求被取消不影响其它等待同一上游结果的请求
+        return await asyncio.shield(task)
+
+    def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]], group: Optional[Hashable]) -> asyncio.Task:
+        async def load() -> Any:
+            started = time.perf_counter()
+            self.upstream_requests += 1
+            try:
+                value = await loader()
+            except Exception:
+                self.upstream_errors += 1
+                raise
+            finally:
+                self.upstream_seconds += time.perf_counter() - started
+            if asyncio.current_task() not in self._stale:
+                entry = self._cache.set(key, value)
+                entry.meta["latency"] = time.perf_counter() - started
+            return value
+
+        task = asyncio.create_task(load())
+        self._inflight[key] = task
+        self._inflight_groups[key] = group
+        task.add_done_callback(lambda _: self._finish_load(key, task))
+        return task
+
+    def _finish_load(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+            self._inflight_groups.pop(key, None)
+        self._stale.discard(task)
+
+    def _log_refresh_error(self, task: asyncio.Task) -> None:
+        # 后台刷新失败时保留旧值，等下次访问再试
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"{self.name} 缓存后台刷新失败: {task.exception()}")
+
+    def invalidate_group(self, group: Hashable) -> int:
+        """删除该组全部条目，并使组内尚未返回的上游请求结果不再写入缓存"""
+        for key, task in self._inflight.items():
+            if self._inflight_groups.get(key) == group:
+                self._stale.add(task)
+        return self._cache.invalidate_where(lambda key: isinstance(key, tuple) and key and key[0] == group)
+
+    def stats(self) -> Dict[str, Any]:
+        served = self.hits + self.stale_hits
+        total = served + self.misses
+        return {
+            "ttl": self.ttl,
+            "stale_ttl": self.stale_ttl,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_rate": round(served / total, 4) if total else None,
+            "upstream_requests": self.upstream_requests,
+            "upstream_errors": self.upstream_errors,
+            "avg_upstream_ms": round(self.upstream_seconds / self.upstream_requests * 1000, 1) if self.upstream_requests else None,
+            "latency_saved_seconds": round(self.saved_seconds, 3),
+        }
+
+
+datasets_cache = DifyResponseCache("知识库列表", DIFY_DATASETS_CACHE_TTL, DIFY_DATASETS_STALE_TTL)
+history_cache = DifyResponseCache("会话历史", DIFY_HISTORY_CACHE_TTL, maxsize=1024)
@@ -0,0 +1,153 @@
+"""
+Dify API 客户端
+所有 Dify 代理接口共用一个连接池客户端（应用启动时创建、关闭时释放），不再为每个请求新建 AsyncClient 与 TCP/TLS 连接：
+- 各类请求使用各自的超时（健康检查、列表查询、流式对话、流式工作流），流式请求的读超时按“两次数据块间隔”计算；
+- 流式接口先读取上游响应头，非 2xx 时读取错误体并抛出 DifyError，由接口层转换为 HTTP 错误，
+  而不是在已经开始的流中途断开；
+- 状态正常时把上游 SSE 原始字节块原样转发，不做解码与重新分帧。
+"""
+
+import asyncio
+import json
+import logging
+import os
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+DIFY_API_URL = os.getenv("DIFY_API_URL", "http://localhost")
+DIFY_API_KEY = os.getenv("DIFY_API_KEY", "")
+DIFY_POOL_LIMITS = httpx.Limits(
+    max_connections=int(os.getenv("DIFY_MAX_CONNECTIONS", "100")),
+    max_keepalive_connections=int(os.getenv("DIFY_MAX_KEEPALIVE", "20")),
+    keepalive_expiry=30.0,
+)
+
+# 按接口区分的超时（秒）；流式请求的 read 为两次数据块之间的最长等待
+DIFY_TIMEOUTS: Dict[str, httpx.Timeout] = {
+    "health": httpx.Timeout(5.0),
+    "query": httpx.Timeout(float(os.getenv("DIFY_QUERY_TIMEOUT", "15")), connect=5.0),
+    "chat": httpx.Timeout(10.0, read=float(os.getenv("DIFY_CHAT_READ_TIMEOUT", "120"))),
+    "workflow": httpx.Timeout(10.0, read=float(os.getenv("DIFY_WORKFLOW_READ_TIMEOUT", "600"))),
+}
+
+
+class DifyError(Exception):
+    """Dify 调用失败：status_code 为应返回给前端的 HTTP 状态码"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _error_message(response: httpx.Response) -> str:
+    """从 Dify 错误体（{"code", "message", "status"}）中提取说明，非 JSON 时截取原文"""
+    try:
+        body = json.loads(response.content)
+    except httpx.ResponseNotRead:
+        return f"HTTP {response.status_code}"
+    except ValueError:
+        body = None
+    if isinstance(body, dict) and body.get("message"):
+        return f"{body.get('code') or response.status_code}: {body['message']}"
+    return response.content[:500].decode("utf-8", "replace") or f"HTTP {response.status_code}"
+
+
+def _status_error(response: httpx.Response) -> DifyError:
+    # 上游 4xx（参数错误、会话不存在、鉴权失败等）原样透传；上游自身故障统一为 502
+    status_code = response.status_code if 400 <= response.status_code < 500 else 502
+    return DifyError(status_code, f"Dify API错误: {_error_message(response)}")
+
+
+def _transport_error(e: httpx.HTTPError) -> DifyError:
+    if isinstance(e, httpx.TimeoutException):
+        return DifyError(504, f"Dify API超时: {type(e).__name__}")
+    return DifyError(503, f"无法连接到Dify服务: {str(e) or type(e).__name__}")
+
+
+class DifyClient:
+    """共享连接池的 Dify 客户端"""
+
+    def __init__(self, base_url: str = DIFY_API_URL, api_key: str = DIFY_API_KEY):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self) -> None:
+        """应用启动时调用：创建连接池"""
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers={"Authorization": f"Bearer {self.api_key}"} if self.api_key else None,
+            limits=DIFY_POOL_LIMITS,
+            timeout=DIFY_TIMEOUTS["query"],
+        )
+        self._loop = asyncio.get_running_loop()
+
+    async def close(self) -> None:
+        """应用关闭时调用：关闭连接池"""
+        client, self._client = self._client, None
+        if client is not None and not client.is_closed:
+            await client.aclose()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # 未经 lifespan 启动（脚本直接调用）或事件循环已更换时按需重建
+        if self._client is None or self._client.is_closed or self._loop is not asyncio.get_running_loop():
+            self.start()
+        return self._client
+
+    async def get(self, path: str, params: Optional[Dict[str, Any]] = None, route: str = "query") -> Any:
+        """GET 请求并返回 JSON；失败时抛出 DifyError"""
+        try:
+            response = await self.client.get(path, params=params, timeout=DIFY_TIMEOUTS[route])
+        except httpx.HTTPError as e:
+            raise _transport_error(e) from e
+        if response.status_code >= 400:
+            raise _status_error(response)
+        return response.json()
+
+    async def probe(self, path: str) -> httpx.Response:
+        """健康检查：返回原始响应，连接失败时抛出 httpx.HTTPError"""
+        return await self.client.get(path, timeout=DIFY_TIMEOUTS["health"])
+
+    async def open_stream(self, path: str, payload: Dict[str, Any], route: str) -> httpx.Response:
+        """发起流式 POST 并等待响应头；非 2xx 时读取错误体并抛出 DifyError，成功时返回未读取正文的响应"""
+        request = self.client.build_request(
+            "POST", path, json=payload,
+            headers={"Accept": "text/event-stream", "Accept-Encoding": "identity"},
+            timeout=DIFY_TIMEOUTS[route],
+        )
+        try:
+            response = await self.client.send(request, stream=True)
+        except httpx.HTTPError as e:
+            raise _transport_error(e) from e
+        if response.status_code >= 400:
+            try:
+                await response.aread()
+            except httpx.HTTPError:
+                pass
+            finally:
+                await response.aclose()
+            raise _status_error(response)
+        return response
+
+    @staticmethod
+    async def relay(response: httpx.Response, on_close: Optional[Callable[[], None]] = None) -> AsyncIterator[bytes]:
+        """原样转发上游正文字节块；结束、出错或客户端断开时释放连接并调用 on_close"""
+        try:
+            async for chunk in response.aiter_raw():
+                yield chunk
+        except httpx.HTTPError as e:
+            # 响应头已发出，只能记录并结束流
+            logger.error(f"Dify 流式响应中断: {e}")
+        finally:
+            await response.aclose()
+            if on_close is not None:
+                on_close()
+
+
+dify_client = DifyClient()
@@ -0,0 +1,138 @@
+"""
+评估指标
+逐样本计算精确匹配、BLEU-4、ROUGE-1 / ROUGE-L（F1），以及解析 LLM 评审的打分。
+不依赖 nltk / rouge_score：切词复用数据集校验的规则（中日韩按字、英文按词），中英文混合文本也能得到稳定的分数。
+"""
+
+import math
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import orjson
+
+from app.services.dataset_validator import tokenize
+
+REFERENCE_METRICS = ("exact_match", "bleu", "rouge_1", "rouge_l")
+JUDGE_METRIC = "judge"
+SUPPORTED_METRICS = REFERENCE_METRICS + (JUDGE_METRIC,)
+# ROUGE-L 的 LCS 为 O(n·m)，超长文本只取前这么多个 token
+MAX_LCS_TOKENS = 1000
+BLEU_MAX_N = 4
+JUDGE_SCORE_RANGE = (1.0, 10.0)
+
+_WS_RE = re.compile(r"\s+")
+_EDGE_PUNCT = " \t\n.。!！?？,，;；:：\"'“”‘’"
+_JSON_OBJECT_RE = re.compile(r"\{[^{}]*\}", re.DOTALL)
+_SCORE_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(?:/\s*10|分)")
+
+JUDGE_PROMPT = """你是严格的评审。请根据问题和参考答案，为模型回答的正确性与完整性打分（1-10 分，10 分最好）。
+只输出 JSON：{{"score": 分数, "reason": "一句话理由"}}
+
+[问题]
+{question}
+
+[参考答案]
+{reference}
+
+[模型回答]
+{prediction}"""
+
+
+def normalize_answer(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    return _WS_RE.sub(" ", text).strip(_EDGE_PUNCT)
+
+
+def _tokens(text: str) -> List[str]:
+    return tokenize(normalize_answer(text))
+
+
+def exact_match(prediction: str, reference: str) -> float:
+    return float(normalize_answer(prediction) == normalize_answer(reference))
+
+
+def _ngrams(tokens: Sequence[str], n: int) -> Counter:
+    return Counter(tuple(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+
+
+def bleu(prediction: str, reference: str, max_n: int = BLEU_MAX_N) -> float:
+    """句子级 BLEU-4；n>1 阶采用加一平滑（Lin & Och, 2004），避免短句因某一阶无匹配直接得 0"""
+    hyp, ref = _tokens(prediction), _tokens(reference)
+    if not hyp or not ref:
+        return 0.0
+    log_precision = 0.0
+    for n in range(1, max_n + 1):
+        hyp_ngrams, ref_ngrams = _ngrams(hyp, n), _ngrams(ref, n)
+        matches = sum(min(count, ref_ngrams[gram]) for gram, count in hyp_ngrams.items())
+        total = max(len(hyp) - n + 1, 0)
+        if n == 1:
+            if matches == 0:
+                return 0.0
+            precision = matches / total
+        else:
+            precision = (matches + 1) / (total + 1)
+        log_precision += math.log(precision) / max_n
+    brevity = 1.0 if len(hyp) > len(ref) else math.exp(1 - len(ref) / len(hyp))
+    return brevity * math.exp(log_precision)
+
+
+def _f1(overlap: int, hyp_len: int, ref_len: int) -> float:
+    if overlap == 0:
+        return 0.0
+    precision, recall = overlap / hyp_len, overlap / ref_len
+    return 2 * precision * recall / (precision + recall)
+
+
+def rouge_1(prediction: str, reference: str) -> float:
+    hyp, ref = Counter(_tokens(prediction)), Counter(_tokens(reference))
+    overlap = sum((hyp & ref).values())
+    return _f1(overlap, sum(hyp.values()), sum(ref.values()))
+
+
+def _lcs_length(a: Sequence[str], b: Sequence[str]) -> int:
+    if len(a) < len(b):
+        a, b = b, a
+    previous = [0] * (len(b) + 1)
+    for token in a:
+        current = [0]
+        for j, other in enumerate(b, 1):
+            current.append(previous[j - 1] + 1 if token == other else max(previous[j], current[j - 1]))
+        previous = current
+    return previous[-1]
+
+
+def rouge_l(prediction: str, reference: str) -> float:
+    hyp, ref = _tokens(prediction)[:MAX_LCS_TOKENS], _tokens(reference)[:MAX_LCS_TOKENS]
+    return _f1(_lcs_length(hyp, ref), len(hyp), len(ref))
+
+
+_REFERENCE_SCORERS = {"exact_match": exact_match, "bleu": bleu, "rouge_1": rouge_1, "rouge_l": rouge_l}
+
+
+def score_prediction(prediction: str, reference: Optional[str], metrics: Sequence[str]) -> Dict[str, float]:
+    """计算需要参考答案的指标；没有参考答案的样本不计分（不计入平均值）"""
+    if reference is None:
+        return {}
+    return {name: round(_REFERENCE_SCORERS[name](prediction, reference), 4) for name in metrics if name in _REFERENCE_SCORERS}
+
+
+def build_judge_prompt(question: str, reference: Optional[str], prediction: str) -> str:
+    return JUDGE_PROMPT.format(question=question, reference=reference or "（无）", prediction=prediction)
+
+
+def parse_judge_output(text: str) -> Tuple[Optional[float], str]:
+    """从评审输出中解析 (分数, 理由)；优先解析 JSON，其次匹配“8/10”“8 分”，解析失败时分数为 None"""
+    low, high = JUDGE_SCORE_RANGE
+    for match in _JSON_OBJECT_RE.finditer(text or ""):
+        try:
+            data = orjson.loads(match.group(0))
+        except orjson.JSONDecodeError:
+            continue
+        if isinstance(data, dict) and isinstance(data.get("score"), (int, float)):
+            return min(max(float(data["score"]), low), high), str(data.get("reason", ""))
+    match = _SCORE_RE.search(text or "")
+    if match:
+        return min(max(float(match.group(1)), low), high), (text or "").strip()[:500]
+    return None, (text or "").strip()[:500]
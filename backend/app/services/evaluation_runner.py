@@ -0,0 +1,282 @@
+"""
+训练后评估
+在同一份验证集上让多个模型配置（通常是微调模型与其基座模型）回答相同的问题，逐样本计算指标并保存结果：
+- 数据集按记录流式读取（不整体载入内存），每条记录 × 每个模型为一个评估单元；
+- 所有模型调用（包括 LLM 评审）共用一个 BoundedSemaphore 限制并发，在途单元数也有上限；
+- 结果批量写入 evaluation_results，(run_id, model_config_id, example_index) 唯一，
+  中断后续跑时跳过已有结果的单元，调用失败的单元会被重试；
+- 服务重启后未完成的评估自动续跑。
+"""
+
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.llm_core.llm_client import create_llm_client, split_thinking
+from app.models.evaluation import EvaluationResult, EvaluationRun
+from app.models.model_config import ModelConfig
+from app.services.dataset_converter import iter_chat_records
+from app.services.eval_metrics import JUDGE_METRIC, build_judge_prompt, parse_judge_output, score_prediction
+
+logger = logging.getLogger(__name__)
+
+EVAL_DEFAULT_CONCURRENCY = int(os.getenv("EVAL_DEFAULT_CONCURRENCY", "4"))
+EVAL_MAX_CONCURRENCY = 64
+# 结果攒够条数或间隔秒数后批量写库
+RESULT_FLUSH_SIZE = 50
+RESULT_FLUSH_INTERVAL = 2.0
+# 每次在线程池中从数据集读取的记录数
+READ_BATCH = 256
+ACTIVE_EVAL_STATUSES = ("pending", "running")
+
+
+async def iter_dataset_chats(path: str, format_type: str, start: int = 0,
+                             limit: Optional[int] = None) -> AsyncIterator[Tuple[int, Optional[Tuple[List[Dict[str, str]], Optional[str]]]]]:
+    """在线程池中分批读取数据集，逐条产出 (记录序号, (messages, 参考答案) 或 None)；limit 为序号上限（不含）"""
+    records = iter_chat_records(path, format_type, start)
+    while True:
+        batch = await run_in_threadpool(lambda: list(islice(records, READ_BATCH)))
+        if not batch:
+            return
+        for index, chat in batch:
+            if limit is not None and index >= limit:
+                return
+            yield index, chat
+
+
+def compute_summary(db: Session, run: EvaluationRun) -> Dict[str, Any]:
+    """按模型汇总：样本数、失败数、平均延迟与各指标平均值（没有得分的样本不计入该指标）"""
+    summary: Dict[str, Dict[str, Any]] = {}
+    sums: Dict[str, Dict[str, List[float]]] = {}
+    rows = db.query(EvaluationResult.model_config_id, EvaluationResult.scores, EvaluationResult.latency_ms, EvaluationResult.error) \
+        .filter(EvaluationResult.run_id == run.id).yield_per(1000)
+    for config_id, scores, latency_ms, error in rows:
+        entry = summary.setdefault(config_id, {"count": 0, "errors": 0, "avg_latency_ms": None, "metrics": {}})
+        totals = sums.setdefault(config_id, {"_latency": [0.0, 0]})
+        entry["count"] += 1
+        if error:
+            entry["errors"] += 1
+            continue
+        if latency_ms is not None:
+            totals["_latency"][0] += latency_ms
+            totals["_latency"][1] += 1
+        for name, value in (scores or {}).items():
+            pair = totals.setdefault(name, [0.0, 0])
+            pair[0] += value
+            pair[1] += 1
+    for config_id, totals in sums.items():
+        latency_sum, latency_count = totals.pop("_latency")
+        if latency_count:
+            summary[config_id]["avg_latency_ms"] = round(latency_sum / latency_count, 1)
+        summary[config_id]["metrics"] = {name: round(total / count, 4) for name, (total, count) in totals.items()}
+    return summary
+
+
+class EvaluationRunner:
+    """执行单个评估任务；结果在内存中攒批后写库"""
+
+    def __init__(self, manager: "EvaluationManager", run_id: int):
+        self.manager = manager
+        self.run_id = run_id
+        self.db = SessionLocal()
+        self._buffer: List[EvaluationResult] = []
+        self._last_flush = time.monotonic()
+
+    def _setup(self, run: EvaluationRun) -> None:
+        params = run.params or {}
+        configs = {config.id: config for config in self.db.query(ModelConfig).filter(
+            ModelConfig.id.in_(list(run.model_config_ids) + ([run.judge_config_id] if run.judge_config_id else []))
+        )}
+        missing = [config_id for config_id in run.model_config_ids if config_id not in configs]
+        if missing:
+            raise ValueError(f"模型配置不存在: {', '.join(missing)}")
+        self.clients = {config_id: create_llm_client(configs[config_id]) for config_id in run.model_config_ids}
+        self.judge_client = None
+        if JUDGE_METRIC in run.metrics:
+            if run.judge_config_id not in configs:
+                raise ValueError("LLM 评审的模型配置不存在")
+            self.judge_client = create_llm_client(configs[run.judge_config_id])
+        self.metrics = list(run.metrics)
+        self.concurrency = min(max(int(params.get("concurrency") or EVAL_DEFAULT_CONCURRENCY), 1), EVAL_MAX_CONCURRENCY)
+        self.semaphore = asyncio.BoundedSemaphore(self.concurrency)
+        self.system_prompt = params.get("system_prompt")
+        self.options: Dict[str, Any] = {"temperature": params.get("temperature", 0.0)}
+        if params.get("max_tokens"):
+            self.options["max_tokens"] = params["max_tokens"]
+
+    def _resume_state(self, run: EvaluationRun) -> Set[Tuple[int, str]]:
+        """删除失败的结果（续跑时重试），返回已完成的 (样本序号, 模型) 集合"""
+        self.db.query(EvaluationResult).filter(
+            EvaluationResult.run_id == run.id, EvaluationResult.error.isnot(None)
+        ).delete(synchronize_session=False)
+        done = {(index, config_id) for index, config_id in self.db.query(
+            EvaluationResult.example_index, EvaluationResult.model_config_id
+        ).filter(EvaluationResult.run_id == run.id)}
+        run.completed_count = len(done)
+        self.db.commit()
+        return done
+
+    async def run(self) -> None:
+        db = self.db
+        pending: Set[asyncio.Task] = set()
+        run = None
+        try:
+            run = db.query(EvaluationRun).filter(EvaluationRun.id == self.run_id).first()
+            if run is None or run.status not in ACTIVE_EVAL_STATUSES:
+                return
+            dataset = run.dataset
+            if dataset is None or not os.path.exists(dataset.file_path):
+                raise FileNotFoundError("数据集文件不存在")
+            self._setup(run)
+            done = self._resume_state(run)
+            run.status = "running"
+            run.started_at = run.started_at or datetime.now(timezone.utc)
+            run.error = None
+            max_examples = (run.params or {}).get("max_examples")
+            estimate = dataset.line_count or 0
+            run.total_examples = min(estimate, max_examples) if max_examples and estimate else (max_examples or estimate or None)
+            db.commit()
+
+            examples = 0
+            async for index, chat in iter_dataset_chats(dataset.file_path, dataset.format_type, limit=max_examples):
+                if chat is None:
+                    continue
+                examples += 1
+                messages, reference = chat
+                if self.system_prompt and messages[0]["role"] != "system":
+                    messages = [{"role": "system", "content": self.system_prompt}] + messages
+                for config_id in run.model_config_ids:
+                    if (index, config_id) in done:
+                        continue
+                    if len(pending) >= self.concurrency * 2:
+                        _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    pending.add(asyncio.create_task(self._evaluate(index, messages, reference, config_id)))
+                self._maybe_flush(run)
+            if pending:
+                await asyncio.gather(*pending)
+                pending.clear()
+            self._flush(run)
+            run.total_examples = examples
+            run.summary = compute_summary(db, run)
+            run.status = "completed"
+            run.completed_at = datetime.now(timezone.utc)
+            db.commit()
+            logger.info(f"评估 {run.id} 完成，{examples} 条样本 × {len(run.model_config_ids)} 个模型")
+        except asyncio.CancelledError:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            if run is not None:
+                self._flush(run)
+                run.summary = compute_summary(db, run)
+                # 服务关闭导致的中断保持待续跑状态，重启后自动继续
+                run.status = "pending" if self.manager.shutting_down else "cancelled"
+                if run.status == "cancelled":
+                    run.completed_at = datetime.now(timezone.utc)
+                db.commit()
+            raise
+        except Exception as e:
+            logger.exception(f"评估 {self.run_id} 失败")
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            db.rollback()
+            if run is not None:
+                self._flush(run)
+                run.status = "failed"
+                run.error = str(e) or type(e).__name__
+                run.completed_at = datetime.now(timezone.utc)
+                db.commit()
+        finally:
+            db.close()
+
+    async def _evaluate(self, index: int, messages: List[Dict[str, str]], reference: Optional[str], config_id: str) -> None:
+        result = EvaluationResult(
+            run_id=self.run_id,
+            model_config_id=config_id,
+            example_index=index,
+            prompt=next((m["content"] for m in reversed(messages) if m["role"] == "user"), None),
+            reference=reference,
+        )
+        try:
+            started = time.perf_counter()
+            async with self.semaphore:
+                response = await self.clients[config_id].chat(messages, self.options)
+            result.latency_ms = round((time.perf_counter() - started) * 1000, 1)
+            result.prediction = split_thinking(response.get("text") or "")[0]
+            scores = await run_in_threadpool(score_prediction, result.prediction, reference, self.metrics)
+            if self.judge_client is not None:
+                prompt = build_judge_prompt(result.prompt or "", reference, result.prediction)
+                async with self.semaphore:
+                    verdict = await self.judge_client.chat([{"role": "user", "content": prompt}], {"temperature": 0.0})
+                score, result.judge_reason = parse_judge_output(split_thinking(verdict.get("text") or "")[0])
+                if score is not None:
+                    scores[JUDGE_METRIC] = score
+            result.scores = scores
+        except Exception as e:
+            result.error = str(e) or type(e).__name__
+        self._buffer.append(result)
+
+    def _maybe_flush(self, run: EvaluationRun) -> None:
+        if len(self._buffer) >= RESULT_FLUSH_SIZE or (self._buffer and time.monotonic() - self._last_flush >= RESULT_FLUSH_INTERVAL):
+            self._flush(run)
+
+    def _flush(self, run: EvaluationRun) -> None:
+        buffer, self._buffer = self._buffer, []
+        self._last_flush = time.monotonic()
+        if not buffer:
+            return
+        self.db.add_all(buffer)
+        run.completed_count = (run.completed_count or 0) + len(buffer)
+        self.db.commit()
+
+
+class EvaluationManager:
+    """管理后台运行的评估任务：提交、取消，以及服务启停时的中断与续跑"""
+
+    def __init__(self):
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self.shutting_down = False
+
+    def is_active(self, run_id: int) -> bool:
+        return run_id in self._tasks
+
+    def submit(self, run_id: int) -> None:
+        if run_id in self._tasks:
+            return
+        task = asyncio.create_task(EvaluationRunner(self, run_id).run())
+        self._tasks[run_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(run_id, None))
+
+    async def cancel(self, run_id: int) -> bool:
+        task = self._tasks.get(run_id)
+        if task is None:
+            return False
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return True
+
+    def recover(self, db: Session) -> int:
+        """服务启动时继续上次未完成的评估"""
+        runs = db.query(EvaluationRun.id).filter(EvaluationRun.status.in_(ACTIVE_EVAL_STATUSES)).all()
+        for (run_id,) in runs:
+            self.submit(run_id)
+        return len(runs)
+
+    async def shutdown(self) -> None:
+        self.shutting_down = True
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+evaluation_manager = EvaluationManager()
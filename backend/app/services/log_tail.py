@@ -0,0 +1,236 @@
+"""
+训练日志增量跟踪
+每个日志文件只有一个 LogTailer：按字节偏移轮询文件大小，只读取新增部分，
+在行边界（\\n 或 tqdm 使用的 \\r）处切块后广播给所有订阅者，五十个人看同一个训练只需一个读取器。
+订阅者可从任意字节偏移续传：先从磁盘补读 [offset, 订阅时的跟踪位置)，再接上实时数据，不重复不遗漏。
+"""
+
+import asyncio
+import logging
+import os
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+# 轮询文件大小的间隔（秒）
+LOG_TAIL_POLL_INTERVAL = float(os.getenv("LOG_TAIL_POLL_INTERVAL", "0.5"))
+# 单次读取上限；补读历史时也按此大小分块
+LOG_TAIL_READ_SIZE = 256 * 1024
+# 每个订阅者最多积压的块数，超过视为跟不上，由订阅者自行从磁盘续传
+LOG_TAIL_QUEUE_SIZE = 256
+# 最后一个订阅者离开后，跟踪器保留的秒数（页面刷新重连时无需重建）
+LOG_TAIL_LINGER = 10.0
+# 未指定偏移时，从文件末尾往前回看的字节数
+LOG_TAIL_DEFAULT_BACKLOG = 64 * 1024
+
+# (起始偏移, 结束偏移, 内容)
+LogChunk = Tuple[int, int, bytes]
+# 跟踪器发现文件被截断时广播的标记，订阅者据此把读取位置归零
+_TRUNCATED: LogChunk = (0, 0, b"")
+
+
+def _line_boundary(data: bytes) -> int:
+    """最后一个完整行的结束位置（含换行符），没有完整行时返回 0"""
+    return max(data.rfind(b"\n"), data.rfind(b"\r")) + 1
+
+
+def read_log_range(path: str, start: int, end: Optional[int] = None, limit: int = LOG_TAIL_READ_SIZE) -> Tuple[bytes, int]:
+    """读取 [start, end) 中不超过 limit 字节、截止到行边界的内容，返回 (内容, 下一次的起始偏移)
+
+    end 为空表示读到文件末尾（此时末尾不完整的一行也会返回）；单行超过 limit 时按 limit 截断。
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        stop = size if end is None else min(end, size)
+        if start >= stop:
+            return b"", start
+        f.seek(start)
+        data = f.read(min(limit, stop - start))
+    if start + len(data) < stop:
+        boundary = _line_boundary(data)
+        if boundary:
+            data = data[:boundary]
+    return data, start + len(data)
+
+
+def default_start_offset(path: str, backlog: int = LOG_TAIL_DEFAULT_BACKLOG) -> int:
+    """类似 tail -f：从末尾往前 backlog 字节处的下一行开头开始"""
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return 0
+    if size <= backlog:
+        return 0
+    with open(path, "rb") as f:
+        f.seek(size - backlog)
+        data = f.read(backlog)
+    newline = data.find(b"\n")
+    return size - backlog + newline + 1 if newline >= 0 else size - backlog
+
+
+class LogSubscription:
+    """一个查看者的订阅；lagged 表示积压过多已被跟踪器移除，需要从 offset 处重新订阅"""
+
+    def __init__(self, tailer: "LogTailer"):
+        self.tailer = tailer
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=LOG_TAIL_QUEUE_SIZE)
+        self.lagged = False
+        # 订阅时跟踪器已读到的位置，之前的内容由订阅者自行从磁盘补读
+        self.live_from = tailer.offset
+
+    async def get(self, timeout: float) -> Optional[LogChunk]:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self) -> None:
+        self.tailer.unsubscribe(self)
+
+
+class LogTailer:
+    """单个日志文件的跟踪器：只有在有订阅者时轮询，读到的新内容广播到各订阅者队列"""
+
+    def __init__(self, hub: "LogTailHub", path: str):
+        self.hub = hub
+        self.path = path
+        self.offset = self._current_line_end()
+        self.subscribers: List[LogSubscription] = []
+        self._task: Optional[asyncio.Task] = None
+        self._idle_since: Optional[float] = None
+
+    def _current_line_end(self) -> int:
+        """从文件当前末尾的最后一个完整行之后开始跟踪"""
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return 0
+        start = max(0, size - LOG_TAIL_READ_SIZE)
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            boundary = _line_boundary(f.read(size - start))
+        if boundary or start == 0:
+            return start + boundary
+        # 末尾是一行超长的未完成内容，直接从文件末尾开始
+        return size
+
+    def subscribe(self) -> LogSubscription:
+        subscription = LogSubscription(self)
+        self.subscribers.append(subscription)
+        self._idle_since = None
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._poll())
+        return subscription
+
+    def unsubscribe(self, subscription: LogSubscription) -> None:
+        if subscription in self.subscribers:
+            self.subscribers.remove(subscription)
+        if not self.subscribers:
+            self._idle_since = asyncio.get_running_loop().time()
+
+    def _broadcast(self, chunk: LogChunk) -> None:
+        for subscription in list(self.subscribers):
+            try:
+                subscription.queue.put_nowait(chunk)
+            except asyncio.QueueFull:
+                subscription.lagged = True
+                self.subscribers.remove(subscription)
+        if not self.subscribers and self._idle_since is None:
+            self._idle_since = asyncio.get_running_loop().time()
+
+    async def _poll(self) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                if self._idle_since is not None and loop.time() - self._idle_since >= LOG_TAIL_LINGER:
+                    break
+                try:
+                    size = os.path.getsize(self.path)
+                except OSError:
+                    size = 0
+                if size < self.offset:
+                    # 文件被截断（重新训练覆盖日志），从头开始
+                    self.offset = 0
+                    self._broadcast(_TRUNCATED)
+                if size - self.offset > 0:
+                    data, next_offset = await run_in_threadpool(read_log_range, self.path, self.offset, size)
+                    # 末尾不完整的一行留到下次，等写完整后再发送
+                    complete = data[:_line_boundary(data)] if next_offset == size else data
+                    if complete:
+                        chunk = (self.offset, self.offset + len(complete), complete)
+                        self.offset += len(complete)
+                        self._broadcast(chunk)
+                        continue
+                await asyncio.sleep(LOG_TAIL_POLL_INTERVAL)
+        except Exception:
+            logger.exception(f"日志跟踪失败: {self.path}")
+        finally:
+            self.hub._discard(self)
+            for subscription in self.subscribers:
+                subscription.lagged = True
+
+
+class LogTailHub:
+    """按文件路径复用 LogTailer"""
+
+    def __init__(self):
+        self._tailers: Dict[str, LogTailer] = {}
+
+    def subscribe(self, path: str) -> LogSubscription:
+        key = os.path.abspath(path)
+        tailer = self._tailers.get(key)
+        if tailer is None:
+            tailer = self._tailers[key] = LogTailer(self, key)
+        return tailer.subscribe()
+
+    def _discard(self, tailer: LogTailer) -> None:
+        if self._tailers.get(tailer.path) is tailer:
+            del self._tailers[tailer.path]
+
+    def stats(self) -> Dict[str, int]:
+        return {path: len(tailer.subscribers) for path, tailer in self._tailers.items()}
+
+
+log_tail_hub = LogTailHub()
+
+
+async def follow_log(path: str, position: int, timeout: float) -> AsyncIterator[Optional[LogChunk]]:
+    """从 position 开始持续产出日志块：先从磁盘补读，再接上共享跟踪器的实时数据
+
+    timeout 秒内没有新内容时产出 None，便于调用方检查任务状态或发送保活；
+    积压过多被跟踪器移除时自动从已产出的位置重新订阅。起始偏移为 0 且小于上次位置的块表示文件被截断。
+    注意：position 可能领先于共享跟踪器（如跟踪器在上一次运行后仍在保留期内），position 之前的实时块会被跳过或截取，
+    只有跟踪器确认文件被截断时才会从 0 重新产出。
+    需配合 contextlib.aclosing 使用，确保退出时取消订阅。
+    """
+    subscription = log_tail_hub.subscribe(path)
+    try:
+        while True:
+            while position < subscription.live_from:
+                data, next_position = await run_in_threadpool(read_log_range, path, position, subscription.live_from)
+                if not data:
+                    break
+                yield position, next_position, data
+                position = next_position
+            chunk = await subscription.get(timeout)
+            if subscription.lagged:
+                subscription.close()
+                subscription = log_tail_hub.subscribe(path)
+                continue
+            if chunk is None:
+                yield None
+                continue
+            if chunk is _TRUNCATED:
+                position = 0
+                continue
+            start, end, data = chunk
+            if end <= position:
+                continue
+            if start < position:
+                chunk = (position, end, data[position - start:])
+            position = end
+            yield chunk
+    finally:
+        subscription.close()
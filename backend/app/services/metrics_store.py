@@ -0,0 +1,207 @@
+"""
+训练指标时间序列存储
+每个训练任务的每个指标一个只追加的二进制文件（<output_dir>/metrics/<指标名>.f64），
+内容为连续的 (step, value) float64 对，每个点 16 字节；读取时 mmap 后 memoryview.cast("d") 直接按列访问，
+不做反序列化。查询在服务端用 LTTB 降采样，20 万步的 loss 曲线只返回几百个点。
+新一次运行开始前由执行器截断到恢复的 checkpoint 步数（全新运行时清空）。
+"""
+
+import bisect
+import math
+import mmap
+import os
+import re
+import threading
+from array import array
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+METRICS_DIR_NAME = "metrics"
+METRIC_SUFFIX = ".f64"
+# 每个点占用的 float64 个数（step, value）
+_POINT_WIDTH = 2
+_POINT_BYTES = 8 * _POINT_WIDTH
+# 查询默认返回的点数与上限
+DEFAULT_METRIC_POINTS = 500
+MAX_METRIC_POINTS = 5000
+# 需要入库的指标：固定名称 + 所有 eval_ 开头的数值指标
+RECORDED_METRICS = ("loss", "lr", "grad_norm", "epoch", "tokens_per_second")
+
+_NAME_RE = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+def metrics_dir(output_dir: str) -> str:
+    return os.path.join(output_dir, METRICS_DIR_NAME)
+
+
+def _metric_path(output_dir: str, name: str) -> str:
+    return os.path.join(metrics_dir(output_dir), _NAME_RE.sub("_", name) + METRIC_SUFFIX)
+
+
+def is_recorded_metric(name: str) -> bool:
+    return name in RECORDED_METRICS or name.startswith("eval_")
+
+
+class MetricsWriter:
+    """单个任务的指标写入器：append 只在内存中缓冲，flush 批量写入文件（在线程池中调用）
+
+    同一指标的步数必须递增：从 checkpoint 恢复训练后重复上报的旧步数在 flush 时跳过，保证序列有序。
+    """
+
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+        self._files: Dict[str, Any] = {}
+        self._last_step: Dict[str, float] = {}
+        self._pending: Dict[str, array] = {}
+        # _lock 保护缓冲区（append 在事件循环中调用，只持有极短时间）；_io_lock 串行化文件写入
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+
+    def _open(self, name: str):
+        fp = self._files.get(name)
+        if fp is None:
+            path = _metric_path(self.output_dir, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fp = open(path, "ab")
+            # 文件末尾可能残留上次进程写了一半的点，截掉以保持 16 字节对齐
+            size = fp.tell()
+            if size % _POINT_BYTES:
+                fp.truncate(size - size % _POINT_BYTES)
+                size -= size % _POINT_BYTES
+            if size:
+                with open(path, "rb") as reader:
+                    reader.seek(size - _POINT_BYTES)
+                    self._last_step[name] = array("d", reader.read(_POINT_BYTES))[0]
+            self._files[name] = fp
+        return fp
+
+    def append(self, step: float, values: Dict[str, Any]) -> None:
+        with self._lock:
+            for name, value in values.items():
+                if not is_recorded_metric(name) or isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                self._pending.setdefault(name, array("d")).extend((step, value))
+
+    def flush(self) -> None:
+        """把缓冲的点写入文件（同步，在线程池中调用）"""
+        with self._io_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            for name, points in pending.items():
+                fp = self._open(name)
+                last_step = self._last_step.get(name, float("-inf"))
+                kept = array("d")
+                for i in range(0, len(points), _POINT_WIDTH):
+                    if points[i] > last_step:
+                        kept.extend(points[i:i + _POINT_WIDTH])
+                        last_step = points[i]
+                if kept:
+                    fp.write(kept.tobytes())
+                    fp.flush()
+                    self._last_step[name] = last_step
+
+    def close(self) -> None:
+        self.flush()
+        with self._io_lock:
+            for fp in self._files.values():
+                fp.close()
+            self._files.clear()
+
+
+def truncate_metrics(output_dir: str, after_step: float = 0) -> None:
+    """开始新一次运行前调用：只保留各指标中 step <= after_step 的点（after_step 为 0 时清空）
+
+    从 checkpoint-N 恢复时 after_step 为 N，N 之后的旧点会被新运行重新上报；全新运行时清空，
+    否则旧序列的最大步数会让新运行的点全部被当作重复步数跳过。
+    """
+    directory = metrics_dir(output_dir)
+    if not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        if not name.endswith(METRIC_SUFFIX):
+            continue
+        path = os.path.join(directory, name)
+        if after_step <= 0:
+            os.remove(path)
+            continue
+        with open(path, "r+b") as f:
+            data = f.read()
+            points = array("d", data[:len(data) - len(data) % _POINT_BYTES])
+            keep = bisect.bisect_right(points[0::_POINT_WIDTH], after_step)
+            f.truncate(keep * _POINT_BYTES)
+
+
+def list_metrics(output_dir: str) -> List[str]:
+    directory = metrics_dir(output_dir)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(name[:-len(METRIC_SUFFIX)] for name in os.listdir(directory) if name.endswith(METRIC_SUFFIX))
+
+
+def lttb(xs: Sequence[float], ys: Sequence[float], threshold: int) -> List[Tuple[float, float]]:
+    """Largest-Triangle-Three-Buckets 降采样：保留首尾点，其余每个桶选出与相邻桶构成最大三角形的点"""
+    n = len(xs)
+    if threshold >= n or threshold < 3:
+        return list(zip(xs, ys))
+    sampled = [(xs[0], ys[0])]
+    bucket_size = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        # 下一个桶的平均点（最后一个桶取末尾点）
+        next_start, next_end = end, min(int((i + 2) * bucket_size) + 1, n)
+        if next_start >= next_end:
+            avg_x, avg_y = xs[n - 1], ys[n - 1]
+        else:
+            count = next_end - next_start
+            avg_x = sum(xs[next_start:next_end]) / count
+            avg_y = sum(ys[next_start:next_end]) / count
+        ax, ay = xs[a], ys[a]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        sampled.append((xs[best], ys[best]))
+        a = best
+    sampled.append((xs[n - 1], ys[n - 1]))
+    return sampled
+
+
+@lru_cache(maxsize=64)
+def _query_file(path: str, size: int, mtime_ns: int, points: int, start_step: Optional[float], end_step: Optional[float]) -> Tuple[int, List[Tuple[float, float]]]:
+    # size / mtime_ns 参与缓存键：训练中文件持续追加，新一次运行还会截断后重写，任一变化都重新计算
+    count = size // _POINT_BYTES
+    if count == 0:
+        return 0, []
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), count * _POINT_BYTES, access=mmap.ACCESS_READ) as mm:
+        view = memoryview(mm).cast("d")
+        try:
+            xs, ys = view[0::_POINT_WIDTH], view[1::_POINT_WIDTH]
+            lo = bisect.bisect_left(xs, start_step) if start_step is not None else 0
+            hi = bisect.bisect_right(xs, end_step) if end_step is not None else count
+            # 切片拷贝为 array 后释放 mmap（memoryview 存活时 mmap 无法关闭）
+            xs, ys = array("d", xs[lo:hi]), array("d", ys[lo:hi])
+        finally:
+            view.release()
+    return len(xs), lttb(xs, ys, points)
+
+
+def query_metrics(output_dir: str, names: Optional[Iterable[str]] = None, points: int = DEFAULT_METRIC_POINTS,
+                  start_step: Optional[float] = None, end_step: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+    """读取并降采样指标曲线，返回 {指标名: {"total": 区间内原始点数, "points": [[step, value], ...]}}"""
+    result: Dict[str, Dict[str, Any]] = {}
+    for name in names or list_metrics(output_dir):
+        path = _metric_path(output_dir, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        total, sampled = _query_file(path, stat.st_size, stat.st_mtime_ns, points, start_step, end_step)
+        # 值保留 6 位有效数字，足够绘图且显著缩小响应体；NaN/Inf（如 loss 发散）输出为 null
+        result[name] = {
+            "total": total,
+            "points": [[int(x) if x.is_integer() else x, float(f"{y:.6g}") if math.isfinite(y) else None] for x, y in sampled],
+        }
+    return result
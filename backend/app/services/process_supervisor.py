@@ -0,0 +1,480 @@
+"""
+辅助服务进程监管
+LLaMA-Factory Web UI 与 SwanBoard 作为子进程运行，由 ProcessSupervisor 统一管理：
+- 每隔 SUPERVISOR_HEALTH_INTERVAL 秒检查一次：进程是否存活、端口是否可连接，并用 psutil 采样 CPU/内存；
+- 子进程退出、启动超时或就绪后连续多次健康检查失败时按指数退避重启，稳定运行一段时间后退避清零；
+- 子进程的 stdout/stderr 由后台线程写入 logs/<name>.log，按大小轮转；
+- 状态（stopped/idle/starting/ready/unhealthy/backoff）实时反映子进程情况，查询时也会检查进程是否已退出；
+- 服务按需启动：接口首次使用时 ensure_started 拉起；设置了 idle_timeout 的服务超过空闲时间无人使用后回收为 idle。
+"""
+
+import asyncio
+import logging
+import logging.handlers
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SUPERVISOR_LOG_DIR = os.getenv("SUPERVISOR_LOG_DIR", os.path.join(BACKEND_DIR, "logs"))
+SUPERVISOR_HEALTH_INTERVAL = float(os.getenv("SUPERVISOR_HEALTH_INTERVAL", "5"))
+# 启动阶段更频繁地探测端口，尽快报告就绪
+STARTING_CHECK_INTERVAL = 1.0
+# 按需启动的服务超过该秒数无人使用即回收（0 表示不回收）
+AUX_SERVICE_IDLE_TIMEOUT = float(os.getenv("AUX_SERVICE_IDLE_TIMEOUT", "1800"))
+# 重启退避：1s、2s、4s … 最长 RESTART_BACKOFF_MAX 秒；连续健康运行 RESTART_RESET_AFTER 秒后清零
+RESTART_BACKOFF_BASE = 1.0
+RESTART_BACKOFF_MAX = float(os.getenv("SUPERVISOR_BACKOFF_MAX", "60"))
+RESTART_RESET_AFTER = 120.0
+# 启动后超过该秒数端口仍不可连接视为启动失败（LLaMA-Factory 首次导入较慢）
+STARTUP_TIMEOUT = float(os.getenv("SUPERVISOR_STARTUP_TIMEOUT", "180"))
+# 就绪后连续失败次数达到该值时重启
+UNHEALTHY_THRESHOLD = 3
+HEALTH_CONNECT_TIMEOUT = 1.0
+STOP_TIMEOUT = 10.0
+LOG_MAX_BYTES = int(os.getenv("SUPERVISOR_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = 3
+# 状态中附带的最近输出行数，便于排查启动失败
+OUTPUT_TAIL_LINES = 50
+
+
+@dataclass
+class ServiceSpec:
+    """受监管服务的启动方式与健康检查端口"""
+    name: str
+    command: Callable[[], List[str]]  # 每次启动时生成命令，便于读取最新配置
+    port: int
+    env: Dict[str, str] = field(default_factory=dict)
+    health_host: str = "127.0.0.1"
+    idle_timeout: Optional[float] = None  # 空闲超过该秒数后回收，None 表示一直运行
+
+
+class ManagedProcess:
+    """单个受监管子进程的运行状态"""
+
+    def __init__(self, spec: ServiceSpec):
+        self.spec = spec
+        self.proc: Optional[subprocess.Popen] = None
+        self.status = "idle"  # 尚未使用，首次使用时启动
+        self.restarts = 0
+        self.backoff_level = 0
+        self.health_failures = 0
+        self.last_exit_code: Optional[int] = None
+        self.last_error: Optional[str] = None
+        self.started_at: Optional[float] = None  # monotonic
+        self.started_wall: Optional[datetime] = None
+        self.ready_at: Optional[datetime] = None
+        self.next_restart_at: Optional[float] = None  # monotonic
+        self.usage: Dict[str, Any] = {}
+        self.output_tail: Deque[str] = deque(maxlen=OUTPUT_TAIL_LINES)
+        self.log_path = os.path.join(SUPERVISOR_LOG_DIR, f"{spec.name}.log")
+        self._ps: Optional[psutil.Process] = None
+        self._ps_children: Dict[int, psutil.Process] = {}
+        self.restart_reason: Optional[str] = None  # 由监管方主动重启时记录原因
+        self.last_used = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self.enabled = False
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self.proc.pid if self.proc is not None else None
+
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def launch(self) -> None:
+        """启动子进程，输出交给后台线程写入轮转日志"""
+        os.makedirs(SUPERVISOR_LOG_DIR, exist_ok=True)
+        env = os.environ.copy()
+        env.update(self.spec.env)
+        env.setdefault("PYTHONUNBUFFERED", "1")
+        command = self.spec.command()
+        self.proc = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            stdin=subprocess.DEVNULL,
+            env=env,
+            cwd=BACKEND_DIR,
+        )
+        self.status = "starting"
+        self.health_failures = 0
+        self.started_at = time.monotonic()
+        self.started_wall = datetime.now(timezone.utc)
+        self.ready_at = None
+        self.next_restart_at = None
+        self.usage = {}
+        try:
+            self._ps = psutil.Process(self.proc.pid)
+            self._ps.cpu_percent(None)  # 首次调用只建立基准
+        except psutil.Error:
+            self._ps = None
+        self._ps_children = {}
+        threading.Thread(target=self._pump_output, args=(self.proc,), name=f"{self.spec.name}-output", daemon=True).start()
+        logger.info(f"{self.spec.name} 子进程已启动，PID={self.proc.pid}，日志：{self.log_path}")
+
+    def _pump_output(self, proc: subprocess.Popen) -> None:
+        handler = logging.handlers.RotatingFileHandler(
+            self.log_path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+        )
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        try:
+            for raw in iter(proc.stdout.readline, b""):
+                line = raw.decode("utf-8", errors="replace").rstrip()
+                self.output_tail.append(line)
+                handler.emit(logging.makeLogRecord({"msg": line, "levelno": logging.INFO, "levelname": "INFO"}))
+        except (OSError, ValueError):
+            pass
+        finally:
+            handler.close()
+            proc.stdout.close()
+
+    def sample_usage(self) -> None:
+        """采样整个进程树的 CPU 与内存（Gradio/SwanBoard 可能再派生子进程）"""
+        if self._ps is None:
+            return
+        try:
+            children = self._ps.children(recursive=True)
+        except psutil.Error:
+            self.usage = {}
+            return
+        # 复用上次采样的 Process 对象，cpu_percent 才有可比较的基准
+        procs = [self._ps] + [self._ps_children.get(child.pid, child) for child in children]
+        cpu, rss, threads = 0.0, 0, 0
+        for proc in procs:
+            try:
+                with proc.oneshot():
+                    cpu += proc.cpu_percent(None)
+                    rss += proc.memory_info().rss
+                    threads += proc.num_threads()
+            except psutil.Error:
+                continue
+        self._ps_children = {proc.pid: proc for proc in procs[1:]}
+        self.usage = {
+            "cpu_percent": round(cpu, 1),
+            "memory_rss_mb": round(rss / (1024 * 1024), 1),
+            "num_threads": threads,
+            "num_children": len(children),
+        }
+
+    def terminate(self) -> None:
+        """结束子进程及其派生进程（阻塞，最多等待 STOP_TIMEOUT 秒后强制结束）"""
+        if self.proc is None:
+            return
+        children: List[psutil.Process] = []
+        if self._ps is not None:
+            try:
+                children = self._ps.children(recursive=True)
+            except psutil.Error:
+                pass
+        if self.proc.poll() is None:
+            self.proc.terminate()
+        for child in children:
+            try:
+                child.terminate()
+            except psutil.Error:
+                pass
+        try:
+            self.proc.wait(timeout=STOP_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+        _, alive = psutil.wait_procs(children, timeout=STOP_TIMEOUT)
+        for child in alive:
+            try:
+                child.kill()
+            except psutil.Error:
+                pass
+        self.last_exit_code = self.proc.returncode
+
+    def snapshot(self) -> Dict[str, Any]:
+        status = self.status
+        if self.proc is not None and status in ("starting", "ready", "unhealthy") and not self.alive():
+            # 监控循环尚未察觉的退出：立即如实报告
+            status = "backoff" if self.enabled else "idle"
+        now = time.monotonic()
+        return {
+            "name": self.spec.name,
+            "status": status,
+            "pid": self.pid if self.alive() else None,
+            "port": self.spec.port,
+            "restarts": self.restarts,
+            "last_exit_code": self.proc.poll() if self.proc is not None and not self.alive() else self.last_exit_code,
+            "last_error": self.last_error,
+            "started_at": self.started_wall.isoformat() if self.started_wall else None,
+            "ready_at": self.ready_at.isoformat() if self.ready_at else None,
+            "uptime_seconds": round(now - self.started_at, 1) if self.started_at and self.alive() else None,
+            "next_restart_in": round(max(self.next_restart_at - now, 0), 1) if self.next_restart_at else None,
+            "usage": self.usage if self.alive() else {},
+            "idle_seconds": round(now - self.last_used, 1) if self.enabled and self.spec.idle_timeout else None,
+            "log_path": self.log_path,
+            # 未就绪时附带最近的输出，便于直接看到启动报错
+            "recent_output": list(self.output_tail)[-20:] if status != "ready" else [],
+        }
+
+
+async def _port_open(host: str, port: int) -> bool:
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout=HEALTH_CONNECT_TIMEOUT)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return True
+
+
+class ProcessSupervisor:
+    """按服务名管理子进程：启动、停止、健康检查与退避重启"""
+
+    def __init__(self):
+        self._services: Dict[str, ManagedProcess] = {}
+
+    def register(self, spec: ServiceSpec) -> None:
+        if spec.name not in self._services:
+            self._services[spec.name] = ManagedProcess(spec)
+
+    def get(self, name: str) -> ManagedProcess:
+        return self._services[name]
+
+    def status(self, name: str) -> Dict[str, Any]:
+        return self._services[name].snapshot()
+
+    def status_all(self) -> List[Dict[str, Any]]:
+        return [service.snapshot() for service in self._services.values()]
+
+    def start(self, name: str) -> None:
+        """启动服务并开始监管；已在监管中时不做任何事"""
+        service = self._services[name]
+        service.enabled = True
+        if service._task is None or service._task.done():
+            service.backoff_level = 0
+            service.status = "starting"
+            service._wake = asyncio.Event()
+            service._task = asyncio.create_task(self._supervise(service))
+        else:
+            service._wake.set()
+
+    def ensure_started(self, name: str) -> Dict[str, Any]:
+        """按需服务的使用入口：记录使用时间，未运行时启动，返回当前状态"""
+        service = self._services[name]
+        service.last_used = time.monotonic()
+        if not service.enabled:
+            logger.info(f"{name} 首次使用，按需启动")
+            self.start(name)
+        return service.snapshot()
+
+    def touch(self, name: str) -> None:
+        """记录一次使用，推迟空闲回收"""
+        self._services[name].last_used = time.monotonic()
+
+    def is_running(self, name: str) -> bool:
+        """是否处于监管中（包括启动中与退避重启中）"""
+        service = self._services[name]
+        return service.enabled or service.alive()
+
+    async def wait_ready(self, name: str, probe: Callable[[], Awaitable[bool]], timeout: float,
+                         interval: float = 0.2) -> Dict[str, Any]:
+        """轮询 probe 直到服务可用、子进程退出或超时，返回最终状态快照
+
+        probe 成功时立即把状态置为 ready，不必等监控循环的下一次检查。
+        """
+        service = self._services[name]
+        called = time.monotonic()
+        deadline = called + timeout
+        while True:
+            if service.alive():
+                if await probe():
+                    if service.status != "ready":
+                        service.status = "ready"
+                        service.ready_at = datetime.now(timezone.utc)
+                        logger.info(f"{name} 已就绪（端口 {service.spec.port}）")
+                    break
+            elif service.proc is not None and (service.started_at or 0) >= called:
+                break  # 本次启动的进程已退出：交给调用方根据快照中的 last_exit_code 判断
+            if time.monotonic() >= deadline:
+                break
+            await asyncio.sleep(interval)
+        return service.snapshot()
+
+    async def stop(self, name: str) -> None:
+        service = self._services[name]
+        service.enabled = False
+        task, service._task = service._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        if service.alive():
+            logger.info(f"关闭 {name}（PID={service.pid}）...")
+        await asyncio.to_thread(service.terminate)
+        service.status = "stopped"
+        service.next_restart_at = None
+
+    async def shutdown(self) -> None:
+        await asyncio.gather(*(self.stop(name) for name in self._services), return_exceptions=True)
+
+    async def _supervise(self, service: ManagedProcess) -> None:
+        name = service.spec.name
+        while service.enabled:
+            if self._idle_expired(service):
+                await self._reap(service)
+                continue
+            if not service.alive():
+                if service.proc is not None:
+                    service.last_exit_code = service.proc.poll()
+                    if service.restart_reason:
+                        service.last_error, service.restart_reason = service.restart_reason, None
+                    else:
+                        service.last_error = f"进程退出，返回码 {service.last_exit_code}"
+                        logger.warning(f"{name} 子进程已退出（返回码 {service.last_exit_code}）")
+                    await self._backoff(service)
+                    if not service.enabled or self._idle_expired(service):
+                        continue
+                    service.restarts += 1
+                try:
+                    service.launch()
+                except OSError as e:
+                    service.proc = None
+                    service.last_error = f"启动失败: {e}"
+                    logger.error(f"启动 {name} 失败: {e}")
+                    await self._backoff(service)
+                    continue
+
+            await self._wait(service, STARTING_CHECK_INTERVAL if service.status == "starting" else SUPERVISOR_HEALTH_INTERVAL)
+            if not service.alive():
+                continue
+            healthy = await _port_open(service.spec.health_host, service.spec.port)
+            service.sample_usage()
+            now = time.monotonic()
+            if healthy:
+                if service.status != "ready":
+                    service.ready_at = datetime.now(timezone.utc)
+                    logger.info(f"{name} 已就绪（端口 {service.spec.port}）")
+                service.status = "ready"
+                service.health_failures = 0
+                service.last_error = None
+                if service.backoff_level and now - service.started_at >= RESTART_RESET_AFTER:
+                    service.backoff_level = 0
+                continue
+            if service.status == "starting":
+                if now - service.started_at < STARTUP_TIMEOUT:
+                    continue
+                service.restart_reason = f"启动超过 {STARTUP_TIMEOUT:.0f} 秒端口仍不可用"
+            else:
+                service.health_failures += 1
+                service.status = "unhealthy"
+                if service.health_failures < UNHEALTHY_THRESHOLD:
+                    continue
+                service.restart_reason = f"连续 {service.health_failures} 次健康检查失败"
+            logger.warning(f"{name} {service.restart_reason}，准备重启")
+            await asyncio.to_thread(service.terminate)
+
+    @staticmethod
+    def _idle_expired(service: ManagedProcess) -> bool:
+        timeout = service.spec.idle_timeout
+        return bool(timeout) and time.monotonic() - service.last_used >= timeout
+
+    async def _reap(self, service: ManagedProcess) -> None:
+        """空闲回收：结束子进程并转为 idle；回收期间再次被使用则继续运行"""
+        logger.info(f"{service.spec.name} 空闲超过 {service.spec.idle_timeout:.0f} 秒，回收子进程")
+        service.enabled = False
+        await asyncio.to_thread(service.terminate)
+        service.proc = None
+        service.next_restart_at = None
+        service.backoff_level = 0
+        if self._idle_expired(service):
+            service.status = "idle"
+        else:
+            service.enabled = True
+
+    async def _backoff(self, service: ManagedProcess) -> None:
+        delay = min(RESTART_BACKOFF_BASE * (2 ** service.backoff_level), RESTART_BACKOFF_MAX)
+        service.backoff_level += 1
+        service.status = "backoff"
+        service.next_restart_at = time.monotonic() + delay
+        logger.info(f"{service.spec.name} 将在 {delay:.0f} 秒后重启")
+        await asyncio.sleep(delay)
+        service.next_restart_at = None
+
+    @staticmethod
+    async def _wait(service: ManagedProcess, timeout: float) -> None:
+        """等待下一次检查；子进程退出时尽快唤醒"""
+        service._wake.clear()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and service.alive() and not service._wake.is_set():
+            try:
+                await asyncio.wait_for(service._wake.wait(), timeout=min(0.5, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                pass
+
+
+def _llamafactory_command() -> List[str]:
+    return [sys.executable, os.path.join(BACKEND_DIR, "start_lf.py")]
+
+
+# SwanBoard 的启动参数；用户在页面保存/启动时通过 configure_swanboard 更新，下次启动生效
+_swanboard_settings: Dict[str, Any] = {"data_dir": os.path.join(BACKEND_DIR, "swanlab_data"), "host": "0.0.0.0", "port": 5092}
+
+
+def swanboard_data_dir() -> str:
+    return _swanboard_settings["data_dir"]
+
+
+def probe_host(bind_host: str) -> str:
+    """监听地址对应的本机探测地址：通配地址探测回环地址，指定地址则直接探测该地址"""
+    return "127.0.0.1" if bind_host in ("0.0.0.0", "::", "") else bind_host
+
+
+def configure_swanboard(data_dir: str, host: str, port: int) -> bool:
+    """更新 SwanBoard 启动参数（相对路径按后端目录解析），返回参数是否有变化"""
+    settings = {
+        "data_dir": os.path.normpath(os.path.join(BACKEND_DIR, data_dir)),
+        "host": host,
+        "port": int(port),
+    }
+    if settings == _swanboard_settings:
+        return False
+    _swanboard_settings.update(settings)
+    spec = process_supervisor.get(SWANBOARD_SERVICE).spec
+    spec.port = settings["port"]
+    # 健康检查与就绪探测使用同一地址，否则监听指定地址时端口检查失败会被判为不健康而反复重启
+    spec.health_host = probe_host(settings["host"])
+    return True
+
+
+def _swanboard_command() -> List[str]:
+    settings = _swanboard_settings
+    return [sys.executable, os.path.join(BACKEND_DIR, "start_swanboard.py"),
+            settings["data_dir"].replace("\\", "/"), settings["host"], str(settings["port"])]
+
+
+LLAMAFACTORY_SERVICE = "llamafactory"
+SWANBOARD_SERVICE = "swanboard"
+
+process_supervisor = ProcessSupervisor()
+process_supervisor.register(ServiceSpec(
+    name=LLAMAFACTORY_SERVICE,
+    command=_llamafactory_command,
+    port=7860,
+    env={"GRADIO_SERVER_NAME": "0.0.0.0", "GRADIO_OPEN_BROWSER": "false", "BROWSER": ""},
+    idle_timeout=AUX_SERVICE_IDLE_TIMEOUT or None,
+))
+process_supervisor.register(ServiceSpec(
+    name=SWANBOARD_SERVICE,
+    command=_swanboard_command,
+    port=5092,
+    idle_timeout=AUX_SERVICE_IDLE_TIMEOUT or None,
+))
@@ -0,0 +1,207 @@
+"""
+SwanLab 本地日志目录索引
+读取 SwanLab 本地模式写出的真实运行信息，供训练监控页面展示：
+- 项目、实验及其状态来自数据目录下 SwanBoard 的 runs.swanlab（SQLite，只读打开）；
+- 指标列表来自实验的 tag 记录，步数与最新值来自运行目录 logs/<列 id>/ 下的 _summary.json 与分片日志；
+- 扫描在线程池中执行；结果按文件 mtime 缓存：已结束的实验直接复用，运行中的实验只在其指标文件变化时重读，
+  数据库文件未变化且所有实验都命中缓存时整体复用上次结果；
+- 并发请求串行扫描，后到的请求直接命中缓存。
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from fastapi.concurrency import run_in_threadpool
+
+from app.llm_core.base_client import get_http_client
+
+logger = logging.getLogger(__name__)
+
+SWANBOARD_DB_NAME = "runs.swanlab"
+SUMMARY_FILE = "_summary.json"
+# 读取分片日志末尾的字节数，用于取最后一步的 step 与数值
+LOG_TAIL_BYTES = 4096
+# SwanBoard 实验状态码
+EXPERIMENT_STATUS = {-1: "crashed", 0: "running", 1: "finished"}
+
+
+def _stat_key(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _read_json(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _last_metric(metric_dir: str) -> Optional[Dict[str, Any]]:
+    """编号最大的分片日志（如 1000.log）的最后一行：{"index": step, "data": value, ...}"""
+    try:
+        shards = [name for name in os.listdir(metric_dir) if name.endswith(".log") and name[:-4].isdigit()]
+    except OSError:
+        return None
+    if not shards:
+        return None
+    path = os.path.join(metric_dir, max(shards, key=lambda name: int(name[:-4])))
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(f.tell() - LOG_TAIL_BYTES, 0))
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+    for line in reversed(lines):
+        try:
+            return json.loads(line)
+        except ValueError:
+            continue
+    return None
+
+
+class SwanLabCatalog:
+    """按数据目录缓存的项目/实验索引"""
+
+    def __init__(self):
+        self._db_keys: Dict[str, Optional[Tuple[int, int]]] = {}
+        self._projects: Dict[str, List[Dict[str, Any]]] = {}
+        # (数据目录, run_id) → (指标文件签名, 实验状态, 指标信息)
+        self._runs: Dict[Tuple[str, str], Tuple[Tuple, str, Dict[str, Any]]] = {}
+        self._lock = asyncio.Lock()
+
+    async def list_projects(self, data_dir: str) -> List[Dict[str, Any]]:
+        """返回项目列表（含实验明细）；数据目录或数据库不存在时返回空列表"""
+        data_dir = os.path.abspath(data_dir)
+        async with self._lock:
+            return await run_in_threadpool(self._load, data_dir)
+
+    def _load(self, data_dir: str) -> List[Dict[str, Any]]:
+        db_path = os.path.join(data_dir, SWANBOARD_DB_NAME)
+        db_key = _stat_key(db_path)
+        if db_key is None:
+            return []
+        try:
+            projects, experiments, tags = self._query_board(db_path)
+        except sqlite3.Error as e:
+            logger.warning(f"读取 SwanBoard 数据库失败: {e}")
+            return self._projects.get(data_dir, [])
+
+        changed = db_key != self._db_keys.get(data_dir)
+        seen = set()
+        by_project: Dict[int, List[Dict[str, Any]]] = {}
+        for exp in experiments:
+            key = (data_dir, exp["run_id"])
+            seen.add(key)
+            run, run_changed = self._run_info(data_dir, exp, tags.get(exp["id"], []))
+            changed = changed or run_changed
+            by_project.setdefault(exp["project_id"], []).append({**exp, **run})
+        for key in [key for key in self._runs if key[0] == data_dir and key not in seen]:
+            del self._runs[key]
+        if not changed and data_dir in self._projects:
+            return self._projects[data_dir]
+
+        result = []
+        for project in projects:
+            items = by_project.get(project["id"], [])
+            for item in items:
+                item.pop("id", None)
+                item.pop("project_id", None)
+            updated = max([project["update_time"] or ""] + [item["updated_at"] or "" for item in items]) or None
+            result.append({
+                "name": project["name"],
+                "description": project["description"],
+                "status": "running" if any(item["status"] == "running" for item in items) else "active",
+                "created_at": project["create_time"],
+                "updated_at": updated,
+                "experiments": items,
+            })
+        self._db_keys[data_dir] = db_key
+        self._projects[data_dir] = result
+        return result
+
+    @staticmethod
+    def _query_board(db_path: str):
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=2)
+        try:
+            conn.row_factory = sqlite3.Row
+            projects = [dict(row) for row in conn.execute(
+                "SELECT id, name, description, create_time, update_time FROM project ORDER BY id"
+            )]
+            experiments = [{
+                "id": row["id"],
+                "project_id": row["project_id"],
+                "run_id": row["run_id"],
+                "name": row["name"],
+                "description": row["description"],
+                "status": EXPERIMENT_STATUS.get(row["status"], str(row["status"])),
+                "created_at": row["create_time"],
+                "finished_at": row["finish_time"],
+                "updated_at": row["update_time"],
+            } for row in conn.execute(
+                "SELECT id, project_id, run_id, name, description, status, create_time, finish_time, update_time "
+                "FROM experiment ORDER BY sort"
+            )]
+            tags: Dict[int, List[Tuple[str, Optional[str]]]] = {}
+            for row in conn.execute("SELECT experiment_id, name, folder FROM tag WHERE system = 0 ORDER BY sort, id"):
+                tags.setdefault(row["experiment_id"], []).append((row["name"], row["folder"]))
+            return projects, experiments, tags
+        finally:
+            conn.close()
+
+    def _run_info(self, data_dir: str, exp: Dict[str, Any],
+                  tags: List[Tuple[str, Optional[str]]]) -> Tuple[Dict[str, Any], bool]:
+        """读取实验的指标信息；返回 (信息, 是否重新读取)"""
+        key = (data_dir, exp["run_id"])
+        cached = self._runs.get(key)
+        if cached is not None and exp["status"] != "running" and cached[1] == exp["status"]:
+            # 已结束的实验不会再写入指标
+            return cached[2], False
+        log_dir = os.path.join(data_dir, exp["run_id"], "logs")
+        # 以每个指标 _summary.json 的 mtime/大小作为签名（每记录一步都会重写该文件）
+        signature = tuple((name, _stat_key(os.path.join(log_dir, folder or name, SUMMARY_FILE))) for name, folder in tags)
+        if cached is not None and cached[0] == signature:
+            self._runs[key] = (signature, exp["status"], cached[2])
+            return cached[2], cached[1] != exp["status"]
+
+        metrics = []
+        steps, last_step = 0, None
+        latest: Dict[str, Any] = {}
+        for name, folder in tags:
+            metric_dir = os.path.join(log_dir, folder or name)
+            summary = _read_json(os.path.join(metric_dir, SUMMARY_FILE)) or {}
+            metrics.append(name)
+            steps = max(steps, int(summary.get("num") or 0))
+            last = _last_metric(metric_dir)
+            if last is not None:
+                latest[name] = last.get("data")
+                step = last.get("index")
+                if isinstance(step, int) and (last_step is None or step > last_step):
+                    last_step = step
+        info = {"metrics": metrics, "steps": steps, "last_step": last_step, "latest": latest}
+        self._runs[key] = (signature, exp["status"], info)
+        return info, True
+
+
+async def check_board_http(url: str, timeout: float = 5.0) -> Tuple[bool, str]:
+    """请求看板首页确认 HTTP 服务可用；返回 (是否可用, 说明)"""
+    try:
+        response = await get_http_client().get(url, timeout=timeout)
+    except httpx.HTTPError as e:
+        return False, str(e) or type(e).__name__
+    if response.status_code == 200:
+        return True, "ok"
+    return False, f"HTTP {response.status_code}"
+
+
+swanlab_catalog = SwanLabCatalog()
@@ -0,0 +1,513 @@
+"""
+训练任务执行器
+把训练任务渲染为 LLaMA-Factory YAML 配置，以受监管的子进程运行 `llamafactory-cli train`，
+输出直接写入任务的 log_file（运行期间由 training_progress 解析进度与指标），
+进程退出后把状态更新为 completed / failed / cancelled。
+
+队列持久化在数据库中：status=queued 的任务按“优先级降序、入队时间升序”调度，
+放行前检查每用户运行配额与资源需求（CPU 核数、内存、GPU 数）是否能被主机剩余容量满足，
+主机容量由 psutil 探测。服务重启时运行中的任务回到队列，重新调度。
+"""
+
+import asyncio
+import logging
+import os
+import shlex
+import signal
+import shutil
+import subprocess
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import psutil
+import yaml
+from sqlalchemy import func
+from fastapi.concurrency import run_in_threadpool
+
+from app.database import SessionLocal
+from app.models.training import Dataset, TrainingTask
+from app.schemas.training import LlamaFactoryConfig
+from app.services.dataset_converter import convert_and_register
+from app.services.training_progress import prepare_run_outputs, progress_tracker
+from app.services.checkpoint_index import index_task_outputs, latest_checkpoint_step
+from app.services.upload_service import hash_file
+
+logger = logging.getLogger(__name__)
+
+# 同时运行的训练进程数上限
+TRAINING_MAX_CONCURRENT = int(os.getenv("TRAINING_MAX_CONCURRENT", "1"))
+# 训练命令（可替换为假训练脚本用于无 GPU 环境联调，如 "python fake_trainer.py"），实际执行 <命令> train <yaml>
+TRAINER_COMMAND = os.getenv("TRAINER_COMMAND", "llamafactory-cli")
+# 停止任务时等待进程优雅退出的秒数，超时后强制结束
+TRAINING_STOP_GRACE = float(os.getenv("TRAINING_STOP_GRACE", "30"))
+# 每个用户同时运行 / 排队的任务数上限（0 表示不限）
+TRAINING_USER_MAX_RUNNING = int(os.getenv("TRAINING_USER_MAX_RUNNING", "1"))
+TRAINING_USER_MAX_QUEUED = int(os.getenv("TRAINING_USER_MAX_QUEUED", "10"))
+# 主机 GPU 数；未设置时依次从 CUDA_VISIBLE_DEVICES、nvidia-smi 探测
+TRAINING_GPU_COUNT = os.getenv("TRAINING_GPU_COUNT")
+# 调度器定期重试的间隔（秒），用于在内存等外部资源释放后放行排队任务
+TRAINING_SCHEDULE_INTERVAL = float(os.getenv("TRAINING_SCHEDULE_INTERVAL", "10"))
+
+TRAIN_CONFIG_FILE = "train_config.yaml"
+TRAIN_LOG_FILE = "train.log"
+# 仍在执行器中（排队或运行）的任务状态
+ACTIVE_STATUSES = ("queued", "running")
+RESOURCE_KEYS = ("cpu_cores", "memory_gb", "gpus")
+_GIB = 1024 ** 3
+
+
+def render_llamafactory_args(config: LlamaFactoryConfig, dataset_dir: str, eval_dataset: Optional[str],
+                             extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """把 LlamaFactoryConfig 转为 llamafactory-cli train 接受的参数字典
+
+    注意：
+    - model_name → model_name_or_path，evaluation_strategy → eval_strategy（LLaMA-Factory 的参数名）；
+    - 没有验证集时关闭评估相关选项，否则 transformers 会因缺少 eval 数据报错；
+    - extra 中 LlamaFactoryConfig 未定义的参数原样透传。
+    """
+    args = config.model_dump()
+    args["model_name_or_path"] = args.pop("model_name")
+    args["eval_strategy"] = args.pop("evaluation_strategy")
+    args["do_train"] = True
+    args["dataset_dir"] = dataset_dir
+    args["report_to"] = "none"
+    if eval_dataset:
+        args["eval_dataset"] = eval_dataset
+    else:
+        args.update({"do_eval": False, "eval_strategy": "no", "load_best_model_at_end": False})
+        args.pop("eval_steps", None)
+    if not args.get("use_swanlab"):
+        args.pop("swanlab_project", None)
+    args.update(extra or {})
+    return args
+
+
+def _process_group_kwargs() -> Dict[str, Any]:
+    # 训练进程可能再派生 torchrun 等子进程，放进独立进程组以便整组结束
+    if os.name == "nt":
+        return {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {"start_new_session": True}
+
+
+async def terminate_process(proc: asyncio.subprocess.Process, grace: float = TRAINING_STOP_GRACE) -> None:
+    """先发 SIGTERM（Windows 为 terminate），超时后 SIGKILL 整个进程组"""
+    if proc.returncode is not None:
+        return
+    try:
+        if os.name == "nt":
+            proc.terminate()
+        else:
+            os.killpg(proc.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+    try:
+        await asyncio.wait_for(proc.wait(), timeout=grace)
+    except asyncio.TimeoutError:
+        try:
+            if os.name == "nt":
+                proc.kill()
+            else:
+                os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        await proc.wait()
+
+
+def detect_gpu_count() -> int:
+    if TRAINING_GPU_COUNT is not None:
+        return int(TRAINING_GPU_COUNT)
+    visible = os.environ.get("CUDA_VISIBLE_DEVICES")
+    if visible is not None:
+        return len([device for device in visible.split(",") if device.strip() and device.strip() != "-1"])
+    if shutil.which("nvidia-smi") is None:
+        return 0
+    try:
+        output = subprocess.run(["nvidia-smi", "-L"], capture_output=True, text=True, timeout=10).stdout
+    except (OSError, subprocess.SubprocessError):
+        return 0
+    return sum(1 for line in output.splitlines() if line.startswith("GPU "))
+
+
+def detect_host_capacity() -> Dict[str, Any]:
+    """主机可分配给训练的总资源"""
+    return {
+        "cpu_cores": psutil.cpu_count(logical=True) or 1,
+        "memory_gb": round(psutil.virtual_memory().total / _GIB, 2),
+        "gpus": detect_gpu_count(),
+    }
+
+
+def normalize_resources(request: Optional[Dict[str, Any]], capacity: Dict[str, Any]) -> Dict[str, Any]:
+    """补齐资源需求的缺省值：1 核 CPU、不声明内存，主机有 GPU 时默认占用 1 张"""
+    request = request or {}
+    gpus = request.get("gpus")
+    return {
+        "cpu_cores": request.get("cpu_cores") or 1,
+        "memory_gb": request.get("memory_gb") or 0,
+        "gpus": (1 if capacity["gpus"] else 0) if gpus is None else gpus,
+    }
+
+
+def _exceeds_capacity(resources: Dict[str, Any], capacity: Dict[str, Any]) -> Optional[str]:
+    for key in RESOURCE_KEYS:
+        if resources[key] > capacity[key]:
+            return f"资源需求超过主机容量: {key} 需要 {resources[key]}，主机仅有 {capacity[key]}"
+    return None
+
+
+async def _dataset_ref(db, dataset: Dataset) -> Tuple[str, str]:
+    """确保数据集已转换并登记到 LLaMA-Factory，返回 (dataset_info.json 中的名称, dataset_dir)"""
+    if not dataset.content_hash:
+        result = await run_in_threadpool(hash_file, dataset.file_path)
+        dataset.content_hash = result.sha256
+        db.commit()
+    converted = await convert_and_register(dataset.file_path, dataset.format_type, dataset.content_hash)
+    return converted["dataset"], converted["dataset_dir"]
+
+
+class TrainingExecutor:
+    """以数据库为队列的训练调度器（单进程内调度，任务状态以数据库为准）
+
+    调度规则：
+    - 同时运行数不超过 max_concurrent，每个用户不超过 TRAINING_USER_MAX_RUNNING；
+    - 用户配额已满的任务跳过，不影响其他用户；
+    - 队首任务资源不足时停止放行后续任务（不回填），避免需要整机资源的大任务被小任务持续饿死；
+    - 需求超过主机总容量、永远无法满足的任务直接标记为失败。
+    """
+
+    def __init__(self, max_concurrent: int = TRAINING_MAX_CONCURRENT):
+        self.max_concurrent = max_concurrent
+        self._capacity: Optional[Dict[str, Any]] = None
+        # task_id -> {"user": 创建者, "resources": 占用资源, "gpu_ids": 分配的 GPU 序号}
+        self._reserved: Dict[int, Dict[str, Any]] = {}
+        self._runners: Dict[int, asyncio.Task] = {}
+        self._procs: Dict[int, asyncio.subprocess.Process] = {}
+        self._cancelled: Set[int] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop_task: Optional[asyncio.Task] = None
+        self._shutting_down = False
+
+    @property
+    def capacity(self) -> Dict[str, Any]:
+        if self._capacity is None:
+            self._capacity = detect_host_capacity()
+        return self._capacity
+
+    def is_active(self, task_id: int) -> bool:
+        return task_id in self._runners
+
+    def start(self) -> None:
+        """启动调度循环（幂等）；由 lifespan 在恢复队列后调用，submit 时也会确保已启动"""
+        if self._loop_task is not None and not self._loop_task.done():
+            return
+        self._shutting_down = False
+        self._wakeup = asyncio.Event()
+        self._wakeup.set()  # 立即调度一次，继续执行恢复后的队列
+        self._loop_task = asyncio.create_task(self._schedule_loop())
+
+    def submit(self, task_id: int) -> None:
+        """通知调度器有新的排队任务（调用方已把状态置为 queued 并提交）"""
+        self._cancelled.discard(task_id)
+        self.start()
+        self._wakeup.set()
+
+    async def stop(self, task_id: int) -> bool:
+        """结束运行中的训练进程，返回任务是否由执行器运行（排队中的任务由调用方直接标记取消）"""
+        if task_id not in self._runners:
+            return False
+        self._cancelled.add(task_id)
+        proc = self._procs.get(task_id)
+        if proc is not None:
+            await terminate_process(proc)
+        return True
+
+    async def shutdown(self) -> None:
+        """服务关闭时结束所有训练进程，任务放回队列，下次启动后重新调度"""
+        self._shutting_down = True
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            await asyncio.gather(self._loop_task, return_exceptions=True)
+            self._loop_task = None
+        await asyncio.gather(*(terminate_process(proc, grace=10) for proc in list(self._procs.values())), return_exceptions=True)
+        if self._runners:
+            await asyncio.gather(*list(self._runners.values()), return_exceptions=True)
+
+    # ------------------------------------------------------------ 调度
+
+    async def _schedule_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=TRAINING_SCHEDULE_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                self._schedule()
+            except Exception:
+                logger.exception("训练任务调度失败")
+
+    def _reserved_total(self) -> Dict[str, Any]:
+        return {key: sum(entry["resources"][key] for entry in self._reserved.values()) for key in RESOURCE_KEYS}
+
+    def _free_gpu_ids(self) -> List[int]:
+        used = {gpu for entry in self._reserved.values() for gpu in entry["gpu_ids"]}
+        return [gpu for gpu in range(self.capacity["gpus"]) if gpu not in used]
+
+    def _blocked_reason(self, resources: Dict[str, Any], user_running: int, available_memory_gb: float) -> Optional[str]:
+        """返回任务当前不能放行的原因，可以放行时返回 None"""
+        if len(self._reserved) >= self.max_concurrent:
+            return "concurrency"
+        if TRAINING_USER_MAX_RUNNING and user_running >= TRAINING_USER_MAX_RUNNING:
+            return "quota"
+        reserved = self._reserved_total()
+        if (reserved["cpu_cores"] + resources["cpu_cores"] > self.capacity["cpu_cores"]
+                or reserved["memory_gb"] + resources["memory_gb"] > self.capacity["memory_gb"]
+                or resources["memory_gb"] > available_memory_gb
+                or resources["gpus"] > len(self._free_gpu_ids())):
+            return "resources"
+        return None
+
+    def _queued_tasks(self, db) -> List[TrainingTask]:
+        return db.query(TrainingTask).filter(TrainingTask.status == "queued").order_by(
+            func.coalesce(TrainingTask.priority, 0).desc(), TrainingTask.queued_at, TrainingTask.id
+        ).all()
+
+    def _schedule(self) -> None:
+        """按优先级放行排队任务，直到名额或资源用尽"""
+        if self._shutting_down:
+            return
+        db = SessionLocal()
+        try:
+            user_running = Counter(entry["user"] for entry in self._reserved.values())
+            available_memory_gb = psutil.virtual_memory().available / _GIB
+            for task in self._queued_tasks(db):
+                if task.id in self._runners:
+                    continue
+                resources = normalize_resources(task.resource_request, self.capacity)
+                impossible = _exceeds_capacity(resources, self.capacity)
+                if impossible:
+                    task.error_message = impossible
+                    self._finish(db, task, "failed")
+                    continue
+                reason = self._blocked_reason(resources, user_running[task.created_by], available_memory_gb)
+                if reason == "quota":
+                    continue
+                if reason is not None:
+                    break
+                gpu_ids = self._free_gpu_ids()[:resources["gpus"]]
+                self._reserved[task.id] = {"user": task.created_by, "resources": resources, "gpu_ids": gpu_ids}
+                user_running[task.created_by] += 1
+                available_memory_gb -= resources["memory_gb"]
+                runner = asyncio.create_task(self._run(task.id, gpu_ids))
+                self._runners[task.id] = runner
+                runner.add_done_callback(lambda _, task_id=task.id: self._release(task_id))
+                logger.info(f"训练任务 {task.id} 获准运行，优先级 {task.priority or 0}，资源 {resources}，GPU {gpu_ids}")
+        finally:
+            db.close()
+
+    def _release(self, task_id: int) -> None:
+        self._runners.pop(task_id, None)
+        self._reserved.pop(task_id, None)
+        if self._wakeup is not None and not self._shutting_down:
+            self._wakeup.set()
+
+    def queue_snapshot(self, db) -> Dict[str, Any]:
+        """当前运行与排队情况，排队任务附带序号与预计的阻塞原因"""
+        def entry(task: TrainingTask, resources: Dict[str, Any], **extra) -> Dict[str, Any]:
+            return {
+                "task_id": task.id, "name": task.name, "status": task.status, "priority": task.priority or 0,
+                "created_by": task.created_by, "resources": resources, "queued_at": task.queued_at, **extra,
+            }
+
+        running_tasks = db.query(TrainingTask).filter(TrainingTask.id.in_(list(self._reserved))).all() if self._reserved else []
+        running = [entry(task, self._reserved[task.id]["resources"]) for task in running_tasks if task.id in self._reserved]
+        user_running = Counter(value["user"] for value in self._reserved.values())
+        available_memory_gb = psutil.virtual_memory().available / _GIB
+        # 已获准运行但仍在准备数据集的任务状态还是 queued，只计入 running
+        waiting = [task for task in self._queued_tasks(db) if task.id not in self._reserved]
+        queued, head_blocked = [], False
+        for position, task in enumerate(waiting, start=1):
+            resources = normalize_resources(task.resource_request, self.capacity)
+            reason = _exceeds_capacity(resources, self.capacity) and "resources"
+            if not reason:
+                reason = self._blocked_reason(resources, user_running[task.created_by], available_memory_gb)
+            if head_blocked and reason != "quota":
+                reason = reason or "order"
+            elif reason not in (None, "quota"):
+                head_blocked = True
+            queued.append(entry(task, resources, position=position, blocked_reason=reason))
+        return {
+            "capacity": self.capacity,
+            "reserved": self._reserved_total(),
+            "available_memory_gb": round(available_memory_gb, 2),
+            "max_concurrent": self.max_concurrent,
+            "user_max_running": TRAINING_USER_MAX_RUNNING,
+            "running": running,
+            "queued": queued,
+        }
+
+    # ------------------------------------------------------------ 运行
+
+    async def _run(self, task_id: int, gpu_ids: List[int]) -> None:
+        db = SessionLocal()
+        try:
+            task = db.query(TrainingTask).filter(TrainingTask.id == task_id).first()
+            if task is None or task.status != "queued":
+                return
+            if task_id in self._cancelled:
+                self._finish(db, task, "cancelled")
+                return
+            try:
+                await self._launch_and_wait(db, task, gpu_ids)
+            except Exception as e:
+                logger.exception(f"训练任务 {task_id} 执行失败")
+                db.rollback()
+                self._append_log(task, f"[modeltrain] 训练任务启动失败: {e}")
+                task.error_message = str(e)
+                task.pid = None
+                self._finish(db, task, "failed")
+        finally:
+            self._procs.pop(task_id, None)
+            self._cancelled.discard(task_id)
+            db.close()
+
+    async def _launch_and_wait(self, db, task: TrainingTask, gpu_ids: List[int]) -> None:
+        os.makedirs(task.output_dir, exist_ok=True)
+        task.log_file = os.path.join(task.output_dir, TRAIN_LOG_FILE)
+        db.commit()
+        dataset_name, dataset_dir = await _dataset_ref(db, task.dataset)
+        eval_name = (await _dataset_ref(db, task.eval_dataset))[0] if task.eval_dataset else None
+
+        config_data = dict(task.config.config_data) if task.config else {}
+        known = {key: config_data.pop(key) for key in list(config_data) if key in LlamaFactoryConfig.model_fields}
+        config = LlamaFactoryConfig(**{**known, "model_name": task.model_name, "dataset": dataset_name, "output_dir": task.output_dir})
+        args = render_llamafactory_args(config, dataset_dir, eval_name, config_data)
+        config_path = os.path.join(task.output_dir, TRAIN_CONFIG_FILE)
+        with open(config_path, "w", encoding="utf-8") as f:
+            yaml.safe_dump(args, f, allow_unicode=True, sort_keys=False)
+
+        if task.id in self._cancelled:
+            # 准备数据集期间已被取消
+            self._finish(db, task, "cancelled")
+            return
+
+        # LLaMA-Factory 在输出目录存在 checkpoint 且未设置 overwrite_output_dir 时从最近的 checkpoint 继续
+        resume_step = 0 if args.get("overwrite_output_dir") else await run_in_threadpool(latest_checkpoint_step, task.output_dir)
+        trainer_log_offset = await run_in_threadpool(prepare_run_outputs, task.output_dir, resume_step)
+
+        command = shlex.split(TRAINER_COMMAND, posix=os.name != "nt") + ["train", config_path]
+        env = {**os.environ, "PYTHONUNBUFFERED": "1"}
+        if self.capacity["gpus"]:
+            # 只暴露分配给该任务的 GPU，避免多个训练抢占同一张卡
+            env["CUDA_VISIBLE_DEVICES"] = ",".join(str(gpu) for gpu in gpu_ids)
+        with open(task.log_file, "ab") as log_fp:
+            log_offset = log_fp.tell()
+            proc = await asyncio.create_subprocess_exec(
+                *command, stdout=log_fp, stderr=asyncio.subprocess.STDOUT, stdin=asyncio.subprocess.DEVNULL,
+                env=env, **_process_group_kwargs()
+            )
+        self._procs[task.id] = proc
+        task.status = "running"
+        task.pid = proc.pid
+        task.progress = 0.0
+        task.metrics = None
+        task.error_message = None
+        task.started_at = datetime.now(timezone.utc)
+        task.completed_at = None
+        db.commit()
+        logger.info(f"训练任务 {task.id} 已启动，PID={proc.pid}，命令: {' '.join(command)}")
+
+        samples_per_step = config.per_device_train_batch_size * config.gradient_accumulation_steps * max(1, len(gpu_ids))
+        progress_tracker.watch(task.id, task.log_file, task.output_dir, log_offset, samples_per_step, trainer_log_offset)
+        try:
+            return_code = await proc.wait()
+        finally:
+            # 进度解析或写库失败不影响任务结果，状态只由进程退出码决定
+            try:
+                await progress_tracker.finish(task.id)
+            except Exception:
+                logger.exception(f"训练任务 {task.id} 进度收尾失败")
+        db.refresh(task)
+        task.pid = None
+        if task.id in self._cancelled:
+            self._finish(db, task, "cancelled")
+        elif self._shutting_down:
+            # 服务关闭导致的中断：放回队列，重启后重新调度
+            task.status = "queued"
+            db.commit()
+            self._append_log(task, "[modeltrain] 服务关闭，训练中断，任务已重新排队")
+        elif return_code == 0:
+            task.progress = 1.0
+            self._finish(db, task, "completed")
+        else:
+            task.error_message = f"训练进程退出码 {return_code}"
+            self._finish(db, task, "failed")
+        logger.info(f"训练任务 {task.id} 结束，状态 {task.status}，退出码 {return_code}")
+        try:
+            await run_in_threadpool(index_task_outputs, task.id)
+        except Exception:
+            logger.exception(f"训练任务 {task.id} 输出目录索引失败")
+
+    @staticmethod
+    def _finish(db, task: TrainingTask, status: str) -> None:
+        task.status = status
+        task.completed_at = datetime.now(timezone.utc)
+        db.commit()
+
+    @staticmethod
+    def _append_log(task: TrainingTask, message: str) -> None:
+        if not task.log_file:
+            return
+        try:
+            with open(task.log_file, "a", encoding="utf-8") as f:
+                f.write(message + "\n")
+        except OSError:
+            pass
+
+
+def _kill_orphan(task: TrainingTask) -> None:
+    """结束上次服务遗留的训练进程组；通过命令行中的配置文件路径确认 PID 未被其他进程复用"""
+    try:
+        proc = psutil.Process(task.pid)
+        cmdline = proc.cmdline()
+    except (psutil.NoSuchProcess, psutil.AccessDenied):
+        return
+    config_path = os.path.join(task.output_dir or "", TRAIN_CONFIG_FILE)
+    if not any(config_path in arg for arg in cmdline):
+        return
+    procs = [proc] + proc.children(recursive=True)
+    for p in procs:
+        try:
+            p.terminate()
+        except psutil.NoSuchProcess:
+            pass
+    _, alive = psutil.wait_procs(procs, timeout=10)
+    for p in alive:
+        try:
+            p.kill()
+        except psutil.NoSuchProcess:
+            pass
+    logger.info(f"已结束训练任务 {task.id} 的遗留进程 PID={task.pid}")
+
+
+def recover_interrupted_tasks(db) -> int:
+    """服务启动时恢复队列：运行中的任务结束遗留进程后放回队列（保留原入队时间与优先级），排队任务保持不变
+
+    LLaMA-Factory 在 output_dir 中存在 checkpoint 时会自动从最近的 checkpoint 继续训练。
+    """
+    tasks = db.query(TrainingTask).filter(TrainingTask.status.in_(ACTIVE_STATUSES)).all()
+    for task in tasks:
+        if task.status == "running":
+            if task.pid:
+                _kill_orphan(task)
+            task.status = "queued"
+            task.pid = None
+            TrainingExecutor._append_log(task, "[modeltrain] 服务重启，任务已重新排队")
+        if task.queued_at is None:
+            task.queued_at = datetime.now(timezone.utc)
+    db.commit()
+    return len(tasks)
+
+
+training_executor = TrainingExecutor()
@@ -0,0 +1,329 @@
+"""
+训练进度与指标提取
+训练运行期间增量读取两路输出并合并为一份最新状态：
+- output_dir/trainer_log.jsonl：LLaMA-Factory 每个 logging_steps 追加一行（步数、loss、学习率、剩余时间、吞吐）；
+- 训练进程的 stdout（train.log）：transformers 打印的指标字典与 tqdm 进度条，作为 trainer_log 缺失时的补充。
+状态先在内存中更新，由单个写入循环每 TRAINING_PROGRESS_INTERVAL 秒把所有有变化的任务在一个事务里写回
+TrainingTask.progress / metrics，避免逐行写库；带步数的指标点同时追加到 metrics_store 的时间序列文件。
+"""
+
+import ast
+import asyncio
+import logging
+import os
+import re
+from contextlib import aclosing
+from typing import Any, Dict, List, Optional
+
+import orjson
+from fastapi.concurrency import run_in_threadpool
+
+from app.database import SessionLocal
+from app.models.training import TrainingTask
+from app.services.log_tail import follow_log, read_log_range
+from app.services.metrics_store import MetricsWriter, truncate_metrics
+
+logger = logging.getLogger(__name__)
+
+# 进度写库的最小间隔（秒），同一轮内所有任务批量提交
+TRAINING_PROGRESS_INTERVAL = float(os.getenv("TRAINING_PROGRESS_INTERVAL", "5"))
+# trainer_log.jsonl 的轮询间隔（秒）
+TRAINER_LOG_POLL_INTERVAL = 2.0
+TRAINER_LOG_FILE = "trainer_log.jsonl"
+
+# tqdm 训练进度条："  5%|▌    | 10/200 [00:10<03:10,  1.00it/s]"
+_TQDM_RE = re.compile(r"(\d+)/(\d+) \[([\d:]+)<([\d:?]+),\s*([\d.]+)(it/s|s/it)")
+# transformers 打印的指标字典："{'loss': 1.23, 'grad_norm': 0.5, 'learning_rate': 5e-05, 'epoch': 0.1}"
+_METRICS_DICT_RE = re.compile(r"\{'(?:loss|eval_\w+|train_runtime)'[^{}]*\}")
+_DURATION_RE = re.compile(r"(?:(\d+) days?, )?(\d+):(\d{1,2})(?::(\d{1,2}))?$")
+_LINE_SPLIT_RE = re.compile(rb"[\r\n]+")
+
+# transformers 指标名 → 统一名称
+_HF_KEYS = {
+    "loss": "loss",
+    "learning_rate": "lr",
+    "grad_norm": "grad_norm",
+    "epoch": "epoch",
+    "train_samples_per_second": "samples_per_second",
+    "train_steps_per_second": "steps_per_second",
+    "train_runtime": "elapsed_seconds",
+    "train_loss": "train_loss",
+}
+# LLaMA-Factory trainer_log.jsonl 字段 → 统一名称
+_LF_KEYS = {
+    "current_steps": "step",
+    "total_steps": "total_steps",
+    "loss": "loss",
+    "eval_loss": "eval_loss",
+    "lr": "lr",
+    "epoch": "epoch",
+    "throughput": "tokens_per_second",
+    "total_tokens": "total_tokens",
+}
+
+
+def parse_duration(text: Any) -> Optional[float]:
+    """把 "1:02:03" / "02:03" / "1 day, 0:00:05" 解析为秒数，无法解析时返回 None"""
+    match = _DURATION_RE.search(str(text).strip())
+    if not match:
+        return None
+    days, first, second, third = match.groups()
+    if third is None:
+        hours, minutes, seconds = 0, int(first), int(second)
+    else:
+        hours, minutes, seconds = int(first), int(second), int(third)
+    return float(int(days or 0) * 86400 + hours * 3600 + minutes * 60 + seconds)
+
+
+def parse_trainer_log_entry(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """把 trainer_log.jsonl 中的一行转为统一字段"""
+    update = {name: entry[key] for key, name in _LF_KEYS.items() if entry.get(key) is not None}
+    for key, name in (("elapsed_time", "elapsed_seconds"), ("remaining_time", "eta_seconds")):
+        seconds = parse_duration(entry.get(key)) if entry.get(key) is not None else None
+        if seconds is not None:
+            update[name] = seconds
+    return update
+
+
+def parse_stdout_line(line: str) -> Optional[Dict[str, Any]]:
+    """从训练进程的一行输出中提取指标；不含指标时返回 None"""
+    match = _METRICS_DICT_RE.search(line)
+    if match:
+        try:
+            values = ast.literal_eval(match.group(0))
+        except (ValueError, SyntaxError):
+            return None
+        update = {_HF_KEYS[key]: value for key, value in values.items() if key in _HF_KEYS}
+        update.update({key: value for key, value in values.items() if key.startswith("eval_") and isinstance(value, (int, float))})
+        return update or None
+    match = _TQDM_RE.search(line)
+    if match:
+        step, total, elapsed, remaining, rate, unit = match.groups()
+        rate = float(rate)
+        update = {
+            "step": int(step),
+            "total_steps": int(total),
+            "steps_per_second": rate if unit == "it/s" else (1 / rate if rate else 0.0),
+        }
+        for name, text in (("elapsed_seconds", elapsed), ("eta_seconds", remaining)):
+            seconds = parse_duration(text)
+            if seconds is not None:
+                update[name] = seconds
+        return update
+    return None
+
+
+def prepare_run_outputs(output_dir: str, resume_step: int) -> int:
+    """训练进程启动前调用（同步，在线程池中调用），返回 trainer_log.jsonl 的起始读取位置
+
+    - 全新运行（resume_step 为 0）：清空指标序列，旧 trainer_log.jsonl 改名为 .prev，
+      否则 LLaMA-Factory 会接着旧文件追加，旧运行的记录会被当作本次运行的指标；
+    - 从 checkpoint-N 恢复：指标序列截断到第 N 步，trainer_log.jsonl 只读取本次运行新追加的内容。
+    """
+    truncate_metrics(output_dir, resume_step)
+    trainer_log = os.path.join(output_dir, TRAINER_LOG_FILE)
+    if not resume_step:
+        if os.path.exists(trainer_log):
+            os.replace(trainer_log, trainer_log + ".prev")
+        return 0
+    try:
+        return os.path.getsize(trainer_log)
+    except OSError:
+        return 0
+
+
+class TrainingMonitor:
+    """单个运行中训练任务的解析器；状态只在内存中合并，由 ProgressTracker 统一写库"""
+
+    def __init__(self, task_id: int, log_file: str, output_dir: str, log_offset: int, samples_per_step: int,
+                 trainer_log_offset: int = 0):
+        self.task_id = task_id
+        self.log_file = log_file
+        self.trainer_log = os.path.join(output_dir, TRAINER_LOG_FILE)
+        self.samples_per_step = samples_per_step
+        self.metrics: Dict[str, Any] = {}
+        # apply 每次合并更新时递增；写库成功后记录写入时的版本，两者不同即有未写库的更新
+        self.version = 0
+        self.flushed_version = 0
+        self._log_position = log_offset
+        self._trainer_log_position = trainer_log_offset
+        # 首个 tqdm 进度条是训练进度条；之后出现的其他总数（评估进度条）忽略
+        self._train_total: Optional[int] = None
+        self._has_trainer_log = False
+        # 两路跟踪各自独立运行，stop 时一起取消；一路出错只记录日志，不影响另一路
+        self._tasks: List[asyncio.Task] = []
+        self.series = MetricsWriter(output_dir)
+
+    @property
+    def dirty(self) -> bool:
+        return self.version != self.flushed_version
+
+    @property
+    def progress(self) -> Optional[float]:
+        step, total = self.metrics.get("step"), self.metrics.get("total_steps")
+        if not step or not total:
+            return None
+        return min(step / total, 1.0)
+
+    def apply(self, update: Dict[str, Any], source: str) -> None:
+        if source == "stdout" and "total_steps" in update:
+            if self._has_trainer_log:
+                # trainer_log 已提供准确的步数与剩余时间，进度条只补充速度
+                update = {"steps_per_second": update["steps_per_second"]}
+            elif self._train_total is None:
+                self._train_total = update["total_steps"]
+            elif update["total_steps"] != self._train_total:
+                return
+        if source == "trainer_log":
+            self._has_trainer_log = True
+        self.metrics.update(update)
+        # 时间序列以 trainer_log 为准；没有 trainer_log 时用 stdout 指标字典，步数取最近一次进度条的值
+        if source == "trainer_log" or not self._has_trainer_log:
+            step = update.get("step", self.metrics.get("step"))
+            if step is not None:
+                self.series.append(step, update)
+        if "steps_per_second" in update and self.samples_per_step and "samples_per_second" not in update:
+            self.metrics["samples_per_second"] = round(update["steps_per_second"] * self.samples_per_step, 4)
+        self.version += 1
+
+    def _feed_stdout(self, data: bytes) -> None:
+        for raw in _LINE_SPLIT_RE.split(data):
+            if raw:
+                update = parse_stdout_line(raw.decode("utf-8", errors="replace"))
+                if update:
+                    self.apply(update, "stdout")
+
+    def _read_trainer_log(self) -> None:
+        """读取 trainer_log.jsonl 的新增完整行（同步，在线程池中调用）"""
+        try:
+            size = os.path.getsize(self.trainer_log)
+        except OSError:
+            return
+        if size < self._trainer_log_position:
+            # 文件被截断或重写：其中已全是新内容，从头读取
+            self._trainer_log_position = 0
+        while self._trainer_log_position < size:
+            data, next_position = read_log_range(self.trainer_log, self._trainer_log_position, size)
+            complete = data[:data.rfind(b"\n") + 1]
+            if not complete:
+                break
+            for line in complete.splitlines():
+                try:
+                    self.apply(parse_trainer_log_entry(orjson.loads(line)), "trainer_log")
+                except orjson.JSONDecodeError:
+                    continue
+            self._trainer_log_position += len(complete)
+
+    async def _follow_stdout(self) -> None:
+        async with aclosing(follow_log(self.log_file, self._log_position, TRAINER_LOG_POLL_INTERVAL)) as chunks:
+            async for chunk in chunks:
+                if chunk is not None:
+                    self._feed_stdout(chunk[2])
+                    self._log_position = chunk[1]
+
+    async def _follow_trainer_log(self) -> None:
+        while True:
+            await run_in_threadpool(self._read_trainer_log)
+            await asyncio.sleep(TRAINER_LOG_POLL_INTERVAL)
+
+    def start(self) -> None:
+        self._tasks = [
+            asyncio.create_task(self._guard("stdout", self._follow_stdout())),
+            asyncio.create_task(self._guard(TRAINER_LOG_FILE, self._follow_trainer_log())),
+        ]
+
+    async def _guard(self, source: str, follower) -> None:
+        try:
+            await follower
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception(f"训练任务 {self.task_id} 进度解析失败（{source}）")
+
+    async def stop(self) -> None:
+        """停止跟踪并读完两路输出中剩余的内容；无论读取是否出错都关闭指标序列"""
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        try:
+            while True:
+                data, next_position = await run_in_threadpool(read_log_range, self.log_file, self._log_position)
+                if not data:
+                    break
+                self._feed_stdout(data)
+                self._log_position = next_position
+            await run_in_threadpool(self._read_trainer_log)
+        finally:
+            await run_in_threadpool(self.series.close)
+
+
+class ProgressTracker:
+    """管理所有运行中任务的 TrainingMonitor，并批量、节流地把进度写回数据库"""
+
+    def __init__(self, interval: float = TRAINING_PROGRESS_INTERVAL):
+        self.interval = interval
+        self._monitors: Dict[int, TrainingMonitor] = {}
+        self._flusher: Optional[asyncio.Task] = None
+
+    def watch(self, task_id: int, log_file: str, output_dir: str, log_offset: int, samples_per_step: int = 0,
+              trainer_log_offset: int = 0) -> TrainingMonitor:
+        monitor = TrainingMonitor(task_id, log_file, output_dir, log_offset, samples_per_step, trainer_log_offset)
+        self._monitors[task_id] = monitor
+        monitor.start()
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+        return monitor
+
+    def snapshot(self, task_id: int) -> Optional[Dict[str, Any]]:
+        """内存中的最新指标（比数据库中的值最多新 interval 秒）"""
+        monitor = self._monitors.get(task_id)
+        return dict(monitor.metrics) if monitor else None
+
+    async def finish(self, task_id: int) -> None:
+        """训练进程退出后调用：读完剩余输出并立即写库（读取出错时仍写入已解析的部分）"""
+        monitor = self._monitors.pop(task_id, None)
+        if monitor is None:
+            return
+        try:
+            await monitor.stop()
+        finally:
+            await run_in_threadpool(self._write, [monitor])
+
+    async def _flush_loop(self) -> None:
+        while self._monitors:
+            await asyncio.sleep(self.interval)
+            dirty = [monitor for monitor in self._monitors.values() if monitor.dirty]
+            if dirty:
+                try:
+                    await run_in_threadpool(self._write, dirty)
+                except Exception:
+                    logger.exception("训练进度写库失败")
+
+    @staticmethod
+    def _write(monitors) -> None:
+        """一个事务内更新多个任务；只更新 progress/metrics 两列，不影响执行器维护的状态字段
+
+        同时把各任务缓冲的指标点写入时间序列文件，文件写入不占用事件循环。
+        注意：写库失败不清除 dirty，期间新到的更新也不会因本次写库被标记为已写入。
+        """
+        db = SessionLocal()
+        try:
+            versions = []
+            for monitor in monitors:
+                monitor.series.flush()
+                # 先记录版本再取值：取值之后 apply 的更新版本号更大，不会被误判为已写库
+                versions.append(monitor.version)
+                values: Dict[str, Any] = {"metrics": dict(monitor.metrics)}
+                if monitor.progress is not None:
+                    values["progress"] = monitor.progress
+                db.query(TrainingTask).filter(TrainingTask.id == monitor.task_id).update(values, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        # 只有提交成功才标记为已写库；失败时保持 dirty，下一轮重试
+        for monitor, version in zip(monitors, versions):
+            monitor.flushed_version = max(monitor.flushed_version, version)
+
+
+progress_tracker = ProgressTracker()
@@ -0,0 +1,281 @@
+"""
+文件上传服务
+以固定大小分块把上传内容写入磁盘（在线程池中执行，不阻塞事件循环），
+同时计算 SHA-256 与行数，并提供可断点续传的分块上传会话。
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass, asdict
+from typing import AsyncIterator, BinaryIO, Dict, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+# 每次读写的块大小
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# 数据集与图片的大小上限（字节），可通过环境变量调整
+MAX_DATASET_SIZE = int(os.getenv("MAX_DATASET_SIZE", str(20 * 1024 ** 3)))
+MAX_IMAGE_SIZE = int(os.getenv("MAX_IMAGE_SIZE", str(20 * 1024 ** 2)))
+# 断点续传会话的暂存目录与过期时间（秒）
+PARTIAL_UPLOAD_DIR = os.path.join("uploads", "datasets", ".partial")
+PARTIAL_UPLOAD_TTL = int(os.getenv("PARTIAL_UPLOAD_TTL", str(24 * 3600)))
+
+
+class UploadTooLargeError(Exception):
+    """上传内容超过大小上限"""
+
+    def __init__(self, limit: int):
+        super().__init__(f"文件大小超过上限 {limit} 字节")
+        self.limit = limit
+
+
+class UploadOffsetError(Exception):
+    """分块的起始偏移与服务端已接收字节数不一致"""
+
+    def __init__(self, expected: int):
+        super().__init__(f"分块偏移不匹配，服务端已接收 {expected} 字节")
+        self.expected = expected
+
+
+@dataclass
+class UploadResult:
+    """上传落盘结果"""
+    path: str
+    size: int
+    sha256: str
+    line_count: int
+
+
+class _DigestWriter:
+    """边写边算：SHA-256、行数与字节数"""
+
+    def __init__(self, fp: BinaryIO, max_size: Optional[int]):
+        self.fp = fp
+        self.max_size = max_size
+        self.hasher = hashlib.sha256()
+        self.size = 0
+        self.line_count = 0
+        self._last_byte = b""
+
+    def write(self, chunk: bytes) -> None:
+        if not chunk:
+            return
+        self.size += len(chunk)
+        if self.max_size is not None and self.size > self.max_size:
+            raise UploadTooLargeError(self.max_size)
+        self.hasher.update(chunk)
+        self.line_count += chunk.count(b"\n")
+        self._last_byte = chunk[-1:]
+        self.fp.write(chunk)
+
+    def total_lines(self) -> int:
+        # 末行没有换行符时也计为一行
+        return self.line_count + (1 if self._last_byte not in (b"", b"\n") else 0)
+
+
+def _copy_stream(src: BinaryIO, dest_path: str, max_size: Optional[int]) -> UploadResult:
+    tmp_path = f"{dest_path}.part"
+    try:
+        with open(tmp_path, "wb") as fp:
+            writer = _DigestWriter(fp, max_size)
+            while True:
+                chunk = src.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                writer.write(chunk)
+        os.replace(tmp_path, dest_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return UploadResult(dest_path, writer.size, writer.hasher.hexdigest(), writer.total_lines())
+
+
+async def save_upload_file(upload, dest_path: str, max_size: Optional[int] = None) -> UploadResult:
+    """把 UploadFile 分块写入 dest_path 并返回大小/哈希/行数
+
+    注意：
+    - 已知大小（upload.size）超限时直接拒绝，不做任何拷贝；
+    - 整个拷贝在线程池中完成，先写 .part 临时文件，成功后原子重命名；
+    - 超限或异常时删除临时文件，不会留下半截文件。
+    """
+    if max_size is not None and upload.size is not None and upload.size > max_size:
+        raise UploadTooLargeError(max_size)
+    await upload.seek(0)
+    return await run_in_threadpool(_copy_stream, upload.file, dest_path, max_size)
+
+
+def hash_file(path: str) -> UploadResult:
+    """对已落盘文件重新计算大小/哈希/行数（同步函数，需在线程池中调用）"""
+    with open(path, "rb") as src, open(os.devnull, "wb") as sink:
+        writer = _DigestWriter(sink, None)
+        while True:
+            chunk = src.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            writer.write(chunk)
+    return UploadResult(path, writer.size, writer.hasher.hexdigest(), writer.total_lines())
+
+
+@dataclass
+class UploadSession:
+    """断点续传会话元数据（以 JSON 旁路文件持久化，进程重启后仍可续传）"""
+    upload_id: str
+    filename: str
+    total_size: int
+    user_id: int
+    created_at: float
+    received: int = 0
+
+    @property
+    def data_path(self) -> str:
+        return os.path.join(PARTIAL_UPLOAD_DIR, f"{self.upload_id}.bin")
+
+    @property
+    def meta_path(self) -> str:
+        return os.path.join(PARTIAL_UPLOAD_DIR, f"{self.upload_id}.json")
+
+
+class ChunkedUploadManager:
+    """可续传的分块上传
+
+    流程：create() 建立会话 → append() 按偏移顺序追加分块（重复发送已接收的区间会得到 409 与当前偏移）
+    → complete() 校验大小并返回哈希与行数。哈希状态保存在内存中随分块增量更新；
+    若进程重启导致状态丢失，complete() 时会重新扫描文件计算。
+    """
+
+    def __init__(self, base_dir: str = PARTIAL_UPLOAD_DIR):
+        self.base_dir = base_dir
+        self._digests: Dict[str, _DigestWriter] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._guard = threading.Lock()
+
+    def _lock_for(self, upload_id: str) -> asyncio.Lock:
+        with self._guard:
+            return self._locks.setdefault(upload_id, asyncio.Lock())
+
+    def _save(self, session: UploadSession) -> None:
+        tmp = f"{session.meta_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(asdict(session), f)
+        os.replace(tmp, session.meta_path)
+
+    def create(self, filename: str, total_size: int, user_id: int, max_size: int = MAX_DATASET_SIZE) -> UploadSession:
+        if total_size > max_size:
+            raise UploadTooLargeError(max_size)
+        os.makedirs(self.base_dir, exist_ok=True)
+        self.cleanup_expired()
+        session = UploadSession(
+            upload_id=uuid.uuid4().hex,
+            filename=filename,
+            total_size=total_size,
+            user_id=user_id,
+            created_at=time.time(),
+        )
+        open(session.data_path, "wb").close()
+        self._save(session)
+        return session
+
+    def get(self, upload_id: str) -> Optional[UploadSession]:
+        if not upload_id.isalnum():
+            return None
+        meta_path = os.path.join(self.base_dir, f"{upload_id}.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, "r", encoding="utf-8") as f:
+            session = UploadSession(**json.load(f))
+        # 以磁盘上的实际字节数为准（上次写入可能在更新元数据前中断）
+        if os.path.exists(session.data_path):
+            session.received = os.path.getsize(session.data_path)
+        return session
+
+    async def append(self, session: UploadSession, offset: int, body: AsyncIterator[bytes]) -> UploadSession:
+        """从 offset 处追加请求体中的字节流，按 UPLOAD_CHUNK_SIZE 攒批后在线程池中写盘"""
+        async with self._lock_for(session.upload_id):
+            session = self.get(session.upload_id) or session
+            if offset != session.received:
+                raise UploadOffsetError(session.received)
+
+            digest = self._digests.get(session.upload_id)
+            fp = await run_in_threadpool(open, session.data_path, "ab")
+            try:
+                if digest is None or digest.size != session.received:
+                    # 哈希状态丢失（例如进程重启），改为只写文件，complete 时重新计算
+                    self._digests.pop(session.upload_id, None)
+                    digest = None
+                    writer = _DigestWriter(fp, None)
+                else:
+                    digest.fp = fp
+                    writer = digest
+
+                start_size = writer.size
+                buffer = bytearray()
+                async for chunk in body:
+                    if session.received + (writer.size - start_size) + len(buffer) + len(chunk) > session.total_size:
+                        raise UploadTooLargeError(session.total_size)
+                    buffer.extend(chunk)
+                    if len(buffer) >= UPLOAD_CHUNK_SIZE:
+                        await run_in_threadpool(writer.write, bytes(buffer))
+                        buffer.clear()
+                if buffer:
+                    await run_in_threadpool(writer.write, bytes(buffer))
+                await run_in_threadpool(fp.flush)
+            finally:
+                await run_in_threadpool(fp.close)
+
+            if digest is None and session.received == 0:
+                # 第一个分块从零开始写，哈希状态完整，可继续增量计算
+                self._digests[session.upload_id] = writer
+            session.received += writer.size - start_size
+            await run_in_threadpool(self._save, session)
+            return session
+
+    async def complete(self, session: UploadSession, dest_path: str) -> UploadResult:
+        """校验已接收完整，把暂存文件移动到 dest_path 并返回哈希与行数"""
+        async with self._lock_for(session.upload_id):
+            session = self.get(session.upload_id) or session
+            if session.received != session.total_size:
+                raise UploadOffsetError(session.received)
+            digest = self._digests.pop(session.upload_id, None)
+            if digest is not None and digest.size == session.total_size:
+                result = UploadResult(dest_path, digest.size, digest.hasher.hexdigest(), digest.total_lines())
+            else:
+                result = await run_in_threadpool(hash_file, session.data_path)
+                result.path = dest_path
+            await run_in_threadpool(os.replace, session.data_path, dest_path)
+            await run_in_threadpool(self._remove_meta, session)
+        return result
+
+    def abort(self, session: UploadSession) -> None:
+        self._digests.pop(session.upload_id, None)
+        for path in (session.data_path, session.meta_path):
+            if os.path.exists(path):
+                os.remove(path)
+        with self._guard:
+            self._locks.pop(session.upload_id, None)
+
+    def _remove_meta(self, session: UploadSession) -> None:
+        if os.path.exists(session.meta_path):
+            os.remove(session.meta_path)
+        with self._guard:
+            self._locks.pop(session.upload_id, None)
+
+    def cleanup_expired(self) -> None:
+        """删除超过 PARTIAL_UPLOAD_TTL 未完成的会话"""
+        if not os.path.isdir(self.base_dir):
+            return
+        deadline = time.time() - PARTIAL_UPLOAD_TTL
+        for name in os.listdir(self.base_dir):
+            if not name.endswith(".json"):
+                continue
+            session = self.get(name[:-5])
+            if session and session.created_at < deadline:
+                self.abort(session)
+
+
+upload_manager = ChunkedUploadManager()
@@ -24,7 +24,12 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
 
+# SSE 流令牌有效期（秒）：只在建立连接时校验，已建立的流不受影响
+STREAM_TOKEN_EXPIRE_SECONDS = int(os.getenv("STREAM_TOKEN_EXPIRE_SECONDS", "300"))
+
 security = HTTPBearer()
+# 允许缺少 Authorization 头（改用其它方式鉴权）的接口使用
+optional_security = HTTPBearer(auto_error=False)
 
 
 def verify_password(plain_password: str, password_hash: str) -> bool:
@@ -66,6 +71,27 @@ def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def create_stream_token(user_id: int, scope: str) -> str:
+    """创建 SSE 流专用的短期令牌
+
+    浏览器原生 EventSource 不能设置 Authorization 请求头，令牌只能放在 URL 查询参数中，
+    因此只对 scope 指定的一个流有效，且不含 sub，不能当作访问令牌调用其它接口。
+    """
+    expire = datetime.now(timezone.utc) + timedelta(seconds=STREAM_TOKEN_EXPIRE_SECONDS)
+    return jwt.encode({"uid": user_id, "scope": scope, "type": "stream", "exp": expire}, SECRET_KEY, algorithm=ALGORITHM)
+
+def get_stream_user(db: Session, token: str, scope: str) -> User:
+    """校验流令牌并返回对应用户；无效、过期或 scope 不符时返回 401，账号被禁用时返回 403"""
+    payload = verify_token(token)
+    if payload is None or payload.get("type") != "stream" or payload.get("scope") != scope:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="流令牌无效或已过期")
+    user = db.query(User).filter(User.id == payload.get("uid")).first()
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="用户不存在")
+    if not user.is_active:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="账号已被禁用")
+    return user
+
 def verify_token(token: str) -> Optional[dict]:
     """检查通行证是否有效 - 解密并验证用户通行证"""
     try:
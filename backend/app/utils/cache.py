@@ -0,0 +1,104 @@
+"""
+进程内 TTL 缓存
+为变化不频繁的只读接口提供带过期时间的内存缓存，并为缓存内容生成 ETag，
+配合 If-None-Match 条件请求让前端在数据未变化时直接收到 304。
+"""
+
+import hashlib
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+@dataclass
+class CacheEntry:
+    """缓存条目：值、ETag 与写入/过期时间（time.monotonic 秒）"""
+    value: Any
+    etag: str
+    stored_at: float
+    expires_at: float
+    meta: Dict[str, Any] = field(default_factory=dict)
+
+    def is_fresh(self, now: Optional[float] = None) -> bool:
+        return (now if now is not None else time.monotonic()) < self.expires_at
+
+
+def compute_etag(value: Any) -> str:
+    """根据 JSON 序列化结果计算强 ETag（键排序，保证同内容同标签）"""
+    raw = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+    return f'"{hashlib.sha1(raw).hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """判断请求头 If-None-Match 是否命中当前 ETag（支持 *、逗号分隔列表与弱标签 W/）"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+class TTLCache:
+    """线程安全的 TTL 缓存
+
+    参数：
+    - ttl：条目存活秒数。
+    - maxsize：最多保留的条目数，超出时淘汰最早写入的条目。
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 256):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: Dict[Hashable, CacheEntry] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[CacheEntry]:
+        """返回未过期的条目；过期或不存在返回 None"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if not entry.is_fresh():
+                del self._data[key]
+                return None
+            return entry
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> CacheEntry:
+        """写入条目并返回（附带计算好的 ETag）"""
+        now = time.monotonic()
+        entry = CacheEntry(
+            value=value,
+            etag=compute_etag(value),
+            stored_at=now,
+            expires_at=now + (ttl if ttl is not None else self.ttl),
+        )
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = entry
+            while len(self._data) > self.maxsize:
+                self._data.pop(next(iter(self._data)))
+        return entry
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """删除指定条目；key 为空时清空整个缓存"""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """删除键满足条件的所有条目，返回删除数量"""
+        with self._lock:
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                del self._data[key]
+        return len(keys)
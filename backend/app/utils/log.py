@@ -0,0 +1,165 @@
+"""
+日志管线
+所有日志记录经 QueueHandler 放入内存队列，由后台 QueueListener 线程统一写控制台与文件，
+请求路径上只做一次入队操作，不会发生阻塞的文件 I/O。
+"""
+
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+from datetime import datetime, timezone
+from typing import Any, Iterable, List, Optional
+
+# 刷新模型等调试细节使用的专用日志器，单独落盘到 debug_refresh.log
+REFRESH_DEBUG_LOGGER = "modeltrain.refresh"
+
+# 大负载日志：超过该字符数只记录摘要
+PAYLOAD_LOG_LIMIT = int(os.getenv("LOG_PAYLOAD_LIMIT", "2000"))
+# 超限负载按该概率在 DEBUG 级别记录完整内容（0 表示从不记录）
+PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.01"))
+
+# LogRecord 自带属性，JSON 格式化时其余属性视为 extra 字段输出
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """把日志记录格式化为单行 JSON，extra 传入的字段原样保留"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "time": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class _StructuredQueueHandler(logging.handlers.QueueHandler):
+    """入队前只合并消息参数与异常文本，保留 extra 字段交给后台线程格式化"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class _LoggerNameFilter(logging.Filter):
+    """按日志器名前缀放行（include）或排除（exclude）"""
+
+    def __init__(self, prefixes: Iterable[str], exclude: bool = False):
+        super().__init__()
+        self.prefixes = tuple(prefixes)
+        self.exclude = exclude
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        matched = record.name.startswith(self.prefixes)
+        return not matched if self.exclude else matched
+
+
+def setup_logging(base_dir: str, level: int = logging.INFO) -> logging.handlers.QueueListener:
+    """初始化队列化日志管线（幂等，可重复调用）
+
+    参数：
+    - base_dir：后端目录，debug_refresh.log 写在该目录下。
+    - level：根日志级别。
+
+    环境变量：
+    - LOG_FORMAT=json：控制台也输出 JSON（默认人类可读文本）。
+    - LOG_FILE：额外把所有日志以 JSON 写入该文件（按 10MB 轮转）。
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    console = logging.StreamHandler()
+    if os.getenv("LOG_FORMAT", "text") == "json":
+        console.setFormatter(JsonFormatter())
+    else:
+        console.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    console.addFilter(_LoggerNameFilter([REFRESH_DEBUG_LOGGER], exclude=True))
+
+    refresh_file = logging.handlers.RotatingFileHandler(
+        os.path.join(base_dir, "debug_refresh.log"),
+        maxBytes=5 * 1024 * 1024, backupCount=3, encoding="utf-8", delay=True
+    )
+    refresh_file.setFormatter(JsonFormatter())
+    refresh_file.addFilter(_LoggerNameFilter([REFRESH_DEBUG_LOGGER]))
+
+    handlers: List[logging.Handler] = [console, refresh_file]
+    log_file = os.getenv("LOG_FILE")
+    if log_file:
+        app_file = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=10 * 1024 * 1024, backupCount=5, encoding="utf-8", delay=True
+        )
+        app_file.setFormatter(JsonFormatter())
+        handlers.append(app_file)
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_StructuredQueueHandler(log_queue))
+    root.setLevel(level)
+    logging.getLogger(REFRESH_DEBUG_LOGGER).setLevel(logging.DEBUG)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging() -> None:
+    """停止后台监听线程，并把队列中剩余的日志全部写出"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def _serialize(data: Any) -> str:
+    try:
+        return json.dumps(data, ensure_ascii=False, default=str)
+    except (TypeError, ValueError):
+        return repr(data)
+
+
+def summarize_payload(data: Any, limit: int = PAYLOAD_LOG_LIMIT) -> str:
+    """把任意负载转为适合日志的短文本：未超限原样返回，超限返回结构摘要与截断预览"""
+    text = _serialize(data)
+    if len(text) <= limit:
+        return text
+    if isinstance(data, dict):
+        shape = f"dict keys={list(data.keys())[:20]}"
+    elif isinstance(data, (list, tuple)):
+        shape = f"{type(data).__name__} len={len(data)}"
+    else:
+        shape = type(data).__name__
+    return f"<{shape}, {len(text)} chars> {text[:limit]}..."
+
+
+def log_payload(logger: logging.Logger, message: str, data: Any, level: int = logging.INFO) -> None:
+    """记录负载：大负载只记摘要，并按 PAYLOAD_SAMPLE_RATE 抽样在 DEBUG 级别记录全文"""
+    if not logger.isEnabledFor(level):
+        return
+    text = _serialize(data)
+    logger.log(level, "%s: %s", message, summarize_payload(data))
+    if (len(text) > PAYLOAD_LOG_LIMIT and PAYLOAD_SAMPLE_RATE > 0
+            and logger.isEnabledFor(logging.DEBUG) and random.random() < PAYLOAD_SAMPLE_RATE):
+        logger.debug("%s（抽样全文）", message, extra={"payload": text})
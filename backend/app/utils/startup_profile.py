@@ -0,0 +1,128 @@
+"""
+启动耗时分析
+STARTUP_PROFILE=1 时在导入阶段挂载计时钩子，记录每个模块的导入耗时（含子模块与不含子模块两种口径），
+并与 lifespan 中各初始化步骤的耗时一起在启动完成时输出到日志。未开启时只对初始化步骤计时，开销可忽略。
+本模块只依赖标准库，需在 main.py 中先于其他导入加载才能覆盖全部导入。
+"""
+
+import importlib.abc
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# 报告中列出的最慢模块数
+PROFILE_TOP_IMPORTS = int(os.getenv("STARTUP_PROFILE_TOP", "25"))
+# 初始化步骤总耗时预算（秒），超出时输出警告，便于发现启动退化
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "1.0"))
+
+
+class _ImportTimer(importlib.abc.MetaPathFinder):
+    """包装其余 finder 返回的 loader.exec_module，按调用栈计算模块导入的包含/自身耗时"""
+
+    def __init__(self, profiler: "StartupProfiler"):
+        self.profiler = profiler
+        self._stack: List[List[float]] = []  # 每层：[开始时间, 子模块累计耗时]
+
+    def find_spec(self, name, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is None:
+                continue
+            loader = spec.loader
+            # 内置/冻结模块的 loader 是类本身，包装会影响全局，跳过
+            if loader is not None and not isinstance(loader, type) and hasattr(loader, "exec_module"):
+                loader.exec_module = self._wrap(name, loader.exec_module)
+            return spec
+        return None
+
+    def _wrap(self, name: str, exec_module):
+        def timed_exec_module(module):
+            frame = [time.perf_counter(), 0.0]
+            self._stack.append(frame)
+            try:
+                exec_module(module)
+            finally:
+                self._stack.pop()
+                inclusive = time.perf_counter() - frame[0]
+                if self._stack:
+                    self._stack[-1][1] += inclusive
+                self.profiler.imports.append((name, inclusive, inclusive - frame[1]))
+        return timed_exec_module
+
+
+class StartupProfiler:
+    """记录导入与初始化步骤耗时"""
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.created = time.perf_counter()
+        self.imports: List[Tuple[str, float, float]] = []  # (模块, 包含子模块耗时, 自身耗时)
+        self.steps: List[Tuple[str, float]] = []
+        self._hook: Optional[_ImportTimer] = None
+
+    def install_import_hook(self) -> None:
+        if self._hook is None:
+            self._hook = _ImportTimer(self)
+            sys.meta_path.insert(0, self._hook)
+
+    def remove_import_hook(self) -> None:
+        if self._hook is not None:
+            try:
+                sys.meta_path.remove(self._hook)
+            except ValueError:
+                pass
+            self._hook = None
+
+    @contextmanager
+    def step(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps.append((name, time.perf_counter() - started))
+
+    def report(self) -> Dict[str, Any]:
+        slowest = sorted(self.imports, key=lambda item: item[2], reverse=True)[:PROFILE_TOP_IMPORTS]
+        return {
+            "since_import_seconds": round(time.perf_counter() - self.created, 3),
+            "steps": [{"name": name, "seconds": round(seconds, 4)} for name, seconds in self.steps],
+            "imports": [
+                {"module": name, "seconds": round(inclusive, 4), "self_seconds": round(own, 4)}
+                for name, inclusive, own in slowest
+            ],
+        }
+
+    def finish(self, logger: logging.Logger) -> Dict[str, Any]:
+        """启动完成时调用：开启分析时输出报告并卸载导入钩子；步骤记录清空，供下一次启动重新计时"""
+        report = self.report()
+        total = sum(item["seconds"] for item in report["steps"])
+        if total > STARTUP_BUDGET_SECONDS:
+            slowest = max(report["steps"], key=lambda item: item["seconds"])
+            logger.warning(
+                f"初始化步骤耗时 {total:.3f}s 超出预算 {STARTUP_BUDGET_SECONDS:.1f}s，"
+                f"最慢步骤 {slowest['name']}（{slowest['seconds']:.3f}s）"
+            )
+        if self.enabled:
+            self.remove_import_hook()
+            lines = [f"启动耗时分析（自导入 main 起 {report['since_import_seconds']:.3f}s）", "初始化步骤："]
+            lines += [f"  {item['seconds'] * 1000:9.1f} ms  {item['name']}" for item in report["steps"]]
+            lines.append(f"最慢的 {len(report['imports'])} 个模块导入（自身 / 含子模块）：")
+            lines += [
+                f"  {item['self_seconds'] * 1000:9.1f} ms / {item['seconds'] * 1000:9.1f} ms  {item['module']}"
+                for item in report["imports"]
+            ]
+            logger.info("\n".join(lines))
+        else:
+            logger.info(f"初始化步骤耗时 {total:.3f}s（设置 STARTUP_PROFILE=1 查看明细）")
+        self.steps = []
+        return report
+
+
+startup_profile = StartupProfiler(enabled=os.getenv("STARTUP_PROFILE", "").lower() in ("1", "true", "yes"))
+if startup_profile.enabled:
+    startup_profile.install_import_hook()
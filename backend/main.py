@@ -1,3 +1,4 @@
+from app.utils.startup_profile import startup_profile  # 启动耗时分析（须最先导入，STARTUP_PROFILE=1 时记录各模块导入耗时）
 from fastapi import FastAPI, Depends, HTTPException, status  # FastAPI 核心框架与常用类型
 from fastapi.middleware.cors import CORSMiddleware  # CORS 中间件，用于跨域设置
 from fastapi.staticfiles import StaticFiles  # 静态资源服务
@@ -7,15 +8,24 @@ import os  # 读取环境变量
 import logging  # 统一日志接口
 from dotenv import load_dotenv  # 读取 .env 文件中的环境变量
 from contextlib import asynccontextmanager  # 用于新版 lifespan
-import subprocess  # 启动子进程（如 LLaMA-Factory）
 
-from app.database import SessionLocal, engine, get_db  # 数据库会话工厂与依赖
-from app.api import auth, chat, model, training, admin, model_config, playground, dify  # 各业务路由模块
+from app.database import SessionLocal, engine, get_db, init_schema  # 数据库会话工厂、依赖与表结构初始化
+from app.api import auth, chat, model, training, admin, model_config, playground, dify, evaluation, batch_inference  # 各业务路由模块
 # 导入所有模型以确保 Base.metadata.create_all 能创建所有表
-from app.models import user, chat as chat_models, model as model_models, model_config as model_config_models, training as training_models
+from app.models import user, chat as chat_models, model as model_models, model_config as model_config_models, training as training_models, evaluation as evaluation_models, batch_inference as batch_inference_models
 from app.utils.auth import create_admin_user  # 管理员初始化工具
 from app.api.model_config import init_default_model_configs  # 默认模型配置初始化
 from app.schemas.common import ErrorResponse, ErrorDetail  # 统一错误响应模型
+from app.utils.log import setup_logging, shutdown_logging  # 队列化日志管线
+from app.services.dataset_validator import reset_interrupted_validations, shutdown_process_pool  # 数据集校验进程池与中断校验收尾
+from app.services.dataset_jobs import fail_interrupted_jobs  # 数据集后台任务收尾
+from app.services.adapter_deploy import fail_interrupted_deployments  # 模型部署收尾
+from app.services.training_executor import training_executor, recover_interrupted_tasks  # 训练任务调度器
+from app.services.evaluation_runner import evaluation_manager  # 模型评估任务
+from app.services.batch_inference import batch_inference_manager  # 批量推理任务
+from app.services.process_supervisor import process_supervisor  # 辅助服务进程监管
+from app.services.dify_client import dify_client  # Dify 共享连接池
+from app.llm_core.base_client import close_http_clients  # 模型调用共享连接池
 
 # 读取 backend/.env（确保无论从哪里启动都能加载到）
 # 作用（为什么存在）：
@@ -31,14 +41,13 @@ load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"))
 # 作用：
 # - 提供统一的日志级别与格式，便于排错与日志聚合。
 # 触发：
-# - 模块导入时配置全局 logging。
+# - 模块导入时配置全局 logging：根日志器只挂 QueueHandler，由后台线程写控制台/文件，请求路径不做文件 I/O。
 # 参数说明：
 # - level：根据 ENVIRONMENT 控制日志级别（生产 INFO，开发 DEBUG）。
-# - format：统一日志输出格式（时间-模块-级别-消息）。
-logging.basicConfig(
-    level=logging.INFO if os.getenv("ENVIRONMENT", "development") == "production" else logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# - LOG_FORMAT / LOG_FILE：见 app/utils/log.py（JSON 输出与全量日志文件）。
+LOG_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LOG_LEVEL = logging.INFO if os.getenv("ENVIRONMENT", "development") == "production" else logging.DEBUG
+setup_logging(base_dir=LOG_BASE_DIR, level=LOG_LEVEL)
 # logger：本模块专用日志记录器
 logger = logging.getLogger(__name__)
 
@@ -54,65 +63,53 @@ async def lifespan(app: FastAPI):
     触发：
     - FastAPI 启动/关闭时自动调用
     """
-    # 启动时执行
+    # 启动时执行（日志管线幂等初始化；上一次关闭后重新进入生命周期时会重建监听线程）
+    setup_logging(base_dir=LOG_BASE_DIR, level=LOG_LEVEL)
     logger.info("应用启动中...")
 
-    # 启动 LLaMA-Factory Web UI（端口 7860）
-    llamafactory_proc = None
-    try:
-        logger.info("尝试启动 LLaMA-Factory Web UI...")
-        env = os.environ.copy()
-        env["GRADIO_SERVER_NAME"] = "0.0.0.0"
-        env["GRADIO_OPEN_BROWSER"] = "false"
-        env["BROWSER"] = ""
-        lf_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "start_lf.py")
-        llamafactory_proc = subprocess.Popen(
-            ["python", lf_script],
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-            env=env,
-        )
-        logger.info("LLaMA-Factory Web UI 子进程已启动，PID=%s", llamafactory_proc.pid)
-    except FileNotFoundError:
-        logger.error("无法找到 'llamafactory-cli' 命令，请确认 LLaMA-Factory 已正确安装到当前环境中。")
-    except Exception as e:
-        logger.error("启动 LLaMA-Factory 失败: %s", e)
-    app.state.llamafactory_proc = llamafactory_proc
-
-    # 启动 SwanBoard 可视化服务（端口 5092）
-    swanlab_proc = None
-    try:
-        data_dir = os.path.join(os.path.dirname(__file__), "swanlab_data")
-        os.makedirs(data_dir, exist_ok=True)
-        # 检查是否有训练数据
-        if os.listdir(data_dir):
-            logger.info("尝试启动 SwanBoard 可视化服务（:5092）...")
-            sb_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "start_swanboard.py")
-            swanlab_proc = subprocess.Popen(
-                ["python", sb_script, data_dir.replace("\\", "/"), "0.0.0.0", "5092"],
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-            )
-            logger.info("SwanBoard 子进程已启动，PID=%s", swanlab_proc.pid)
+    # LLaMA-Factory Web UI（端口 7860）与 SwanBoard（端口 5092）不在此启动：
+    # 前端在“模型训练”/“训练可视化”页面可见时轮询 /training/llamafactory/health 与 /training/swanlab/health，
+    # 由监管器按需拉起；轮询同时续期，页面关闭后空闲超时才回收，API 进程自身启动不受其拖累
+
+    # 创建所有表并补齐新增列（表结构指纹与上次启动一致时跳过）
+    with startup_profile.step("init_schema"):
+        if init_schema(engine):
+            logger.info("数据库表结构已创建或已同步")
         else:
-            logger.info("SwanLab 数据目录为空，跳过 SwanBoard 启动（训练后可手动启动）")
-    except Exception as e:
-        logger.error("启动 SwanBoard 失败: %s", e)
-    app.state.swanlab_proc = swanlab_proc
+            logger.info("数据库表结构未变化，跳过建表")
 
-    # 创建所有表（如果不存在）
-    from app.database import Base
-    Base.metadata.create_all(bind=engine)
-    logger.info("数据库表结构已创建或已存在")
+    # 初始化默认数据（每一步单独计时，STARTUP_PROFILE=1 时输出明细）
+    db = SessionLocal()
+    try:
+        with startup_profile.step("create_admin_user"):
+            create_admin_user(db)  # 确保默认管理员账号存在
+        with startup_profile.step("fail_interrupted_jobs"):
+            fail_interrupted_jobs(db)  # 上次未结束的数据集任务已随旧进程中断
+        with startup_profile.step("reset_interrupted_validations"):
+            reset_interrupted_validations(db)  # 上次未完成的数据集校验同样已中断，允许重新提交
+        with startup_profile.step("fail_interrupted_deployments"):
+            fail_interrupted_deployments(db)  # 上次未结束的模型部署同样已中断
+        with startup_profile.step("recover_interrupted_tasks"):
+            recover_interrupted_tasks(db)  # 上次运行中的训练任务放回持久化队列
+        with startup_profile.step("init_default_model_configs"):
+            await init_default_model_configs(db)  # 初始化默认模型配置（模板未变化时跳过）
+    finally:
+        db.close()
 
-    # 初始化默认数据
+    with startup_profile.step("training_executor.start"):
+        training_executor.start()  # 启动训练调度循环，继续执行队列中的任务
     db = SessionLocal()
     try:
-        create_admin_user(db)  # 确保默认管理员账号存在
-        await init_default_model_configs(db)  # 初始化默认模型配置
+        with startup_profile.step("recover_background_jobs"):
+            evaluation_manager.recover(db)  # 从中断处继续上次未完成的评估
+            batch_inference_manager.recover(db)  # 批量推理从最近一次检查点续跑
     finally:
         db.close()
 
+    with startup_profile.step("dify_client.start"):
+        dify_client.start()  # Dify 代理接口共用的连接池
+
+    startup_profile.finish(logger)
     logger.info("应用启动完成")
     
     yield  # 应用运行期间
@@ -120,23 +117,25 @@ async def lifespan(app: FastAPI):
     # 关闭时执行（可选）
     logger.info("应用关闭中...")
 
-    # 关闭 LLaMA-Factory 子进程（如果有）
-    if llamafactory_proc is not None:
-        try:
-            logger.info("关闭 LLaMA-Factory（PID=%s）...", llamafactory_proc.pid)
-            llamafactory_proc.terminate()
-            llamafactory_proc.wait(timeout=10)
-        except Exception as e:
-            logger.error("关闭 LLaMA-Factory 失败: %s", e)
-
-    # 关闭 SwanLab 子进程（如果有，由前端手动启动的）
-    if getattr(app.state, 'swanlab_proc', None) is not None:
-        try:
-            logger.info("关闭 SwanLab（PID=%s）...", app.state.swanlab_proc.pid)
-            app.state.swanlab_proc.terminate()
-            app.state.swanlab_proc.wait(timeout=10)
-        except Exception as e:
-            logger.error("关闭 SwanLab 失败: %s", e)
+    # 关闭受监管的 LLaMA-Factory / SwanBoard 子进程（连同其派生进程）
+    await process_supervisor.shutdown()
+
+    # 结束仍在运行的训练进程（任务放回队列，下次启动后重新调度）
+    await training_executor.shutdown()
+
+    # 中断运行中的评估与批量推理（已完成的部分已落盘，下次启动后续跑）
+    await evaluation_manager.shutdown()
+    await batch_inference_manager.shutdown()
+
+    # 关闭 Dify 与模型调用的共享连接池（正在转发的流式响应随之结束）
+    await dify_client.close()
+    await close_http_clients()
+
+    # 关闭数据集校验进程池（取消尚未开始的校验）
+    shutdown_process_pool()
+
+    # 最后停止日志监听线程，确保关闭过程中的日志全部写出
+    shutdown_logging()
 
 # app：FastAPI 应用实例
 # 作用：
@@ -308,6 +307,8 @@ app.include_router(admin.router, prefix="/admin", tags=["管理"])
 app.include_router(model_config.router, prefix="/model-config", tags=["模型配置"])
 app.include_router(playground.router, prefix="/playground", tags=["Playground"])
 app.include_router(dify.router, prefix="/dify", tags=["Dify"])
+app.include_router(evaluation.router, prefix="/evaluation", tags=["评估"])
+app.include_router(batch_inference.router, prefix="/batch-inference", tags=["批量推理"])
 
 # 静态文件服务
 # 作用：
@@ -0,0 +1,57 @@
+"""
+假训练脚本：代替 llamafactory-cli 在无 GPU 环境中联调训练执行器
+用法与 LLaMA-Factory 相同：TRAINER_COMMAND="python tests/fake_trainer.py"，执行器实际调用 <命令> train <yaml>。
+
+按步输出 tqdm 进度条与 transformers 风格的指标字典，并向 output_dir/trainer_log.jsonl 追加记录，最后以指定退出码结束。
+行为由 YAML 中的透传参数控制（未设置时读取同名大写环境变量）：
+- fake_steps / FAKE_TRAINER_STEPS：总步数，默认 5；
+- fake_step_seconds / FAKE_TRAINER_STEP_SECONDS：每步耗时（秒），默认 0.05；
+- fake_exit_code / FAKE_TRAINER_EXIT_CODE：退出码，默认 0。
+收到 SIGTERM 时以 143 退出，模拟被停止的训练进程。
+"""
+
+import json
+import os
+import signal
+import sys
+import time
+
+import yaml
+
+
+def _option(args: dict, name: str, default: str) -> str:
+    value = args.get(name)
+    return str(value) if value is not None else os.getenv(name.upper().replace("FAKE_", "FAKE_TRAINER_"), default)
+
+
+def main(argv: list) -> int:
+    if len(argv) != 3 or argv[1] != "train":
+        print(f"usage: {argv[0]} train <config.yaml>", file=sys.stderr)
+        return 2
+    with open(argv[2], encoding="utf-8") as f:
+        args = yaml.safe_load(f) or {}
+    steps = int(_option(args, "fake_steps", "5"))
+    step_seconds = float(_option(args, "fake_step_seconds", "0.05"))
+    exit_code = int(_option(args, "fake_exit_code", "0"))
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(143))
+
+    trainer_log = os.path.join(args["output_dir"], "trainer_log.jsonl")
+    print(f"[fake_trainer] model={args.get('model_name_or_path')} dataset={args.get('dataset')} steps={steps}", flush=True)
+    started = time.monotonic()
+    for step in range(1, steps + 1):
+        time.sleep(step_seconds)
+        loss = round(2.0 / step, 4)
+        elapsed = int(time.monotonic() - started)
+        remaining = int(step_seconds * (steps - step))
+        print(f"{step * 100 // steps:3d}%|#| {step}/{steps} [00:{elapsed:02d}<00:{remaining:02d}, {1 / step_seconds:.2f}it/s]", flush=True)
+        print({"loss": loss, "grad_norm": 0.5, "learning_rate": args.get("learning_rate", 5e-5), "epoch": round(step / steps, 2)}, flush=True)
+        with open(trainer_log, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"current_steps": step, "total_steps": steps, "loss": loss,
+                                "lr": args.get("learning_rate", 5e-5), "epoch": round(step / steps, 2)}) + "\n")
+    if exit_code:
+        print(f"[fake_trainer] exiting with code {exit_code}", file=sys.stderr, flush=True)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
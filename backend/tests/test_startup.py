@@ -0,0 +1,69 @@
+"""
+启动耗时回归测试
+在独立子进程中对临时数据库导入 main 并完整执行一次 lifespan 启动：
+- lifespan 初始化（STARTUP_BUDGET_SECONDS 所约束的部分）不得超过 STARTUP_BUDGET_SECONDS；
+- 导入 main 不得超过 STARTUP_IMPORT_BUDGET_SECONDS（默认 2 秒，可用同名环境变量调整）。
+子进程保证导入阶段从零开始计时，不受本进程已加载模块的影响；取多次测量的最小值，排除机器负载抖动。
+
+运行：cd backend && python -m unittest discover -s tests
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STARTUP_IMPORT_BUDGET_SECONDS = float(os.getenv("STARTUP_IMPORT_BUDGET_SECONDS", "2.0"))
+MEASURE_RUNS = 3
+
+# 子进程脚本：分别记录导入 main 与 lifespan 启动（进入 yield 之前）的耗时
+_PROBE = """
+import asyncio, json, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+from app.utils.startup_profile import STARTUP_BUDGET_SECONDS
+
+async def startup():
+    began = time.perf_counter()
+    async with main.app.router.lifespan_context(main.app):
+        ready = time.perf_counter()
+    return ready - began
+
+init = asyncio.run(startup())
+print(json.dumps({"import": imported - started, "init": init, "budget": STARTUP_BUDGET_SECONDS}))
+"""
+
+
+def measure_startup(work_dir: str) -> dict:
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{os.path.join(work_dir, 'startup.db')}",
+        "PYTHONPATH": BACKEND_DIR,
+    }
+    proc = subprocess.run(
+        [sys.executable, "-c", _PROBE], cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=120,
+    )
+    if proc.returncode != 0:
+        raise AssertionError(f"启动子进程失败（退出码 {proc.returncode}）：\n{proc.stderr.decode('utf-8', 'replace')[-2000:]}")
+    return json.loads(proc.stdout.decode().strip().splitlines()[-1])
+
+
+class StartupBudgetTest(unittest.TestCase):
+    def test_startup_within_budget(self):
+        with tempfile.TemporaryDirectory() as work_dir:
+            # 首次运行新建表结构（之后由 schema 指纹跳过），之后才是常规重启的耗时
+            measure_startup(work_dir)
+            timings = [measure_startup(work_dir) for _ in range(MEASURE_RUNS)]
+        imported = min(timing["import"] for timing in timings)
+        init = min(timing["init"] for timing in timings)
+        self.assertLess(init, timings[0]["budget"], f"lifespan 初始化耗时超出预算: {timings}")
+        self.assertLess(imported, STARTUP_IMPORT_BUDGET_SECONDS, f"导入 main 耗时超出预算: {timings}")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,180 @@
+"""
+训练执行器端到端测试
+用 tests/fake_trainer.py 代替 llamafactory-cli，让任务完整经过 queued → running → completed / failed / cancelled，
+并检查进度、指标与指标时间序列是否写回。数据库、数据集目录与输出目录都在临时目录中。
+
+运行：cd backend && python -m unittest discover -s tests
+"""
+
+import asyncio
+import json
+import os
+import shlex
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from unittest import mock
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORK_DIR = tempfile.mkdtemp(prefix="modeltrain-executor-test-")
+# 必须在导入 app 之前设置：数据库与各目录在模块导入时确定
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(WORK_DIR, 'test.db')}"
+os.environ["LLAMAFACTORY_DATA_DIR"] = os.path.join(WORK_DIR, "llamafactory")
+os.environ["TRAINING_GPU_COUNT"] = "0"
+os.environ["TRAINING_PROGRESS_INTERVAL"] = "0.2"
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+import main  # noqa: E402,F401  注册全部模型
+from app.database import SessionLocal, engine, init_schema  # noqa: E402
+from app.models.training import Dataset, TrainingConfig, TrainingTask  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.services import training_executor as executor_module  # noqa: E402
+from app.services.metrics_store import query_metrics  # noqa: E402
+from app.services.training_progress import TrainingMonitor  # noqa: E402
+
+FAKE_TRAINER = os.path.join(BACKEND_DIR, "tests", "fake_trainer.py")
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+
+
+def setUpModule():
+    init_schema(engine)
+    executor_module.TRAINER_COMMAND = f"{shlex.quote(sys.executable)} {shlex.quote(FAKE_TRAINER)}"
+    executor_module.TRAINING_STOP_GRACE = 5
+
+
+class TrainingExecutorTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        db = SessionLocal()
+        try:
+            user = db.query(User).filter(User.email == "executor-test@example.com").first()
+            if user is None:
+                user = User(email="executor-test@example.com", password_hash="x")
+                db.add(user)
+                db.flush()
+            data_path = os.path.join(WORK_DIR, "alpaca.jsonl")
+            with open(data_path, "w", encoding="utf-8") as f:
+                for i in range(20):
+                    f.write(json.dumps({"instruction": f"问题 {i}", "input": "", "output": f"回答 {i}"}, ensure_ascii=False) + "\n")
+            dataset = Dataset(name="executor-test", file_path=data_path, format_type="jsonl", uploaded_by=user.id)
+            db.add(dataset)
+            db.commit()
+            self.user_id, self.dataset_id = user.id, dataset.id
+        finally:
+            db.close()
+        self.executor = executor_module.TrainingExecutor(max_concurrent=1)
+
+    async def asyncTearDown(self):
+        await self.executor.shutdown()
+
+    def _create_task(self, **fake_options) -> int:
+        db = SessionLocal()
+        try:
+            config = TrainingConfig(name="fake", config_data={"fake_step_seconds": 0.05, **fake_options}, created_by=self.user_id)
+            db.add(config)
+            db.flush()
+            task = TrainingTask(
+                name="fake-run", model_name="fake/model", dataset_id=self.dataset_id, config_id=config.id,
+                status="queued", queued_at=datetime.now(timezone.utc), created_by=self.user_id,
+                output_dir=tempfile.mkdtemp(prefix="output-", dir=WORK_DIR),
+            )
+            db.add(task)
+            db.commit()
+            return task.id
+        finally:
+            db.close()
+
+    @staticmethod
+    def _load(task_id: int) -> TrainingTask:
+        db = SessionLocal()
+        try:
+            task = db.get(TrainingTask, task_id)
+            db.expunge(task)
+            return task
+        finally:
+            db.close()
+
+    async def _wait_for(self, task_id: int, statuses, timeout: float = 30) -> TrainingTask:
+        deadline = asyncio.get_running_loop().time() + timeout
+        while True:
+            task = self._load(task_id)
+            if task.status in statuses:
+                return task
+            if asyncio.get_running_loop().time() > deadline:
+                self.fail(f"任务 {task_id} 在 {timeout}s 内未进入 {statuses}，当前状态 {task.status}")
+            await asyncio.sleep(0.05)
+
+    async def test_completed(self):
+        task_id = self._create_task(fake_steps=5)
+        self.executor.submit(task_id)
+        await self._wait_for(task_id, ("running",) + TERMINAL_STATUSES)
+        task = await self._wait_for(task_id, TERMINAL_STATUSES)
+
+        self.assertEqual(task.status, "completed")
+        self.assertEqual(task.progress, 1.0)
+        self.assertIsNone(task.pid)
+        self.assertIsNotNone(task.completed_at)
+        self.assertEqual(task.metrics["step"], 5)
+        self.assertEqual(task.metrics["total_steps"], 5)
+        self.assertAlmostEqual(task.metrics["loss"], 0.4)
+        loss = query_metrics(task.output_dir, ["loss"])["loss"]
+        self.assertEqual([step for step, _ in loss["points"]], [1, 2, 3, 4, 5])
+
+    async def test_rerun_replaces_metric_series(self):
+        task_id = self._create_task(fake_steps=6)
+        self.executor.submit(task_id)
+        await self._wait_for(task_id, ("completed",))
+        db = SessionLocal()
+        try:
+            task = db.get(TrainingTask, task_id)
+            task.config.config_data = {**task.config.config_data, "fake_steps": 3}
+            task.status = "queued"
+            db.commit()
+        finally:
+            db.close()
+        self.executor.submit(task_id)
+        task = await self._wait_for(task_id, ("completed",))
+        # 没有 checkpoint 的重跑是全新运行：序列与 trainer_log 都从本次运行重新开始，不残留上次的第 4-6 步
+        loss = query_metrics(task.output_dir, ["loss"])["loss"]
+        self.assertEqual([step for step, _ in loss["points"]], [1, 2, 3])
+        self.assertEqual(task.metrics["total_steps"], 3)
+        with open(os.path.join(task.output_dir, "trainer_log.jsonl"), encoding="utf-8") as f:
+            self.assertEqual(len(f.readlines()), 3)
+
+    async def test_progress_error_keeps_exit_status(self):
+        task_id = self._create_task(fake_steps=2)
+        with mock.patch.object(TrainingMonitor, "stop", side_effect=OSError("disk error")):
+            self.executor.submit(task_id)
+            task = await self._wait_for(task_id, TERMINAL_STATUSES)
+        # 进度收尾失败不影响任务结果：退出码为 0 即为完成
+        self.assertEqual(task.status, "completed")
+        self.assertIsNone(task.error_message)
+
+    async def test_failed(self):
+        task_id = self._create_task(fake_steps=2, fake_exit_code=3)
+        self.executor.submit(task_id)
+        task = await self._wait_for(task_id, TERMINAL_STATUSES)
+
+        self.assertEqual(task.status, "failed")
+        self.assertIn("3", task.error_message)
+        self.assertEqual(task.metrics["step"], 2)
+        with open(task.log_file, encoding="utf-8") as f:
+            self.assertIn("exiting with code 3", f.read())
+
+    async def test_cancelled(self):
+        task_id = self._create_task(fake_steps=200, fake_step_seconds=0.1)
+        self.executor.submit(task_id)
+        task = await self._wait_for(task_id, ("running",) + TERMINAL_STATUSES)
+        self.assertEqual(task.status, "running")
+        self.assertIsNotNone(task.pid)
+
+        self.assertTrue(await self.executor.stop(task_id))
+        task = await self._wait_for(task_id, TERMINAL_STATUSES)
+        self.assertEqual(task.status, "cancelled")
+        self.assertIsNone(task.pid)
+        self.assertFalse(self.executor.is_active(task_id))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+"""
+训练进度解析测试
+不启动训练进程，直接向 train.log / trainer_log.jsonl 写入内容，检查 TrainingMonitor 的跟踪与收尾行为。
+
+运行：cd backend && python -m unittest discover -s tests
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORK_DIR = tempfile.mkdtemp(prefix="modeltrain-progress-test-")
+# 单独运行本模块时也不触碰开发数据库（与其他测试模块一起运行时以先导入者为准）
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(WORK_DIR, 'test.db')}")
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from app.services import training_progress  # noqa: E402
+from app.services.metrics_store import query_metrics  # noqa: E402
+from app.services.training_progress import TRAINER_LOG_FILE, TrainingMonitor  # noqa: E402
+
+
+def _write_trainer_log(path: str, steps, mode: str = "a") -> None:
+    with open(path, mode, encoding="utf-8") as f:
+        for step in steps:
+            f.write(json.dumps({"current_steps": step, "total_steps": 10, "loss": 1.0 / step}) + "\n")
+
+
+class TrainingMonitorTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp(prefix="output-", dir=WORK_DIR)
+        self.log_file = os.path.join(self.output_dir, "train.log")
+        self.trainer_log = os.path.join(self.output_dir, TRAINER_LOG_FILE)
+        open(self.log_file, "wb").close()
+
+    async def _wait_for_step(self, monitor: TrainingMonitor, step: int, timeout: float = 5) -> None:
+        deadline = asyncio.get_running_loop().time() + timeout
+        while monitor.metrics.get("step") != step:
+            if asyncio.get_running_loop().time() > deadline:
+                self.fail(f"{timeout}s 内未读到第 {step} 步，当前指标 {monitor.metrics}")
+            await asyncio.sleep(0.02)
+
+    async def test_trainer_log_truncated_while_following(self):
+        _write_trainer_log(self.trainer_log, range(1, 6))
+        with mock.patch.object(training_progress, "TRAINER_LOG_POLL_INTERVAL", 0.02):
+            monitor = TrainingMonitor(1, self.log_file, self.output_dir, 0, 0)
+            monitor.start()
+            await self._wait_for_step(monitor, 5)
+            # 训练重新开始、日志被截断重写：应从头读取新内容，而不是中断跟踪
+            _write_trainer_log(self.trainer_log, range(1, 3), mode="w")
+            await self._wait_for_step(monitor, 2)
+            _write_trainer_log(self.trainer_log, range(3, 5))
+            await self._wait_for_step(monitor, 4)
+            self.assertFalse(any(task.done() for task in monitor._tasks))
+            await monitor.stop()
+        self.assertEqual(monitor.metrics["step"], 4)
+        self.assertAlmostEqual(monitor.metrics["loss"], 0.25)
+
+    async def test_truncated_before_stop(self):
+        _write_trainer_log(self.trainer_log, range(1, 6))
+        monitor = TrainingMonitor(1, self.log_file, self.output_dir, 0, 0)
+        monitor._read_trainer_log()
+        _write_trainer_log(self.trainer_log, [1], mode="w")
+        await monitor.stop()
+        self.assertEqual(monitor.metrics["step"], 1)
+        self.assertEqual(query_metrics(self.output_dir, ["loss"])["loss"]["total"], 5)
+
+
+    async def test_follower_error_does_not_orphan_sibling(self):
+        with mock.patch.object(training_progress, "TRAINER_LOG_POLL_INTERVAL", 0.02), \
+                mock.patch.object(TrainingMonitor, "_feed_stdout", side_effect=ValueError("bad line")):
+            monitor = TrainingMonitor(1, self.log_file, self.output_dir, 0, 0)
+            monitor.start()
+            stdout_task, trainer_log_task = monitor._tasks
+            with open(self.log_file, "ab") as f:
+                f.write(b" 10%|#| 1/10 [00:01<00:09,  1.00it/s]\n")
+            # stdout 一路出错结束，trainer_log 一路继续跟踪
+            _write_trainer_log(self.trainer_log, range(1, 3))
+            await self._wait_for_step(monitor, 2)
+            self.assertTrue(stdout_task.done())
+            self.assertFalse(trainer_log_task.done())
+            with self.assertRaises(ValueError):
+                await monitor.stop()
+        self.assertTrue(trainer_log_task.cancelled())
+        self.assertEqual(query_metrics(self.output_dir, ["loss"])["loss"]["total"], 2)
+
+if __name__ == "__main__":
+    unittest.main()
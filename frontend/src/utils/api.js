@@ -235,6 +235,7 @@ export const modelConfigAPI = {
   deleteModel: (modelId) => api.delete(`/model-config/${modelId}`),
   getAvailableModels: (providerId) => api.get('/model-config/models', { params: { provider_id: providerId } }),
   refreshModels: (refreshData) => api.post('/model-config/models/refresh', refreshData),
+  refreshAllModels: () => api.post('/model-config/models/refresh-all'),
 }
 
 export const trainingAPI = {
@@ -248,6 +249,27 @@ export const trainingAPI = {
       headers: { 'Content-Type': 'multipart/form-data' }
     })
   },
+  // 大文件分块上传（支持断点续传：再次调用时从服务端已接收的偏移继续）
+  uploadDatasetChunked: async (file, { name, description, uploadId, onProgress } = {}) => {
+    let status
+    if (uploadId) {
+      status = (await api.get(`/training/datasets/uploads/${uploadId}`)).data
+    } else {
+      status = (await api.post('/training/datasets/uploads', { filename: file.name, total_size: file.size })).data
+    }
+    while (status.received < status.total_size) {
+      const chunk = file.slice(status.received, status.received + status.chunk_size)
+      status = (await api.put(`/training/datasets/uploads/${status.upload_id}`, chunk, {
+        params: { offset: status.received },
+        headers: { 'Content-Type': 'application/octet-stream' }
+      })).data
+      if (onProgress) onProgress(status)
+    }
+    return api.post(`/training/datasets/uploads/${status.upload_id}/complete`, { name, description })
+  },
+  // 秒传：服务端已有相同内容（SHA-256）时直接创建数据集，返回 404 表示需要上传
+  createDatasetFromHash: (sha256, filename, name, description) =>
+    api.post('/training/datasets/from-hash', { sha256, filename, name, description }),
   getDatasets: () => api.get('/training/datasets'),
   deleteDataset: (datasetId) => api.delete(`/training/datasets/${datasetId}`),
   
@@ -257,7 +279,12 @@ export const trainingAPI = {
   startTraining: (taskId) => api.post(`/training/tasks/${taskId}/start`),
   stopTraining: (taskId) => api.post(`/training/tasks/${taskId}/stop`),
   getTrainingLogs: (taskId) => api.get(`/training/tasks/${taskId}/logs`),
+  getTrainingLogStreamToken: (taskId) => api.post(`/training/tasks/${taskId}/logs/stream-token`),
   
+  // 辅助服务（按需启动，轮询同时续期）
+  getLlamaFactoryHealth: () => api.get('/training/llamafactory/health'),
+  getSwanBoardHealth: () => api.get('/training/swanlab/health'),
+
   // SwanLab 管理
   getSwanLabInfo: () => api.get('/training/swanlab'),
   startSwanLab: (config) => api.post('/training/swanlab/start', config),